@@ -10,7 +10,9 @@ from .models import (
     MorphologyTool,
     BlobToolConfig,
     LocateToolConfig,
+    TemplateToolConfig,
     MathTool,
+    SpcToolConfig,
     InspectionResult,
 )
 
@@ -123,6 +125,17 @@ class LocateToolConfigInline(admin.StackedInline):
     ]
 
 
+class TemplateToolConfigInline(admin.StackedInline):
+    model = TemplateToolConfig
+    extra = 0
+    can_delete = True
+    fieldsets = [
+        ('Modelo', { 'fields': ['template'] }),
+        ('Parâmetros', { 'fields': ['min_score','angle_range','angle_step','pyramid_levels','candidates','apply_transform','rotate'] }),
+        ('Reference', { 'fields': ['reference_x','reference_y','reference_A'] }),
+    ]
+
+
 class MathToolInline(admin.StackedInline):
     model = MathTool
     fk_name = 'tool'
@@ -131,6 +144,20 @@ class MathToolInline(admin.StackedInline):
     raw_id_fields = ['reference_tool']
 
 
+class SpcToolConfigInline(admin.StackedInline):
+    model = SpcToolConfig
+    fk_name = 'tool'
+    extra = 0
+    can_delete = True
+    raw_id_fields = ['reference_tool']
+    fieldsets = [
+        ('Campo', { 'fields': ['reference_tool','field'] }),
+        ('Janela', { 'fields': ['window','baseline'] }),
+        ('Limites', { 'fields': ['lsl','usl','center','sigma'] }),
+        ('Regras', { 'fields': ['rules','fail_on_drift'] }),
+    ]
+
+
 @admin.register(InspectionTool)
 class InspectionToolAdmin(admin.ModelAdmin):
     list_display = ['name', 'type', 'tool_kind', 'inspection', 'order_index', 'inspec_pass_fail', 'updated_at']
@@ -144,7 +171,9 @@ class InspectionToolAdmin(admin.ModelAdmin):
         MorphologyToolInline,
         BlobToolConfigInline,
         LocateToolConfigInline,
+        TemplateToolConfigInline,
         MathToolInline,
+        SpcToolConfigInline,
     ]
     ordering = ['inspection', 'order_index']
 
@@ -0,0 +1,136 @@
+"""
+Decodificação da geometria compacta dos resultados da VM (blobs_packed/edges_packed).
+
+A VM publica e envia nos logs a geometria de blobs/bordas codificada
+(vision_machine/tools/geometry_codec.py); o orquestrador armazena `result_json` como veio e
+devolve a forma expandida (`blobs`/`edges`) na leitura pela API. Implementação em Python puro
+(o servidor não depende de numpy), equivalente a `unpack_tool_result` da VM.
+"""
+import base64
+import struct
+from typing import Any, Dict, List
+
+BLOB_CODEC = 'vmgeo1'
+EDGE_CODEC = 'vmcol1'
+_BLOB_COLUMNS = 10
+
+
+def _read_varints(data: bytes) -> List[int]:
+    """Varints zigzag (7 bits por byte) -> inteiros com sinal."""
+    values = []
+    z = shift = 0
+    for byte in data:
+        z |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((z >> 1) ^ -(z & 1))
+        z = shift = 0
+    return values
+
+
+def unpack_blobs(packed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if packed.get('codec') != BLOB_CODEC:
+        raise ValueError(f"Codec de blobs desconhecido: {packed.get('codec')}")
+    n = int(packed.get('count', 0))
+    stream = _read_varints(base64.b64decode(packed.get('data', '')))
+    columns = [stream[k * n:(k + 1) * n] for k in range(_BLOB_COLUMNS)]
+    # Canto da bounding box como delta do blob anterior
+    for k in (1, 2):
+        total = 0
+        for i, delta in enumerate(columns[k]):
+            total += delta
+            columns[k][i] = total
+    n_polys = sum(columns[7])
+    offset = _BLOB_COLUMNS * n
+    counts = stream[offset:offset + n_polys]
+    points = stream[offset + n_polys:]
+
+    blobs = []
+    poly_index = 0
+    position = 0
+    for i in range(n):
+        bx, by = columns[1][i], columns[2][i]
+        polys = []
+        for count in counts[poly_index:poly_index + columns[7][i]]:
+            size = abs(count)
+            # Primeiro ponto relativo ao canto da bounding box; demais como delta do anterior
+            x, y = bx, by
+            poly = []
+            for k in range(size):
+                x += points[position + 2 * k]
+                y += points[position + 2 * k + 1]
+                poly.append([x, y])
+            position += 2 * size
+            if count < 0 and poly:
+                poly.append(list(poly[0]))
+            polys.append(poly)
+        poly_index += columns[7][i]
+        contour_ref = columns[8][i]
+        blob = {
+            'area': float(columns[0][i]),
+            'centroid': [bx + columns[5][i], by + columns[6][i]],
+            'bounding_box': [bx, by, columns[3][i], columns[4][i]],
+            'contour': polys[contour_ref - 1] if contour_ref else [],
+        }
+        if columns[9][i]:
+            blob['contours'] = polys
+        blobs.append(blob)
+    return blobs
+
+
+def unpack_edges(packed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if packed.get('codec') != EDGE_CODEC:
+        raise ValueError(f"Codec de bordas desconhecido: {packed.get('codec')}")
+    fields = packed.get('fields', [])
+    data = base64.b64decode(packed.get('data', ''))
+    if not fields:
+        return []
+    table = struct.unpack(f'<{len(data) // 8}d', data)
+    edges = []
+    for start in range(0, len(table), len(fields)):
+        edge = {}
+        for field, value in zip(fields, table[start:start + len(fields)]):
+            if field[1] == 's':
+                value = field[2][int(value)]
+            elif field[1] == 'i':
+                value = int(value)
+            edge[field[0]] = value
+        edges.append(edge)
+    return edges
+
+
+def unpack_tool_result(result: Any) -> Any:
+    """Resultado de ferramenta com `blobs`/`edges` expandidos (os demais voltam intactos)."""
+    if not isinstance(result, dict) or ('blobs_packed' not in result and 'edges_packed' not in result):
+        return result
+    result = dict(result)
+    if 'blobs_packed' in result:
+        result['blobs'] = unpack_blobs(result.pop('blobs_packed'))
+    if 'edges_packed' in result:
+        result['edges'] = unpack_edges(result.pop('edges_packed'))
+    return result
+
+
+# Chaves do log da VM com a lista de resultados das ferramentas
+_RESULT_LIST_KEYS = ('result', 'tool_results')
+
+
+def unpack_result_json(result_json: Any) -> Any:
+    """`result_json` de um InspectionResult expandido.
+
+    Aceita a lista de resultados de ferramentas, o log da VM (dict com a lista em `result` ou
+    `tool_results`) ou um único resultado. Geometria que não decodifica segue como foi armazenada.
+    """
+    try:
+        if isinstance(result_json, list):
+            return [unpack_tool_result(result) for result in result_json]
+        if isinstance(result_json, dict) and any(isinstance(result_json.get(key), list) for key in _RESULT_LIST_KEYS):
+            result_json = dict(result_json)
+            for key in _RESULT_LIST_KEYS:
+                if isinstance(result_json.get(key), list):
+                    result_json[key] = [unpack_tool_result(result) for result in result_json[key]]
+            return result_json
+        return unpack_tool_result(result_json)
+    except (TypeError, ValueError, KeyError, IndexError, struct.error):
+        return result_json
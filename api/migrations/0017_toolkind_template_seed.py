@@ -0,0 +1,73 @@
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_template_toolkind(apps, schema_editor):
+    ToolKind = apps.get_model('api', 'ToolKind')
+    data = {
+        'slug': 'template',
+        'label': 'Template',
+        'category': 'analytic',
+        'description': 'Localização de um modelo por correlação em pirâmide (score, x,y,ângulo)'
+    }
+    ToolKind.objects.update_or_create(slug=data['slug'], defaults=data)
+
+
+def unseed_template_toolkind(apps, schema_editor):
+    ToolKind = apps.get_model('api', 'ToolKind')
+    ToolKind.objects.filter(slug='template').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_locatetoolconfig_reference_a_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inspectiontool',
+            name='type',
+            field=models.CharField(
+                choices=[
+                    ('grayscale', 'Grayscale'),
+                    ('blur', 'Blur'),
+                    ('threshold', 'Threshold'),
+                    ('morphology', 'Morphology'),
+                    ('blob', 'Blob'),
+                    ('locate', 'Locate'),
+                    ('template', 'Template'),
+                    ('math', 'Math'),
+                ],
+                max_length=20,
+                verbose_name='Tipo',
+            ),
+        ),
+        migrations.CreateModel(
+            name='TemplateToolConfig',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('template', models.TextField(blank=True, default='')),
+                ('min_score', models.FloatField(default=0.7, validators=[
+                    django.core.validators.MinValueValidator(-1.0),
+                    django.core.validators.MaxValueValidator(1.0),
+                ])),
+                ('angle_range', models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0.0)])),
+                ('angle_step', models.FloatField(default=1.0, validators=[django.core.validators.MinValueValidator(0.1)])),
+                ('pyramid_levels', models.IntegerField(default=-1)),
+                ('candidates', models.IntegerField(default=3, validators=[django.core.validators.MinValueValidator(1)])),
+                ('apply_transform', models.BooleanField(default=False)),
+                ('rotate', models.BooleanField(default=False)),
+                ('reference_x', models.FloatField(blank=True, null=True)),
+                ('reference_y', models.FloatField(blank=True, null=True)),
+                ('reference_A', models.FloatField(blank=True, null=True)),
+                ('tool', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='template',
+                    to='api.inspectiontool',
+                )),
+            ],
+        ),
+        migrations.RunPython(seed_template_toolkind, unseed_template_toolkind),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0017_toolkind_template_seed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mathtool",
+            name="result_min",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="mathtool",
+            name="result_max",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
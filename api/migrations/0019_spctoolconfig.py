@@ -0,0 +1,76 @@
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_spc_toolkind(apps, schema_editor):
+    ToolKind = apps.get_model('api', 'ToolKind')
+    data = {
+        'slug': 'spc',
+        'label': 'SPC',
+        'category': 'math',
+        'description': 'Controle estatístico de um campo ao longo dos frames (média, desvio, Cp/Cpk, regras de Western Electric)'
+    }
+    ToolKind.objects.update_or_create(slug=data['slug'], defaults=data)
+
+
+def unseed_spc_toolkind(apps, schema_editor):
+    ToolKind = apps.get_model('api', 'ToolKind')
+    ToolKind.objects.filter(slug='spc').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_mathtool_result_limits'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inspectiontool',
+            name='type',
+            field=models.CharField(
+                choices=[
+                    ('grayscale', 'Grayscale'),
+                    ('blur', 'Blur'),
+                    ('threshold', 'Threshold'),
+                    ('morphology', 'Morphology'),
+                    ('blob', 'Blob'),
+                    ('locate', 'Locate'),
+                    ('template', 'Template'),
+                    ('math', 'Math'),
+                    ('spc', 'SPC'),
+                ],
+                max_length=20,
+                verbose_name='Tipo',
+            ),
+        ),
+        migrations.CreateModel(
+            name='SpcToolConfig',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=200)),
+                ('window', models.IntegerField(default=100, validators=[django.core.validators.MinValueValidator(2)])),
+                ('baseline', models.IntegerField(default=25, validators=[django.core.validators.MinValueValidator(2)])),
+                ('lsl', models.FloatField(blank=True, null=True)),
+                ('usl', models.FloatField(blank=True, null=True)),
+                ('center', models.FloatField(blank=True, null=True)),
+                ('sigma', models.FloatField(blank=True, null=True)),
+                ('rules', models.CharField(blank=True, default='1,2,3,4', max_length=20)),
+                ('fail_on_drift', models.BooleanField(default=True)),
+                ('reference_tool', models.ForeignKey(
+                    blank=True,
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='referenced_by_spc',
+                    to='api.inspectiontool',
+                )),
+                ('tool', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='spc',
+                    to='api.inspectiontool',
+                )),
+            ],
+        ),
+        migrations.RunPython(seed_spc_toolkind, unseed_spc_toolkind),
+    ]
@@ -209,7 +209,9 @@ class InspectionTool(models.Model):
         ('morphology', 'Morphology'),
         ('blob', 'Blob'),
         ('locate', 'Locate'),
+        ('template', 'Template'),
         ('math', 'Math'),
+        ('spc', 'SPC'),
     ]
 
     inspection = models.ForeignKey(
@@ -336,6 +338,23 @@ class LocateToolConfig(models.Model):
     reference_A = models.FloatField(null=True, blank=True)  # graus
 
 
+class TemplateToolConfig(models.Model):
+    tool = models.OneToOneField(InspectionTool, on_delete=models.CASCADE, related_name='template')
+    # modelo (PNG/JPEG em base64)
+    template = models.TextField(blank=True, default='')
+    # parâmetros
+    min_score = models.FloatField(default=0.7, validators=[MinValueValidator(-1.0), MaxValueValidator(1.0)])
+    angle_range = models.FloatField(default=0.0, validators=[MinValueValidator(0.0)])
+    angle_step = models.FloatField(default=1.0, validators=[MinValueValidator(0.1)])
+    pyramid_levels = models.IntegerField(default=-1)  # -1 = automático
+    candidates = models.IntegerField(default=3, validators=[MinValueValidator(1)])
+    apply_transform = models.BooleanField(default=False)
+    rotate = models.BooleanField(default=False)
+    reference_x = models.FloatField(null=True, blank=True)
+    reference_y = models.FloatField(null=True, blank=True)
+    reference_A = models.FloatField(null=True, blank=True)  # graus
+
+
 class MathTool(models.Model):
     tool = models.OneToOneField(InspectionTool, on_delete=models.CASCADE, related_name='math')
     operation = models.CharField(
@@ -345,3 +364,24 @@ class MathTool(models.Model):
     )
     reference_tool = models.ForeignKey(InspectionTool, null=True, blank=True, on_delete=models.SET_NULL, related_name='referenced_by_math')
     custom_formula = models.TextField(blank=True)
+    # faixa de aprovação do resultado (vazio = padrão da operação)
+    result_min = models.FloatField(null=True, blank=True)
+    result_max = models.FloatField(null=True, blank=True)
+
+
+class SpcToolConfig(models.Model):
+    tool = models.OneToOneField(InspectionTool, on_delete=models.CASCADE, related_name='spc')
+    reference_tool = models.ForeignKey(InspectionTool, null=True, blank=True, on_delete=models.SET_NULL, related_name='referenced_by_spc')
+    # campo acompanhado (ex.: total_area, offset.x, t3.blob_count)
+    field = models.CharField(max_length=200)
+    window = models.IntegerField(default=100, validators=[MinValueValidator(2)])
+    baseline = models.IntegerField(default=25, validators=[MinValueValidator(2)])
+    # limites de especificação
+    lsl = models.FloatField(null=True, blank=True)
+    usl = models.FloatField(null=True, blank=True)
+    # linha central/sigma das regras (vazio = estimado na linha de base)
+    center = models.FloatField(null=True, blank=True)
+    sigma = models.FloatField(null=True, blank=True)
+    # regras de Western Electric ativas (ex.: "1,2,3,4")
+    rules = models.CharField(max_length=20, default='1,2,3,4', blank=True)
+    fail_on_drift = models.BooleanField(default=True)
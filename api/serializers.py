@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import VirtualMachine, InspectionResult
+from .geometry import unpack_result_json
 
 
 class VirtualMachineListSerializer(serializers.ModelSerializer):
@@ -150,4 +151,10 @@ class InspectionResultSerializer(serializers.ModelSerializer):
             'approved', 'duration_ms', 'image_url', 'image_mime',
             'image_width', 'image_height', 'result_json', 'created_at'
         ]
-        read_only_fields = ['id', 'created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Geometria armazenada compacta (blobs_packed/edges_packed) volta expandida
+        data['result_json'] = unpack_result_json(data.get('result_json'))
+        return data
\ No newline at end of file
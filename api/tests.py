@@ -1,3 +1,231 @@
-from django.test import TestCase
+"""
+Testes dos modelos de configuração das ferramentas e das migrações que os criam
+"""
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from .models import (
+    VirtualMachine, Inspection, InspectionTool, ToolKind,
+    TemplateToolConfig, MathTool, SpcToolConfig,
+)
+from user.models import User
+
+
+class ToolConfigTestCase(TestCase):
+    """Base: VM, inspeção e cliente autenticado para os testes de configuração das tools"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass123')
+        self.vm = VirtualMachine.objects.create(
+            machine_id='VM001',
+            name='VM de Teste',
+            status='running',
+            mode='TESTE',
+            ip_address='192.168.1.100',
+            port=5000,
+            inspection_config={},
+            owner=self.user
+        )
+        self.inspection = Inspection.objects.create(vm=self.vm, name='Inspeção')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _tool(self, name, type, order_index=0):
+        return InspectionTool.objects.create(inspection=self.inspection, name=name, type=type, order_index=order_index)
+
+    def _save_and_read(self, tools_cfg):
+        """Salva a configuração da VM como inspeção e devolve as tools lidas no detalhe"""
+        self.vm.inspection_config = {'tools': tools_cfg}
+        self.vm.save()
+        response = self.client.post(reverse('save_inspection', args=[self.vm.id]), {'name': 'Nova'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['tools_created'], len(tools_cfg))
+        response = self.client.get(reverse('inspection_detail', args=[response.data['inspection_id']]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['tools']
+
+
+class TemplateToolConfigTestCase(ToolConfigTestCase):
+    """Tool de template (migração 0017)"""
+
+    def test_toolkind_seeded(self):
+        self.assertEqual(ToolKind.objects.get(slug='template').category, 'analytic')
+
+    def test_defaults(self):
+        template = TemplateToolConfig.objects.create(tool=self._tool('template', 'template'))
+        template.refresh_from_db()
+        self.assertEqual((template.template, template.min_score, template.angle_range, template.angle_step), ('', 0.7, 0.0, 1.0))
+        self.assertEqual((template.pyramid_levels, template.candidates), (-1, 3))
+        self.assertIsNone(template.reference_A)
+
+    def test_save_and_detail_round_trip(self):
+        template, plain = self._save_and_read([
+            {'id': 1, 'name': 'template', 'type': 'template', 'template': 'aGVsbG8=', 'min_score': 0.0,
+             'angle_range': 15, 'angle_step': 0.5, 'pyramid_levels': 0, 'candidates': 5,
+             'reference': {'x': 10.5, 'y': 20.0, 'angle_deg': -3.0}},
+            {'id': 2, 'name': 'sem_ref', 'type': 'template'},
+        ])
+        self.assertEqual(template['template'], 'aGVsbG8=')
+        # Zeros explícitos não são trocados pelos padrões
+        self.assertEqual((template['min_score'], template['angle_step'], template['pyramid_levels']), (0.0, 0.5, 0))
+        self.assertEqual(template['reference'], {'x': 10.5, 'y': 20.0, 'angle_deg': -3.0})
+        self.assertEqual((plain['min_score'], plain['pyramid_levels']), (0.7, -1))
+        self.assertIsNone(plain['reference'])
+
+
+class MathToolLimitsTestCase(ToolConfigTestCase):
+    """Faixa de aprovação da MathTool (migração 0018)"""
+
+    def test_limits_default_to_operation_range(self):
+        math = MathTool.objects.create(tool=self._tool('math', 'math'), operation='area_ratio')
+        math.refresh_from_db()
+        self.assertIsNone(math.result_min)
+        self.assertIsNone(math.result_max)
+
+    def test_save_and_detail_round_trip(self):
+        blob, math, open_range = self._save_and_read([
+            {'id': 1, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255},
+            {'id': 2, 'name': 'math', 'type': 'math', 'operation': 'custom_formula',
+             'custom_formula': 't1.total_area / 2', 'reference_tool_name': 'blob', 'result_min': 0.0,
+             'result_max': 12.5},
+            {'id': 3, 'name': 'ratio', 'type': 'math', 'operation': 'area_ratio', 'reference_tool_name': 'blob'},
+        ])
+        self.assertEqual(math['custom_formula'], 't1.total_area / 2')
+        self.assertEqual((math['result_min'], math['result_max']), (0.0, 12.5))
+        self.assertEqual(math['reference_tool_id'], blob['id'])
+        self.assertEqual((open_range['result_min'], open_range['result_max']), (None, None))
+
+
+class SpcToolConfigTestCase(ToolConfigTestCase):
+    """Tool de SPC (migração 0019)"""
+
+    def test_toolkind_seeded(self):
+        self.assertEqual(ToolKind.objects.get(slug='spc').category, 'math')
+
+    def test_defaults(self):
+        spc = SpcToolConfig.objects.create(tool=self._tool('spc', 'spc'), field='total_area')
+        spc.refresh_from_db()
+        self.assertEqual((spc.window, spc.baseline, spc.rules, spc.fail_on_drift), (100, 25, '1,2,3,4', True))
+        self.assertIsNone(spc.center)
+        self.assertEqual(self.inspection.tools.get(name='spc').spc, spc)
+
+    def test_reference_tool_deleted(self):
+        """Apagar a tool acompanhada mantém o SPC sem referência; apagar a tool apaga a configuração"""
+        blob = self._tool('blob', 'blob')
+        spc_tool = self._tool('spc', 'spc', 1)
+        spc = SpcToolConfig.objects.create(tool=spc_tool, reference_tool=blob, field='total_area')
+        self.assertEqual(list(blob.referenced_by_spc.all()), [spc])
+        blob.delete()
+        spc.refresh_from_db()
+        self.assertIsNone(spc.reference_tool)
+        spc_tool.delete()
+        self.assertFalse(SpcToolConfig.objects.exists())
+
+    def test_save_and_detail_round_trip(self):
+        blob, spc = self._save_and_read([
+            {'id': 1, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255},
+            {'id': 2, 'name': 'spc', 'type': 'spc', 'reference_tool_name': 'blob', 'field': 'total_area',
+             'window': 50, 'baseline': 10, 'lsl': 100.0, 'usl': 900.0, 'rules': [1, 4], 'fail_on_drift': False},
+        ])
+        self.assertEqual(spc['reference_tool_id'], blob['id'])
+        self.assertEqual((spc['field'], spc['window'], spc['baseline']), ('total_area', 50, 10))
+        self.assertEqual((spc['lsl'], spc['usl']), (100.0, 900.0))
+        self.assertEqual(spc['rules'], [1, 4])
+        self.assertIs(spc['fail_on_drift'], False)
+        self.assertIsNone(spc['center'])
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Base: aplica `migrate_to` a partir de `migrate_from` e volta ao estado mais recente no fim"""
+
+    migrate_from = None
+    migrate_to = None
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def _inspection_tool(self, apps, type):
+        """Tool criada com o estado de modelos da migração em `apps`"""
+        User = apps.get_model('user', 'User')
+        owner = User.objects.create(username=f'owner_{type}')
+        vm = apps.get_model('api', 'VirtualMachine').objects.create(machine_id=f'VM_{type}', name='VM', owner=owner)
+        inspection = apps.get_model('api', 'Inspection').objects.create(vm=vm, name='Inspeção')
+        return apps.get_model('api', 'InspectionTool').objects.create(inspection=inspection, name=type, type=type)
+
+
+class TemplateMigrationTestCase(MigrationTestCase):
+    migrate_from = [('api', '0016_locatetoolconfig_reference_a_and_more')]
+    migrate_to = [('api', '0017_toolkind_template_seed')]
+
+    def test_forward_and_backward(self):
+        apps = self._migrate(self.migrate_from)
+        with self.assertRaises(LookupError):
+            apps.get_model('api', 'TemplateToolConfig')
+        self.assertFalse(apps.get_model('api', 'ToolKind').objects.filter(slug='template').exists())
+
+        apps = self._migrate(self.migrate_to)
+        self.assertTrue(apps.get_model('api', 'ToolKind').objects.filter(slug='template').exists())
+        tool = self._inspection_tool(apps, 'template')
+        config = apps.get_model('api', 'TemplateToolConfig').objects.create(tool=tool)
+        self.assertEqual(config.min_score, 0.7)
+
+        # Reversível: desfazer remove o tipo cadastrado e a tabela de configuração
+        apps = self._migrate(self.migrate_from)
+        self.assertFalse(apps.get_model('api', 'ToolKind').objects.filter(slug='template').exists())
+        with self.assertRaises(LookupError):
+            apps.get_model('api', 'TemplateToolConfig')
+
+
+class MathLimitsMigrationTestCase(MigrationTestCase):
+    migrate_from = [('api', '0017_toolkind_template_seed')]
+    migrate_to = [('api', '0018_mathtool_result_limits')]
+
+    def test_existing_rows_keep_default_range(self):
+        apps = self._migrate(self.migrate_from)
+        tool = self._inspection_tool(apps, 'math')
+        apps.get_model('api', 'MathTool').objects.create(tool=tool, operation='area_ratio')
+
+        apps = self._migrate(self.migrate_to)
+        MathTool = apps.get_model('api', 'MathTool')
+        math = MathTool.objects.get(tool_id=tool.id)
+        self.assertEqual((math.result_min, math.result_max), (None, None))
+        math.result_min = 1.5
+        math.save()
+
+        apps = self._migrate(self.migrate_from)
+        math = apps.get_model('api', 'MathTool').objects.get(tool_id=tool.id)
+        self.assertFalse(hasattr(math, 'result_min'))
+
+
+class SpcMigrationTestCase(MigrationTestCase):
+    migrate_from = [('api', '0018_mathtool_result_limits')]
+    migrate_to = [('api', '0019_spctoolconfig')]
+
+    def test_forward_and_backward(self):
+        apps = self._migrate(self.migrate_from)
+        with self.assertRaises(LookupError):
+            apps.get_model('api', 'SpcToolConfig')
+        self.assertFalse(apps.get_model('api', 'ToolKind').objects.filter(slug='spc').exists())
+
+        apps = self._migrate(self.migrate_to)
+        self.assertEqual(apps.get_model('api', 'ToolKind').objects.get(slug='spc').category, 'math')
+        tool = self._inspection_tool(apps, 'spc')
+        config = apps.get_model('api', 'SpcToolConfig').objects.create(tool=tool, field='total_area')
+        self.assertEqual((config.window, config.rules), (100, '1,2,3,4'))
+
+        apps = self._migrate(self.migrate_from)
+        self.assertFalse(apps.get_model('api', 'ToolKind').objects.filter(slug='spc').exists())
+        with self.assertRaises(LookupError):
+            apps.get_model('api', 'SpcToolConfig')
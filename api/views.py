@@ -19,7 +19,7 @@ from rest_framework import status
 # Local imports
 from .models import (
     VirtualMachine, Inspection, InspectionTool, ToolKind,
-    GrayscaleTool, BlurTool, ThresholdTool, MorphologyTool, BlobToolConfig, LocateToolConfig, MathTool,
+    GrayscaleTool, BlurTool, ThresholdTool, MorphologyTool, BlobToolConfig, LocateToolConfig, TemplateToolConfig, MathTool, SpcToolConfig,
     InspectionResult
 )
 from .serializers import (
@@ -33,6 +33,7 @@ from .serializers import (
     SaveInspectionRequestSerializer
 )
 from .protocolo import execute_command, refresh_all_vm_statuses, ProtocoloVM
+from .geometry import unpack_result_json
 from django.conf import settings
 from django.utils.crypto import get_random_string
 from django.utils.text import slugify
@@ -457,6 +458,8 @@ def vm_logs_upload_function(request):
                 image_mime=image_mime,
                 image_width=image_width,
                 image_height=image_height,
+                # Geometria de blobs/bordas chega compacta (blobs_packed/edges_packed) e é armazenada como veio;
+                # a leitura pela API devolve a forma expandida (api/geometry.py)
                 result_json=data.get('result') if isinstance(data.get('result'), (dict, list)) else {'raw': data}
             )
             
@@ -534,7 +537,7 @@ class InspectionResultsList(APIView):
                     'image_mime': result.image_mime,
                     'image_width': result.image_width,
                     'image_height': result.image_height,
-                    'result_json': result.result_json
+                    'result_json': unpack_result_json(result.result_json)
                 })
             
             return Response({'data': results})
@@ -984,6 +987,23 @@ class SaveInspection(APIView):
                         reference_y=(float((t.get('reference') or {}).get('y')) if isinstance(t.get('reference'), dict) and (t.get('reference').get('y') is not None) else None),
                         reference_A=(float((t.get('reference') or {}).get('angle_deg') if isinstance(t.get('reference'), dict) and (t.get('reference').get('angle_deg') is not None) else (t.get('reference') or {}).get('angle')) if isinstance(t.get('reference'), dict) and ((t.get('reference').get('angle_deg') is not None) or (t.get('reference').get('angle') is not None)) else None),
                     )
+                elif t_type == 'template':
+                    ref = t.get('reference') if isinstance(t.get('reference'), dict) else {}
+                    ref_a = ref.get('angle_deg', ref.get('angle'))
+                    TemplateToolConfig.objects.create(
+                        tool=tool,
+                        template=str(t.get('template') or ''),
+                        min_score=float(t['min_score'] if t.get('min_score') is not None else 0.7),
+                        angle_range=float(t.get('angle_range', 0.0) or 0.0),
+                        angle_step=float(t.get('angle_step', 1.0) or 1.0),
+                        pyramid_levels=int(t['pyramid_levels'] if t.get('pyramid_levels') is not None else -1),
+                        candidates=int(t.get('candidates', 3) or 3),
+                        apply_transform=bool(t.get('apply_transform', False)),
+                        rotate=bool(t.get('rotate', False)),
+                        reference_x=float(ref['x']) if ref.get('x') is not None else None,
+                        reference_y=float(ref['y']) if ref.get('y') is not None else None,
+                        reference_A=float(ref_a) if ref_a is not None else None,
+                    )
                 elif t_type == 'math':
                     # MathTool referencia outra tool (por id) se possível
                     ref_name = t.get('reference_tool_name') or None
@@ -997,7 +1017,32 @@ class SaveInspection(APIView):
                         tool=tool,
                         operation=str(t.get('operation') or ''),
                         reference_tool=ref_obj,
-                        custom_formula=str(t.get('custom_formula') or '')
+                        custom_formula=str(t.get('custom_formula') or ''),
+                        result_min=(float(t['result_min']) if t.get('result_min') is not None else None),
+                        result_max=(float(t['result_max']) if t.get('result_max') is not None else None),
+                    )
+                elif t_type == 'spc':
+                    # SPC acompanha um campo de outra tool (referência por id ou nome)
+                    ref_name = t.get('reference_tool_name') or None
+                    ref_id = t.get('reference_tool_id') or None
+                    ref_obj = None
+                    if ref_id:
+                        ref_obj = insp.tools.filter(order_index__lt=tool.order_index, id=ref_id).first()
+                    if not ref_obj and ref_name:
+                        ref_obj = insp.tools.filter(order_index__lt=tool.order_index, name=ref_name).first()
+                    rules = t.get('rules')
+                    SpcToolConfig.objects.create(
+                        tool=tool,
+                        reference_tool=ref_obj,
+                        field=str(t.get('field') or ''),
+                        window=int(t.get('window', 100) or 100),
+                        baseline=int(t.get('baseline', 25) or 25),
+                        lsl=(float(t['lsl']) if t.get('lsl') is not None else None),
+                        usl=(float(t['usl']) if t.get('usl') is not None else None),
+                        center=(float(t['center']) if t.get('center') is not None else None),
+                        sigma=(float(t['sigma']) if t.get('sigma') is not None else None),
+                        rules=(','.join(str(int(r)) for r in rules) if isinstance(rules, (list, tuple)) else str(rules if rules is not None else '1,2,3,4')),
+                        fail_on_drift=bool(t.get('fail_on_drift', True)),
                     )
 
             return Response({
@@ -1143,11 +1188,38 @@ class InspectionDetail(APIView):
                     'rotate': t.locate.rotate,
                     'reference': ({'x': t.locate.reference_x, 'y': t.locate.reference_y, 'angle_deg': t.locate.reference_A} if (t.locate.reference_x is not None and t.locate.reference_y is not None and t.locate.reference_A is not None) else None),
                 })
+            elif t.type == 'template' and hasattr(t, 'template') and t.template:
+                td.update({
+                    'template': t.template.template,
+                    'min_score': t.template.min_score,
+                    'angle_range': t.template.angle_range,
+                    'angle_step': t.template.angle_step,
+                    'pyramid_levels': t.template.pyramid_levels,
+                    'candidates': t.template.candidates,
+                    'apply_transform': t.template.apply_transform,
+                    'rotate': t.template.rotate,
+                    'reference': ({'x': t.template.reference_x, 'y': t.template.reference_y, 'angle_deg': t.template.reference_A} if (t.template.reference_x is not None and t.template.reference_y is not None and t.template.reference_A is not None) else None),
+                })
             elif t.type == 'math' and hasattr(t, 'math') and t.math:
                 td.update({
                     'operation': t.math.operation,
                     'reference_tool_id': t.math.reference_tool_id,
                     'custom_formula': t.math.custom_formula,
+                    'result_min': t.math.result_min,
+                    'result_max': t.math.result_max,
+                })
+            elif t.type == 'spc' and hasattr(t, 'spc') and t.spc:
+                td.update({
+                    'reference_tool_id': t.spc.reference_tool_id,
+                    'field': t.spc.field,
+                    'window': t.spc.window,
+                    'baseline': t.spc.baseline,
+                    'lsl': t.spc.lsl,
+                    'usl': t.spc.usl,
+                    'center': t.spc.center,
+                    'sigma': t.spc.sigma,
+                    'rules': [int(r) for r in t.spc.rules.split(',') if r.strip()],
+                    'fail_on_drift': t.spc.fail_on_drift,
                 })
             tools.append(td)
         return Response({
@@ -1323,6 +1395,23 @@ class InspectionDetail(APIView):
                             reference_y=(float((t.get('reference') or {}).get('y')) if isinstance(t.get('reference'), dict) and (t.get('reference').get('y') is not None) else None),
                             reference_A=(float((t.get('reference') or {}).get('angle_deg') if isinstance(t.get('reference'), dict) and (t.get('reference').get('angle_deg') is not None) else (t.get('reference') or {}).get('angle')) if isinstance(t.get('reference'), dict) and ((t.get('reference').get('angle_deg') is not None) or (t.get('reference').get('angle') is not None)) else None),
                         )
+                    elif t_type == 'template':
+                        ref = t.get('reference') if isinstance(t.get('reference'), dict) else {}
+                        ref_a = ref.get('angle_deg', ref.get('angle'))
+                        TemplateToolConfig.objects.create(
+                            tool=tool,
+                            template=str(t.get('template') or ''),
+                            min_score=float(t['min_score'] if t.get('min_score') is not None else 0.7),
+                            angle_range=float(t.get('angle_range', 0.0) or 0.0),
+                            angle_step=float(t.get('angle_step', 1.0) or 1.0),
+                            pyramid_levels=int(t['pyramid_levels'] if t.get('pyramid_levels') is not None else -1),
+                            candidates=int(t.get('candidates', 3) or 3),
+                            apply_transform=bool(t.get('apply_transform', False)),
+                            rotate=bool(t.get('rotate', False)),
+                            reference_x=float(ref['x']) if ref.get('x') is not None else None,
+                            reference_y=float(ref['y']) if ref.get('y') is not None else None,
+                            reference_A=float(ref_a) if ref_a is not None else None,
+                        )
                     elif t_type == 'math':
                         # Tenta resolver referência pela ordem/nome já criados
                         ref_obj = None
@@ -1336,7 +1425,31 @@ class InspectionDetail(APIView):
                             tool=tool,
                             operation=str(t.get('operation') or ''),
                             reference_tool=ref_obj,
-                            custom_formula=str(t.get('custom_formula') or '')
+                            custom_formula=str(t.get('custom_formula') or ''),
+                            result_min=(float(t['result_min']) if t.get('result_min') is not None else None),
+                            result_max=(float(t['result_max']) if t.get('result_max') is not None else None),
+                        )
+                    elif t_type == 'spc':
+                        ref_obj = None
+                        ref_id = t.get('reference_tool_id')
+                        ref_name = t.get('reference_tool_name')
+                        if ref_id is not None:
+                            ref_obj = insp.tools.filter(order_index__lt=tool.order_index, id=ref_id).first()
+                        if not ref_obj and ref_name:
+                            ref_obj = insp.tools.filter(order_index__lt=tool.order_index, name=ref_name).first()
+                        rules = t.get('rules')
+                        SpcToolConfig.objects.create(
+                            tool=tool,
+                            reference_tool=ref_obj,
+                            field=str(t.get('field') or ''),
+                            window=int(t.get('window', 100) or 100),
+                            baseline=int(t.get('baseline', 25) or 25),
+                            lsl=(float(t['lsl']) if t.get('lsl') is not None else None),
+                            usl=(float(t['usl']) if t.get('usl') is not None else None),
+                            center=(float(t['center']) if t.get('center') is not None else None),
+                            sigma=(float(t['sigma']) if t.get('sigma') is not None else None),
+                            rules=(','.join(str(int(r)) for r in rules) if isinstance(rules, (list, tuple)) else str(rules if rules is not None else '1,2,3,4')),
+                            fail_on_drift=bool(t.get('fail_on_drift', True)),
                         )
 
             return Response({'success': True})
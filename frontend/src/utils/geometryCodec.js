@@ -0,0 +1,117 @@
+/**
+ * Decodificação da geometria compacta dos resultados da VM
+ * (vision_machine/tools/geometry_codec.py): `blobs_packed` -> `blobs`, `edges_packed` -> `edges`.
+ * Resultados sem geometria codificada são devolvidos como estão.
+ */
+
+const BLOB_CODEC = 'vmgeo1'
+const EDGE_CODEC = 'vmcol1'
+const BLOB_COLUMNS = 10
+
+function base64ToBytes(data) {
+  const bin = atob(data || '')
+  const bytes = new Uint8Array(bin.length)
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i)
+  return bytes
+}
+
+// Varints zigzag (7 bits por byte) -> inteiros com sinal
+function readVarints(bytes) {
+  const out = []
+  let value = 0
+  let scale = 1
+  for (let i = 0; i < bytes.length; i++) {
+    const b = bytes[i]
+    value += (b & 0x7f) * scale
+    if (b & 0x80) {
+      scale *= 128
+      continue
+    }
+    out.push(value % 2 ? -(value + 1) / 2 : value / 2)
+    value = 0
+    scale = 1
+  }
+  return out
+}
+
+export function unpackBlobs(packed) {
+  if (!packed || packed.codec !== BLOB_CODEC) return []
+  const n = Number(packed.count) || 0
+  const stream = readVarints(base64ToBytes(packed.data))
+  const col = (c, i) => stream[c * n + i]
+  let pos = BLOB_COLUMNS * n
+  let nPolys = 0
+  for (let i = 0; i < n; i++) nPolys += col(7, i)
+  const counts = stream.slice(pos, pos + nPolys)
+  pos += nPolys
+
+  const blobs = []
+  let bx = 0
+  let by = 0
+  let polyIndex = 0
+  for (let i = 0; i < n; i++) {
+    bx += col(1, i)
+    by += col(2, i)
+    const polys = []
+    for (let p = 0; p < col(7, i); p++) {
+      const count = counts[polyIndex++]
+      const size = Math.abs(count)
+      const poly = []
+      let x = bx
+      let y = by
+      for (let k = 0; k < size; k++) {
+        x += stream[pos++]
+        y += stream[pos++]
+        poly.push([x, y])
+      }
+      if (count < 0 && poly.length) poly.push(poly[0])
+      polys.push(poly)
+    }
+    const contourRef = col(8, i)
+    const blob = {
+      area: col(0, i),
+      centroid: [bx + col(5, i), by + col(6, i)],
+      bounding_box: [bx, by, col(3, i), col(4, i)],
+      contour: contourRef ? polys[contourRef - 1] : []
+    }
+    if (col(9, i)) blob.contours = polys
+    blobs.push(blob)
+  }
+  return blobs
+}
+
+export function unpackEdges(packed) {
+  if (!packed || packed.codec !== EDGE_CODEC) return []
+  const fields = Array.isArray(packed.fields) ? packed.fields : []
+  const bytes = base64ToBytes(packed.data)
+  const view = new DataView(bytes.buffer)
+  const n = Number(packed.count) || 0
+  const edges = []
+  for (let i = 0; i < n; i++) {
+    const edge = {}
+    fields.forEach(([name, kind, labels], j) => {
+      const v = view.getFloat64((i * fields.length + j) * 8, true)
+      edge[name] = kind === 's' ? labels[v] : v
+    })
+    edges.push(edge)
+  }
+  return edges
+}
+
+export function unpackToolResult(result) {
+  if (!result || typeof result !== 'object' || (!result.blobs_packed && !result.edges_packed)) return result
+  const out = { ...result }
+  if (out.blobs_packed) {
+    out.blobs = unpackBlobs(out.blobs_packed)
+    delete out.blobs_packed
+  }
+  if (out.edges_packed) {
+    out.edges = unpackEdges(out.edges_packed)
+    delete out.edges_packed
+  }
+  return out
+}
+
+export function unpackToolResults(results) {
+  return Array.isArray(results) ? results.map(unpackToolResult) : results
+}
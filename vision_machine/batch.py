@@ -0,0 +1,330 @@
+"""Inspeção offline (batch) de conjuntos de imagens com a mesma receita da VM.
+
+Uso pela linha de comando:
+
+    python batch.py testblob_images --config vm_config.json --workers 4 --output resultados.jsonl
+
+Cada imagem gera uma linha JSON em `--output` (na ordem de entrada) e ao final é impresso
+(e opcionalmente salvo com `--summary`) um resumo com aprovação, erros e latências.
+"""
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from frame_region import read_image
+from inspection_processor import InspectionProcessor, stateful_tool_names
+from tools import materialize_deferred_geometry
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+# Item de entrada: caminho de arquivo ou imagem já carregada
+BatchImage = Union[str, np.ndarray]
+
+
+def list_images(folder: str) -> List[str]:
+    """Imagens da pasta (mesmas extensões do source `pasta`), em ordem alfabética."""
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"Pasta não encontrada: {folder}")
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def _decode(item: BatchImage, decode_scale: int = 1) -> Tuple[Optional[np.ndarray], float, Optional[str]]:
+    """Retorna (imagem, tempo de decodificação em ms, erro).
+
+    `decode_scale` > 1 decodifica já reduzida (IMREAD_REDUCED_*), como o source `pasta`.
+    """
+    if isinstance(item, np.ndarray):
+        return item, 0.0, None
+    start = time.perf_counter()
+    try:
+        image = read_image(item, decode_scale)
+    except Exception as e:
+        return None, 0.0, str(e)
+    decode_ms = (time.perf_counter() - start) * 1000
+    if image is None:
+        return None, decode_ms, f"Não foi possível decodificar a imagem: {item}"
+    return image, decode_ms, None
+
+
+def _prefetched(items: Sequence[Tuple[int, BatchImage]], prefetch: int,
+                decode_scale: int = 1) -> Iterator[Tuple[int, BatchImage, tuple]]:
+    """Decodifica até `prefetch` imagens à frente em uma thread (cv2.imread libera o GIL)
+    enquanto a imagem atual é inspecionada."""
+    if prefetch <= 0:
+        for index, item in items:
+            yield index, item, _decode(item, decode_scale)
+        return
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='BatchDecode') as pool:
+        pending = deque()
+        iterator = iter(items)
+        for index, item in iterator:
+            pending.append((index, item, pool.submit(_decode, item, decode_scale)))
+            if len(pending) > prefetch:
+                break
+        while pending:
+            index, item, future = pending.popleft()
+            nxt = next(iterator, None)
+            if nxt is not None:
+                pending.append((nxt[0], nxt[1], pool.submit(_decode, nxt[1], decode_scale)))
+            yield index, item, future.result()
+
+
+def _inspect(processor: InspectionProcessor, index: int, item: BatchImage, decoded: tuple) -> Dict[str, Any]:
+    """Inspeciona uma imagem e monta o registro JSON (sem a imagem final)."""
+    image, decode_ms, error = decoded
+    record = {
+        'index': index,
+        'source': item if isinstance(item, str) else f'array[{index}]',
+        'decode_ms': round(decode_ms, 3),
+    }
+    if error is not None:
+        record.update({'status': 'error', 'error': error, 'overall_pass': False})
+        return record
+    try:
+        result = processor.process_inspection(image)
+    except Exception as e:
+        record.update({'status': 'error', 'error': str(e), 'overall_pass': False})
+        return record
+    result.pop('final_image', None)
+    # Todo registro vai para o JSONL: geometria adiada (Blob geometry=lazy) é calculada aqui
+    materialize_deferred_geometry(result.get('tool_results'))
+    summary = result.get('inspection_summary', {})
+    record.update({
+        'status': 'ok',
+        'overall_pass': bool(summary.get('overall_pass', True)),
+        'inspection_summary': summary,
+        'tool_results': result.get('tool_results', []),
+        'config_version': result.get('config_version', 0),
+    })
+    return record
+
+
+# ----------------------------------------------------------------------
+# Processos do pool: cada um mantém seu próprio InspectionProcessor
+# ----------------------------------------------------------------------
+_worker_processor: Optional[InspectionProcessor] = None
+
+
+def _init_worker(inspection_config: Dict[str, Any]):
+    global _worker_processor
+    # Paralelismo vem dos processos; threads internas do OpenCV só disputariam CPU
+    cv2.setNumThreads(1)
+    _worker_processor = InspectionProcessor(inspection_config)
+
+
+def _run_chunk(chunk: List[Tuple[int, BatchImage]], prefetch: int, decode_scale: int = 1) -> List[Dict[str, Any]]:
+    records = []
+    for index, item, decoded in _prefetched(chunk, prefetch, decode_scale):
+        record = _inspect(_worker_processor, index, item, decoded)
+        record['worker'] = os.getpid()
+        records.append(record)
+    return records
+
+
+def effective_workers(inspection_config: Dict[str, Any], workers: int) -> int:
+    """Processos a usar: receitas com ferramentas de estado entre frames (SPC) rodam no próprio
+    processo, com um único histórico na ordem de entrada."""
+    if workers > 0:
+        stateful = stateful_tool_names(inspection_config)
+        if stateful:
+            print(f"⚠️ Ferramentas com estado entre frames ({', '.join(stateful)}): inspeção sequencial no próprio processo")
+            return 0
+    return workers
+
+
+def iter_batch(images: Union[str, Iterable[BatchImage]], inspection_config: Dict[str, Any], workers: int = 0,
+               chunksize: int = 4, prefetch: int = 2) -> Iterator[Dict[str, Any]]:
+    """Inspeciona `images` (pasta, lista de caminhos ou de arrays) e gera um registro por imagem,
+    na ordem de entrada.
+
+    `workers` = 0 roda no próprio processo; > 0 distribui blocos de `chunksize` imagens em um
+    pool de processos (spawn), mantendo no máximo `workers * prefetch` blocos em andamento.
+    Caminhos são decodificados no próprio worker, `prefetch` imagens à frente da inspeção,
+    com o `decode_scale` do source_config da receita. Receitas com SPC ignoram `workers`
+    (ver `effective_workers`).
+    """
+    workers = effective_workers(inspection_config, workers)
+    if isinstance(images, str):
+        images = list_images(images)
+    items = list(enumerate(images))
+    if not items:
+        return
+    decode_scale = (inspection_config.get('source_config') or {}).get('decode_scale', 1)
+
+    if workers <= 0:
+        processor = InspectionProcessor(inspection_config)
+        try:
+            for index, item, decoded in _prefetched(items, prefetch, decode_scale):
+                yield _inspect(processor, index, item, decoded)
+        finally:
+            processor.close()
+        return
+
+    chunksize = max(1, int(chunksize))
+    chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+    max_pending = max(1, workers * max(1, prefetch))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=_init_worker, initargs=(inspection_config,)) as pool:
+        pending = deque()
+        remaining = iter(chunks)
+        for chunk in remaining:
+            pending.append(pool.submit(_run_chunk, chunk, prefetch, decode_scale))
+            if len(pending) >= max_pending:
+                break
+        while pending:
+            records = pending.popleft().result()
+            chunk = next(remaining, None)
+            if chunk is not None:
+                pending.append(pool.submit(_run_chunk, chunk, prefetch, decode_scale))
+            yield from records
+
+
+class BatchSummary:
+    """Acumula o resumo da execução (aprovação, erros, falhas por ferramenta e latências)."""
+
+    def __init__(self):
+        self.total = 0
+        self.passed = 0
+        self.failed = 0
+        self.errors = 0
+        self.tool_failures: Dict[str, int] = {}
+        self.tool_errors: Dict[str, int] = {}
+        self._inspect_ms: List[float] = []
+        self._decode_ms: List[float] = []
+
+    def add(self, record: Dict[str, Any]):
+        self.total += 1
+        if record['status'] != 'ok':
+            self.errors += 1
+            return
+        if record['overall_pass']:
+            self.passed += 1
+        else:
+            self.failed += 1
+        self._decode_ms.append(record.get('decode_ms', 0.0))
+        self._inspect_ms.append(record['inspection_summary'].get('total_processing_time_ms', 0.0))
+        for tool in record.get('tool_results', []):
+            name = tool.get('tool_name') or str(tool.get('tool_id'))
+            if tool.get('status') == 'error':
+                self.tool_errors[name] = self.tool_errors.get(name, 0) + 1
+            elif tool.get('pass_fail') is False:
+                self.tool_failures[name] = self.tool_failures.get(name, 0) + 1
+
+    @staticmethod
+    def _latency(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {'mean': 0.0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+        samples = np.asarray(values, dtype=np.float64)
+        p50, p90, p99 = np.quantile(samples, (0.5, 0.9, 0.99))
+        return {
+            'mean': round(float(samples.mean()), 3), 'p50': round(float(p50), 3),
+            'p90': round(float(p90), 3), 'p99': round(float(p99), 3), 'max': round(float(samples.max()), 3)
+        }
+
+    def to_dict(self, wall_s: float = 0.0, workers: int = 0) -> Dict[str, Any]:
+        return {
+            'total': self.total,
+            'passed': self.passed,
+            'failed': self.failed,
+            'errors': self.errors,
+            'pass_rate': round(self.passed / self.total, 4) if self.total else 0.0,
+            'tool_failures': dict(sorted(self.tool_failures.items())),
+            'tool_errors': dict(sorted(self.tool_errors.items())),
+            'inspection_ms': self._latency(self._inspect_ms),
+            'decode_ms': self._latency(self._decode_ms),
+            'workers': workers,
+            'wall_time_s': round(wall_s, 3),
+            'images_per_s': round(self.total / wall_s, 2) if wall_s > 0 else 0.0,
+        }
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def process_batch(images: Union[str, Iterable[BatchImage]], inspection_config: Dict[str, Any], workers: int = 0,
+                  output: Optional[Union[str, Any]] = None, chunksize: int = 4, prefetch: int = 2,
+                  on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Roda a receita sobre `images` e retorna o resumo.
+
+    `output`: caminho (ou arquivo aberto) que recebe um registro JSON por linha (JSONL).
+    `on_result`: chamado com cada registro, na ordem de entrada. Os registros não ficam
+    em memória, então conjuntos grandes não crescem o consumo do processo.
+    """
+    workers = effective_workers(inspection_config, workers)
+    summary = BatchSummary()
+    handle = open(output, 'w', encoding='utf-8') if isinstance(output, str) else output
+    start = time.perf_counter()
+    try:
+        for record in iter_batch(images, inspection_config, workers, chunksize, prefetch):
+            summary.add(record)
+            if handle is not None:
+                handle.write(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+            if on_result is not None:
+                on_result(record)
+    finally:
+        if isinstance(output, str) and handle is not None:
+            handle.close()
+    return summary.to_dict(time.perf_counter() - start, workers)
+
+
+def load_inspection_config(path: str) -> Dict[str, Any]:
+    """Lê a receita de um arquivo de configuração da VM (chave `inspection_config`) ou
+    de um JSON que já seja a própria configuração de inspeção."""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return config.get('inspection_config', config)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='AnalyticLens Vision Machine - inspeção offline (batch)')
+    parser.add_argument('folder', help='Pasta com as imagens a inspecionar')
+    parser.add_argument('--config', default='vm_config.json', help='Configuração da VM ou da inspeção (JSON)')
+    parser.add_argument('--output', help='Arquivo JSONL com um resultado por imagem')
+    parser.add_argument('--summary', help='Arquivo JSON para salvar o resumo')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Processos de inspeção (0 = no próprio processo)')
+    parser.add_argument('--chunksize', type=int, default=4, help='Imagens enviadas por vez a cada processo')
+    parser.add_argument('--prefetch', type=int, default=2, help='Imagens decodificadas à frente da inspeção')
+    args = parser.parse_args(argv)
+
+    inspection_config = load_inspection_config(args.config)
+    images = list_images(args.folder)
+    workers = effective_workers(inspection_config, args.workers)
+    print(f"📁 {len(images)} imagens em {args.folder} | {len(inspection_config.get('tools', []))} ferramentas"
+          f" | {workers} workers")
+
+    summary = process_batch(images, inspection_config, workers=workers, output=args.output,
+                            chunksize=args.chunksize, prefetch=args.prefetch)
+
+    print(f"✅ {summary['total']} imagens em {summary['wall_time_s']:.2f}s ({summary['images_per_s']:.1f} img/s)")
+    print(f"   Aprovadas: {summary['passed']} | Reprovadas: {summary['failed']} | Erros: {summary['errors']}")
+    inspection_ms = summary['inspection_ms']
+    print(f"   Inspeção: p50 {inspection_ms['p50']:.2f}ms | p99 {inspection_ms['p99']:.2f}ms | máx {inspection_ms['max']:.2f}ms")
+    for name, count in summary['tool_failures'].items():
+        print(f"   ❌ {name}: {count} reprovações")
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0 if summary['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
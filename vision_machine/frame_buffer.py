@@ -0,0 +1,121 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class FrameBuffer:
+    """Imagem de trabalho do pipeline de inspeção com cópia sob demanda (copy-on-write).
+
+    O frame recebido nunca é alterado: enquanto nenhum filtro escrever, as ferramentas leem
+    diretamente dele. Na primeira escrita o frame é copiado uma única vez para um buffer
+    pré-alocado do pool, e os filtros seguintes escrevem in-place apenas na região do seu ROI.
+
+    O pool é circular: a imagem final de um frame continua válida até que `pool_size`
+    frames adicionais tenham sido escritos pelo mesmo processador. Com `pool_size=0`
+    cada frame aloca um buffer novo (útil quando a imagem final é retida por muito tempo).
+    """
+
+    def __init__(self, pool_size: int = 3):
+        self.pool_size = max(0, int(pool_size))
+        self._pool = [None] * self.pool_size
+        self._next_slot = 0
+        self._image: Optional[np.ndarray] = None
+        self._owned = False
+        # Incrementado a cada escrita; identifica a "versão" da imagem de trabalho
+        self.version = 0
+
+    def ensure_pool_size(self, min_size: int):
+        """Amplia o pool para que `min_size` imagens finais possam estar em uso ao mesmo tempo.
+
+        Usado quando estágios posteriores (ex.: publicação) ainda retêm imagens de frames
+        anteriores enquanto o processador já trabalha nos seguintes. `pool_size=0` não é alterado.
+        """
+        if 0 < self.pool_size < min_size:
+            self._pool.extend([None] * (min_size - self.pool_size))
+            self.pool_size = min_size
+
+    def begin(self, image: np.ndarray):
+        """Inicia um novo frame emprestando a imagem de entrada (sem copiar)."""
+        self._image = image
+        self._owned = False
+        self.version = 0
+
+    @property
+    def image(self) -> np.ndarray:
+        """Imagem atual (somente leitura por convenção; use `write_roi` para alterar)."""
+        return self._image
+
+    def writable(self) -> np.ndarray:
+        """Garante um buffer próprio (copiando o frame emprestado uma única vez) e o retorna."""
+        if not self._owned:
+            src = self._image
+            buf = self._acquire(src.shape, src.dtype)
+            np.copyto(buf, src)
+            self._image = buf
+            self._owned = True
+        return self._image
+
+    def replace(self, image: np.ndarray):
+        """Substitui a imagem inteira (ex.: filtro sem ROI que muda o formato)."""
+        self._image = image
+        self._owned = False
+        self.version += 1
+
+    def write_roi(self, roi_result: np.ndarray, bbox: Tuple[int, int, int, int], mask: Optional[np.ndarray]) -> bool:
+        """Escreve o resultado de um filtro na região do bbox, respeitando a máscara.
+
+        Retorna False quando o resultado não cabe na imagem (nada é escrito).
+        """
+        x, y, w, h = bbox
+        shape = self._image.shape
+        if x + w > shape[1] or y + h > shape[0]:
+            return False
+
+        target = self.writable()
+        sub = target[y:y+h, x:x+w]
+
+        # Compatibiliza canais
+        if len(shape) == 3 and len(roi_result.shape) == 2:
+            if mask is None:
+                out = cv2.cvtColor(roi_result, cv2.COLOR_GRAY2BGR, dst=sub)
+                self._check_written(sub, out)
+                self.version += 1
+                return True
+            roi_result = cv2.cvtColor(roi_result, cv2.COLOR_GRAY2BGR)
+        elif len(shape) == 2 and len(roi_result.shape) == 3:
+            roi_result = cv2.cvtColor(roi_result, cv2.COLOR_BGR2GRAY)
+
+        if mask is None:
+            # retângulo puro
+            if not np.may_share_memory(sub, roi_result):
+                sub[...] = roi_result
+            elif sub.ctypes.data != roi_result.ctypes.data:
+                sub[...] = roi_result.copy()
+        else:
+            # aplica somente onde mask > 0
+            out = cv2.copyTo(roi_result, mask, sub)
+            self._check_written(sub, out)
+        self.version += 1
+        return True
+
+    def shares_memory(self, arr: np.ndarray) -> bool:
+        """Indica se `arr` pode ser uma view da imagem de trabalho (escritas futuras o alterariam)."""
+        return self._image is not None and np.may_share_memory(arr, self._image)
+
+    def _acquire(self, shape, dtype) -> np.ndarray:
+        if self.pool_size == 0:
+            return np.empty(shape, dtype=dtype)
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.pool_size
+        buf = self._pool[slot]
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._pool[slot] = buf
+        return buf
+
+    @staticmethod
+    def _check_written(sub: np.ndarray, out: Optional[np.ndarray]):
+        # Algumas versões do OpenCV realocam o dst em vez de escrever na view
+        if out is not None and out is not sub and not np.may_share_memory(out, sub):
+            np.copyto(sub, out)
@@ -0,0 +1,245 @@
+"""Redução dos pixels lidos e processados por frame.
+
+- Decodificação reduzida (`decode_scale` no source_config): a pasta é lida com as flags
+  IMREAD_REDUCED_* do OpenCV, que decodificam JPEG direto em 1/2, 1/4 ou 1/8 da resolução.
+- Recorte pela união dos ROIs (`roi_crop` na receita): o frame é recortado no retângulo que
+  contém todos os ROIs (mais uma margem para o offset das Locate) e as coordenadas das
+  ferramentas são rebaseadas uma única vez para o recorte.
+"""
+import copy
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Ferramentas que não leem a imagem (não entram na união dos ROIs)
+IMAGELESS_TOOL_TYPES = ('math', 'spc')
+
+# Margem padrão (px) em volta dos ROIs deslocados em tempo de execução por uma Locate
+DEFAULT_CROP_MARGIN = 32
+
+
+def decode_flag(scale: Any) -> int:
+    """Flag do cv2.imread para o fator de redução (1, 2, 4 ou 8); inválido = 1."""
+    try:
+        return REDUCED_DECODE_FLAGS.get(int(scale or 1), cv2.IMREAD_COLOR)
+    except (TypeError, ValueError):
+        return cv2.IMREAD_COLOR
+
+
+def read_image(path: str, scale: Any = 1) -> Optional[np.ndarray]:
+    """cv2.imread com decodificação reduzida quando `scale` > 1."""
+    return cv2.imread(path, decode_flag(scale))
+
+
+def _roi_bounds(roi: Any) -> Optional[Tuple[float, float, float, float]]:
+    """(x0, y0, x1, y1) do ROI, com a mesma interpretação de BaseTool._roi_spec_from_conf.
+    None quando o ROI cobre a imagem inteira."""
+    if not isinstance(roi, dict) or not roi:
+        return None
+    shape = roi.get('shape', 'rect')
+    if shape == 'circle':
+        c = roi.get('circle', {})
+        cx, cy, r = float(c.get('cx', 0)), float(c.get('cy', 0)), float(c.get('r', 0))
+        return cx - r, cy - r, cx + r, cy + r
+    if shape == 'ellipse':
+        e = roi.get('ellipse', {})
+        cx, cy = float(e.get('cx', 0)), float(e.get('cy', 0))
+        rx, ry = float(e.get('rx', 0)), float(e.get('ry', 0))
+        return cx - rx, cy - ry, cx + rx, cy + ry
+    r = roi.get('rect', roi) if shape == 'rect' else roi
+    if r.get('w') is None or r.get('h') is None:
+        return None
+    x, y = float(r.get('x', 0)), float(r.get('y', 0))
+    return x, y, x + float(r['w']), y + float(r['h'])
+
+
+def _tool_points(tool: Dict[str, Any]) -> List[Tuple[float, float]]:
+    """Pontos em coordenadas da imagem usados além do ROI (seta da Locate)."""
+    roi = tool.get('ROI') if isinstance(tool.get('ROI'), dict) else {}
+    arrow = tool.get('arrow') or roi.get('arrow') or {}
+    points = []
+    for key in ('p0', 'p1'):
+        p = arrow.get(key)
+        if isinstance(p, dict) and p.get('x') is not None and p.get('y') is not None:
+            points.append((float(p['x']), float(p['y'])))
+    return points
+
+
+def roi_union_bbox(tools: List[Dict[str, Any]], margin: float = DEFAULT_CROP_MARGIN) -> Optional[Tuple[int, int, int, int]]:
+    """Retângulo (x, y, w, h) que contém os ROIs de todas as ferramentas que leem a imagem.
+
+    ROIs de ferramentas posteriores a uma Locate com `apply_transform` ganham `margin` px de
+    cada lado (o offset é conhecido só em tempo de execução). Retorna None quando alguma
+    ferramenta usa a imagem inteira (não há o que recortar).
+    """
+    union = None
+    transformed = False
+    for tool in tools:
+        if tool.get('type') in IMAGELESS_TOOL_TYPES:
+            continue
+        bounds = _roi_bounds(tool.get('ROI'))
+        if bounds is None:
+            return None
+        x0, y0, x1, y1 = bounds
+        for px, py in _tool_points(tool):
+            x0, y0, x1, y1 = min(x0, px), min(y0, py), max(x1, px + 1), max(y1, py + 1)
+        if transformed:
+            x0, y0, x1, y1 = x0 - margin, y0 - margin, x1 + margin, y1 + margin
+        if union is None:
+            union = [x0, y0, x1, y1]
+        else:
+            union = [min(union[0], x0), min(union[1], y0), max(union[2], x1), max(union[3], y1)]
+        if tool.get('apply_transform'):
+            transformed = True
+    if union is None:
+        return None
+    x0, y0 = max(0, int(np.floor(union[0]))), max(0, int(np.floor(union[1])))
+    x1, y1 = int(np.ceil(union[2])), int(np.ceil(union[3]))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _shift_point(point: Any, dx: float, dy: float, x_key: str = 'x', y_key: str = 'y'):
+    if not isinstance(point, dict):
+        return
+    if isinstance(point.get(x_key), (int, float)):
+        point[x_key] = point[x_key] + dx
+    if isinstance(point.get(y_key), (int, float)):
+        point[y_key] = point[y_key] + dy
+
+
+def _shift_roi(roi: Any, dx: float, dy: float):
+    if not isinstance(roi, dict) or not roi:
+        return
+    shape = roi.get('shape', 'rect')
+    if shape == 'circle':
+        _shift_point(roi.get('circle'), dx, dy, 'cx', 'cy')
+    elif shape == 'ellipse':
+        _shift_point(roi.get('ellipse'), dx, dy, 'cx', 'cy')
+    else:
+        _shift_point(roi.get('rect', roi) if shape == 'rect' else roi, dx, dy)
+    arrow = roi.get('arrow')
+    if isinstance(arrow, dict):
+        _shift_point(arrow.get('p0'), dx, dy)
+        _shift_point(arrow.get('p1'), dx, dy)
+
+
+def rebase_inspection_config(inspection_config: Dict[str, Any], crop: Tuple[int, int, int, int]) -> Dict[str, Any]:
+    """Cópia da receita com as coordenadas das ferramentas relativas ao recorte `crop`.
+
+    Desloca ROI, seta e referência da Locate; offsets (diferenças) não mudam. A resolução
+    do source_config passa a ser a do recorte.
+    """
+    x, y, w, h = crop
+    config = copy.deepcopy(inspection_config)
+    for tool in config.get('tools', []):
+        _shift_roi(tool.get('ROI'), -x, -y)
+        arrow = tool.get('arrow')
+        if isinstance(arrow, dict):
+            _shift_point(arrow.get('p0'), -x, -y)
+            _shift_point(arrow.get('p1'), -x, -y)
+        _shift_point(tool.get('reference'), -x, -y)
+    source_config = config.get('source_config')
+    if isinstance(source_config, dict):
+        resolution = source_config.get('resolution')
+        try:
+            source_config['resolution'] = [max(1, min(w, int(resolution[0]) - x)), max(1, min(h, int(resolution[1]) - y))]
+        except (TypeError, ValueError, IndexError):
+            source_config['resolution'] = [w, h]
+    return config
+
+
+def paste_crop(full_image: np.ndarray, crop_image: np.ndarray, crop: Tuple[int, int, int, int]) -> np.ndarray:
+    """Imagem final do frame inteiro a partir da imagem final do recorte.
+
+    Sem escrita de filtro a imagem do recorte é uma view do próprio frame, que é devolvido
+    sem cópia; senão o frame é copiado uma vez e o recorte colado na sua posição (com os
+    canais do recorte, ex.: cinza após um grayscale).
+    """
+    x, y = crop[0], crop[1]
+    h, w = crop_image.shape[:2]
+    view = full_image[y:y + h, x:x + w]
+    if crop_image.shape == view.shape and np.shares_memory(crop_image, full_image):
+        return full_image
+    if crop_image.ndim == 2 and full_image.ndim == 3:
+        out = cv2.cvtColor(full_image, cv2.COLOR_BGR2GRAY)
+    elif crop_image.ndim == 3 and full_image.ndim == 2:
+        out = cv2.cvtColor(full_image, cv2.COLOR_GRAY2BGR)
+    else:
+        out = full_image.copy()
+    out[y:y + h, x:x + w] = crop_image
+    return out
+
+
+def _shift_xy_list(points: Any, dx: float, dy: float):
+    """Cópia de uma lista de pontos [x, y] deslocada."""
+    if not isinstance(points, list):
+        return points
+    return [[p[0] + dx, p[1] + dy] if isinstance(p, (list, tuple)) and len(p) >= 2 else p for p in points]
+
+
+def _shifted_copy(value: Any, dx: float, dy: float, shift=_shift_point):
+    if not isinstance(value, dict):
+        return value
+    value = copy.deepcopy(value)
+    shift(value, dx, dy)
+    return value
+
+
+def shift_tool_result(result: Dict[str, Any], dx: float, dy: float,
+                      frame_size: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Cópia rasa do resultado de uma ferramenta com as coordenadas de imagem deslocadas.
+
+    Desloca o ROI efetivo (e o debug do ROI), os pontos da Locate/Template (`edges`,
+    `primary_point`, `reference`, `result`, `arrow`, pontos do caliper). Offsets são
+    diferenças e não mudam; a geometria dos blobs é relativa ao ROI da ferramenta.
+    Ferramentas que não leem a imagem (Math, SPC) informam como ROI a imagem inteira:
+    com `frame_size` (w, h) ele passa a ser o frame inteiro, como sem recorte.
+    """
+    if not isinstance(result, dict):
+        return result
+    out = dict(result)
+    if 'ROI' in out and frame_size is not None and out.get('tool_type') in IMAGELESS_TOOL_TYPES:
+        out['ROI'] = {'shape': 'rect', 'rect': {'x': 0, 'y': 0, 'w': int(frame_size[0]), 'h': int(frame_size[1])}}
+    elif 'ROI' in out:
+        out['ROI'] = _shifted_copy(out['ROI'], dx, dy, _shift_roi)
+    for key in ('primary_point', 'reference', 'result'):
+        if key in out:
+            out[key] = _shifted_copy(out[key], dx, dy)
+    if isinstance(out.get('edges'), list):
+        out['edges'] = [_shifted_copy(edge, dx, dy) for edge in out['edges']]
+    arrow = out.get('arrow')
+    if isinstance(arrow, dict):
+        out['arrow'] = {k: _shifted_copy(v, dx, dy) for k, v in arrow.items()}
+    caliper = out.get('caliper')
+    if isinstance(caliper, dict) and 'points' in caliper:
+        out['caliper'] = dict(caliper, points=_shift_xy_list(caliper['points'], dx, dy))
+    debug = out.get('debug')
+    roi_debug = debug.get('roi_debug') if isinstance(debug, dict) else None
+    if isinstance(roi_debug, dict):
+        roi_debug = dict(roi_debug)
+        for key in ('roi_before', 'roi_after'):
+            roi_debug[key] = _shifted_copy(roi_debug.get(key), dx, dy, _shift_roi)
+        out['debug'] = dict(debug, roi_debug=roi_debug)
+    return out
+
+
+def crop_settings(value: Any) -> Tuple[bool, float]:
+    """Interpreta `roi_crop` da receita: `true` ou `{"enabled": true, "margin": 32}`."""
+    if isinstance(value, dict):
+        enabled = bool(value.get('enabled', True))
+        try:
+            margin = float(value.get('margin', DEFAULT_CROP_MARGIN))
+        except (TypeError, ValueError):
+            margin = DEFAULT_CROP_MARGIN
+        return enabled, max(0.0, margin)
+    return bool(value), DEFAULT_CROP_MARGIN
@@ -1,7 +1,14 @@
+import hashlib
+import json
 import time
-from typing import Dict, Any, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 import cv2
 import numpy as np
+from frame_buffer import FrameBuffer
+from frame_region import crop_settings, paste_crop, rebase_inspection_config, roi_union_bbox, shift_tool_result
+from metrics import METRICS
 from tools import (
     BlobTool,
     GrayscaleTool,
@@ -10,30 +17,429 @@ from tools import (
     ThresholdFilterTool,
     MorphologyFilterTool,
     LocateTool,
+    TemplateMatchTool,
+    SpcTool,
+    ROI_GEOMETRY_CACHE,
+    FrameArtifactCache,
 )
 
+# Ferramentas com estado entre frames: o resultado depende de um único histórico na ordem de
+# captura, então a receita não pode ser dividida entre processos (worker farm, batch)
+STATEFUL_TOOL_TYPES = ('spc',)
+
+
+def stateful_tool_names(inspection_config: Dict[str, Any]) -> List[str]:
+    """Nomes das ferramentas da receita com estado entre frames."""
+    return [str(tool.get('name') or tool.get('id')) for tool in inspection_config.get('tools') or []
+            if isinstance(tool, dict) and tool.get('type') in STATEFUL_TOOL_TYPES]
+
+
+class PlanStep(NamedTuple):
+    """Passo imutável do plano de execução compilado (uma ferramenta já resolvida)."""
+    index: int
+    tool: Any
+    result_key: Any
+    is_filter: bool
+    # Ferramenta cujo resultado pode deslocar os ROIs seguintes (apply_transform=true)
+    emits_transform: bool
+    # Índices das ferramentas anteriores que emitem transformação (ordem de composição)
+    transform_sources: Tuple[int, ...]
+    # Índices de que este passo depende (imagem, referência e transformação)
+    depends_on: Tuple[int, ...]
+    # Nível no grafo de dependências (passos do mesmo nível podem rodar em paralelo)
+    level: int
+    # Sequência de filtros consecutivos com o mesmo ROI executada como um estágio único:
+    # índices do primeiro e do último passo da sequência (o próprio índice quando isolado)
+    fusion_head: int
+    fusion_end: int
+    # Pode ser pulado no modo fail-fast (não é always_run nem pré-requisito de um always_run)
+    skippable: bool
+
+
+_IDENTITY_LUT = np.arange(256, dtype=np.uint8)
+# Marca de ferramenta inalterada a reaproveitar do processador anterior (resolvida em attach)
+_REUSE = object()
+
+
+def _apply_lut(src: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    """Aplica uma LUT composta com o kernel nativo mais barato equivalente.
+
+    Composições de limiares/faixas (inclusive sobre a equalização, que é monotônica) quase
+    sempre resultam em identidade, constante, limiar binário ou faixa, que o OpenCV executa
+    bem mais rápido que uma LUT genérica; os demais casos usam cv2.LUT.
+    """
+    if np.array_equal(lut, _IDENTITY_LUT):
+        return src
+    values = np.unique(lut)
+    if values.size == 1:
+        return np.full(src.shape, int(values[0]), dtype=np.uint8)
+    if values.size == 2 and values[0] == 0:
+        on = np.flatnonzero(lut)
+        lo, hi, value = int(on[0]), int(on[-1]), int(values[1])
+        if on.size == hi - lo + 1:
+            if hi == 255:
+                return cv2.threshold(src, lo - 1, value, cv2.THRESH_BINARY)[1]
+            if lo == 0:
+                return cv2.threshold(src, hi, value, cv2.THRESH_BINARY_INV)[1]
+            if value == 255:
+                return cv2.inRange(src, lo, hi)
+    return cv2.LUT(src, lut)
+
+
+def _config_signature(config: Any) -> str:
+    """Representação canônica de uma configuração (para detectar ferramentas alteradas)."""
+    return json.dumps(config, sort_keys=True, default=str)
+
+
 class InspectionProcessor:
     """Processador principal para coordenação das ferramentas de inspeção"""
     
-    def __init__(self, inspection_config: Dict[str, Any]):
+    def __init__(self, inspection_config: Dict[str, Any], previous: Optional['InspectionProcessor'] = None,
+                 config_version: int = 0, attach: bool = True):
+        """`previous`: processador anterior cujas ferramentas com configuração idêntica são
+        reaproveitadas (instância e caches) em vez de recriadas. `config_version` é copiado
+        para cada resultado gerado por este processador.
+
+        Com `attach=False` só as ferramentas alteradas são criadas (sem tocar no `previous`);
+        a ligação ao processador em uso fica para `attach()`, chamado na troca entre frames.
+        """
         self.config = inspection_config
+        self.config_version = config_version
+        # Recorte pela união dos ROIs: o frame é recortado na entrada e as coordenadas das
+        # ferramentas são rebaseadas uma única vez (resultados ficam relativos ao recorte)
+        self.roi_crop: Optional[Tuple[int, int, int, int]] = None
+        crop_enabled, crop_margin = crop_settings(inspection_config.get('roi_crop'))
+        if crop_enabled:
+            self.roi_crop = roi_union_bbox(inspection_config.get('tools', []), crop_margin)
+            if self.roi_crop is None:
+                print("⚠️ roi_crop ignorado: há ferramenta usando a imagem inteira")
+            else:
+                self.config = rebase_inspection_config(inspection_config, self.roi_crop)
         self.tools = []
+        self.reused_tools = 0
+        self.plan: Tuple[PlanStep, ...] = ()
+        self.levels: Tuple[Tuple[PlanStep, ...], ...] = ()
         self.results = {}
-        self._initialize_tools()
-    
-    def _initialize_tools(self):
-        """Inicializa todas as ferramentas baseado na configuração"""
+        # Logs por ferramenta a cada frame custam caro; só quando a receita pedir
+        self.verbose = bool(inspection_config.get('verbose', False))
+        # Limites opcionais do cache compartilhado de geometria de ROI
+        roi_cache_conf = inspection_config.get('roi_cache')
+        if isinstance(roi_cache_conf, dict):
+            ROI_GEOMETRY_CACHE.configure(roi_cache_conf.get('max_entries'), roi_cache_conf.get('max_bytes'))
+        # Imagem de trabalho com copy-on-write e pool de buffers pré-alocados
+        # (na troca de versão o pool já alocado do processador anterior é mantido; ver attach)
+        self._frame_buffer_pool = inspection_config.get('frame_buffer_pool', 3)
+        self.frame_buffer: Optional[FrameBuffer] = None
+        # Execução paralela de ferramentas independentes (1 = sequencial)
+        try:
+            self.max_workers = max(1, int(inspection_config.get('max_workers', 1) or 1))
+        except (TypeError, ValueError):
+            self.max_workers = 1
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Filtros consecutivos com o mesmo ROI rodam como um único estágio (uma escrita)
+        self.fuse_filters = bool(inspection_config.get('fuse_filters', True))
+        # Fail-fast: após a primeira reprovação, pular as ferramentas restantes (exceto always_run).
+        # Opção da receita; a VM só ativa no modo RUN (set_fail_fast)
+        self.fail_fast = bool(inspection_config.get('fail_fast', False))
+        self._fail_fast_active = False
+        # Histogramas de latência (obtidos uma vez; atualizar não aloca por frame)
+        self._roi_extract_latency = METRICS.stage('roi_extract')
+        self._roi_writeback_latency = METRICS.stage('roi_writeback')
+        self._inspection_latency = METRICS.stage('inspection')
+        self._tool_latency = ()
+        # Cache de estágios do último frame (desligado por padrão; a VM liga no modo TESTE)
+        self.stage_cache_enabled = bool(inspection_config.get('stage_cache', False))
+        self._stage_cache = None
+        self._run_lock = threading.Lock()
+        # Artefatos intermediários compartilhados entre as ferramentas de um frame
+        self._artifacts = FrameArtifactCache()
+        # Assinaturas para comparar configurações (cache de estágios / hot swap)
+        self._settings_signature = _config_signature({k: v for k, v in inspection_config.items() if k != 'tools'})
+        self._tool_signatures: Tuple[str, ...] = ()
+        # Linhagem de cada ferramenta (config própria + das ferramentas de que depende), por id
+        self._lineage: Dict[Any, str] = {}
+        # Sequência do frame (a re-inspeção repete a do frame original); continua na troca de versão
+        self._frame_seq = 0
+        # (assinatura, configuração, ferramenta nova ou _REUSE) até attach()
+        self._pending_tools: Optional[List[Tuple[str, Dict[str, Any], Any]]] = None
+        self._prepare_tools(previous)
+        if attach:
+            self.attach(previous)
+
+    def _prepare_tools(self, previous: Optional['InspectionProcessor'] = None):
+        """Cria as ferramentas cuja configuração não existe no processador anterior.
+
+        Só lê as assinaturas do `previous` (imutáveis): pode rodar enquanto ele processa um frame.
+        As demais ficam marcadas para reuso e são resolvidas em attach().
+        """
         tools_config = self.config.get('tools', [])
+        self._pending_tools = []
         if not tools_config:
             print("⚠️ Nenhuma ferramenta configurada para inspeção")
             return
-            
+        
+        # Ferramentas do processador anterior disponíveis para reuso, por assinatura
+        available: Dict[str, int] = {}
+        if previous is not None:
+            for signature in previous._tool_signatures:
+                available[signature] = available.get(signature, 0) + 1
+        
+        frame_size = self._frame_size()
         for tool_config in tools_config:
+            signature = _config_signature(tool_config)
+            if available.get(signature):
+                available[signature] -= 1
+                self._pending_tools.append((signature, tool_config, _REUSE))
+                continue
             tool = self._create_tool(tool_config)
             if tool:
-                self.tools.append(tool)
                 print(f"✅ Ferramenta {tool.name} (ID: {tool.id}, Tipo: {tool.type}) inicializada")
+                # Geometria dos ROIs pré-compilada aqui, fora da troca
+                tool.prepare_roi(frame_size)
+                self._pending_tools.append((signature, tool_config, tool))
+
+    def attach(self, previous: Optional['InspectionProcessor'] = None):
+        """Liga o processador ao anterior e compila o plano de execução.
+
+        Reaproveita as instâncias inalteradas do `previous`, mantém o pool de buffers e a
+        sequência de frames e transfere o histórico das ferramentas com estado. Altera as
+        ferramentas compartilhadas: com o `previous` em uso, chamar entre dois frames (a VM chama
+        sob `processor_lock`). Ferramentas que não existem mais no `previous` são criadas aqui.
+        """
+        pending = self._pending_tools
+        if pending is None:
+            return
+        self._pending_tools = None
+        if previous is not None and previous._frame_buffer_pool == self._frame_buffer_pool:
+            self.frame_buffer = previous.frame_buffer
+        else:
+            self.frame_buffer = FrameBuffer(self._frame_buffer_pool)
+        if previous is not None:
+            self._frame_seq = previous._frame_seq
+
+        reusable: Dict[str, List[Any]] = {}
+        if previous is not None:
+            for tool, signature in zip(previous.tools, previous._tool_signatures):
+                reusable.setdefault(signature, []).append(tool)
+
+        signatures = []
+        for signature, tool_config, tool in pending:
+            if tool is _REUSE:
+                candidates = reusable.get(signature)
+                if candidates:
+                    tool = candidates.pop(0)
+                    self.reused_tools += 1
+                    if self.verbose:
+                        print(f"♻️ Ferramenta {tool.name} (ID: {tool.id}) reaproveitada")
+                else:
+                    # O processador em uso mudou desde a preparação
+                    tool = self._create_tool(tool_config)
+                    if tool:
+                        print(f"✅ Ferramenta {tool.name} (ID: {tool.id}, Tipo: {tool.type}) inicializada")
+            if tool:
+                self.tools.append(tool)
+                signatures.append(signature)
+        if not self.tools:
+            return
+
+        self.plan = self._compile_plan()
+        self.levels = self._compile_levels(self.plan)
+        self._tool_signatures = tuple(signatures)
+        self._lineage = self._compile_lineage()
+        if previous is not None:
+            self._carry_tool_state(previous)
+        self._tool_latency = tuple(
+            METRICS.histogram('vm_tool_latency_ms', tool_id=step.result_key, tool_name=step.tool.name, tool_type=step.tool.type)
+            for step in self.plan
+        )
+
+    def _frame_size(self) -> Optional[Tuple[int, int]]:
+        """Tamanho de frame de referência (source_config.resolution) para pré-compilar os ROIs."""
+        try:
+            resolution = (self.config.get('source_config') or {}).get('resolution')
+            if resolution and len(resolution) >= 2:
+                return int(resolution[0]), int(resolution[1])
+        except Exception:
+            pass
+        return None
+
+    def _compile_lineage(self) -> Dict[Any, str]:
+        """Assinatura de cada ferramenta combinada com a das ferramentas cujos dados ela lê
+        (filtro anterior, referências, transformações), transitivamente: muda quando a
+        ferramenta ou qualquer etapa que alimenta o seu resultado muda.
+
+        Para filtros, as ferramentas de análise anteriores só entram nas dependências do plano
+        por ordem de escrita na imagem e não fazem parte da linhagem.
+        """
+        lineage: List[str] = []
+        for step, signature in zip(self.plan, self._tool_signatures):
+            tool = step.tool
+            read_ids = set(tool.referenced_tool_ids())
+            read_ids.update(condition.tool_id for condition in tool.run_if)
+            digest = hashlib.sha1(signature.encode('utf-8'))
+            for d in step.depends_on:
+                source = self.plan[d]
+                if step.is_filter and not (source.is_filter or source.emits_transform or source.tool.id in read_ids):
+                    continue
+                digest.update(lineage[d].encode('ascii'))
+            lineage.append(digest.hexdigest())
+        return {step.tool.id: key for step, key in zip(self.plan, lineage) if step.tool.id is not None}
+
+    def _carry_tool_state(self, previous: 'InspectionProcessor'):
+        """Ferramentas com estado entre frames (SpcTool) mantêm o histórico na troca de versão
+        enquanto a linhagem do que acompanham não mudar; do contrário recomeçam do zero."""
+        previous_tools = {tool.id: tool for tool in previous.tools if tool.id is not None}
+        for tool in self.tools:
+            key = tool.state_key(self._lineage)
+            if key is None:
+                continue
+            old = previous_tools.get(tool.id)
+            unchanged = old is not None and old.type == tool.type and old.state_key(previous._lineage) == key
+            if old is tool:
+                # Instância reaproveitada, mas a origem dos dados mudou
+                if not unchanged:
+                    tool.reset_state()
+            elif unchanged:
+                tool.adopt_state(old)
+                if self.verbose:
+                    print(f"♻️ Histórico de {tool.name} (ID: {tool.id}) mantido")
+    
+    def _compile_plan(self) -> Tuple[PlanStep, ...]:
+        """Compila a configuração em um plano imutável executado a cada frame.
+
+        Tudo o que não depende dos pixels é resolvido aqui uma única vez: chave de resultado,
+        categoria da ferramenta, quais ferramentas emitem transformação, dependências e a
+        geometria dos ROIs para o tamanho de frame de referência (source_config.resolution).
+
+        Dependências de um passo:
+        - o último filtro anterior (a imagem que ele lê);
+        - a ferramenta de `reference_tool_id` (e as citadas na fórmula da Math);
+        - as ferramentas anteriores com `apply_transform` (offset do ROI);
+        - as ferramentas citadas nas condições `run_if`;
+        - para filtros, todos os passos desde o filtro anterior, pois o filtro escreve
+          in-place na imagem que eles leem.
+        """
+        frame_size = self._frame_size()
+
+        index_by_id = {tool.id: i for i, tool in enumerate(self.tools) if tool.id is not None}
+        steps = []
+        transform_sources: List[int] = []
+        last_filter = None
+        since_filter: List[int] = []
+        levels: List[int] = []
+        for i, tool in enumerate(self.tools):
+            tool.verbose = self.verbose
+            tool.prepare_roi(frame_size)
+
+            depends_on = set(transform_sources)
+            if last_filter is not None:
+                depends_on.add(last_filter)
+            for ref_id in tool.referenced_tool_ids():
+                ref_index = index_by_id.get(ref_id)
+                if ref_index is not None and ref_index < i:
+                    depends_on.add(ref_index)
+            for condition in tool.run_if:
+                cond_index = index_by_id.get(condition.tool_id)
+                if cond_index is not None and cond_index < i:
+                    depends_on.add(cond_index)
+                else:
+                    print(f"⚠️ run_if de {tool.name}: ferramenta {condition.tool_id} não é anterior; a ferramenta nunca será executada")
+
+            is_filter = tool.is_filter_tool()
+            if is_filter:
+                depends_on.update(since_filter)
+            emits_transform = bool(getattr(tool, 'apply_transform', False))
+            level = 1 + max((levels[d] for d in depends_on), default=-1)
+            levels.append(level)
+            steps.append(PlanStep(
+                index=i,
+                tool=tool,
+                result_key=tool.id if tool.id is not None else f"idx_{i}",
+                is_filter=is_filter,
+                emits_transform=emits_transform,
+                transform_sources=tuple(transform_sources),
+                depends_on=tuple(sorted(depends_on)),
+                level=level,
+                fusion_head=i,
+                fusion_end=i,
+                skippable=not tool.always_run,
+            ))
+            if is_filter:
+                last_filter = i
+                since_filter = []
+            else:
+                since_filter.append(i)
+            if emits_transform:
+                transform_sources.append(i)
+        if self.fuse_filters:
+            steps = self._compile_fusion(steps)
+        return tuple(self._compile_skippable(steps))
+
+    @staticmethod
+    def _compile_fusion(steps: List[PlanStep]) -> List[PlanStep]:
+        """Agrupa filtros consecutivos com ROI idêntico em sequências fundidas.
+
+        Entre dois filtros consecutivos não há ferramenta que emita transformação, então
+        o mesmo ROI configurado resulta no mesmo bbox/máscara em tempo de execução.
+        Filtros com `run_if` ficam fora das sequências (são decididos individualmente).
+        """
+        i = 0
+        while i < len(steps):
+            j = i
+            while (j + 1 < len(steps) and steps[i].is_filter and steps[j + 1].is_filter
+                   and not steps[i].tool.run_if and not steps[j + 1].tool.run_if
+                   and steps[j + 1].tool._roi_spec == steps[i].tool._roi_spec):
+                j += 1
+            if j > i:
+                for k in range(i, j + 1):
+                    steps[k] = steps[k]._replace(fusion_head=i, fusion_end=j)
+            i = j + 1
+        return steps
     
+    @staticmethod
+    def _compile_skippable(steps: List[PlanStep]) -> List[PlanStep]:
+        """Marca como não puláveis as dependências (transitivas) das ferramentas always_run,
+        para que elas vejam a mesma imagem/referências da execução completa. Uma sequência
+        fundida é pulada inteira ou não é pulada."""
+        required = set()
+        for step in reversed(steps):
+            if not step.skippable or step.index in required:
+                required.add(step.index)
+                required.update(step.depends_on)
+        for step in steps:
+            if step.fusion_end > step.fusion_head and any(
+                    i in required for i in range(step.fusion_head, step.fusion_end + 1)):
+                required.add(step.index)
+        return [step._replace(skippable=step.index not in required) for step in steps]
+
+    @staticmethod
+    def _compile_levels(plan: Tuple[PlanStep, ...]) -> Tuple[Tuple[PlanStep, ...], ...]:
+        """Agrupa os passos por nível do grafo (ordem da lista preservada dentro do nível)."""
+        grouped: Dict[int, List[PlanStep]] = {}
+        for step in plan:
+            grouped.setdefault(step.level, []).append(step)
+        return tuple(tuple(grouped[level]) for level in sorted(grouped))
+
+    def _get_executor(self):
+        """Pool de threads (criado sob demanda) quando a receita pede paralelismo."""
+        if self.max_workers <= 1 or len(self.levels) == len(self.plan):
+            return None
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='InspectionTool'
+                    )
+        return self._executor
+
+    def close(self):
+        """Libera o pool de threads (chamado quando o processador é substituído)."""
+        executor = self._executor
+        self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
     def _create_tool(self, config: Dict[str, Any]):
         """Factory para criar ferramentas baseado no tipo"""
         tool_type = config.get('type')
@@ -51,8 +457,12 @@ class InspectionProcessor:
                 return MorphologyFilterTool(config)
             elif tool_type == 'locate':
                 return LocateTool(config)
+            elif tool_type == 'template':
+                return TemplateMatchTool(config)
             elif tool_type == 'math':
                 return MathTool(config)
+            elif tool_type == 'spc':
+                return SpcTool(config)
             else:
                 print(f"⚠️ Tipo de ferramenta não reconhecido: {tool_type}")
                 return None
@@ -60,9 +470,16 @@ class InspectionProcessor:
             print(f"❌ Erro ao criar ferramenta {config.get('name', 'unknown')}: {str(e)}")
             return None
     
-    def process_inspection(self, image: np.ndarray) -> Dict[str, Any]:
-        """Executa o ciclo completo de inspeção seguindo a sequência da lista"""
-        if not self.tools:
+    def process_inspection(self, image: np.ndarray, trace=None) -> Dict[str, Any]:
+        """Executa o ciclo completo de inspeção seguindo o plano compilado.
+
+        Com `max_workers > 1` os passos de um mesmo nível do grafo de dependências rodam em
+        paralelo (OpenCV libera o GIL); os resultados continuam na ordem da lista de ferramentas.
+        `trace` (tracing.FrameTrace, opcional) recebe os spans extract_roi/process/apply de cada ferramenta.
+        """
+        if self._pending_tools is not None:
+            raise RuntimeError("Processador criado com attach=False: chame attach() antes de processar")
+        if not self.plan:
             print("⚠️ Nenhuma ferramenta disponível para processamento")
             return {
                 'inspection_summary': {
@@ -72,126 +489,500 @@ class InspectionProcessor:
                 },
                 'tool_results': [],
                 'final_image': image,
+                'config_version': self.config_version,
                 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
             }
         
-        self.results = {}
-        current_image = image.copy()
-        processed_images = {}  # Cache de imagens processadas por tipo
-        total_start_time = time.time()
+        full_image = image
+        # View (sem cópia): com roi_crop tudo a seguir trabalha só com a região dos ROIs
+        image = self._crop_frame(image)
         
-        print(f" Iniciando inspeção com {len(self.tools)} ferramentas...")
+        with self._run_lock:
+            self.results = {}
+            self._frame_seq += 1
+            # O frame de entrada é apenas emprestado: a cópia só ocorre na primeira escrita de um filtro
+            frame_buffer = self.frame_buffer
+            frame_buffer.begin(image)
+            artifacts = self._artifacts
+            artifacts.reset()
+            cache = self._new_stage_cache(image, full_image) if self.stage_cache_enabled else None
+            total_start_time = time.time()
+            
+            if self.verbose:
+                print(f" Iniciando inspeção com {len(self.plan)} ferramentas...")
+            
+            self._execute_plan(0, frame_buffer, artifacts, trace, cache)
+            
+            total_processing_time = (time.time() - total_start_time) * 1000
+            self._inspection_latency.observe(total_processing_time)
+            self._stage_cache = cache
+            
+            # Resultado final da inspeção
+            return self._generate_final_result(frame_buffer.image, total_processing_time, full_image)
+
+    def _execute_plan(self, start_index: int, frame_buffer: FrameBuffer, artifacts: FrameArtifactCache, trace, cache):
+        """Executa os passos do plano a partir de `start_index` (resultados anteriores já em self.results)."""
+        executor = self._get_executor()
+        # Reprovação definitiva já ocorrida (inclusive nos resultados reaproveitados da re-inspeção)
+        failed = self._fail_fast_active and any(r.get('pass_fail') is False for r in self.results.values())
+        if executor is None:
+            for step in self.plan[start_index:]:
+                for member, (key, result) in self._run_unit(step, frame_buffer, artifacts, trace, failed):
+                    self.results[key] = result
+                    if cache is not None:
+                        self._record_stage(cache, member, key, result, frame_buffer)
+                    if result.get('pass_fail') is False:
+                        failed = self._fail_fast_active
+            return
         
-        for i, tool in enumerate(self.tools):
-            print(f"  [{i+1}/{len(self.tools)}] Processando {tool.name} (ID: {tool.id}, Tipo: {tool.type})")
+        prefix = list(self.results.items())
+        outputs = [None] * len(self.plan)
+        for level in self.levels:
+            if start_index:
+                level = tuple(s for s in level if s.index >= start_index)
+                if not level:
+                    continue
+            if len(level) == 1 or (failed and all(s.skippable for s in level)):
+                level_outputs = [o for s in level for o in self._run_unit(s, frame_buffer, artifacts, trace, failed)]
+            else:
+                try:
+                    level_outputs = [o for outputs_ in executor.map(
+                        lambda s: self._run_unit(s, frame_buffer, artifacts, trace, failed), level
+                    ) for o in outputs_]
+                except RuntimeError:
+                    # Pool encerrado durante o frame (processador substituído): concluir em série
+                    level_outputs = [o for s in level for o in self._run_unit(s, frame_buffer, artifacts, trace, failed)]
+            # Resultados do nível ficam visíveis aos níveis seguintes (referências/offsets)
+            for step, (key, result) in level_outputs:
+                outputs[step.index] = (key, result)
+                self.results[key] = result
+                if cache is not None:
+                    # Filtros ficam sozinhos no seu nível: o buffer reflete exatamente este passo
+                    self._record_stage(cache, step, key, result, frame_buffer)
+                if result.get('pass_fail') is False:
+                    failed = self._fail_fast_active
+        # Reordenar na ordem da lista (determinístico, igual à execução sequencial)
+        self.results = dict(prefix)
+        for key, result in outputs[start_index:]:
+            self.results[key] = result
+
+    def _run_unit(self, step: PlanStep, frame_buffer: FrameBuffer, artifacts: FrameArtifactCache, trace,
+                  skip: bool = False):
+        """Executa um passo ou, no primeiro filtro de uma sequência fundida, a sequência inteira.
+
+        Com `skip` (fail-fast após uma reprovação) passos puláveis retornam o resultado 'skipped';
+        o mesmo ocorre quando a condição `run_if` é falsa ou a referência foi pulada (ramo inteiro),
+        sem extrair o ROI nem processar.
+        Retorna [(passo, (chave, resultado))]; vazio para os demais filtros da sequência.
+        """
+        if step.fusion_head != step.index:
+            return []
+        run = self.plan[step.index:step.fusion_end + 1]
+        if skip and step.skippable:
+            return [(s, (s.result_key, self._skipped_result(s, 'fail_fast'))) for s in run]
+        if not self._should_run(step):
+            return [(step, (step.result_key, self._skipped_result(step, 'run_if')))]
+        if len(run) > 1:
+            return list(zip(run, self._run_fused(run, frame_buffer, artifacts, trace)))
+        return [(step, self._run_step(step, frame_buffer, artifacts, trace))]
+
+    def _should_run(self, step: PlanStep) -> bool:
+        """Avalia `run_if` sobre os resultados anteriores; uma ferramenta cuja referência foi
+        pulada também é pulada."""
+        tool = step.tool
+        for ref_id in tool.referenced_tool_ids():
+            reference = self.results.get(ref_id)
+            if isinstance(reference, dict) and reference.get('status') == 'skipped':
+                return False
+        return all(condition.evaluate(self.results) for condition in tool.run_if)
+
+    @staticmethod
+    def _skipped_result(step: PlanStep, reason: str) -> Dict[str, Any]:
+        tool = step.tool
+        return {
+            'tool_id': tool.id if tool.id is not None else step.index,
+            'tool_name': tool.name,
+            'tool_type': tool.type,
+            'status': 'skipped',
+            'skip_reason': reason,
+            'pass_fail': None,
+            'processing_time_ms': 0
+        }
+
+    def set_fail_fast(self, enabled: bool):
+        """Ativa o fail-fast da receita (`fail_fast`); a VM ativa apenas no modo RUN."""
+        self._fail_fast_active = self.fail_fast and bool(enabled)
+
+    # ------------------------------------------------------------------
+    # Cache de estágios do último frame (re-inspeção incremental)
+    # ------------------------------------------------------------------
+    def set_stage_cache(self, enabled: bool):
+        """Liga/desliga o cache de estágios (usado no modo TESTE para edição ao vivo)."""
+        self.stage_cache_enabled = bool(enabled)
+        if not enabled:
+            self._stage_cache = None
+
+    def _crop_frame(self, image: np.ndarray) -> np.ndarray:
+        """View da região de roi_crop (o próprio frame quando não há recorte)."""
+        if self.roi_crop is None:
+            return image
+        x, y, w, h = self.roi_crop
+        return image[y:y + h, x:x + w]
+
+    def _new_stage_cache(self, image: np.ndarray, full_image: np.ndarray) -> Dict[str, Any]:
+        # checkpoints: índice do filtro -> imagem após o filtro; full_frame: frame antes do roi_crop
+        return {'frame': image, 'full_frame': full_image, 'checkpoints': {}, 'outputs': [None] * len(self.plan)}
+
+    def _record_stage(self, cache, step: PlanStep, key, result, frame_buffer: FrameBuffer):
+        cache['outputs'][step.index] = (key, result)
+        # Na sequência fundida só a imagem após o último filtro passa pelo buffer de trabalho
+        if step.is_filter and step.fusion_end == step.index:
+            # Cópia: o buffer de trabalho é sobrescrito in-place pelos filtros seguintes
+            cache['checkpoints'][step.index] = frame_buffer.image.copy()
+
+    def adopt_stage_cache(self, previous: 'InspectionProcessor') -> Optional[int]:
+        """Reaproveita o cache de estágios de um processador anterior.
+
+        Retorna o índice da primeira ferramenta alterada (a partir da qual é preciso
+        reprocessar) ou None quando não há cache utilizável.
+        """
+        cache = getattr(previous, '_stage_cache', None)
+        if cache is None or not self.plan or previous._settings_signature != self._settings_signature:
+            return None
+        start = 0
+        old, new = previous._tool_signatures, self._tool_signatures
+        while start < min(len(old), len(new)) and old[start] == new[start]:
+            start += 1
+        if start == len(old) == len(new):
+            # Nada mudou nas ferramentas: reprocessar só a última para atualizar a tela
+            start = len(new) - 1
+        frame = cache['frame']
+        if self.roi_crop != previous.roi_crop:
+            # Recorte diferente: o frame é recortado de novo e nada é reaproveitado
+            frame = self._crop_frame(cache['full_frame'])
+            start = 0
+        self._stage_cache = {
+            'frame': frame,
+            'full_frame': cache['full_frame'],
+            'checkpoints': {i: v for i, v in cache['checkpoints'].items() if i < start},
+            'outputs': list(cache['outputs'][:start]) + [None] * (len(self.plan) - start),
+        }
+        return start
+
+    def reinspect(self, start_index: int = 0, trace=None) -> Optional[Dict[str, Any]]:
+        """Reprocessa o último frame a partir da ferramenta `start_index`, reutilizando a imagem
+        intermediária e os resultados das ferramentas anteriores guardados no cache de estágios.
+
+        Retorna o mesmo formato de `process_inspection` ou None se não houver cache.
+        """
+        with self._run_lock:
+            cache = self._stage_cache
+            if cache is None or not self.plan:
+                return None
+            start_index = max(0, min(int(start_index), len(self.plan) - 1))
+            # Dentro de uma sequência fundida: reprocessar a sequência inteira
+            start_index = self.plan[start_index].fusion_head
+            if any(output is None for output in cache['outputs'][:start_index]):
+                start_index = 0
+
+            prior = [i for i in cache['checkpoints'] if i < start_index]
+            if prior:
+                image = cache['checkpoints'][max(prior)]
+            else:
+                image = cache['frame']
             
-            try:
-                # Extrair ROI (retorna também bbox/máscara através de atributos internos do tool)
-                # Antes de extrair ROI, calcule offset acumulado de ferramentas anteriores com apply_transform=true
+            new_cache = {
+                'frame': cache['frame'],
+                'full_frame': cache['full_frame'],
+                'checkpoints': {i: v for i, v in cache['checkpoints'].items() if i < start_index},
+                'outputs': list(cache['outputs'][:start_index]) + [None] * (len(self.plan) - start_index),
+            }
+            self.results = {}
+            for key, result in new_cache['outputs'][:start_index]:
+                self.results[key] = result
+            frame_buffer = self.frame_buffer
+            frame_buffer.begin(image)
+            # Artefatos são recalculados a partir do checkpoint (versões do buffer reiniciam)
+            artifacts = self._artifacts
+            artifacts.reset()
+            total_start_time = time.time()
+            
+            if self.verbose:
+                print(f" Re-inspeção a partir da ferramenta {start_index + 1}/{len(self.plan)}...")
+            
+            self._execute_plan(start_index, frame_buffer, artifacts, trace, new_cache)
+            
+            total_processing_time = (time.time() - total_start_time) * 1000
+            self._stage_cache = new_cache
+            final = self._generate_final_result(frame_buffer.image, total_processing_time, cache['full_frame'])
+            summary = final['inspection_summary']
+            summary['reinspected_from'] = start_index
+            # Ferramentas anteriores vieram do cache: overhead só sobre as reprocessadas
+            rerun_time = sum(r.get('processing_time_ms', 0) or 0 for _, r in new_cache['outputs'][start_index:])
+            summary['overhead_time_ms'] = total_processing_time - rerun_time
+            return final
+
+    def _run_step(self, step: PlanStep, frame_buffer: FrameBuffer, artifacts: FrameArtifactCache, trace=None):
+        """Executa um passo do plano e retorna (chave do resultado, resultado)."""
+        tool = step.tool
+        if self.verbose:
+            print(f"  [{step.index+1}/{len(self.plan)}] Processando {tool.name} (ID: {tool.id}, Tipo: {tool.type})")
+        
+        step_start = time.perf_counter()
+        try:
+            # Offset acumulado das ferramentas anteriores com apply_transform=true
+            tx = self._compute_cumulative_offset(step.transform_sources) if step.transform_sources else None
+            if tx:
+                tool._transform_offset = tx
+            elif hasattr(tool, '_transform_offset'):
+                # Sem offset: garantir ROI original (não altera tool.roi)
+                del tool._transform_offset
+
+            # Cache de artefatos do frame (cinza, blur, gradientes...) para a versão atual da imagem
+            tool._artifact_cache = artifacts
+            tool._artifact_version = frame_buffer.version
+            tool._frame_seq = self._frame_seq
+
+            # Extrair ROI (retorna também bbox/máscara através de atributos internos do tool)
+            roi_image = tool.extract_roi(frame_buffer.image)
+            process_start = time.perf_counter()
+            self._roi_extract_latency.observe((process_start - step_start) * 1000)
+            if trace is not None:
+                trace.add(f'{tool.name}.extract_roi', step_start, process_start, 'tool')
+            
+            # Processar com a ferramenta
+            if step.is_filter:
+                # Ferramentas de filtro modificam a imagem
+                processed_image = tool.process(frame_buffer.image, roi_image, self.results)
+                if trace is not None:
+                    trace.add(f'{tool.name}.process', process_start, time.perf_counter(), 'tool')
+                
+                # Aplica resultado de volta (in-place no ROI) considerando shape/máscara
+                writeback_start = time.perf_counter()
+                version_before = frame_buffer.version
+                roi_bbox = getattr(tool, '_last_roi_bbox', None)
+                roi_mask = getattr(tool, '_last_roi_mask', None)
+                self._apply_roi_result(frame_buffer, processed_image, roi_bbox, roi_mask)
+                writeback_end = time.perf_counter()
+                
+                self._register_output_artifact(tool, processed_image, roi_bbox, roi_mask, version_before, frame_buffer, artifacts)
+                self._roi_writeback_latency.observe((writeback_end - writeback_start) * 1000)
+                if trace is not None:
+                    trace.add(f'{tool.name}.apply_roi_result', writeback_start, writeback_end, 'tool')
+                
+                # Adicionar tempo de processamento
+                result = self._filter_result(tool, getattr(tool, 'last_processing_time', 0))
+                
+            else:
+                # Ferramentas de análise/math geram resultados
+                result = tool.process(frame_buffer.image, roi_image, self.results)
+                if trace is not None:
+                    trace.add(f'{tool.name}.process', process_start, time.perf_counter(), 'tool')
+                result['status'] = 'success'
+                result['image_modified'] = False
+                # Injetar ROI efetivo usado (após transform)
                 try:
-                    tx = self._compute_cumulative_offset(i)
-                    if tx:
-                        setattr(tool, '_transform_offset', tx)
-                    else:
-                        if hasattr(tool, '_transform_offset'):
-                            delattr(tool, '_transform_offset')
-                        # Sem offset: garantir ROI original
-                        # (não altera tool.roi)
+                    x, y, w, h = getattr(tool, '_last_roi_bbox', (None, None, None, None))
+                    if all(v is not None for v in (x, y, w, h)) and w > 0 and h > 0:
+                        result['ROI'] = { 'shape': 'rect', 'rect': { 'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h) } }
                 except Exception:
                     pass
-                roi_image = tool.extract_roi(current_image)
-                
-                # Verificar se já temos uma imagem processada do tipo necessário
-                if tool.type == 'blob' and 'grayscale' in processed_images:
-                    print(f"    🔄 Usando imagem grayscale já processada para {tool.name}")
-                    roi_image = tool.extract_roi(processed_images['grayscale'])
-                
-                # Processar com a ferramenta
-                if tool.is_filter_tool():
-                    # Ferramentas de filtro modificam a imagem
-                    processed_image = tool.process(current_image, roi_image, self.results)
-                    
-                    # Armazenar imagem processada por tipo para reutilização
-                    if tool.type == 'grayscale':
-                        processed_images['grayscale'] = processed_image.copy()
-                        print(f"    💾 Imagem grayscale armazenada para reutilização")
-                    
-                    # Aplica resultado de volta considerando shape/máscara
-                    current_image = self._apply_roi_result(current_image, processed_image, getattr(tool, '_last_roi_bbox', None), getattr(tool, '_last_roi_mask', None))
-                    
-                    # Adicionar tempo de processamento
-                    result = {
-                        'tool_id': tool.id,
-                        'tool_name': tool.name,
-                        'tool_type': tool.type,
-                        'status': 'success',
-                        'image_modified': True,
-                        'pass_fail': None,
-                        'processing_time_ms': getattr(tool, 'last_processing_time', 0)
+                # Injeta debug do offset aplicado ao ROI se houver
+                try:
+                    applied = getattr(tool, '_last_applied_offset', None)
+                    result['debug'] = result.get('debug') or {}
+                    result['debug']['roi_transform'] = {
+                        'applied': bool(applied is not None),
+                        'offset': applied if isinstance(applied, dict) else None
                     }
-                    # Injetar ROI efetivo usado (após transform)
-                    try:
-                        x, y, w, h = getattr(tool, '_last_roi_bbox', (None, None, None, None))
-                        if all(v is not None for v in (x, y, w, h)) and w > 0 and h > 0:
-                            result['ROI'] = { 'shape': 'rect', 'rect': { 'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h) } }
-                        rd = getattr(tool, '_last_roi_debug', None)
-                        if isinstance(rd, dict):
-                            result['debug'] = result.get('debug') or {}
-                            result['debug']['roi_debug'] = rd
-                    except Exception:
-                        pass
-                    
-                else:
-                    # Ferramentas de análise/math geram resultados
-                    result = tool.process(current_image, roi_image, self.results)
-                    result['status'] = 'success'
-                    result['image_modified'] = False
-                    # Injetar ROI efetivo usado (após transform)
-                    try:
-                        x, y, w, h = getattr(tool, '_last_roi_bbox', (None, None, None, None))
-                        if all(v is not None for v in (x, y, w, h)) and w > 0 and h > 0:
-                            result['ROI'] = { 'shape': 'rect', 'rect': { 'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h) } }
-                    except Exception:
-                        pass
-                    # Injeta debug do offset aplicado ao ROI se houver
-                    try:
-                        applied = getattr(tool, '_last_applied_offset', None)
-                        result['debug'] = result.get('debug') or {}
-                        result['debug']['roi_transform'] = {
-                            'applied': bool(applied is not None),
-                            'offset': applied if isinstance(applied, dict) else None
-                        }
-                        rd = getattr(tool, '_last_roi_debug', None)
-                        if isinstance(rd, dict):
-                            result['debug']['roi_debug'] = rd
-                    except Exception:
-                        pass
-                
-                # Armazenar resultado por chave estável (fallback para índice quando não houver ID)
-                result_key = tool.id if tool.id is not None else f"idx_{i}"
-                # Garantir que tool_id esteja preenchido no resultado para consumo do frontend
-                if result.get('tool_id') is None:
-                    result['tool_id'] = tool.id if tool.id is not None else i
-                self.results[result_key] = result
+                    rd = getattr(tool, '_last_roi_debug', None)
+                    if isinstance(rd, dict):
+                        result['debug']['roi_debug'] = rd
+                except Exception:
+                    pass
+            
+            # Garantir que tool_id esteja preenchido no resultado para consumo do frontend
+            if result.get('tool_id') is None:
+                result['tool_id'] = tool.id if tool.id is not None else step.index
+            self._tool_latency[step.index].observe((time.perf_counter() - step_start) * 1000)
+            if self.verbose:
                 print(f"    ✅ {tool.name} processado em {result.get('processing_time_ms', 0):.2f}ms")
-                
-            except Exception as e:
-                error_result = {
-                    'tool_id': tool.id,
-                    'tool_name': tool.name,
-                    'tool_type': tool.type,
-                    'status': 'error',
-                    'error': str(e),
-                    'pass_fail': False if tool.inspec_pass_fail else None,
-                    'processing_time_ms': 0
-                }
-                self.results[tool.id] = error_result
-                print(f"    ❌ Erro em {tool.name}: {str(e)}")
-        
-        total_processing_time = (time.time() - total_start_time) * 1000
-        
-        # Resultado final da inspeção
-        return self._generate_final_result(current_image, total_processing_time)
+            # Armazenar resultado por chave estável (fallback para índice quando não houver ID)
+            return step.result_key, result
+            
+        except Exception as e:
+            error_result = {
+                'tool_id': tool.id if tool.id is not None else step.index,
+                'tool_name': tool.name,
+                'tool_type': tool.type,
+                'status': 'error',
+                'error': str(e),
+                'pass_fail': False if tool.inspec_pass_fail else None,
+                'processing_time_ms': 0
+            }
+            print(f"    ❌ Erro em {tool.name}: {str(e)}")
+            return step.result_key, error_result
+
+    def _filter_result(self, tool, processing_time: float) -> Dict[str, Any]:
+        """Resultado padrão de um filtro (com o ROI efetivo usado, após transform)."""
+        result = {
+            'tool_id': tool.id,
+            'tool_name': tool.name,
+            'tool_type': tool.type,
+            'status': 'success',
+            'image_modified': True,
+            'pass_fail': None,
+            'processing_time_ms': processing_time
+        }
+        try:
+            x, y, w, h = getattr(tool, '_last_roi_bbox', (None, None, None, None))
+            if all(v is not None for v in (x, y, w, h)) and w > 0 and h > 0:
+                result['ROI'] = { 'shape': 'rect', 'rect': { 'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h) } }
+            rd = getattr(tool, '_last_roi_debug', None)
+            if isinstance(rd, dict):
+                result['debug'] = result.get('debug') or {}
+                result['debug']['roi_debug'] = rd
+        except Exception:
+            pass
+        return result
+
+    def _register_output_artifact(self, tool, output, roi_bbox, roi_mask, version_before: int,
+                                  frame_buffer: FrameBuffer, artifacts: FrameArtifactCache):
+        """A saída escrita no ROI (sem máscara) é o próprio artefato sobre a nova imagem
+        (ex.: grayscale = cinza do ROI): ferramentas seguintes a reaproveitam.
+        Cópia apenas se for uma view do buffer, que será sobrescrito in-place."""
+        output_artifact = tool.output_artifact(output)
+        if output_artifact is not None and roi_mask is None and frame_buffer.version != version_before:
+            kind, params = output_artifact
+            artifact = output.copy() if frame_buffer.shares_memory(output) else output
+            artifacts.put(kind, params, frame_buffer.version, roi_bbox, artifact)
+
+    def _run_fused(self, run: Tuple[PlanStep, ...], frame_buffer: FrameBuffer, artifacts: FrameArtifactCache, trace=None):
+        """Executa filtros consecutivos com o mesmo ROI como um único estágio.
+
+        O ROI é extraído uma vez e os filtros trabalham em um buffer do tamanho do ROI (com a
+        mesma semântica de canais e máscara da imagem de trabalho); a imagem de trabalho é
+        escrita uma única vez, no final. Filtros pontuais consecutivos sobre cinza 8 bits
+        (limiar, faixa, equalização) são compostos em uma única LUT.
+        Retorna [(chave, resultado)] na ordem da sequência.
+        """
+        head = run[0]
+        if self.verbose:
+            print(f"  [{head.index+1}-{run[-1].index+1}/{len(self.plan)}] Sequência fundida: {', '.join(s.tool.name for s in run)}")
+        step_start = time.perf_counter()
+        try:
+            tx = self._compute_cumulative_offset(head.transform_sources) if head.transform_sources else None
+            roi_image = None
+            for step in run:
+                tool = step.tool
+                if tx:
+                    tool._transform_offset = tx
+                elif hasattr(tool, '_transform_offset'):
+                    del tool._transform_offset
+                # Só o primeiro filtro lê a imagem de trabalho; os artefatos do frame não valem
+                # para o buffer local dos seguintes
+                tool._artifact_cache = artifacts if step is head else None
+                tool._artifact_version = frame_buffer.version
+                # Todos extraem (bbox/máscara/debug por ferramenta); a geometria é a mesma
+                image = tool.extract_roi(frame_buffer.image)
+                if roi_image is None:
+                    roi_image = image
+            bbox = getattr(head.tool, '_last_roi_bbox', None)
+            mask = getattr(head.tool, '_last_roi_mask', None)
+            if bbox is None or bbox[2] <= 0 or bbox[3] <= 0:
+                # ROI inválido: cada filtro segue o caminho normal (avisos/escrita individuais)
+                return [self._run_step(step, frame_buffer, artifacts, trace) for step in run]
+
+            process_start = time.perf_counter()
+            self._roi_extract_latency.observe((process_start - step_start) * 1000)
+            if trace is not None:
+                trace.add(f'{head.tool.name}.extract_roi', step_start, process_start, 'tool')
+
+            w, h = int(bbox[2]), int(bbox[3])
+            local_bbox = (0, 0, w, h)
+            local = FrameBuffer(0)
+            local.begin(roi_image)
+            # Saída 2D pendente (sem máscara): é exatamente o cinza do ROI atual. Filtros que
+            # tratam cada canal igualmente (gray_equivalent) a processam em um só canal; ela só é
+            # convertida para o layout colorido da imagem quando outro filtro precisar
+            gray = None
+            times = [0.0] * len(run)
+            folded = [False] * len(run)
+            i = 0
+            while i < len(run):
+                if mask is None and i + 1 < len(run) and run[i].tool.is_point_op() and run[i + 1].tool.is_point_op():
+                    src = run[i].tool.lut_input(gray if gray is not None else local.image)
+                    if src is not None and src.ndim == 2 and src.dtype == np.uint8:
+                        composed = None
+                        src_hist = []
+
+                        def input_hist():
+                            # Histograma da entrada do filtro atual, derivado do histograma da origem
+                            if not src_hist:
+                                src_hist.append(cv2.calcHist([src], [0], None, [256], [0, 256]).ravel().astype(np.int64))
+                            if composed is None:
+                                return src_hist[0]
+                            return np.bincount(composed, weights=src_hist[0], minlength=256).astype(np.int64)
+
+                        j = i
+                        while j < len(run) and run[j].tool.is_point_op():
+                            lut = run[j].tool.point_lut(input_hist)
+                            if lut is None:
+                                break
+                            composed = lut if composed is None else lut[composed]
+                            j += 1
+                        if j - i >= 2:
+                            lut_start = time.perf_counter()
+                            gray = _apply_lut(src, composed)
+                            lut_end = time.perf_counter()
+                            if trace is not None:
+                                trace.add('fused_lut[' + ','.join(s.tool.name for s in run[i:j]) + ']', lut_start, lut_end, 'tool')
+                            for k in range(i, j):
+                                times[k] = (lut_end - lut_start) * 1000 / (j - i)
+                                folded[k] = True
+                            i = j
+                            continue
+
+                tool = run[i].tool
+                if gray is not None and local.image.ndim == 3 and not tool.gray_equivalent():
+                    local.write_roi(gray, local_bbox, None)
+                    gray = None
+                stage_start = time.perf_counter()
+                out = tool.process(frame_buffer.image, gray if gray is not None else local.image, self.results)
+                if trace is not None:
+                    trace.add(f'{tool.name}.process', stage_start, time.perf_counter(), 'tool')
+                times[i] = getattr(tool, 'last_processing_time', 0)
+                if mask is None and isinstance(out, np.ndarray) and out.ndim == 2 and out.shape == (h, w):
+                    gray = out
+                elif not local.write_roi(out, local_bbox, mask):
+                    print(f"⚠️ ROI result ({out.shape}) de {tool.name} não cabe no ROI {w}x{h}")
+                i += 1
+
+            # Escrita única na imagem de trabalho
+            writeback_start = time.perf_counter()
+            final = gray if gray is not None else local.image
+            version_before = frame_buffer.version
+            if gray is not None or local.version:
+                self._apply_roi_result(frame_buffer, final, bbox, mask)
+                self._register_output_artifact(run[-1].tool, final, bbox, mask, version_before, frame_buffer, artifacts)
+            writeback_end = time.perf_counter()
+            self._roi_writeback_latency.observe((writeback_end - writeback_start) * 1000)
+            if trace is not None:
+                trace.add(f'{run[-1].tool.name}.apply_roi_result', writeback_start, writeback_end, 'tool')
+        except Exception as e:
+            # O buffer de trabalho só é alterado na escrita final: refazer a sequência passo a passo
+            print(f"    ⚠️ Sequência fundida {head.tool.name}..{run[-1].tool.name} falhou ({str(e)}); executando sem fusão")
+            return [self._run_step(step, frame_buffer, artifacts, trace) for step in run]
+
+        outputs = []
+        for k, step in enumerate(run):
+            result = self._filter_result(step.tool, times[k])
+            result['fused'] = {'first_index': head.index, 'size': len(run), 'lut': folded[k]}
+            if result.get('tool_id') is None:
+                result['tool_id'] = step.tool.id if step.tool.id is not None else step.index
+            self._tool_latency[step.index].observe(times[k])
+            outputs.append((step.result_key, result))
+        return outputs
 
     def _apply_offset_to_roi_copy(self, roi_obj, tx):
         import copy
@@ -225,9 +1016,9 @@ class InspectionProcessor:
                 e['angle'] = float(e.get('angle', 0.0)) + dth
         return roi
 
-    def _compute_cumulative_offset(self, upto_index: int):
-        """Computa offset cumulativo (dx, dy, dtheta_deg) somando todas as ferramentas anteriores
-        com apply_transform=true (tipicamente Locate) até o índice anterior a `upto_index`.
+    def _compute_cumulative_offset(self, sources: Tuple[int, ...]):
+        """Computa offset cumulativo (dx, dy, dtheta_deg) somando as ferramentas anteriores
+        com apply_transform=true (tipicamente Locate), cujos índices vêm pré-compilados no plano.
 
         Regras de composição (simples e robustas para coordenadas globais):
         - Somar dx e dy em coordenadas globais
@@ -239,10 +1030,11 @@ class InspectionProcessor:
             total_dy = 0.0
             total_dth = 0.0
             any_rotate = False
-            # percorrer do início até a ferramenta anterior (ordem natural de composição)
-            for j in range(0, max(0, upto_index)):
-                tool_j = self.tools[j]
-                res_key = tool_j.id if tool_j.id is not None else f"idx_{j}"
+            # percorrer as fontes na ordem natural de composição
+            for j in sources:
+                step_j = self.plan[j]
+                tool_j = step_j.tool
+                res_key = step_j.result_key
                 res = self.results.get(res_key)
                 if not isinstance(res, dict):
                     continue
@@ -294,43 +1086,31 @@ class InspectionProcessor:
             return None
         return None
     
-    def _apply_roi_result(self, original_image: np.ndarray, roi_result: np.ndarray, bbox, mask) -> np.ndarray:
-        """Aplica o resultado do ROI de volta à imagem original respeitando máscara (para circle/ellipse)."""
+    def _apply_roi_result(self, frame_buffer: FrameBuffer, roi_result: np.ndarray, bbox, mask):
+        """Aplica o resultado do ROI de volta à imagem de trabalho respeitando máscara (para circle/ellipse).
+
+        A escrita é feita in-place na região do ROI; o frame original só é copiado (uma vez)
+        na primeira escrita do ciclo.
+        """
         if bbox is None:
-            return roi_result
+            frame_buffer.replace(roi_result)
+            return
 
         x, y, w, h = bbox
         if w <= 0 or h <= 0:
-            return original_image
-
-        result_image = original_image.copy()
-
-        # Compatibiliza canais
-        if len(original_image.shape) == 3 and len(roi_result.shape) == 2:
-            roi_result = cv2.cvtColor(roi_result, cv2.COLOR_GRAY2BGR)
-        elif len(original_image.shape) == 2 and len(roi_result.shape) == 3:
-            roi_result = cv2.cvtColor(roi_result, cv2.COLOR_BGR2GRAY)
-
-        if x + w <= original_image.shape[1] and y + h <= original_image.shape[0]:
-            if mask is None:
-                # retângulo puro
-                result_image[y:y+h, x:x+w] = roi_result
-            else:
-                # aplica somente onde mask > 0
-                sub = result_image[y:y+h, x:x+w]
-                if len(sub.shape) == 3:
-                    mask3 = cv2.merge([mask, mask, mask])
-                    np.copyto(sub, roi_result, where=mask3.astype(bool))
-                else:
-                    np.copyto(sub, roi_result, where=mask.astype(bool))
-                result_image[y:y+h, x:x+w] = sub
-        else:
-            print(f"⚠️ ROI result ({w}x{h}) não cabe na posição ({x},{y}) da imagem original {original_image.shape}")
+            return
 
-        return result_image
+        if not frame_buffer.write_roi(roi_result, bbox, mask):
+            print(f"⚠️ ROI result ({w}x{h}) não cabe na posição ({x},{y}) da imagem original {frame_buffer.image.shape}")
     
-    def _generate_final_result(self, final_image: np.ndarray, total_time: float) -> Dict[str, Any]:
-        """Gera resultado final da inspeção"""
+    def _generate_final_result(self, final_image: np.ndarray, total_time: float,
+                               full_image: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Gera resultado final da inspeção.
+
+        Com roi_crop, `final_image` (do tamanho do recorte) volta para dentro de `full_image` e
+        as coordenadas dos resultados são deslocadas para o frame: quem consome o resultado
+        (overlay, editor, logs) não sabe do recorte.
+        """
         # Contar ferramentas com pass/fail
         pass_fail_tools = [r for r in self.results.values() if r.get('pass_fail') is not None]
         passed_tools = [r for r in pass_fail_tools if r['pass_fail']]
@@ -340,11 +1120,21 @@ class InspectionProcessor:
             r.get('processing_time_ms', 0) for r in self.results.values()
         )
         
+        tool_results = list(self.results.values())  # Lista para manter ordem
+        crop_h, crop_w = final_image.shape[:2]
+        if self.roi_crop is not None and full_image is not None:
+            x, y = self.roi_crop[0], self.roi_crop[1]
+            final_image = paste_crop(full_image, final_image, self.roi_crop)
+            # Cópias: os resultados em self.results (cache de estágios) ficam relativos ao recorte
+            frame_size = (full_image.shape[1], full_image.shape[0])
+            tool_results = [shift_tool_result(r, x, y, frame_size) for r in tool_results]
+        
         overall_result = {
             'inspection_summary': {
                 'total_tools': len(self.tools),
                 'successful_tools': len([r for r in self.results.values() if r['status'] == 'success']),
                 'failed_tools': len([r for r in self.results.values() if r['status'] == 'error']),
+                'skipped_tools': len([r for r in self.results.values() if r['status'] == 'skipped']),
                 'pass_fail_tools': len(pass_fail_tools),
                 'passed_tests': len(passed_tools),
                 'overall_pass': len(pass_fail_tools) == 0 or len(passed_tools) == len(pass_fail_tools),
@@ -352,8 +1142,14 @@ class InspectionProcessor:
                 'tools_processing_time_ms': tools_processing_time,
                 'overhead_time_ms': total_time - tools_processing_time
             },
-            'tool_results': list(self.results.values()),  # Lista para manter ordem
+            'tool_results': tool_results,
             'final_image': final_image,
+            # Região processada (roi_crop), informativa: resultados e imagem já estão no frame inteiro
+            'roi_crop': {
+                'x': self.roi_crop[0], 'y': self.roi_crop[1],
+                'w': int(crop_w), 'h': int(crop_h)
+            } if self.roi_crop is not None else None,
+            'config_version': self.config_version,
             'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
         }
         
@@ -0,0 +1,137 @@
+import threading
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """Janela deslizante de latências (ms) com memória pré-alocada.
+
+    `observe()` apenas escreve em um ring numpy de tamanho fixo e atualiza contadores,
+    sem alocar estruturas por frame; os percentis (p50/p90/p99) e o máximo são calculados
+    somente na leitura, sobre as últimas `window` amostras. `count` e `sum` são acumulados
+    desde o início (formato summary do Prometheus).
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window: int = 1024):
+        self.window = max(1, int(window))
+        self._ring = np.zeros(self.window, dtype=np.float64)
+        self._next = 0
+        self._filled = 0
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float):
+        with self._lock:
+            self._ring[self._next] = value_ms
+            self._next = (self._next + 1) % self.window
+            if self._filled < self.window:
+                self._filled += 1
+            self.count += 1
+            self.sum += value_ms
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            samples = self._ring[:self._filled].copy()
+            count, total = self.count, self.sum
+        result = {'count': count, 'sum': round(total, 3), 'window': int(samples.size)}
+        if samples.size:
+            values = np.quantile(samples, self.QUANTILES)
+            for q, v in zip(self.QUANTILES, values):
+                result[f'p{int(q * 100)}'] = round(float(v), 3)
+            result['max'] = round(float(samples.max()), 3)
+        else:
+            for q in self.QUANTILES:
+                result[f'p{int(q * 100)}'] = 0.0
+            result['max'] = 0.0
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._next = 0
+            self._filled = 0
+            self.count = 0
+            self.sum = 0.0
+
+
+class MetricsRegistry:
+    """Registro de histogramas de latência por (família, rótulos).
+
+    Os histogramas devem ser obtidos uma vez (ex.: ao compilar o plano de inspeção) e
+    reutilizados a cada frame; `histogram()` retorna sempre a mesma instância para a
+    mesma chave.
+    """
+
+    FAMILIES = {
+        'vm_stage_latency_ms': 'Latência por estágio do ciclo de inspeção (ms)',
+        'vm_tool_latency_ms': 'Latência de processamento por ferramenta (ms)',
+    }
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, family: str, **labels) -> LatencyHistogram:
+        key = (family, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = LatencyHistogram(self.window)
+                    self._histograms[key] = hist
+        return hist
+
+    def stage(self, name: str) -> LatencyHistogram:
+        """Atalho para os estágios do ciclo (capture, roi_extract, roi_writeback, ...)."""
+        return self.histogram('vm_stage_latency_ms', stage=name)
+
+    def reset(self):
+        with self._lock:
+            for hist in self._histograms.values():
+                hist.reset()
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            items = list(self._histograms.items())
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        for (family, labels), hist in sorted(items, key=lambda kv: kv[0]):
+            out.setdefault(family, []).append({'labels': dict(labels), **hist.snapshot()})
+        return out
+
+    def to_prometheus(self) -> str:
+        """Exporta no formato texto do Prometheus (summary + gauge de máximo)."""
+        lines = []
+        for family, entries in self.to_dict().items():
+            lines.append(f"# HELP {family} {self.FAMILIES.get(family, family)}")
+            lines.append(f"# TYPE {family} summary")
+            for entry in entries:
+                labels = entry['labels']
+                for q in LatencyHistogram.QUANTILES:
+                    lines.append(f"{family}{_format_labels(labels, quantile=q)} {entry[f'p{int(q * 100)}']}")
+                lines.append(f"{family}_sum{_format_labels(labels)} {entry['sum']}")
+                lines.append(f"{family}_count{_format_labels(labels)} {entry['count']}")
+            lines.append(f"# TYPE {family}_max gauge")
+            for entry in entries:
+                lines.append(f"{family}_max{_format_labels(entry['labels'])} {entry['max']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str], **extra) -> str:
+    merged = dict(labels)
+    merged.update({k: str(v) for k, v in extra.items()})
+    if not merged:
+        return ''
+    parts = []
+    for k, v in merged.items():
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{v}"')
+    return '{' + ','.join(parts) + '}'
+
+
+# Registro compartilhado pelo processo da VM
+METRICS = MetricsRegistry()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Testes do cache de artefatos por frame (tools/artifact_cache.py) e do reaproveitamento entre
+ferramentas no InspectionProcessor
+"""
+import copy
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from inspection_processor import InspectionProcessor
+from test_inspection_processor import _comparable, _frame
+from tools import FrameArtifactCache
+
+
+def _blob(tool_id, roi, th_min=128, **config):
+    return dict({'id': tool_id, 'name': f'blob{tool_id}', 'type': 'blob', 'th_min': th_min, 'th_max': 255,
+                 'area_min': 50, 'area_max': 1e9, 'ROI': roi}, **config)
+
+
+FULL = {'x': 0, 'y': 0, 'w': 320, 'h': 240}
+INNER = {'x': 40, 'y': 30, 'w': 200, 'h': 150}
+
+
+def _uncached(self, kind, params, version, bbox, compute, pointwise=False):
+    return compute()
+
+
+class FrameArtifactCacheTest(unittest.TestCase):
+
+    def test_exact_and_contained_hits(self):
+        cache = FrameArtifactCache()
+        image = np.arange(100, dtype=np.uint8).reshape(10, 10)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return image.copy()
+
+        full = cache.get_or_compute('gray', (), 1, (0, 0, 10, 10), compute, pointwise=True)
+        self.assertFalse(full.flags.writeable)
+        self.assertIs(cache.get_or_compute('gray', (), 1, (0, 0, 10, 10), compute, pointwise=True), full)
+        # Pontual: um bbox contido é recortado do artefato maior
+        crop = cache.get_or_compute('gray', (), 1, (2, 3, 4, 5), compute, pointwise=True)
+        np.testing.assert_array_equal(crop, image[3:8, 2:6])
+        self.assertTrue(np.may_share_memory(crop, full))
+        self.assertEqual(len(calls), 1)
+        # Não pontual, outra versão ou outros parâmetros: calculado de novo
+        cache.get_or_compute('gray', (), 1, (2, 3, 4, 5), compute)
+        cache.get_or_compute('gray', (), 2, (0, 0, 10, 10), compute, pointwise=True)
+        cache.get_or_compute('gray', ('x',), 1, (0, 0, 10, 10), compute, pointwise=True)
+        # Bbox que sai do artefato maior também não é atendido
+        cache.get_or_compute('gray', (), 1, (8, 8, 4, 4), compute, pointwise=True)
+        self.assertEqual(len(calls), 5)
+        self.assertEqual(cache.stats(), {'entries': 5, 'hits': 2, 'misses': 5})
+        cache.reset()
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_put_tuples_and_ignores_non_arrays(self):
+        cache = FrameArtifactCache()
+        gx, gy = np.zeros((4, 4), np.float32), np.ones((4, 4), np.float32)
+        cache.put('sobel', (3,), 0, (0, 0, 4, 4), (gx, gy))
+        self.assertFalse(gx.flags.writeable or gy.flags.writeable)
+        value = cache.get_or_compute('sobel', (3,), 0, (0, 0, 4, 4), lambda: self.fail('recalculado'))
+        self.assertIs(value[1], gy)
+        cache.put('info', (), 0, (0, 0, 4, 4), {'not': 'array'})
+        self.assertEqual(cache.stats()['entries'], 1)
+
+
+class ProcessorArtifactTest(unittest.TestCase):
+
+    def _run(self, config, frames=(0, 7)):
+        processor = InspectionProcessor(copy.deepcopy(config))
+        outputs = [processor.process_inspection(_frame(shift)) for shift in frames]
+        return processor, outputs
+
+    def test_shared_gray_and_threshold(self):
+        config = {'tools': [_blob(1, FULL), _blob(2, INNER), _blob(3, FULL, th_min=200)]}
+        processor, outputs = self._run(config)
+        # Por frame: blob1 calcula cinza e faixa; blob2 recorta ambos; blob3 recorta só o cinza.
+        # O cache é esvaziado entre frames (entradas de um frame só).
+        self.assertEqual(processor._artifacts.stats(), {'entries': 3, 'hits': 6, 'misses': 6})
+        with mock.patch.object(FrameArtifactCache, 'get_or_compute', _uncached):
+            _, expected = self._run(config)
+        for output, reference in zip(outputs, expected):
+            self.assertEqual(_comparable(output), _comparable(reference))
+
+    def test_filter_output_is_reused_and_invalidates_older_artifacts(self):
+        config = {'tools': [_blob(1, FULL),
+                            {'id': 2, 'name': 'gray', 'type': 'grayscale', 'normalize': False, 'ROI': FULL},
+                            _blob(3, INNER),
+                            {'id': 4, 'name': 'otsu', 'type': 'threshold', 'mode': 'otsu', 'ROI': INNER},
+                            _blob(5, INNER)]}
+        requests = []
+        get_or_compute = FrameArtifactCache.get_or_compute
+
+        def spy(cache, kind, params, version, bbox, compute, pointwise=False):
+            hits = cache.hits
+            value = get_or_compute(cache, kind, params, version, bbox, compute, pointwise)
+            requests.append((kind, version, cache.hits > hits))
+            return value
+
+        with mock.patch.object(FrameArtifactCache, 'get_or_compute', spy):
+            processor, outputs = self._run(config, frames=(0,))
+        self.assertEqual(requests, [
+            ('gray', 0, False), ('gray_in_range', 0, False),   # blob1
+            ('gray', 0, True),                                  # filtro gray: cinza de blob1
+            # blob3: cinza escrito pelo filtro (versão 1); a faixa da versão 0 não vale mais
+            ('gray', 1, True), ('gray_in_range', 1, False),
+            ('gray', 1, True), ('gray_otsu', 1, False),         # otsu
+            ('gray', 2, True), ('gray_in_range', 2, False),     # blob5: saída do otsu
+        ])
+        with mock.patch.object(FrameArtifactCache, 'get_or_compute', _uncached):
+            _, expected = self._run(config, frames=(0,))
+        for output, reference in zip(outputs, expected):
+            self.assertEqual(_comparable(output), _comparable(reference))
+            np.testing.assert_array_equal(output['final_image'], reference['final_image'])
+
+
+if __name__ == '__main__':
+    unittest.main()
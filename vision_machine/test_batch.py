@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Testes da inspeção offline (batch.py): registros na ordem de entrada, iguais aos do
+InspectionProcessor, no próprio processo e no pool de processos
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from batch import iter_batch, list_images, process_batch
+from inspection_processor import InspectionProcessor
+from test_inspection_processor import _comparable, _frame, _recipe
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        for i, shift in enumerate((0, 4, 8, 12, 16)):
+            cv2.imwrite(os.path.join(self.tmpdir, f'{i:03d}.png'), _frame(shift))
+        # Reprovada: sem o disco da esquerda
+        cv2.imwrite(os.path.join(self.tmpdir, '005.png'), np.zeros((240, 320, 3), np.uint8))
+        with open(os.path.join(self.tmpdir, '006.png'), 'wb') as f:
+            f.write(b'nao e uma imagem')
+        with open(os.path.join(self.tmpdir, 'leia-me.txt'), 'w') as f:
+            f.write('ignorado')
+        self.images = list_images(self.tmpdir)
+
+    def _expected(self):
+        processor = InspectionProcessor(_recipe())
+        expected = []
+        for path in self.images:
+            image = cv2.imread(path)
+            expected.append(None if image is None else processor.process_inspection(image))
+        processor.close()
+        return expected
+
+
+class ProcessBatchTest(BatchTestCase):
+
+    def test_records_match_processor_in_input_order(self):
+        self.assertEqual([os.path.basename(p) for p in self.images], [f'{i:03d}.png' for i in range(7)])
+        expected = self._expected()
+        for workers in (0, 2):
+            records = []
+            output = os.path.join(self.tmpdir, f'resultados_{workers}.jsonl')
+            summary = process_batch(self.tmpdir, _recipe(), workers=workers, output=output, chunksize=2,
+                                    on_result=records.append)
+            self.assertEqual([record['index'] for record in records], list(range(7)), workers)
+            self.assertEqual([record['source'] for record in records], self.images)
+            for record, reference in zip(records, expected):
+                if reference is None:
+                    self.assertEqual((record['status'], record['overall_pass']), ('error', False))
+                    self.assertIn('006.png', record['error'])
+                    continue
+                self.assertEqual(record['status'], 'ok')
+                self.assertEqual(record['overall_pass'], reference['inspection_summary']['overall_pass'])
+                self.assertEqual(_comparable(record), _comparable(reference), (workers, record['source']))
+                self.assertNotIn('final_image', record)
+                self.assertEqual('worker' in record, workers > 0)
+                if workers:
+                    self.assertNotEqual(record['worker'], os.getpid())
+
+            # JSONL: uma linha por imagem, na mesma ordem
+            with open(output, encoding='utf-8') as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual([line['index'] for line in lines], list(range(7)))
+            self.assertEqual(lines[0]['tool_results'][2]['blob_count'], records[0]['tool_results'][2]['blob_count'])
+
+            passed = sum(1 for r in expected if r is not None and r['inspection_summary']['overall_pass'])
+            self.assertEqual((summary['total'], summary['passed'], summary['failed'], summary['errors']),
+                             (7, passed, 6 - passed, 1))
+            self.assertEqual(summary['workers'], workers)
+            self.assertEqual(summary['tool_failures'].get('left'), 1)
+            self.assertLessEqual(summary['inspection_ms']['p50'], summary['inspection_ms']['max'])
+
+
+class IterBatchTest(BatchTestCase):
+
+    def test_arrays_are_inspected_in_place(self):
+        frames = [_frame(shift) for shift in (0, 6, 12)]
+        processor = InspectionProcessor(_recipe())
+        for prefetch in (0, 2):
+            records = list(iter_batch(frames, _recipe(), prefetch=prefetch))
+            self.assertEqual([record['source'] for record in records], ['array[0]', 'array[1]', 'array[2]'])
+            self.assertEqual([record['decode_ms'] for record in records], [0.0] * 3)
+            for record, frame in zip(records, frames):
+                self.assertEqual(_comparable(record), _comparable(processor.process_inspection(frame)))
+        self.assertEqual(list(iter_batch([], _recipe())), [])
+
+    def test_decode_scale_from_source_config(self):
+        config = dict(_recipe(), source_config={'decode_scale': 2})
+        record = next(iter_batch(self.images[:1], config))
+        reduced = cv2.imread(self.images[0], cv2.IMREAD_REDUCED_COLOR_2)
+        self.assertEqual(reduced.shape[:2], (120, 160))
+        expected = InspectionProcessor(config).process_inspection(reduced)
+        self.assertEqual(_comparable(record), _comparable(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
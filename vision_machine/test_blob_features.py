@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Testes dos descritores de forma dos blobs (tools/blob_features.py)
+"""
+import unittest
+
+import cv2
+import numpy as np
+
+from tools.blob_features import compute_blob_features
+
+
+def _convexity(mask: np.ndarray) -> float:
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    return float(compute_blob_features(labels, num_labels, stats, centroids, mask, mask, ['convexity'])['convexity'][1])
+
+
+class ConvexityTest(unittest.TestCase):
+
+    def test_convex_blobs_measure_one(self):
+        for radius in (5, 12, 50):
+            mask = np.zeros((140, 140), np.uint8)
+            cv2.circle(mask, (70, 70), radius, 255, -1)
+            self.assertAlmostEqual(_convexity(mask), 1.0, places=6, msg=f"disco r={radius}")
+        for angle in (0, 20, 45):
+            mask = np.zeros((200, 200), np.uint8)
+            cv2.ellipse(mask, (100, 100), (70, 20), angle, 0, 360, 255, -1)
+            self.assertAlmostEqual(_convexity(mask), 1.0, places=6, msg=f"elipse {angle}°")
+            mask = np.zeros((200, 200), np.uint8)
+            box = cv2.boxPoints(((100, 100), (90, 40), angle)).astype(np.int32)
+            cv2.fillPoly(mask, [box], 255)
+            self.assertAlmostEqual(_convexity(mask), 1.0, places=6, msg=f"retângulo {angle}°")
+
+    def test_concave_blob_matches_pixel_centre_hull(self):
+        mask = np.zeros((200, 200), np.uint8)
+        mask[40:160, 40:70] = 255
+        mask[130:160, 40:160] = 255
+        ys, xs = np.nonzero(mask)
+        hull = cv2.contourArea(cv2.convexHull(np.c_[xs, ys].astype(np.int32)))
+        self.assertAlmostEqual(_convexity(mask), xs.size / hull, places=4)
+
+    def test_degenerate_blobs(self):
+        mask = np.zeros((50, 50), np.uint8)
+        mask[10, 5:40] = 255
+        self.assertEqual(_convexity(mask), 1.0)
+        mask[10] = 0
+        mask[30, 30] = 255
+        self.assertEqual(_convexity(mask), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Testes da BlobTool (tools/blob_tool.py): contornos em uma única passada contra a extração
+por componente e níveis de geometria
+"""
+import pickle
+import unittest
+
+import cv2
+import numpy as np
+
+from tools.blob_tool import BlobTool, materialize_deferred_geometry
+
+
+def _scene(seed):
+    """Blobs com buracos, blobs encostados na borda e ruído de pixels isolados"""
+    rng = np.random.default_rng(seed)
+    img = np.zeros((160, 200), np.uint8)
+    for _ in range(8):
+        cx, cy = (int(v) for v in rng.integers(0, [200, 160]))
+        cv2.ellipse(img, (cx, cy), tuple(int(v) for v in rng.integers(6, 30, 2)), float(rng.uniform(0, 180)),
+                    0, 360, 255, -1)
+        if rng.random() < 0.6:
+            cv2.circle(img, (cx, cy), int(rng.integers(2, 6)), 0, -1)
+    img[rng.random(img.shape) < 0.01] = 255
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+
+def _run(img, roi, **config):
+    tool = BlobTool(dict({'id': 1, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255,
+                          'area_min': 3, 'area_max': 1e9, 'ROI': roi}, **config))
+    result = tool.process(img, tool.extract_roi(img), {})
+    return tool, result
+
+
+def _per_component(tool, img):
+    """Extração de referência: máscara e findContours para cada componente (um a um)"""
+    roi_image = tool.extract_roi(img)
+    binary = cv2.inRange(cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY), 128, 255)
+    if tool._last_roi_mask is not None:
+        binary = cv2.bitwise_and(binary, binary, mask=tool._last_roi_mask)
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    blobs = []
+    for label_id in range(1, num_labels):
+        x, y, w, h, area = (int(v) for v in stats[label_id])
+        if not tool.area_min <= area <= tool.area_max:
+            continue
+        component = (labels[y:y + h, x:x + w] == label_id).astype(np.uint8) * 255
+        contours, hierarchy = cv2.findContours(component, cv2.RETR_CCOMP, tool._chain_mode())
+        all_polys, outer = [], []
+        for ci, contour in enumerate(contours):
+            poly = tool._build_polygon_from_contour(contour)
+            if poly:
+                all_polys.append([[px + x, py + y] for px, py in poly])
+            if hierarchy[0][ci][3] == -1:
+                outer.append(contour)
+        poly = tool._build_polygon_from_contour(max(outer, key=cv2.contourArea)) if outer else []
+        blob = {'area': float(area), 'centroid': tuple(int(round(v)) for v in centroids[label_id]),
+                'bounding_box': [x, y, w, h], 'contour': [[px + x, py + y] for px, py in poly]}
+        if all_polys:
+            blob['contours'] = all_polys
+        blobs.append(blob)
+    return blobs
+
+
+class SinglePassContoursTest(unittest.TestCase):
+
+    def test_matches_per_component_extraction(self):
+        rois = ({'x': 0, 'y': 0, 'w': 200, 'h': 160}, {'x': 15, 'y': 10, 'w': 150, 'h': 120},
+                {'shape': 'circle', 'circle': {'cx': 100, 'cy': 80, 'r': 70}})
+        settings = ({}, {'contour_chain': 'NONE', 'approx_epsilon_ratio': 0},
+                    {'contour_chain': 'TC89_KCOS', 'polygon_max_points': 12},
+                    {'contour_chain': 'TC89_L1', 'approx_epsilon_ratio': 0.05})
+        holes = 0
+        for seed in range(6):
+            img = _scene(seed)
+            for roi in rois:
+                for config in settings:
+                    tool, result = _run(img, roi, **config)
+                    expected = _per_component(tool, img)
+                    holes += sum(len(blob.get('contours', ())) > 1 for blob in expected)
+                    self.assertEqual(result['blobs'], expected, (seed, roi, config))
+                    self.assertEqual(result['total_area'], sum(blob['area'] for blob in expected))
+        # A cena exercita blobs com buracos (mais de um contorno por componente)
+        self.assertGreater(holes, 0)
+
+
+class GeometryLevelsTest(unittest.TestCase):
+
+    ROI = {'shape': 'circle', 'circle': {'cx': 100, 'cy': 80, 'r': 70}}
+
+    def test_levels_keep_measurements(self):
+        img = _scene(3)
+        full = _run(img, self.ROI)[1]
+        measured = [(b['area'], b['centroid'], b['bounding_box']) for b in full['blobs']]
+        for level in ('none', 'bbox', 'outer', 'lazy'):
+            result = _run(img, self.ROI, geometry=level, blob_count_test=True, test_blob_count_max=3)[1]
+            self.assertEqual(result['geometry'], level)
+            self.assertEqual([(b['area'], b['centroid'], b['bounding_box']) for b in result['blobs']], measured)
+            self.assertEqual((result['total_area'], result['blob_count']), (full['total_area'], full['blob_count']))
+            self.assertFalse(result['test_results']['overall_pass'])
+            if level != 'lazy':
+                self.assertNotIn('deferred_geometry', result)
+            for blob, reference in zip(result['blobs'], full['blobs']):
+                self.assertNotIn('contours', blob)
+                x, y, w, h = blob['bounding_box']
+                expected = {'none': [], 'lazy': [], 'outer': reference['contour'],
+                            'bbox': [[x, y], [x + w - 1, y], [x + w - 1, y + h - 1], [x, y + h - 1], [x, y]]}[level]
+                self.assertEqual(blob['contour'], expected, level)
+
+    def test_lazy_materializes_full_geometry(self):
+        img = _scene(4)
+        full = _run(img, self.ROI)[1]
+        result = _run(img, self.ROI, geometry='lazy')[1]
+        # Serializável: o worker farm devolve o resultado ainda sem polígonos
+        result = pickle.loads(pickle.dumps(result))
+        materialize_deferred_geometry([result])
+        self.assertNotIn('deferred_geometry', result)
+        self.assertEqual(result['blobs'], full['blobs'])
+        materialize_deferred_geometry([result])
+        self.assertEqual(result['blobs'], full['blobs'])
+
+    def test_invalid_level_falls_back_to_full(self):
+        self.assertEqual(_run(_scene(0), self.ROI, geometry='polygons')[0].geometry, 'full')
+
+
+if __name__ == '__main__':
+    unittest.main()
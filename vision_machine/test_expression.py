@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Testes das fórmulas compiladas (tools/expression.py) e da MathTool (tools/math_tool.py)
+"""
+import math
+import unittest
+
+from tools.expression import compile_expression
+from tools.math_tool import MathTool
+
+RESULTS = {
+    1: {'total_area': 500, 'total_area_x': 7, 'blob_count': 3, 'roi_area': 1000,
+        'test_results': {'overall_pass': True},
+        'blobs': [{'area': 100.0, 'centroid': [1, 2]}, {'area': 150.0, 'centroid': [3, 4]},
+                  {'area': 250.0, 'centroid': [5, 6]}],
+        'features': {'circularity': [0.9, 0.8, 0.7]}},
+    5: {'total_area': 250, 'edges': [{'x': 1.5, 'strength': 10}, {'x': 2.5, 'strength': 30}]},
+}
+
+
+def _eval(text, default_tool_id=1):
+    return compile_expression(text, default_tool_id).evaluate(RESULTS)
+
+
+def _math(formula, **config):
+    tool = {'id': 9, 'name': 'math', 'type': 'math', 'operation': 'custom_formula', 'custom_formula': formula,
+            'inspec_pass_fail': True}
+    tool.update(config)
+    return MathTool(tool)
+
+
+class ExpressionTest(unittest.TestCase):
+
+    def test_rejected_constructs(self):
+        for text in ('__import__("os")', 'open("x")', '().__class__', 'total_area.__class__',
+                     'blobs.__class__.__mro__', 'blobs[0]', 'total_area[0]', 'lambda: 1', '[1, 2]', 'f"{1}"',
+                     'x if 1 else "a"', 'min(x=1)', 'max(*blobs.area)', 'a; b', 'total_area = 1', 't3'):
+            with self.assertRaises(ValueError, msg=text):
+                compile_expression(text, 1)
+
+    def test_reference_required_without_alias(self):
+        with self.assertRaises(ValueError):
+            compile_expression('total_area')
+        self.assertEqual(compile_expression('t1.total_area').evaluate(RESULTS), 500.0)
+
+    def test_huge_powers_overflow_as_float(self):
+        with self.assertRaises(OverflowError):
+            _eval('10 ** 10 ** 10')
+        with self.assertRaises(OverflowError):
+            _eval('blob_count ** 1000000')
+        self.assertEqual(_eval('blob_count ** blob_count'), 27.0)
+
+    def test_prefix_colliding_keys(self):
+        self.assertEqual(_eval('total_area_x'), 7.0)
+        self.assertEqual(_eval('total_area - total_area_x'), 493.0)
+        self.assertEqual(_eval('total_area_x + total_area'), 507.0)
+
+    def test_tool_aliases(self):
+        expression = compile_expression('t1.total_area / t5.total_area')
+        self.assertEqual(expression.tool_ids, (1, 5))
+        self.assertEqual(expression.evaluate(RESULTS), 2.0)
+        self.assertEqual(compile_expression('total_area + t1.total_area', 1).tool_ids, (1,))
+        with self.assertRaises(ValueError):
+            compile_expression('t7.total_area').evaluate(RESULTS)
+
+    def test_list_columns_and_aggregates(self):
+        self.assertAlmostEqual(_eval('mean(blobs.area)'), 500.0 / 3)
+        self.assertEqual(_eval('max(blobs.area) - min(blobs.area)'), 150.0)
+        self.assertEqual(_eval('count(blobs.area)'), 3.0)
+        self.assertEqual(_eval('sum(blobs.area > 120)'), 2.0)
+        self.assertEqual(_eval('min(features.circularity)'), 0.7)
+        self.assertEqual(_eval('mean(t5.edges.strength)'), 20.0)
+        self.assertEqual(_eval('mean(blobs.centroid)'), 3.5)
+        self.assertEqual(_eval('max(blob_count, 10)'), 10.0)
+        self.assertEqual(_eval('sum(t5.edges.x) + count(t5.edges.x)'), 6.0)
+        self.assertTrue(math.isnan(compile_expression('mean(t1.none.x)').evaluate({1: {'none': []}})))
+        self.assertEqual(compile_expression('sum(t1.none.x)').evaluate({1: {'none': []}}), 0.0)
+        with self.assertRaises(ValueError):
+            _eval('count(blobs)')
+
+    def test_scalars_conditions_and_nested_fields(self):
+        self.assertEqual(_eval('test_results.overall_pass'), 1.0)
+        self.assertEqual(_eval('total_area if blob_count > 2 else -1'), 500.0)
+        self.assertEqual(_eval('clip(total_area, 0, 100)'), 100.0)
+        self.assertAlmostEqual(_eval('sqrt(total_area) + pi'), math.sqrt(500) + math.pi)
+        with self.assertRaises(ValueError):
+            _eval('missing + 1')
+
+
+class MathToolTest(unittest.TestCase):
+
+    def test_result_limits(self):
+        tool = _math('t1.total_area / t5.total_area', result_min=1.5)
+        result = tool.process(None, None, RESULTS)
+        self.assertEqual(result['result'], 2.0)
+        self.assertEqual(result['limits'], {'min': 1.5, 'max': None})
+        self.assertTrue(result['pass_fail'])
+        self.assertFalse(_math('t1.total_area / t5.total_area', result_max=1.9).process(None, None, RESULTS)['pass_fail'])
+        self.assertTrue(_math('t1.total_area', result_min=500, result_max=500).process(None, None, RESULTS)['pass_fail'])
+        # Sem faixa: passa; operações prontas mantêm a faixa padrão
+        self.assertIsNone(_math('t1.total_area').process(None, None, RESULTS)['limits'])
+        ratio = MathTool({'id': 9, 'name': 'math', 'type': 'math', 'operation': 'area_ratio', 'reference_tool_id': 1,
+                          'inspec_pass_fail': True})
+        result = ratio.process(None, None, RESULTS)
+        self.assertEqual((result['result'], result['limits'], result['pass_fail']), (0.5, {'min': 0.1, 'max': 0.9}, True))
+
+    def test_referenced_tool_ids(self):
+        self.assertEqual(_math('t1.total_area / t5.total_area').referenced_tool_ids(), (1, 5))
+        self.assertEqual(_math('total_area', reference_tool_id=5).referenced_tool_ids(), (5,))
+        with self.assertRaises(ValueError):
+            _math('1 + 1')
+
+    def test_errors_fail_the_tool(self):
+        for formula in ('blobs.area', 'total_area / 0', 'blob_count ** 1000000'):
+            result = _math(formula, reference_tool_id=1).process(None, None, RESULTS)
+            self.assertEqual(result['status'], 'error', formula)
+            self.assertFalse(result['pass_fail'], formula)
+        with self.assertRaises(ValueError):
+            _math('__import__("os").system("true")', reference_tool_id=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
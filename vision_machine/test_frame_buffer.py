@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Testes do buffer de trabalho com cópia sob demanda (frame_buffer.py) e do seu uso no processador
+"""
+import unittest
+
+import numpy as np
+
+from frame_buffer import FrameBuffer
+from inspection_processor import InspectionProcessor
+from test_inspection_processor import _frame, _recipe
+
+
+class FrameBufferTest(unittest.TestCase):
+
+    def test_copy_on_first_write_only(self):
+        frame = np.arange(48, dtype=np.uint8).reshape(4, 4, 3)
+        original = frame.copy()
+        buffer = FrameBuffer(pool_size=2)
+        buffer.begin(frame)
+        # Sem escrita: a imagem é o próprio frame emprestado
+        self.assertIs(buffer.image, frame)
+        self.assertTrue(buffer.write_roi(np.zeros((2, 2), np.uint8), (0, 0, 2, 2), None))
+        first = buffer.image
+        self.assertFalse(np.may_share_memory(first, frame))
+        self.assertTrue(buffer.write_roi(np.full((2, 2, 3), 9, np.uint8), (2, 2, 2, 2), None))
+        self.assertIs(buffer.image, first)
+        self.assertEqual(buffer.version, 2)
+        np.testing.assert_array_equal(frame, original)
+        expected = original.copy()
+        expected[0:2, 0:2] = 0
+        expected[2:4, 2:4] = 9
+        np.testing.assert_array_equal(first, expected)
+
+    def test_masked_write_and_out_of_bounds(self):
+        buffer = FrameBuffer()
+        buffer.begin(np.zeros((4, 4), np.uint8))
+        mask = np.array([[1, 0], [0, 1]], np.uint8)
+        self.assertTrue(buffer.write_roi(np.full((2, 2), 7, np.uint8), (1, 1, 2, 2), mask))
+        self.assertEqual(buffer.image[1:3, 1:3].tolist(), [[7, 0], [0, 7]])
+        self.assertFalse(buffer.write_roi(np.zeros((2, 2), np.uint8), (3, 3, 2, 2), None))
+        self.assertEqual(buffer.version, 1)
+
+    def test_pool_is_circular(self):
+        buffer = FrameBuffer(pool_size=2)
+        images = []
+        for value in range(3):
+            buffer.begin(np.full((2, 2), value, np.uint8))
+            buffer.writable()
+            images.append(buffer.image)
+        # A imagem do frame 1 continua válida até pool_size frames depois
+        self.assertIsNot(images[0], images[1])
+        self.assertIs(images[2], images[0])
+        self.assertEqual(images[1].tolist(), [[1, 1], [1, 1]])
+        buffer.ensure_pool_size(4)
+        self.assertEqual(buffer.pool_size, 4)
+
+        unpooled = FrameBuffer(pool_size=0)
+        seen = []
+        for _ in range(3):
+            unpooled.begin(np.zeros((2, 2), np.uint8))
+            seen.append(unpooled.writable())
+        self.assertEqual(len({id(image) for image in seen}), 3)
+        unpooled.ensure_pool_size(4)
+        self.assertEqual(unpooled.pool_size, 0)
+
+
+class ProcessorFrameBufferTest(unittest.TestCase):
+
+    def test_input_frame_is_never_written(self):
+        processor = InspectionProcessor(_recipe())
+        frame = _frame()
+        original = frame.copy()
+        first = processor.process_inspection(frame)
+        np.testing.assert_array_equal(frame, original)
+        self.assertFalse(np.may_share_memory(first['final_image'], frame))
+        # Mesmo resultado que inspecionar uma cópia própria do frame
+        expected = InspectionProcessor(_recipe()).process_inspection(frame.copy())
+        np.testing.assert_array_equal(first['final_image'], expected['final_image'])
+        final = first['final_image'].copy()
+        processor.process_inspection(_frame(5))
+        # Pool padrão: a imagem final do frame anterior ainda não foi reutilizada
+        np.testing.assert_array_equal(first['final_image'], final)
+
+
+if __name__ == '__main__':
+    unittest.main()
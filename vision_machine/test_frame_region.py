@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Testes do recorte pela união dos ROIs (frame_region.py / roi_crop no InspectionProcessor)
+"""
+import copy
+import unittest
+
+import cv2
+import numpy as np
+
+from frame_region import paste_crop, roi_union_bbox, shift_tool_result
+from inspection_processor import InspectionProcessor
+from test_inspection_processor import _comparable
+
+
+def _frame():
+    img = np.full((240, 320, 3), 40, np.uint8)
+    cv2.rectangle(img, (150, 0), (319, 239), (200, 200, 200), -1)
+    cv2.circle(img, (90, 170), 25, (255, 255, 255), -1)
+    return img
+
+
+TOOLS = [
+    {'id': 1, 'name': 'gray', 'type': 'grayscale', 'method': 'luminance',
+     'ROI': {'shape': 'rect', 'rect': {'x': 40, 'y': 110, 'w': 180, 'h': 110}}},
+    {'id': 2, 'name': 'locate', 'type': 'locate', 'threshold': 20,
+     'ROI': {'shape': 'rect', 'rect': {'x': 100, 'y': 30, 'w': 100, 'h': 40}},
+     'arrow': {'p0': {'x': 110, 'y': 50}, 'p1': {'x': 190, 'y': 50}},
+     'reference': {'x': 148, 'y': 50, 'angle_deg': 0}},
+    {'id': 3, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 10, 'area_max': 1e9,
+     'ROI': {'shape': 'rect', 'rect': {'x': 50, 'y': 130, 'w': 80, 'h': 80}}},
+]
+
+
+def _rounded(value):
+    """Coordenadas rebaseadas e deslocadas de volta diferem só no arredondamento do float"""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {k: _rounded(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_rounded(v) for v in value]
+    return value
+
+
+class RoiCropTest(unittest.TestCase):
+
+    def _run(self, crop):
+        config = {'tools': copy.deepcopy(TOOLS), 'roi_crop': crop}
+        return InspectionProcessor(config).process_inspection(_frame())
+
+    def test_union_bbox(self):
+        self.assertEqual(roi_union_bbox(TOOLS, 0), (40, 30, 180, 190))
+
+    def test_results_in_frame_coordinates(self):
+        plain = self._run(False)
+        cropped = self._run({'enabled': True, 'margin': 0})
+        self.assertEqual(cropped['roi_crop'], {'x': 40, 'y': 30, 'w': 180, 'h': 190})
+        self.assertEqual(cropped['final_image'].shape, plain['final_image'].shape)
+        self.assertTrue(np.array_equal(cropped['final_image'], plain['final_image']))
+        for a, b in zip(plain['tool_results'], cropped['tool_results']):
+            for key in ('ROI', 'result', 'reference', 'offset', 'edges', 'arrow', 'blobs', 'total_area'):
+                self.assertEqual(a.get(key), b.get(key), f"{a['tool_name']}.{key}")
+
+    def test_all_results_match_uncropped(self):
+        tools = copy.deepcopy(TOOLS)
+        tools[1].update({'apply_transform': True, 'caliper_count': 5, 'caliper_width': 12})
+        tools.append({'id': 4, 'name': 'follow', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 10,
+                      'area_max': 1e9, 'ROI': {'shape': 'circle', 'circle': {'cx': 170, 'cy': 120, 'r': 30}}})
+        tools.append({'id': 5, 'name': 'ratio', 'type': 'math', 'operation': 'custom_formula',
+                      'custom_formula': 't3.total_area / t4.total_area'})
+        for settings in ({}, {'max_workers': 4}):
+            plain = InspectionProcessor(dict({'tools': copy.deepcopy(tools)}, **settings))
+            for margin in (0, 8):
+                cropped = InspectionProcessor(dict({'tools': copy.deepcopy(tools),
+                                                    'roi_crop': {'enabled': True, 'margin': margin}}, **settings))
+                for shift in (0, 6):
+                    frame = np.roll(_frame(), shift, axis=1)
+                    expected = plain.process_inspection(frame)
+                    output = cropped.process_inspection(frame)
+                    self.assertEqual(_rounded(_comparable(output)), _rounded(_comparable(expected)), (settings, margin, shift))
+                    np.testing.assert_array_equal(output['final_image'], expected['final_image'])
+
+    def test_paste_crop_without_write_returns_frame(self):
+        frame = _frame()
+        view = frame[10:50, 20:60]
+        self.assertIs(paste_crop(frame, view, (20, 10, 40, 40)), frame)
+        gray = np.zeros((40, 40), np.uint8)
+        out = paste_crop(frame, gray, (20, 10, 40, 40))
+        self.assertEqual(out.ndim, 2)
+        self.assertEqual(int(out[10:50, 20:60].max()), 0)
+
+    def test_shift_tool_result_copies(self):
+        result = {'ROI': {'shape': 'rect', 'rect': {'x': 1, 'y': 2, 'w': 3, 'h': 4}},
+                  'edges': [{'x': 1.5, 'y': 2.5}], 'result': {'x': 1.0, 'y': 2.0, 'angle_deg': 0.0},
+                  'offset': {'x': 1.0, 'y': 1.0}, 'caliper': {'points': [[1.0, 1.0]]}}
+        shifted = shift_tool_result(result, 10, 20)
+        self.assertEqual(shifted['ROI']['rect'], {'x': 11, 'y': 22, 'w': 3, 'h': 4})
+        self.assertEqual(shifted['edges'], [{'x': 11.5, 'y': 22.5}])
+        self.assertEqual(shifted['result']['x'], 11.0)
+        self.assertEqual(shifted['caliper']['points'], [[11.0, 21.0]])
+        self.assertEqual(shifted['offset'], {'x': 1.0, 'y': 1.0})
+        # Original intacto (cache de estágios)
+        self.assertEqual(result['ROI']['rect']['x'], 1)
+        self.assertEqual(result['edges'][0]['x'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Testes da geometria compacta publicada (tools/geometry_codec.py e a decodificação do Django, api/geometry.py)
+"""
+import json
+import os
+import sys
+import unittest
+
+import cv2
+import numpy as np
+
+from inspection_processor import InspectionProcessor
+from tools.geometry_codec import pack_tool_result, pack_tool_results, unpack_tool_result
+
+# api/geometry.py não depende do Django
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.geometry import unpack_result_json
+
+
+def _blob_result(**config):
+    img = np.zeros((200, 300, 3), np.uint8)
+    cv2.circle(img, (60, 60), 30, (255, 255, 255), -1)
+    cv2.rectangle(img, (150, 50), (250, 150), (255, 255, 255), -1)
+    cv2.circle(img, (200, 100), 20, (0, 0, 0), -1)
+    tool = {'id': 1, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 10, 'area_max': 1e9}
+    tool.update(config)
+    return InspectionProcessor({'tools': [tool]}).process_inspection(img)['tool_results'][0]
+
+
+def _edges(n):
+    return [{'x': 10.123456 + i, 'y': 20.5 - i, 'strength': 3.25 * i, 'polarity': 'rise' if i % 2 else 'fall',
+             'index': i} for i in range(n)]
+
+
+def _as_json(value):
+    return json.loads(json.dumps(value))
+
+
+class GeometryCodecTest(unittest.TestCase):
+
+    def test_blobs_round_trip(self):
+        for config in ({}, {'contour_mode': 'tree'}, {'geometry': 'bbox'}):
+            result = _blob_result(**config)
+            result.pop('debug', None)
+            packed = pack_tool_result(result)
+            self.assertIn('blobs_packed', packed)
+            self.assertNotIn('blobs', packed)
+            self.assertIn('blobs', result)
+            self.assertEqual(_as_json(unpack_tool_result(packed)), _as_json(result), str(config))
+
+    def test_edges_packed_only_when_smaller(self):
+        few = {'tool_id': 2, 'edges': _edges(2)}
+        self.assertIs(pack_tool_result(few), few)
+        many = {'tool_id': 2, 'edges': _edges(40)}
+        packed = pack_tool_result(many)
+        self.assertIn('edges_packed', packed)
+        self.assertLess(len(json.dumps(packed)), len(json.dumps(many)))
+        self.assertEqual(unpack_tool_result(packed), many)
+
+    def test_non_standard_geometry_stays_json(self):
+        result = {'blobs': [{'area': 1.5, 'centroid': [0, 0], 'bounding_box': [0, 0, 1, 1]}],
+                  'edges': [{'x': 1.0}, {'y': 2.0}]}
+        self.assertIs(pack_tool_result(result), result)
+        self.assertIs(pack_tool_results([result], 'json')[0], result)
+
+    def test_django_decoder_matches(self):
+        result = _blob_result(contour_mode='tree')
+        result.pop('debug', None)
+        results = [result, {'tool_id': 2, 'edges': _edges(40)}, {'tool_id': 3, 'value': 1.0}]
+        stored = _as_json(pack_tool_results(results))
+        self.assertEqual(unpack_result_json(stored), _as_json(results))
+        # Registro antigo ou corrompido volta como foi armazenado
+        self.assertEqual(unpack_result_json({'raw': {}}), {'raw': {}})
+        broken = [{'blobs_packed': {'codec': 'outro'}}]
+        self.assertEqual(unpack_result_json(broken), broken)
+
+    def test_django_decoder_expands_vm_log(self):
+        # Formato gravado pela VM em result_json (vm.py, log de inspeção)
+        result = _blob_result()
+        result.pop('debug', None)
+        results = [result, {'tool_id': 2, 'edges': _edges(40)}]
+        log = {'aprovados': 1, 'reprovados': 1, 'frame': 3, 'tools': [{'id': 1, 'type': 'blob'}],
+               'result': pack_tool_results(results)}
+        stored = _as_json(log)
+        self.assertIn('blobs_packed', stored['result'][0])
+        expanded = unpack_result_json(stored)
+        self.assertEqual(expanded, _as_json(dict(log, result=results)))
+        self.assertNotIn('blobs_packed', expanded['result'][0])
+        self.assertIn('blobs_packed', stored['result'][0])
+        self.assertEqual(unpack_result_json({'tool_results': stored['result']}), {'tool_results': _as_json(results)})
+
+
+if __name__ == '__main__':
+    unittest.main()
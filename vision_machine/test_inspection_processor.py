@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Testes do InspectionProcessor: o caminho otimizado (plano compilado, paralelismo, fusão,
+roi_crop, re-inspeção, hot swap, fail-fast) contra a execução sequencial de referência
+"""
+import contextlib
+import copy
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from inspection_processor import InspectionProcessor
+
+
+def _frame(shift=0):
+    """Cena sintética: dois discos e um retângulo sobre fundo com gradiente"""
+    img = np.tile(np.linspace(20, 60, 320, dtype=np.uint8), (240, 1))
+    img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    cv2.circle(img, (70 + shift, 80), 30, (230, 230, 230), -1)
+    cv2.circle(img, (230, 170), 22, (200, 200, 200), -1)
+    cv2.rectangle(img, (150 + shift, 40), (200 + shift, 120), (250, 250, 250), -1)
+    return img
+
+
+def _recipe(**settings):
+    tools = [
+        {'id': 1, 'name': 'gray', 'type': 'grayscale', 'normalize': False, 'ROI': {'x': 0, 'y': 0, 'w': 320, 'h': 240}},
+        {'id': 2, 'name': 'blur', 'type': 'blur', 'ksize': 5, 'ROI': {'x': 0, 'y': 0, 'w': 320, 'h': 240}},
+        {'id': 3, 'name': 'left', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 50, 'area_max': 1e9,
+         'ROI': {'x': 0, 'y': 0, 'w': 140, 'h': 240}, 'inspec_pass_fail': True, 'blob_count_test': True,
+         'test_blob_count_min': 1, 'test_blob_count_max': 1},
+        {'id': 4, 'name': 'right', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 50, 'area_max': 1e9,
+         'ROI': {'x': 140, 'y': 0, 'w': 180, 'h': 240}},
+        {'id': 5, 'name': 'ratio', 'type': 'math', 'operation': 'custom_formula',
+         'custom_formula': 't3.total_area / t4.total_area'},
+    ]
+    return dict({'tools': tools}, **settings)
+
+
+def _transform_recipe(**settings):
+    """Receita com Locate (apply_transform) deslocando o ROI de uma Blob seguinte"""
+    config = _recipe(**settings)
+    config['tools'].append({'id': 6, 'name': 'edge', 'type': 'locate', 'threshold': 20, 'apply_transform': True,
+                            'ROI': {'x': 130, 'y': 60, 'w': 60, 'h': 40},
+                            'arrow': {'p0': {'x': 135, 'y': 80}, 'p1': {'x': 185, 'y': 80}},
+                            'reference': {'x': 150, 'y': 80, 'angle_deg': 90}})
+    config['tools'].append({'id': 7, 'name': 'moved', 'type': 'blob', 'th_min': 128, 'th_max': 255,
+                            'area_min': 50, 'area_max': 1e9, 'ROI': {'x': 140, 'y': 30, 'w': 70, 'h': 100}})
+    return config
+
+
+def _comparable(output):
+    """Resultados sem os campos que dependem de tempo"""
+    results = []
+    for result in output['tool_results']:
+        result = copy.deepcopy(result)
+        for key in ('processing_time_ms', 'debug', 'timing'):
+            result.pop(key, None)
+        results.append(result)
+    return results
+
+
+class ProcessorTestCase(unittest.TestCase):
+
+    def assertSameResults(self, output, expected, msg=None):
+        self.assertEqual(_comparable(output), _comparable(expected), msg)
+        np.testing.assert_array_equal(output['final_image'], expected['final_image'], err_msg=str(msg))
+
+
+class CompiledPlanTest(ProcessorTestCase):
+
+    def test_plan_resolved_once(self):
+        processor = InspectionProcessor(_recipe())
+        plan = processor.plan
+        self.assertEqual([step.result_key for step in plan], [1, 2, 3, 4, 5])
+        self.assertEqual([step.is_filter for step in plan], [True, True, False, False, False])
+        self.assertEqual([step.depends_on for step in plan], [(), (0,), (1,), (1,), (1, 2, 3)])
+        self.assertEqual([step.level for step in plan], [0, 1, 2, 2, 3])
+        with mock.patch.object(type(plan[2].tool), 'prepare_roi') as prepare_roi:
+            for shift in (0, 5):
+                output = processor.process_inspection(_frame(shift))
+        prepare_roi.assert_not_called()
+        self.assertIs(processor.plan, plan)
+        self.assertEqual([r['tool_id'] for r in output['tool_results']], [1, 2, 3, 4, 5])
+
+    def test_errors_keep_result_key(self):
+        config = _recipe()
+        del config['tools'][4]
+        for tool in config['tools'][2:]:
+            del tool['id']
+        processor = InspectionProcessor(config)
+        self.assertEqual([step.result_key for step in processor.plan], [1, 2, 'idx_2', 'idx_3'])
+        for step in processor.plan[2:4]:
+            step.tool.process = mock.Mock(side_effect=ValueError(f'falha {step.index}'))
+        output = processor.process_inspection(_frame())
+        # Cada erro fica na chave do seu passo (sem sobrescrever o outro sem id)
+        self.assertEqual(list(processor.results), [1, 2, 'idx_2', 'idx_3'])
+        errors = [r for r in output['tool_results'] if r['status'] == 'error']
+        self.assertEqual([(r['tool_id'], r['error']) for r in errors], [(2, 'falha 2'), (3, 'falha 3')])
+        self.assertFalse(output['inspection_summary']['overall_pass'])
+
+
+class SchedulerTest(ProcessorTestCase):
+
+    def test_parallel_matches_sequential(self):
+        for recipe in (_recipe, _transform_recipe):
+            sequential = InspectionProcessor(recipe())
+            parallel = InspectionProcessor(recipe(max_workers=4))
+            self.assertIsNone(sequential._get_executor())
+            self.assertIsNotNone(parallel._get_executor())
+            self.assertGreater(max(len(level) for level in parallel.levels), 1)
+            for shift in (0, 7, -9):
+                self.assertSameResults(parallel.process_inspection(_frame(shift)),
+                                       sequential.process_inspection(_frame(shift)), (recipe.__name__, shift))
+            parallel.close()
+
+    def test_transform_orders_levels(self):
+        processor = InspectionProcessor(_transform_recipe(max_workers=4))
+        steps = {step.result_key: step for step in processor.plan}
+        # A Blob deslocada espera a Locate; as Blob anteriores rodam junto com a Locate
+        self.assertIn(steps[6].index, steps[7].depends_on)
+        self.assertGreater(steps[7].level, steps[6].level)
+        self.assertEqual(steps[3].level, steps[6].level)
+        output = processor.process_inspection(_frame(7))
+        moved = next(r for r in output['tool_results'] if r['tool_id'] == 7)
+        self.assertTrue(moved['debug']['roi_transform']['applied'])
+        self.assertEqual([r['tool_id'] for r in output['tool_results']], [1, 2, 3, 4, 5, 6, 7])
+        processor.close()
+
+
+class ReinspectTest(ProcessorTestCase):
+
+    def _edit(self, old, config):
+        new = InspectionProcessor(config, previous=old)
+        new.set_stage_cache(True)
+        return new, new.adopt_stage_cache(old)
+
+    def test_starts_at_first_changed_tool(self):
+        for recipe in (_recipe, _transform_recipe):
+            old = InspectionProcessor(recipe())
+            old.set_stage_cache(True)
+            old.process_inspection(_frame(3))
+            for index, key, value in ((3, 'area_min', 400), (4, 'custom_formula', 't4.total_area'), (1, 'ksize', 3)):
+                config = recipe()
+                config['tools'][index][key] = value
+                new, start = self._edit(old, config)
+                self.assertEqual(start, index, (recipe.__name__, key))
+                # Alteração dentro de uma sequência fundida (gray + blur) recomeça no início dela
+                head = new.plan[start].fusion_head
+                with contextlib.ExitStack() as stack:
+                    earlier = [stack.enter_context(mock.patch.object(step.tool, 'process'))
+                               for step in new.plan[:head]]
+                    output = new.reinspect(start)
+                # Ferramentas antes da alterada vêm do cache
+                self.assertFalse(any(process.called for process in earlier))
+                self.assertEqual(output['inspection_summary']['reinspected_from'], head)
+                self.assertSameResults(output, InspectionProcessor(config).process_inspection(_frame(3)),
+                                       (recipe.__name__, key))
+
+    def test_chained_edits_and_settings_change(self):
+        old = InspectionProcessor(_recipe())
+        old.set_stage_cache(True)
+        old.process_inspection(_frame())
+        config = _recipe()
+        config['tools'][4]['custom_formula'] = 't4.total_area / t3.total_area'
+        new, start = self._edit(old, config)
+        self.assertEqual(start, 4)
+        new.reinspect(start)
+        config['tools'][2]['area_min'] = 60
+        newer, start = self._edit(new, config)
+        self.assertEqual(start, 2)
+        self.assertSameResults(newer.reinspect(start), InspectionProcessor(config).process_inspection(_frame()))
+        # Opções da receita diferentes: cache não é reaproveitado
+        self.assertIsNone(self._edit(newer, dict(config, fuse_filters=False))[1])
+        self.assertIsNone(InspectionProcessor(_recipe()).reinspect(0))
+
+
+class FusionTest(ProcessorTestCase):
+
+    CHAINS = (
+        [{'type': 'grayscale'}, {'type': 'threshold', 'th_min': 150}, {'type': 'morphology', 'open': 1, 'close': 1}],
+        [{'type': 'grayscale', 'normalize': False}, {'type': 'threshold', 'mode': 'range', 'th_min': 100, 'th_max': 220},
+         {'type': 'blur', 'method': 'median', 'ksize': 5}],
+        [{'type': 'grayscale', 'method': 'average', 'normalize': False}, {'type': 'blur', 'ksize': 7},
+         {'type': 'threshold', 'mode': 'otsu'}],
+    )
+    ROIS = ({'x': 20, 'y': 10, 'w': 260, 'h': 200},
+            {'shape': 'circle', 'circle': {'cx': 160, 'cy': 120, 'r': 90}})
+
+    def _chain(self, filters, roi, **settings):
+        tools = [dict(f, id=i + 1, name=f"{f['type']}{i}", ROI=roi) for i, f in enumerate(filters)]
+        tools.append({'id': 9, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 20,
+                      'area_max': 1e9, 'ROI': {'x': 0, 'y': 0, 'w': 320, 'h': 240}})
+        return dict({'tools': tools}, **settings)
+
+    def test_fused_matches_step_by_step(self):
+        for filters in self.CHAINS:
+            for roi in self.ROIS:
+                fused = InspectionProcessor(self._chain(filters, roi))
+                plain = InspectionProcessor(self._chain(filters, roi, fuse_filters=False))
+                self.assertEqual({step.fusion_end for step in fused.plan[:3]}, {2})
+                self.assertTrue(all(step.fusion_head == step.index for step in plain.plan))
+                for shift in (0, 11):
+                    output = fused.process_inspection(_frame(shift))
+                    expected = plain.process_inspection(_frame(shift))
+                    self.assertTrue(all(r.get('fused') for r in output['tool_results'][:3]))
+                    # Resultados iguais, exceto a marcação da sequência fundida
+                    for result in output['tool_results']:
+                        result.pop('fused', None)
+                    self.assertSameResults(output, expected, (filters, roi, shift))
+
+    def test_different_rois_are_not_fused(self):
+        filters = self.CHAINS[0]
+        config = self._chain(filters, self.ROIS[0])
+        for tool in config['tools'][1:3]:
+            tool['ROI'] = self.ROIS[1]
+        plan = InspectionProcessor(config).plan
+        self.assertEqual([(step.fusion_head, step.fusion_end) for step in plan[:3]], [(0, 0), (1, 2), (1, 2)])
+
+
+class FailFastTest(ProcessorTestCase):
+
+    def _rejecting(self, **settings):
+        """Receita em que a Blob da esquerda reprova (espera 2 blobs) e uma Blob always_run no fim"""
+        config = _recipe(fail_fast=True, **settings)
+        config['tools'][2]['test_blob_count_min'] = 2
+        config['tools'].append({'id': 6, 'name': 'log', 'type': 'blob', 'th_min': 128, 'th_max': 255,
+                                'area_min': 50, 'area_max': 1e9, 'always_run': True,
+                                'ROI': {'x': 140, 'y': 0, 'w': 180, 'h': 240}})
+        return config
+
+    def test_skips_after_first_rejection(self):
+        for settings in ({}, {'max_workers': 4}):
+            full = InspectionProcessor(self._rejecting(**settings)).process_inspection(_frame())
+            processor = InspectionProcessor(self._rejecting(**settings))
+            processor.set_fail_fast(True)
+            output = processor.process_inspection(_frame())
+            statuses = [r['status'] for r in output['tool_results']]
+            if settings:
+                # Mesmo nível da reprovação (Blob da direita) já estava em execução
+                self.assertEqual(statuses, ['success'] * 4 + ['skipped', 'success'])
+            else:
+                self.assertEqual(statuses, ['success'] * 3 + ['skipped', 'skipped', 'success'])
+            self.assertEqual(output['tool_results'][4]['skip_reason'], 'fail_fast')
+            summary = output['inspection_summary']
+            self.assertFalse(summary['overall_pass'])
+            self.assertEqual(summary['skipped_tools'], statuses.count('skipped'))
+            # O que rodou (inclusive a always_run e o filtro de que ela depende) é igual à inspeção completa
+            expected = _comparable(full)
+            for i, result in enumerate(_comparable(output)):
+                if result['status'] != 'skipped':
+                    self.assertEqual(result, expected[i], (settings, i))
+            np.testing.assert_array_equal(output['final_image'], full['final_image'])
+
+    def test_only_when_enabled(self):
+        processor = InspectionProcessor(self._rejecting())
+        processor.set_fail_fast(True)
+        processor.set_fail_fast(False)
+        self.assertNotIn('skipped', [r['status'] for r in processor.process_inspection(_frame())['tool_results']])
+        # Receita sem fail_fast: o modo RUN sozinho não pula nada
+        config = self._rejecting()
+        del config['fail_fast']
+        processor = InspectionProcessor(config)
+        processor.set_fail_fast(True)
+        self.assertNotIn('skipped', [r['status'] for r in processor.process_inspection(_frame())['tool_results']])
+
+
+class HotSwapTest(ProcessorTestCase):
+
+    def test_unchanged_tools_are_reused(self):
+        old = InspectionProcessor(_recipe())
+        old.process_inspection(_frame())
+        config = _recipe()
+        config['tools'][3]['area_min'] = 60
+        new = InspectionProcessor(config, previous=old)
+        self.assertEqual(new.reused_tools, 4)
+        self.assertEqual([a is b for a, b in zip(new.tools, old.tools)], [True, True, True, False, True])
+        self.assertIs(new.frame_buffer, old.frame_buffer)
+        self.assertSameResults(new.process_inspection(_frame()), InspectionProcessor(config).process_inspection(_frame()))
+
+    def test_prepare_does_not_touch_processor_in_use(self):
+        old = InspectionProcessor(_recipe())
+        old.process_inspection(_frame())
+        config = _recipe(verbose=True)
+        config['tools'][4]['custom_formula'] = 't3.total_area'
+        new = InspectionProcessor(config, previous=old, config_version=2, attach=False)
+        # Só a ferramenta alterada existe; as compartilhadas seguem como o processador em uso deixou
+        self.assertEqual((new.tools, new.plan), ([], ()))
+        self.assertFalse(any(tool.verbose for tool in old.tools))
+        with self.assertRaises(RuntimeError):
+            new.process_inspection(_frame())
+        # Frames continuam no processador em uso até a troca
+        expected = old.process_inspection(_frame(5))
+        new.attach(old)
+        self.assertEqual(new.reused_tools, 4)
+        self.assertTrue(all(tool.verbose for tool in new.tools))
+        self.assertEqual(new._frame_seq, old._frame_seq)
+        output = new.process_inspection(_frame(5))
+        self.assertEqual(output['config_version'], 2)
+        self.assertEqual(_comparable(output)[:4], _comparable(expected)[:4])
+        self.assertNotEqual(output['tool_results'][4]['result'], expected['tool_results'][4]['result'])
+
+    def test_attach_after_previous_changed(self):
+        first = InspectionProcessor(_recipe())
+        prepared = InspectionProcessor(_recipe(), previous=first, attach=False)
+        # Outra troca aconteceu antes desta: ferramentas que não existem mais são criadas na ligação
+        config = _recipe()
+        config['tools'][2]['th_min'] = 100
+        second = InspectionProcessor(config, previous=first)
+        prepared.attach(second)
+        self.assertEqual(prepared.reused_tools, 4)
+        self.assertIsNot(prepared.tools[2], second.tools[2])
+        self.assertSameResults(prepared.process_inspection(_frame()), InspectionProcessor(_recipe()).process_inspection(_frame()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Testes da LocateTool (tools/locate_tool.py): refinamento sub-pixel opcional da borda e modo caliper
+"""
+import unittest
+
+import numpy as np
+
+from tools.locate_tool import LocateTool
+
+ARROW = {'p0': {'x': 10, 'y': 60}, 'p1': {'x': 150, 'y': 60}}
+
+
+def _edge_image(edge_x, angle_deg=0.0):
+    """Borda escuro -> claro em `edge_x` (sub-pixel, cobertura de área por pixel), inclinada de `angle_deg`"""
+    ys, xs = np.mgrid[0:120, 0:160].astype(np.float32)
+    boundary = edge_x + (ys - 60) * np.tan(np.radians(angle_deg))
+    coverage = np.clip(xs + 0.5 - boundary, 0.0, 1.0)
+    gray = (40 + 160 * coverage).astype(np.uint8)
+    return np.dstack([gray] * 3)
+
+
+def _locate(image, **config):
+    tool = LocateTool(dict({'id': 1, 'name': 'locate', 'type': 'locate', 'arrow': ARROW, 'threshold': 20,
+                            'ROI': {'x': 0, 'y': 0, 'w': 160, 'h': 120}}, **config))
+    return tool.process(image, tool.extract_roi(image), {})
+
+
+class SubpixelTest(unittest.TestCase):
+
+    def test_default_stays_on_sample_grid(self):
+        for edge_x in (60.2, 60.5, 80.7):
+            edge = _locate(_edge_image(edge_x))['edges'][0]
+            # Seta de 140 px: 140 amostras, posição sobre uma delas
+            index = edge['t'] * 139
+            self.assertAlmostEqual(index, round(index), places=4)
+            self.assertAlmostEqual(edge['x'], 10 + round(index) * 140 / 139, places=3)
+            self.assertLessEqual(abs(edge['x'] - edge_x), 1.0)
+
+    def test_subpixel_when_enabled(self):
+        for edge_x in (60.2, 60.5, 80.7):
+            result = _locate(_edge_image(edge_x), subpixel=True)['result']
+            self.assertAlmostEqual(result['x'], edge_x, delta=0.1)
+            self.assertAlmostEqual(result['y'], 60.0, places=3)
+
+
+class CaliperTest(unittest.TestCase):
+
+    CALIPER = {'caliper_count': 7, 'caliper_width': 30, 'subpixel': True}
+
+    def test_fit_recovers_tilted_edge(self):
+        # ROI deslocado: pontos e resultado em coordenadas da imagem
+        roi = {'x': 5, 'y': 20, 'w': 150, 'h': 80}
+        for angle in (0.0, 5.0, -8.0, 15.0):
+            result = _locate(_edge_image(70.3, angle), caliper_mode='fit', ROI=roi, **self.CALIPER)
+            caliper = result['caliper']
+            self.assertEqual((caliper['count'], caliper['width'], caliper['mode']), (7, 30.0, 'fit'))
+            # Um ponto por raio, espaçados na normal da seta, sobre a borda real
+            self.assertEqual([y for _, y in caliper['points']], [45.0, 50.0, 55.0, 60.0, 65.0, 70.0, 75.0])
+            for x, y in caliper['points']:
+                self.assertAlmostEqual(x, 70.3 + (y - 60) * np.tan(np.radians(angle)), delta=0.15)
+            self.assertLess(caliper['fit_rms'], 0.1)
+            # Interseção da reta com a seta e direção da reta
+            self.assertAlmostEqual(result['result']['x'], 70.3, delta=0.1)
+            self.assertAlmostEqual(result['result']['y'], 60.0, places=3)
+            self.assertAlmostEqual(result['result']['angle_deg'], 90.0 - angle, delta=0.2)
+            self.assertEqual(result['edge_count'], 1)
+
+    def test_average_profile(self):
+        for angle in (0.0, 5.0, -8.0):
+            result = _locate(_edge_image(70.3, angle), caliper_mode='average', **self.CALIPER)
+            self.assertNotIn('points', result['caliper'])
+            self.assertAlmostEqual(result['result']['x'], 70.3, delta=0.15)
+            self.assertAlmostEqual(result['result']['angle_deg'], 90.0 - angle, delta=1.0)
+
+    def test_fit_falls_back_to_average(self):
+        # Borda visível só no raio central: sem reta, perfil médio
+        image = np.full_like(_edge_image(70.3), 40)
+        image[57:64] = _edge_image(70.3)[57:64]
+        result = _locate(image, caliper_mode='fit', caliper_count=7, caliper_width=30, threshold=10)
+        self.assertEqual(result['caliper'], {'count': 7, 'width': 30.0, 'mode': 'fit'})
+        self.assertAlmostEqual(result['result']['x'], 70.3, delta=1.0)
+
+    def test_single_ray_and_invalid_mode(self):
+        self.assertNotIn('caliper', _locate(_edge_image(70.3), caliper_mode='fit'))
+        result = _locate(_edge_image(70.3), caliper_mode='hough', caliper_count=3)
+        self.assertEqual(result['caliper'], {'count': 3, 'width': 10.0, 'mode': 'average'})
+
+
+if __name__ == '__main__':
+    unittest.main()
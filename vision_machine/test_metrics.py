@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Testes dos histogramas de latência (metrics.py) e da exportação Prometheus
+"""
+import threading
+import unittest
+
+import numpy as np
+
+from metrics import LatencyHistogram, MetricsRegistry
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_quantiles_over_window(self):
+        hist = LatencyHistogram(window=100)
+        values = np.random.default_rng(0).exponential(20.0, size=250)
+        for value in values:
+            hist.observe(float(value))
+        snapshot = hist.snapshot()
+        window = values[-100:]
+        self.assertEqual((snapshot['count'], snapshot['window']), (250, 100))
+        self.assertAlmostEqual(snapshot['sum'], round(values.sum(), 3), places=3)
+        for q in (50, 90, 99):
+            self.assertAlmostEqual(snapshot[f'p{q}'], round(float(np.quantile(window, q / 100)), 3), places=3)
+        self.assertAlmostEqual(snapshot['max'], round(float(window.max()), 3), places=3)
+
+    def test_empty_and_reset(self):
+        hist = LatencyHistogram(window=4)
+        self.assertEqual(hist.snapshot(), {'count': 0, 'sum': 0.0, 'window': 0, 'p50': 0.0, 'p90': 0.0,
+                                           'p99': 0.0, 'max': 0.0})
+        hist.observe(5.0)
+        hist.reset()
+        self.assertEqual(hist.snapshot()['count'], 0)
+
+    def test_concurrent_observe(self):
+        hist = LatencyHistogram(window=64)
+
+        def observe():
+            for _ in range(1000):
+                hist.observe(1.0)
+
+        threads = [threading.Thread(target=observe) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((hist.count, hist.sum), (4000, 4000.0))
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def test_same_instance_per_labels(self):
+        registry = MetricsRegistry(window=8)
+        self.assertIs(registry.histogram('vm_tool_latency_ms', tool_id=1, tool_name='a'),
+                      registry.histogram('vm_tool_latency_ms', tool_name='a', tool_id='1'))
+        self.assertIs(registry.stage('capture'), registry.histogram('vm_stage_latency_ms', stage='capture'))
+        self.assertIsNot(registry.stage('capture'), registry.stage('inspect'))
+
+    def test_prometheus_format(self):
+        registry = MetricsRegistry(window=8)
+        for value in (1.0, 2.0, 3.0, 4.0):
+            registry.stage('inspect').observe(value)
+        registry.histogram('vm_tool_latency_ms', tool_id=2, tool_name='blob "A"').observe(7.5)
+        lines = registry.to_prometheus().splitlines()
+        self.assertIn('# TYPE vm_stage_latency_ms summary', lines)
+        self.assertIn('vm_stage_latency_ms{stage="inspect",quantile="0.5"} 2.5', lines)
+        self.assertIn('vm_stage_latency_ms_sum{stage="inspect"} 10.0', lines)
+        self.assertIn('vm_stage_latency_ms_count{stage="inspect"} 4', lines)
+        self.assertIn('# TYPE vm_stage_latency_ms_max gauge', lines)
+        self.assertIn('vm_stage_latency_ms_max{stage="inspect"} 4.0', lines)
+        # Rótulos escapados
+        self.assertIn('vm_tool_latency_ms_count{tool_id="2",tool_name="blob \\"A\\""} 1', lines)
+        entry = registry.to_dict()['vm_stage_latency_ms'][0]
+        self.assertEqual(entry['labels'], {'stage': 'inspect'})
+        self.assertEqual((entry['p50'], entry['max']), (2.5, 4.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Testes das estatísticas de janela deslizante (tools/rolling_stats.py) contra o NumPy
+"""
+import unittest
+
+import numpy as np
+
+from tools.rolling_stats import RollingStats
+
+
+class RollingStatsTest(unittest.TestCase):
+
+    def assertWindow(self, stats, window, label=''):
+        self.assertEqual(stats.count, window.size, label)
+        np.testing.assert_array_equal(stats.samples(), window, err_msg=label)
+        self.assertAlmostEqual(stats.mean(), float(window.mean()), delta=1e-9 * max(1.0, abs(window.mean())), msg=label)
+        if window.size > 1:
+            self.assertAlmostEqual(stats.std(), float(window.std(ddof=1)), delta=1e-6 * max(1.0, window.std()), msg=label)
+        else:
+            self.assertIsNone(stats.std(), label)
+        self.assertEqual(stats.min(), float(window.min()), label)
+        self.assertEqual(stats.max(), float(window.max()), label)
+
+    def test_push_and_wrap(self):
+        rng = np.random.default_rng(0)
+        for size in (2, 3, 7, 50):
+            stats = RollingStats(size)
+            self.assertIsNone(stats.mean())
+            self.assertIsNone(stats.min())
+            values = []
+            for i in range(400):
+                # Valores grandes com pouca variação (cancelamento numérico) alternados com inteiros
+                value = float(rng.normal(1e6, 3)) if i % 2 else float(rng.integers(-5, 5))
+                stats.push(value)
+                values.append(value)
+                self.assertWindow(stats, np.array(values[-size:]), f"window={size} i={i}")
+            self.assertEqual(stats.total, 400)
+
+    def test_monotonic_runs(self):
+        # Sequências crescentes e decrescentes exercitam as filas de mínimo/máximo
+        values = np.r_[np.arange(30.0), np.arange(30.0)[::-1], np.full(10, 7.0)]
+        stats = RollingStats(8)
+        for i, value in enumerate(values):
+            stats.push(float(value))
+            self.assertWindow(stats, values[max(0, i - 7):i + 1], f"i={i}")
+
+    def test_resize_keeps_samples(self):
+        rng = np.random.default_rng(1)
+        xs = rng.normal(100.0, 2.0, size=120)
+        for first, second, pushed in ((5, 10, 7), (10, 5, 23), (40, 25, 100), (8, 8, 3), (3, 50, 2)):
+            stats = RollingStats(first)
+            for value in xs[:pushed]:
+                stats.push(float(value))
+            resized = RollingStats.from_samples(stats.samples(), second, stats.total)
+            label = f"{first}->{second} após {pushed}"
+            # Primeira amostra que sobrevive à troca
+            kept = max(0, pushed - min(first, second))
+            self.assertEqual(resized.total, pushed, label)
+            self.assertWindow(resized, xs[kept:pushed], label)
+            # Continua a partir da posição em que parou, completa a janela e dá a volta no buffer
+            for i in range(pushed, xs.size):
+                resized.push(float(xs[i]))
+                self.assertWindow(resized, xs[max(kept, i + 1 - second):i + 1], f"{label} i={i}")
+
+    def test_from_samples_without_total(self):
+        stats = RollingStats.from_samples([1.0, 2.0, 3.0], 4)
+        self.assertEqual(stats.total, 3)
+        self.assertWindow(stats, np.array([1.0, 2.0, 3.0]))
+        empty = RollingStats.from_samples([], 4, 10)
+        self.assertEqual((empty.count, empty.total), (0, 10))
+        empty.push(5.0)
+        self.assertWindow(empty, np.array([5.0]))
+
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            RollingStats(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Testes das condições `run_if` (tools/run_condition.py) e da execução condicional no processador
+"""
+import unittest
+
+import cv2
+import numpy as np
+
+from inspection_processor import InspectionProcessor
+from tools.run_condition import RunCondition, parse_run_if
+from test_inspection_processor import _comparable, _frame, _recipe
+
+RESULTS = {
+    1: {'blob_count': 3, 'total_area': 512.5, 'pass_fail': True, 'label': 'ok', 'missing': None,
+        'test_results': {'overall_pass': False}},
+}
+
+
+class ParseRunIfTest(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(parse_run_if(None, 1), ())
+        self.assertEqual(parse_run_if('', 1), ())
+        self.assertEqual(parse_run_if([], 1), ())
+        self.assertEqual(parse_run_if('  blob_count>0 ', 1),
+                         (RunCondition(1, ('blob_count',), '>', 0, 'blob_count>0'),))
+        self.assertEqual(parse_run_if({'tool_id': 3, 'condition': 'pass_fail == true'}, 1),
+                         (RunCondition(3, ('pass_fail',), '==', True, 'pass_fail == true'),))
+        conditions = parse_run_if(['blob_count >= 2', {'condition': 'test_results.overall_pass != false'}], 1)
+        self.assertEqual([c.tool_id for c in conditions], [1, 1])
+        self.assertEqual(conditions[1].path, ('test_results', 'overall_pass'))
+
+    def test_values(self):
+        for text, value in (('3', 3), ('-2', -2), ('2.5', 2.5), ('1e3', 1000.0), ('TRUE', True), ('False', False),
+                            ('null', None), ('None', None), ('"ok"', 'ok'), ("'a b'", 'a b'), ('ok', 'ok'),
+                            ('"true"', 'true')):
+            self.assertEqual(parse_run_if(f'x == {text}', 1)[0].value, value, text)
+        self.assertIsInstance(parse_run_if('x == 3', 1)[0].value, int)
+        # Operadores de dois caracteres não são lidos como '>' seguido de '=...'
+        self.assertEqual(parse_run_if('x>=1', 1)[0][2:4], ('>=', 1))
+        self.assertEqual(parse_run_if('x<=1', 1)[0][2:4], ('<=', 1))
+
+    def test_invalid(self):
+        for spec in ('blob_count', 'blob_count = 1', '> 1', '1x > 0', 'blob count > 1', 'x ==', 42,
+                     {'tool_id': 1}, [{'condition': 1}]):
+            with self.assertRaises(ValueError, msg=repr(spec)):
+                parse_run_if(spec, 1)
+        with self.assertRaises(ValueError):
+            parse_run_if('blob_count > 0')
+
+
+class EvaluateTest(unittest.TestCase):
+
+    def _check(self, text, expected):
+        self.assertEqual(parse_run_if(text, 1)[0].evaluate(RESULTS), expected, text)
+
+    def test_comparisons(self):
+        for text, expected in (('blob_count > 2', True), ('blob_count > 3', False), ('blob_count == 3.0', True),
+                               ('total_area <= 512.5', True), ('total_area < 512.5', False),
+                               ('pass_fail == true', True), ('label == "ok"', True), ('label != ok', False),
+                               ('missing == null', True), ('test_results.overall_pass == false', True)):
+            self._check(text, expected)
+
+    def test_missing_or_incomparable_is_false(self):
+        for text in ('nothing == null', 'test_results.other == false', 'blob_count.x == 1', 'label > 1',
+                     'missing > 0'):
+            self._check(text, False)
+        self.assertFalse(parse_run_if({'tool_id': 7, 'condition': 'x == null'}, 1)[0].evaluate(RESULTS))
+
+
+class ProcessorRunIfTest(unittest.TestCase):
+
+    def test_branch_skipped_when_condition_fails(self):
+        img = np.zeros((100, 100, 3), np.uint8)
+        cv2.circle(img, (50, 50), 20, (255, 255, 255), -1)
+        blob = {'id': 1, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 10,
+                'area_max': 1e9}
+
+        def run(condition):
+            tools = [blob, {'id': 2, 'name': 'ratio', 'type': 'math', 'operation': 'area_ratio',
+                            'reference_tool_id': 1, 'run_if': condition},
+                     {'id': 3, 'name': 'density', 'type': 'math', 'operation': 'custom_formula',
+                      'custom_formula': 't2.result * 2'}]
+            results = InspectionProcessor({'tools': tools}).process_inspection(img)['tool_results']
+            return {r['tool_id']: r for r in results}
+
+        results = run('blob_count == 1')
+        self.assertNotEqual(results[2].get('status'), 'skipped')
+        self.assertNotEqual(results[3].get('status'), 'skipped')
+        results = run('blob_count > 1')
+        self.assertEqual((results[2]['status'], results[2]['skip_reason']), ('skipped', 'run_if'))
+        # A ferramenta que usa o resultado pulado também é pulada
+        self.assertEqual(results[3]['status'], 'skipped')
+
+    def test_matches_unconditional_run_in_parallel_and_fused(self):
+        def conditional(condition, **settings):
+            config = _recipe(**settings)
+            # Filtro condicional no meio da sequência gray + blur e ramo condicional após a Blob da esquerda
+            config['tools'][1]['run_if'] = {'tool_id': 1, 'condition': 'status == "success"'}
+            config['tools'][3]['run_if'] = {'tool_id': 3, 'condition': condition}
+            return config
+
+        plain = _comparable(InspectionProcessor(_recipe(fuse_filters=False)).process_inspection(_frame()))
+        for settings in ({}, {'max_workers': 4}, {'fuse_filters': False}):
+            processor = InspectionProcessor(conditional('blob_count == 1', **settings))
+            self.assertEqual([(s.fusion_head, s.fusion_end) for s in processor.plan[:2]], [(0, 0), (1, 1)])
+            self.assertEqual(_comparable(processor.process_inspection(_frame())), plain, settings)
+            results = _comparable(InspectionProcessor(conditional('blob_count > 1', **settings)).process_inspection(_frame()))
+            self.assertEqual([r['status'] for r in results], ['success'] * 3 + ['skipped'] * 2, settings)
+            self.assertEqual(results[:3], plain[:3])
+
+
+if __name__ == '__main__':
+    unittest.main()
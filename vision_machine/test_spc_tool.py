@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Testes da ferramenta SPC (tools/spc_tool.py): estatísticas, regras de Western Electric,
+histórico na troca de configuração e execução em sequência no batch
+"""
+import copy
+import unittest
+
+import cv2
+import numpy as np
+
+from batch import effective_workers, process_batch
+from inspection_processor import InspectionProcessor, stateful_tool_names
+from tools.spc_tool import SpcTool
+
+
+def _spc(**config):
+    tool = {'id': 9, 'name': 'spc', 'type': 'spc', 'reference_tool_id': 1, 'field': 'offset.x',
+            'inspec_pass_fail': True}
+    tool.update(config)
+    return SpcTool(tool)
+
+
+def _push(tool, value, frame_seq=None):
+    tool._frame_seq = frame_seq
+    return tool.process(None, None, {1: {'offset': {'x': value}}})
+
+
+def _frame(radius):
+    img = np.zeros((120, 160, 3), np.uint8)
+    cv2.circle(img, (80, 60), int(radius), (255, 255, 255), -1)
+    return img
+
+
+BLOB = {'id': 2, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 10, 'area_max': 1e9}
+SPC = {'id': 3, 'name': 'spc', 'type': 'spc', 'reference_tool_id': 2, 'field': 'total_area', 'baseline': 5,
+       'window': 30}
+
+
+def _spc_result(output):
+    return next(r for r in output['tool_results'] if r.get('tool_type') == 'spc')
+
+
+class SpcToolTest(unittest.TestCase):
+
+    def test_window_statistics_and_capability(self):
+        tool = _spc(window=4, lsl=-3, usl=3)
+        values = [0.5, -1.0, 2.0, 1.5, -0.5]
+        for value in values:
+            result = _push(tool, value)
+        window = np.array(values[-4:])
+        self.assertEqual((result['count'], result['total']), (4, 5))
+        self.assertAlmostEqual(result['mean'], window.mean())
+        self.assertAlmostEqual(result['std'], window.std(ddof=1))
+        self.assertEqual((result['min'], result['max']), (-1.0, 2.0))
+        std = window.std(ddof=1)
+        self.assertAlmostEqual(result['cp'], 6 / (6 * std))
+        self.assertAlmostEqual(result['cpk'], min(3 - window.mean(), window.mean() + 3) / (3 * std))
+        self.assertTrue(result['in_spec'])
+        result = _push(tool, 3.5)
+        self.assertFalse(result['in_spec'])
+        self.assertFalse(result['pass_fail'])
+
+    def test_western_electric_rules(self):
+        tool = _spc(center=0, sigma=1)
+        cases = (([0.1, -0.2, 3.5], [1]), ([2.5, 0.0, 2.6], [2]), ([1.5, 1.2, -0.5, 1.3, 1.4], [3]),
+                 ([0.2] * 8, [4]), ([0.2] * 7, []), ([-2.5, 0.0, 2.6], []))
+        for values, expected in cases:
+            tool.reset_state()
+            for value in values:
+                result = _push(tool, value)
+            self.assertEqual(result['violations'], expected, values)
+            self.assertEqual(result['drift'], bool(expected), values)
+        tool = _spc(center=0, sigma=1, rules='1')
+        for value in [0.2] * 8 + [2.5, 2.6]:
+            result = _push(tool, value)
+        self.assertEqual(result['violations'], [])
+
+    def test_baseline_estimates_limits(self):
+        tool = _spc(baseline=20, window=50)
+        values = np.random.default_rng(0).normal(100, 2, size=20)
+        for i, value in enumerate(values):
+            result = _push(tool, float(value))
+            if i < 19:
+                self.assertIsNone(result['center'])
+        self.assertAlmostEqual(result['center'], values.mean())
+        self.assertAlmostEqual(result['sigma'], values.std(ddof=1))
+        self.assertAlmostEqual(result['ucl'], values.mean() + 3 * values.std(ddof=1))
+
+    def test_reinspection_does_not_add_sample(self):
+        tool = _spc()
+        _push(tool, 1.0, frame_seq=1)
+        self.assertEqual(_push(tool, 2.0, frame_seq=1)['total'], 1)
+        self.assertEqual(_push(tool, 2.0, frame_seq=2)['total'], 2)
+
+    def test_invalid_config_and_values(self):
+        for config in ({'field': ''}, {'window': 1}, {'sigma': 0}, {'rules': '5'}, {'lsl': 'nan'}):
+            with self.assertRaises(ValueError, msg=str(config)):
+                _spc(**config)
+        result = _spc(field='blobs.area').process(None, None, {1: {'blobs': [{'area': 1.0}]}})
+        self.assertEqual(result['status'], 'error')
+
+    def test_hot_swap_keeps_history(self):
+        config = {'tools': [copy.deepcopy(BLOB), copy.deepcopy(SPC)]}
+        processor = InspectionProcessor(config)
+        for i in range(7):
+            output = processor.process_inspection(_frame(20 + i % 3))
+        self.assertEqual(_spc_result(output)['total'], 7)
+
+        def swap(new_config):
+            nonlocal processor
+            processor = InspectionProcessor(new_config, previous=processor)
+            return _spc_result(processor.process_inspection(_frame(21)))
+
+        config['tools'][1]['window'] = 10
+        result = swap(copy.deepcopy(config))
+        self.assertEqual((result['total'], result['count']), (8, 8))
+        self.assertEqual(processor.tools[1].state.stats.window, 10)
+        config['tools'][1]['usl'] = 9000
+        self.assertEqual(swap(copy.deepcopy(config))['total'], 9)
+        # Ferramenta acompanhada alterada: nova janela
+        config['tools'][0]['area_min'] = 20
+        self.assertEqual(swap(copy.deepcopy(config))['total'], 1)
+
+    def test_frames_between_build_and_swap_are_kept(self):
+        config = {'tools': [copy.deepcopy(BLOB), copy.deepcopy(SPC)]}
+        processor = InspectionProcessor(config)
+        window = []
+
+        def inspect(radius):
+            result = _spc_result(processor.process_inspection(_frame(radius)))
+            window.append(result['value'])
+            del window[:-processor.tools[1].window]
+            return result
+
+        for radius in (20, 21, 22):
+            inspect(radius)
+        total = 3
+        for change in ({'usl': 9000}, {'window': 4}, {'window': 40, 'rules': [1]}):
+            config['tools'][1].update(change)
+            # Preparado enquanto o processador em uso continua inspecionando
+            built = InspectionProcessor(copy.deepcopy(config), previous=processor, attach=False)
+            inspect(24)
+            inspect(25)
+            built.attach(processor)
+            processor = built
+            result = inspect(26)
+            total += 3
+            self.assertEqual(result['total'], total, change)
+            np.testing.assert_array_equal(processor.tools[1].state.stats.samples(), window, err_msg=str(change))
+
+    def test_batch_runs_stateful_recipes_in_sequence(self):
+        config = {'tools': [copy.deepcopy(BLOB), copy.deepcopy(SPC)]}
+        self.assertEqual(stateful_tool_names(config), ['spc'])
+        self.assertEqual(effective_workers(config, 4), 0)
+        self.assertEqual(effective_workers({'tools': [BLOB]}, 4), 4)
+        records = []
+        summary = process_batch([_frame(20 + i % 3) for i in range(8)], config, workers=2, on_result=records.append)
+        self.assertEqual(summary['workers'], 0)
+        self.assertEqual([_spc_result(record)['total'] for record in records], list(range(1, 9)))
+
+
+if __name__ == '__main__':
+    unittest.main()
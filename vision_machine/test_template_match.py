@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Testes da TemplateMatchTool com rotação conhecida (tools/template_match_tool.py)
+"""
+import base64
+import os
+import unittest
+
+import cv2
+
+from tools import TemplateMatchTool
+
+IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_locate_nv1', '1.bmp')
+# Modelo: região em volta do retângulo claro da imagem
+X0, Y0, X1, Y1 = 200, 0, 600, 300
+
+
+class KnownRotationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.image = cv2.imread(IMAGE, cv2.IMREAD_GRAYSCALE)
+        template = cls.image[Y0:Y1, X0:X1]
+        cls.template = base64.b64encode(cv2.imencode('.png', template)[1]).decode('ascii')
+        cls.center = (X0 + (X1 - X0 - 1) / 2.0, Y0 + (Y1 - Y0 - 1) / 2.0)
+
+    def _locate(self, angle, **config):
+        h, w = self.image.shape
+        # Cena girada `angle` graus (horário na tela) em torno do centro do modelo
+        m = cv2.getRotationMatrix2D(self.center, -angle, 1.0)
+        scene = cv2.warpAffine(self.image, m, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT)
+        scene = cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR)
+        tool = TemplateMatchTool({'id': 1, 'name': 'template', 'type': 'template', 'template': self.template,
+                                  'angle_range': 10, 'angle_step': 1, **config})
+        return tool.process(scene, tool.extract_roi(scene))
+
+    def test_known_rotation(self):
+        for angle in (5.0, 2.3, -3.7):
+            for levels in (-1, 0):
+                result = self._locate(angle, pyramid_levels=levels)
+                label = f"{angle}° pyramid_levels={levels}"
+                self.assertTrue(result['found'], label)
+                self.assertAlmostEqual(result['result']['angle_deg'], angle, delta=0.15, msg=label)
+                self.assertAlmostEqual(result['result']['x'], self.center[0], delta=0.5, msg=label)
+                self.assertAlmostEqual(result['result']['y'], self.center[1], delta=0.5, msg=label)
+
+    def test_pyramid_matches_full_resolution(self):
+        auto = self._locate(5.0)
+        full = self._locate(5.0, pyramid_levels=0)
+        self.assertGreater(auto['pyramid_levels'], 0)
+        self.assertAlmostEqual(auto['result']['angle_deg'], full['result']['angle_deg'], places=6)
+        self.assertAlmostEqual(auto['score'], full['score'], places=6)
+
+    def test_without_rotation_search(self):
+        result = self._locate(0.0, angle_range=0)
+        self.assertAlmostEqual(result['score'], 1.0, places=4)
+        self.assertEqual(result['result']['angle_deg'], 0.0)
+        self.assertAlmostEqual(result['result']['x'], self.center[0], delta=0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
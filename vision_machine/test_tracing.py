@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Testes do gravador de traces por frame (tracing.py) e da exportação Chrome trace-event
+"""
+import gc
+import json
+import threading
+import unittest
+
+from inspection_processor import InspectionProcessor
+from test_inspection_processor import _frame, _recipe
+from tracing import FrameTrace, TraceRecorder
+
+
+def _finished(recorder, frame_number, start, duration, spans=()):
+    """Frame com instantes controlados (segundos relativos à época do gravador)"""
+    trace = FrameTrace(frame_number)
+    trace.start = recorder._epoch + start
+    for name, t0, t1 in spans:
+        trace.add(name, recorder._epoch + t0, recorder._epoch + t1, 'stage')
+    trace.end = trace.start + duration
+    with recorder._lock:
+        recorder._frames.append(trace)
+    return trace
+
+
+class TraceRecorderTest(unittest.TestCase):
+
+    def _recorder(self, **kwargs):
+        recorder = TraceRecorder(enabled=True, **kwargs)
+        # Não deixar o callback de GC registrado entre testes
+        self.addCleanup(recorder.set_enabled, False)
+        return recorder
+
+    def test_disabled_collects_nothing(self):
+        recorder = TraceRecorder()
+        self.assertIsNone(recorder.begin_frame(1))
+        recorder.finish_frame(None)
+        self.assertEqual(recorder.stats(), {'enabled': False, 'capacity': 200, 'frames': 0})
+        self.assertEqual(recorder.export_chrome_trace()['traceEvents'][0]['ph'], 'M')
+
+    def test_chrome_trace_format(self):
+        recorder = self._recorder()
+        _finished(recorder, 7, 0.010, 0.004, [('capture', 0.010, 0.011), ('inspect', 0.011, 0.0135)])
+        exported = json.loads(json.dumps(recorder.export_chrome_trace()))
+        self.assertEqual(exported['displayTimeUnit'], 'ms')
+        events = exported['traceEvents']
+        complete = [e for e in events if e['ph'] == 'X']
+        self.assertEqual([(e['name'], e['cat'], e['ts'], e['dur']) for e in complete], [
+            ('frame 7', 'frame', 10000.0, 4000.0),
+            ('capture', 'stage', 10000.0, 1000.0),
+            ('inspect', 'stage', 11000.0, 2500.0),
+        ])
+        self.assertEqual(complete[0]['tid'], 0)
+        self.assertEqual(complete[0]['args'], {'frame': 7, 'duration_ms': 4.0})
+        self.assertEqual(complete[1]['tid'], threading.get_ident())
+        self.assertEqual(complete[1]['args'], {'frame': 7})
+        # Metadados: nome da trilha dos frames e de cada thread com spans
+        names = {e['tid']: e['args']['name'] for e in events if e['ph'] == 'M'}
+        self.assertEqual(names, {0: 'Frames', threading.get_ident(): threading.current_thread().name})
+        self.assertEqual(len({e['pid'] for e in events}), 1)
+
+    def test_last_and_slowest(self):
+        recorder = self._recorder()
+        for number, duration in enumerate((0.005, 0.030, 0.002, 0.020, 0.001), start=1):
+            _finished(recorder, number, number * 0.1, duration)
+
+        def frames(**kwargs):
+            return [e['args']['frame'] for e in recorder.export_chrome_trace(**kwargs)['traceEvents']
+                    if e.get('cat') == 'frame']
+
+        self.assertEqual(frames(), [1, 2, 3, 4, 5])
+        self.assertEqual(frames(last=2), [4, 5])
+        # Os mais lentos, em ordem cronológica
+        self.assertEqual(frames(slowest=2), [2, 4])
+        self.assertEqual(frames(slowest=2, last=1), [2, 4])
+
+    def test_capacity_ring_and_clear(self):
+        recorder = self._recorder(capacity=3)
+        for number in range(1, 6):
+            recorder.finish_frame(recorder.begin_frame(number))
+        self.assertEqual([f.frame_number for f in recorder._frames], [3, 4, 5])
+        recorder.set_enabled(True, capacity=2)
+        self.assertEqual((recorder.capacity, [f.frame_number for f in recorder._frames]), (2, [4, 5]))
+        recorder.clear()
+        self.assertEqual(recorder.stats()['frames'], 0)
+
+    def test_gc_pauses_inside_window(self):
+        recorder = self._recorder()
+        trace = recorder.begin_frame(1)
+        gc.collect()
+        recorder.finish_frame(trace)
+        recorder.set_enabled(False)
+        self.assertNotIn(recorder._on_gc, gc.callbacks)
+        gc_events = [e for e in recorder.export_chrome_trace()['traceEvents'] if e.get('cat') == 'gc']
+        self.assertTrue(gc_events)
+        self.assertEqual(gc_events[0]['name'], 'gc gen2')
+        self.assertGreaterEqual(gc_events[0]['dur'], 0)
+
+        # Pausas fora da janela dos frames exportados ficam de fora
+        gc.callbacks.append(recorder._on_gc)
+        try:
+            gc.collect()
+        finally:
+            gc.callbacks.remove(recorder._on_gc)
+        exported = [e for e in recorder.export_chrome_trace()['traceEvents'] if e.get('cat') == 'gc']
+        self.assertEqual(len(exported), len(gc_events))
+
+
+class ProcessorSpansTest(unittest.TestCase):
+
+    def test_tool_spans_inside_frame(self):
+        recorder = TraceRecorder(enabled=True)
+        processor = InspectionProcessor(_recipe())
+        trace = recorder.begin_frame(1)
+        processor.process_inspection(_frame(), trace=trace)
+        recorder.finish_frame(trace)
+        recorder.set_enabled(False)
+        spans = [e for e in recorder.export_chrome_trace()['traceEvents'] if e.get('cat') == 'tool']
+        frame = next(e for e in recorder.export_chrome_trace()['traceEvents'] if e.get('cat') == 'frame')
+        self.assertTrue(spans)
+        for tool in processor.tools:
+            self.assertTrue(any(tool.name in span['name'] for span in spans), tool.name)
+        for span in spans:
+            self.assertGreaterEqual(span['ts'], frame['ts'])
+            self.assertLessEqual(span['ts'] + span['dur'], frame['ts'] + frame['dur'] + 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Testes da VisionMachine e do TestModeProcessor sem servidor: troca de processador entre frames,
+estágios do pipeline e worker farm (VM criada em diretório temporário, fonte de pasta)
+"""
+import copy
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+from flask import Flask
+from flask_socketio import SocketIO
+
+import vm
+from vm import DEFAULT_PROCESSING_CONFIG, VisionMachine
+
+BLOB = {'id': 2, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 10, 'area_max': 1e9,
+        'inspec_pass_fail': True, 'blob_count_test': True, 'test_blob_count_min': 1, 'test_blob_count_max': 1}
+RECIPE = {'tools': [{'id': 1, 'name': 'gray', 'type': 'grayscale', 'normalize': False}, BLOB]}
+
+
+def _frame(radius=20):
+    img = np.zeros((120, 160, 3), np.uint8)
+    cv2.circle(img, (80, 60), int(radius), (255, 255, 255), -1)
+    return img
+
+
+class VisionMachineTestCase(unittest.TestCase):
+    """Base: VM com configuração em diretório temporário e pasta de imagens sintéticas"""
+
+    inspection_config = RECIPE
+    mode = 'TESTE'
+    processing = {}
+    interval_ms = 100
+    frames = 6
+
+    def setUp(self):
+        config_file = self._write_config()
+        self.vm = VisionMachine('vm_test', 'http://localhost:8000', config_file)
+        self.test_processor = vm.TestModeProcessor(self.vm, SocketIO(Flask(__name__), async_mode='threading'))
+
+    def _write_config(self):
+        self.tmpdir = tempfile.mkdtemp()
+        images = os.path.join(self.tmpdir, 'images')
+        os.makedirs(images)
+        for i in range(self.frames):
+            cv2.imwrite(os.path.join(images, f'{i:03d}.png'), _frame(15 + i))
+        config = {
+            'status': 'idle',
+            'mode': self.mode,
+            'inspection_config': copy.deepcopy(self.inspection_config),
+            'source_config': {'type': 'pasta', 'camera_id': 0, 'resolution': [160, 120], 'fps': 30,
+                              'folder_path': images, 'rtsp_url': ''},
+            'trigger_config': {'type': 'continuous', 'interval_ms': self.interval_ms},
+            'processing': dict(DEFAULT_PROCESSING_CONFIG, **self.processing),
+        }
+        config_file = os.path.join(self.tmpdir, 'vm_config.json')
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        return config_file
+
+    def tearDown(self):
+        self.test_processor.stop()
+        self.vm._stop_log_worker()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class ServerTestCase(VisionMachineTestCase):
+    """Base: FlaskVisionServer completo (sem handlers de sinal/atexit) e cliente de teste"""
+
+    def setUp(self):
+        config_file = self._write_config()
+        with mock.patch.object(vm.signal, 'signal'), mock.patch.object(vm.atexit, 'register'):
+            self.server = vm.FlaskVisionServer('vm_test', 'http://localhost:8000', config_file)
+        self.vm = self.server.vm
+        self.test_processor = self.server.test_processor
+        self.client = self.server.app.test_client()
+
+
+class MetricsEndpointTest(ServerTestCase):
+
+    def test_prometheus_and_json(self):
+        for radius in (15, 18, 21):
+            self.test_processor._process_frame(_frame(radius))
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE vm_tool_latency_ms summary', text)
+        self.assertRegex(text, r'vm_tool_latency_ms_count\{tool_id="2",tool_name="blob",tool_type="blob"\} [1-9]')
+        self.assertRegex(text, r'vm_stage_latency_ms\{stage="inspection",quantile="0.99"\} [0-9.]+')
+
+        data = self.client.get('/api/metrics?format=json').get_json()
+        self.assertEqual(data['machine_id'], 'vm_test')
+        blob = next(entry for entry in data['metrics']['vm_tool_latency_ms'] if entry['labels']['tool_id'] == '2')
+        self.assertGreaterEqual(blob['count'], 3)
+        self.assertLessEqual(blob['p50'], blob['max'])
+
+
+class TraceEndpointTest(ServerTestCase):
+
+    interval_ms = 10
+
+    def test_enable_export_and_clear(self):
+        recorder = self.server.trace_recorder
+        self.addCleanup(recorder.set_enabled, False)
+        response = self.client.post('/api/trace', json={'enabled': True, 'capacity': 16})
+        self.assertEqual(response.get_json(), {'success': True, 'enabled': True, 'capacity': 16, 'frames': 0})
+        self.test_processor.start()
+        self.assertTrue(_wait_for(lambda: recorder.stats()['frames'] >= 4))
+        self.test_processor.stop()
+
+        events = self.client.get('/api/trace?last=2').get_json()['traceEvents']
+        frames = [e for e in events if e.get('cat') == 'frame']
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(frames[1]['args']['frame'], frames[0]['args']['frame'] + 1)
+        stages = {e['name'] for e in events if e.get('cat') == 'stage'}
+        self.assertTrue({'capture', 'inspect'} <= stages, stages)
+        self.assertTrue(any(e.get('cat') == 'tool' and e['name'].startswith('blob.') for e in events))
+        self.assertEqual(len([e for e in self.client.get('/api/trace?slowest=1').get_json()['traceEvents']
+                              if e.get('cat') == 'frame']), 1)
+
+        response = self.client.post('/api/trace', json={'enabled': False, 'clear': True})
+        self.assertEqual(response.get_json()['frames'], 0)
+        self.assertIsNone(recorder.begin_frame(1))
+
+
+class PipelineTest(VisionMachineTestCase):
+
+    interval_ms = 10
+
+    def test_stages_publish_in_capture_order(self):
+        published = []
+        send = self.test_processor._send_websocket_update
+        self.test_processor._send_websocket_update = lambda result, counts=None, trace=None: (
+            published.append(counts), send(result, counts, trace))
+        self.test_processor.start()
+        self.assertTrue(_wait_for(lambda: len(published) >= 8))
+        self.test_processor.stop()
+        self.assertEqual([counts[0] for counts in published], list(range(1, len(published) + 1)))
+        # Discos de raio 15..20: todos aprovados (um blob por frame)
+        self.assertTrue(all(counts[1] == counts[0] and counts[2] == 0 for counts in published))
+        stages = self.test_processor.get_pipeline_status()['stages']
+        self.assertGreaterEqual(stages['grab']['count'], stages['inspect']['count'])
+        self.assertGreaterEqual(stages['inspect']['count'], stages['publish']['count'])
+        self.assertGreaterEqual(stages['publish']['count'], len(published))
+
+    def test_publish_error_stops_pipeline(self):
+        with mock.patch.object(self.test_processor, '_send_websocket_update', side_effect=RuntimeError('socket')):
+            self.test_processor.start()
+            self.assertTrue(_wait_for(lambda: not self.test_processor.running))
+        self.assertEqual(self.vm.status, 'error')
+        self.assertIn('publicação', self.vm.error_msg)
+        for thread in (self.test_processor.processing_thread, self.test_processor.inspect_thread,
+                       self.test_processor.publish_thread):
+            thread.join(timeout=2)
+            self.assertFalse(thread.is_alive(), thread.name)
+
+
+class WorkerFarmModeTest(VisionMachineTestCase):
+
+    def test_mode_reaches_farm(self):
+        farm = self.vm.worker_farm = mock.Mock()
+        self.vm.change_mode('RUN')
+        farm.set_fail_fast.assert_called_once_with(True)
+        self.vm.update_inspection_config(copy.deepcopy(RECIPE))
+        self.assertIs(farm.update_config.call_args.kwargs['fail_fast'], True)
+        self.vm.change_mode('TESTE')
+        farm.set_fail_fast.assert_called_with(False)
+        self.vm.update_inspection_config(copy.deepcopy(RECIPE))
+        self.assertIs(farm.update_config.call_args.kwargs['fail_fast'], False)
+
+
+class HotSwapTest(VisionMachineTestCase):
+
+    def test_build_outside_lock_swaps_between_frames(self):
+        old = self.vm.inspection_processor
+        config = copy.deepcopy(RECIPE)
+        config['tools'][1]['area_min'] = 20
+        self.vm.inspection_config = config
+        built = self.vm._build_inspection_processor()
+        # Preparado sem tocar no processador em uso
+        self.assertEqual(built.plan, ())
+        self.assertIs(self.vm.inspection_processor, old)
+        self.assertTrue(self.test_processor._process_frame(_frame())['approved'])
+        self.vm._set_inspection_processor(built)
+        self.assertIs(self.vm.inspection_processor, built)
+        self.assertIs(built.tools[0], old.tools[0])
+        self.assertEqual(built.reused_tools, 1)
+        self.assertEqual(built._frame_seq, old._frame_seq)
+        result = self.test_processor._process_frame(_frame())
+        self.assertEqual(result['inspection_result']['config_version'], self.vm.config_version)
+
+    def test_concurrent_updates_and_frames(self):
+        errors = []
+        versions = []
+        stop = threading.Event()
+
+        def inspect():
+            while not stop.is_set():
+                result = self.test_processor._process_frame(_frame())
+                if 'error' in result or 'inspection_result' not in result:
+                    errors.append(result)
+                    return
+                versions.append(result['inspection_result']['config_version'])
+
+        thread = threading.Thread(target=inspect)
+        thread.start()
+        try:
+            for i in range(20):
+                self.vm.update_inspection_config({'tools': [RECIPE['tools'][0], dict(BLOB, area_min=10 + i)]})
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(versions, sorted(versions))
+        self.assertEqual(self.vm.config_version, 20)
+        self.assertEqual(self.vm.inspection_processor.reused_tools, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Testes do worker farm (worker_farm.py): entrega na ordem de captura, detecção de worker
+morto e troca de modo (fail-fast) nos workers
+"""
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from worker_farm import InspectionWorkerFarm
+
+BLOB = {'id': 1, 'name': 'blob', 'type': 'blob', 'th_min': 128, 'th_max': 255, 'area_min': 10, 'area_max': 1e9,
+        'inspec_pass_fail': True, 'blob_count_test': True, 'test_blob_count_min': 2, 'test_blob_count_max': 2}
+RECIPE = {'fail_fast': True, 'tools': [BLOB, dict(BLOB, id=2, name='blob2', inspec_pass_fail=False)]}
+
+
+def _frame(radius):
+    img = np.zeros((120, 160, 3), np.uint8)
+    cv2.circle(img, (80, 60), int(radius), (255, 255, 255), -1)
+    return img
+
+
+class WorkerFarmTestCase(unittest.TestCase):
+
+    workers = 2
+
+    def setUp(self):
+        self.farm = InspectionWorkerFarm(RECIPE, self.workers)
+
+    def tearDown(self):
+        self.farm.close()
+
+    def _collect(self, count, timeout=30.0):
+        ready = []
+        deadline = time.time() + timeout
+        while len(ready) < count and time.time() < deadline:
+            ready.extend(self.farm.collect(timeout=0.05))
+        return ready
+
+
+class OrderingTest(WorkerFarmTestCase):
+
+    def test_results_in_submission_order(self):
+        ready = []
+        frame_number = 1
+        deadline = time.time() + 30
+        while len(ready) < 8 and time.time() < deadline:
+            # Mais frames que slots no ring: submeter conforme os slots são liberados
+            if frame_number <= 8 and self.farm.submit(frame_number, _frame(10 + frame_number)):
+                frame_number += 1
+            ready.extend(self.farm.collect(timeout=0.01))
+        self.assertEqual([item[0] for item in ready], list(range(1, 9)))
+        for frame_number, frame, status, payload in ready:
+            self.assertEqual(status, 'ok')
+            np.testing.assert_array_equal(frame, _frame(10 + frame_number))
+            # Resultado do próprio frame (área cresce com o raio)
+            self.assertEqual(payload['tool_results'][0]['blob_count'], 1)
+        areas = [payload['tool_results'][0]['total_area'] for _, _, _, payload in ready]
+        self.assertEqual(areas, sorted(areas))
+        self.assertEqual(self.farm.stats()['free_slots'], self.farm.num_slots)
+
+    def test_later_frames_wait_for_earlier(self):
+        for frame_number in (1, 2, 3):
+            self.farm.submit(frame_number, _frame(20))
+        # Frames 3 e 2 concluídos antes do 1: nada é entregue até o 1 chegar
+        for frame_number in (3, 2):
+            slot, worker = self.farm._pending[frame_number][:2]
+            self.farm._receive(('error', frame_number, slot, worker, 0, f'frame {frame_number}', None))
+        self.assertEqual(self.farm.collect(timeout=0), [])
+        ready = self._collect(3)
+        self.assertEqual([(item[0], item[2]) for item in ready], [(1, 'ok'), (2, 'error'), (3, 'error')])
+        self.assertEqual(ready[2][3], 'frame 3')
+
+
+class DeadWorkerTest(WorkerFarmTestCase):
+
+    def test_dead_worker_frames_released(self):
+        self.farm._workers[0].terminate()
+        self.farm._workers[0].join(timeout=5)
+        for frame_number in (1, 2, 3, 4):
+            self.farm.submit(frame_number, _frame(20))
+        lost = sorted(n for n, (_, worker, _, _) in self.farm._pending.items() if worker == 0)
+        self.assertTrue(lost)
+        with self.assertRaisesRegex(RuntimeError, 'worker 0'):
+            self.farm.collect(timeout=0)
+        self.assertEqual([index for index, _ in self.farm.dead_workers], [0])
+        self.assertNotIn(0, self.farm.stats()['in_flight'])
+        # Frames do worker vivo continuam sendo entregues, e os novos vão só para ele
+        self.assertTrue(self.farm.submit(5, _frame(20)))
+        ready = self._collect(4 - len(lost) + 1)
+        self.assertEqual([item[0] for item in ready], [n for n in (1, 2, 3, 4, 5) if n not in lost])
+        self.assertTrue(all(item[2] == 'ok' for item in ready))
+
+
+class FailFastModeTest(WorkerFarmTestCase):
+
+    workers = 1
+
+    def _second_tool_status(self, frame_number):
+        self.farm.submit(frame_number, _frame(20))
+        (item,) = self._collect(1)
+        return item[3]['tool_results'][1].get('status')
+
+    def test_mode_change_reaches_workers(self):
+        # Criado no modo TESTE: receita com fail_fast, mas inspeção completa
+        self.assertEqual(self._second_tool_status(1), 'success')
+        self.farm.set_fail_fast(True)
+        self.assertEqual(self._second_tool_status(2), 'skipped')
+        # Nova configuração mantém o modo atual; com fail_fast explícito troca junto
+        self.farm.update_config(RECIPE)
+        self.assertEqual(self._second_tool_status(3), 'skipped')
+        self.farm.update_config(RECIPE, fail_fast=False)
+        self.assertEqual(self._second_tool_status(4), 'success')
+        self.assertFalse(self.farm.stats()['fail_fast'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,21 +2,39 @@
 # Sistema de ferramentas para inspeção de imagem
 
 from .base_tool import BaseTool
-from .blob_tool import BlobTool
+from .blob_tool import BlobTool, materialize_deferred_geometry
 from .grayscale_tool import GrayscaleTool
 from .math_tool import MathTool
 from .blur_filter_tool import BlurFilterTool
 from .threshold_filter_tool import ThresholdFilterTool
 from .morphology_filter_tool import MorphologyFilterTool
 from .locate_tool import LocateTool
+from .template_match_tool import TemplateMatchTool
+from .spc_tool import SpcTool
+from .rolling_stats import RollingStats
+from .roi_cache import RoiGeometryCache, ROI_GEOMETRY_CACHE
+from .artifact_cache import FrameArtifactCache
+from .run_condition import RunCondition, parse_run_if
+from .geometry_codec import pack_tool_results, unpack_tool_result
 
 __all__ = [
     'BaseTool',
     'BlobTool',
+    'materialize_deferred_geometry',
     'GrayscaleTool',
     'MathTool',
     'BlurFilterTool',
     'ThresholdFilterTool',
     'MorphologyFilterTool',
-    'LocateTool'
+    'LocateTool',
+    'TemplateMatchTool',
+    'SpcTool',
+    'RollingStats',
+    'RoiGeometryCache',
+    'ROI_GEOMETRY_CACHE',
+    'FrameArtifactCache',
+    'RunCondition',
+    'parse_run_if',
+    'pack_tool_results',
+    'unpack_tool_result'
 ]
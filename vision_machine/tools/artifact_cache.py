@@ -0,0 +1,76 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+
+class FrameArtifactCache:
+    """Cache por frame de imagens intermediárias (cinza, blur, threshold, gradientes) de um ROI.
+
+    A chave é (tipo, parâmetros, versão da imagem de trabalho, bbox): a versão do FrameBuffer
+    muda a cada escrita de um filtro, então um artefato nunca é reaproveitado depois que a
+    imagem de origem foi alterada. Artefatos pontuais (`pointwise=True`: cinza, faixas e
+    limiares fixos) também atendem qualquer bbox contido em um já calculado, recortando-o.
+
+    Os arrays armazenados são somente leitura, pois são compartilhados entre ferramentas
+    (possivelmente em threads paralelas). O cache é esvaziado a cada frame (`reset`).
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, List[Tuple[Tuple[int, int, int, int], np.ndarray]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(self, kind: str, params: Tuple, version: int, bbox, compute: Callable[[], Any],
+                       pointwise: bool = False):
+        """Retorna o artefato do ROI `bbox`, calculando-o (fora do lock) quando ausente."""
+        key = (kind, params, version)
+        bbox = tuple(int(v) for v in bbox)
+        with self._lock:
+            found = self._lookup(key, bbox, pointwise)
+            if found is not None:
+                self.hits += 1
+                return found
+            self.misses += 1
+        value = compute()
+        self.put(kind, params, version, bbox, value)
+        return value
+
+    def put(self, kind: str, params: Tuple, version: int, bbox, value):
+        """Registra um artefato já calculado (ex.: a saída de um filtro grayscale).
+
+        `value` é um array ou uma tupla de arrays (ex.: gradientes gx, gy).
+        """
+        arrays = value if isinstance(value, tuple) else (value,)
+        if not arrays or not all(isinstance(a, np.ndarray) for a in arrays):
+            return
+        for a in arrays:
+            a.setflags(write=False)
+        with self._lock:
+            self._entries.setdefault((kind, params, version), []).append((tuple(int(v) for v in bbox), value))
+
+    def _lookup(self, key: Hashable, bbox: Tuple[int, int, int, int], pointwise: bool):
+        entries = self._entries.get(key)
+        if not entries:
+            return None
+        x, y, w, h = bbox
+        for (ex, ey, ew, eh), value in entries:
+            if (ex, ey, ew, eh) == bbox:
+                return value
+            if pointwise and ex <= x and ey <= y and x + w <= ex + ew and y + h <= ey + eh:
+                return value[y - ey:y - ey + h, x - ex:x - ex + w]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': sum(len(v) for v in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
@@ -5,6 +5,9 @@ import copy
 import cv2
 import numpy as np
 
+from .roi_cache import ROI_GEOMETRY_CACHE
+from .run_condition import parse_run_if
+
 class BaseTool(ABC):
     """Classe base para todas as ferramentas de inspeção"""
     
@@ -16,6 +19,16 @@ class BaseTool(ABC):
         self.roi = config.get('ROI', {})
         self.inspec_pass_fail = config.get('inspec_pass_fail', False)
         self.reference_tool_id = config.get('reference_tool_id', None)
+        # Executada mesmo após uma reprovação no modo fail-fast (ex.: logging/estatística)
+        self.always_run = bool(config.get('always_run', False))
+        # Execução condicional: condições sobre resultados anteriores (pré-compiladas)
+        self.run_if = parse_run_if(config.get('run_if'), self.reference_tool_id)
+        # Logs por frame desligados por padrão (o InspectionProcessor propaga o flag da receita)
+        self.verbose = bool(config.get('verbose', False))
+        # ROI normalizado uma única vez; a geometria é pré-compilada por tamanho de imagem
+        self._roi_spec = self._roi_spec_from_conf(self.roi) if isinstance(self.roi, dict) else None
+        self._roi_debug_before = copy.deepcopy(self.roi) if isinstance(self.roi, dict) else None
+        self._static_geometry = {}
         
     @abstractmethod
     def process(self, image: np.ndarray, roi_image: np.ndarray, 
@@ -23,6 +36,16 @@ class BaseTool(ABC):
         """Processa a imagem e retorna resultados ou imagem processada"""
         pass
     
+    def referenced_tool_ids(self) -> Tuple[Any, ...]:
+        """Ferramentas anteriores cujos resultados esta ferramenta lê (dependências no plano)."""
+        return (self.reference_tool_id,) if self.reference_tool_id is not None else ()
+
+    def state_key(self, lineage: Dict[Any, str]) -> Optional[Tuple]:
+        """Identidade do estado mantido entre frames, dada a linhagem das ferramentas por id
+        (None = sem estado). Ferramentas com estado implementam também `adopt_state(anterior)`
+        e `reset_state()`, chamados pelo InspectionProcessor na troca de configuração."""
+        return None
+
     def get_reference_result(self, previous_results: Dict[int, Dict], tool_id: int) -> Optional[Dict]:
         """Obtém resultado de uma ferramenta de referência"""
         if tool_id in previous_results:
@@ -35,51 +58,25 @@ class BaseTool(ABC):
         """Extrai região de interesse (ROI). Suporta rect (legacy), circle e ellipse via máscara.
         Aplica, se presente, um offset de transformação (_transform_offset) vindo de uma ferramenta anterior
         (ex.: Locate com apply_transform=true), sem alterar o ROI configurado permanentemente.
+
+        A geometria (bbox/máscara) do ROI sem offset é pré-compilada por tamanho de imagem
+        (ver `prepare_roi`), de modo que o caminho comum não recalcula nada por frame.
         """
-        # Preparar ROI efetivo (cópia), aplicando offset se existir
-        roi_conf = copy.deepcopy(self.roi) if isinstance(self.roi, dict) else {}
         tx = getattr(self, '_transform_offset', None)
         applied_tx = None
-        if roi_conf and isinstance(tx, dict):
-            try:
-                dx = float(tx.get('dx', 0.0) or 0.0)
-                dy = float(tx.get('dy', 0.0) or 0.0)
-                dth = float(tx.get('dtheta_deg', 0.0) or 0.0)
-                rotate = bool(tx.get('rotate', False))
-                shape_tx = roi_conf.get('shape')
-                # Legacy retângulo direto
-                if shape_tx == 'rect' or (not shape_tx and all(k in roi_conf for k in ('x','y','w','h'))):
-                    r = roi_conf.get('rect', roi_conf)
-                    r['x'] = int(round(float(r.get('x', 0)) + dx))
-                    r['y'] = int(round(float(r.get('y', 0)) + dy))
-                    if 'rect' in roi_conf:
-                        roi_conf['rect'] = r
-                    else:
-                        roi_conf.update(r)
-                    if 'shape' not in roi_conf:
-                        roi_conf['shape'] = 'rect'
-                    applied_tx = {'dx': dx, 'dy': dy, 'dtheta_deg': dth, 'rotate': rotate}
-                elif shape_tx == 'circle' and isinstance(roi_conf.get('circle'), dict):
-                    c = roi_conf['circle']
-                    c['cx'] = int(round(float(c.get('cx', 0)) + dx))
-                    c['cy'] = int(round(float(c.get('cy', 0)) + dy))
-                    applied_tx = {'dx': dx, 'dy': dy, 'dtheta_deg': dth, 'rotate': rotate}
-                elif shape_tx == 'ellipse' and isinstance(roi_conf.get('ellipse'), dict):
-                    e = roi_conf['ellipse']
-                    e['cx'] = int(round(float(e.get('cx', 0)) + dx))
-                    e['cy'] = int(round(float(e.get('cy', 0)) + dy))
-                    if rotate:
-                        e['angle'] = float(e.get('angle', 0.0)) + dth
-                    applied_tx = {'dx': dx, 'dy': dy, 'dtheta_deg': dth, 'rotate': rotate}
-            except Exception:
-                applied_tx = None
+        spec = self._roi_spec
+        roi_after = self._roi_debug_before
+        if spec is not None and isinstance(tx, dict):
+            roi_after, applied_tx = self._offset_roi_conf(tx)
+            if applied_tx is not None:
+                spec = self._roi_spec_from_conf(roi_after)
 
         # Guardar debug do ROI efetivo
         try:
             self._last_roi_debug = {
                 'transform_present': bool(tx is not None),
-                'roi_before': copy.deepcopy(self.roi) if isinstance(self.roi, dict) else None,
-                'roi_after': copy.deepcopy(roi_conf) if isinstance(roi_conf, dict) else None,
+                'roi_before': self._roi_debug_before,
+                'roi_after': roi_after,
                 'applied_offset': applied_tx,
             }
             # Sinaliza para o InspectionProcessor que um offset foi aplicado
@@ -90,18 +87,190 @@ class BaseTool(ABC):
         except Exception:
             pass
 
-        if not roi_conf:
+        if spec is None:
             # Nenhum ROI: a ferramenta trabalha a imagem inteira
             self._last_roi_bbox = (0, 0, image.shape[1], image.shape[0])
             self._last_roi_mask = None
             return image
 
         img_height, img_width = image.shape[:2]
+        if spec is self._roi_spec:
+            geometry = self._static_geometry.get((img_width, img_height))
+            if geometry is None:
+                geometry = self._compute_roi_geometry(spec, img_width, img_height)
+                self._static_geometry[(img_width, img_height)] = geometry
+        else:
+            # ROI deslocado por transformação: geometria compartilhada via cache LRU
+            geometry = self._cached_roi_geometry(spec, img_width, img_height)
+
+        bbox, mask, warning = geometry
+        if warning is not None:
+            print(warning.format(name=self.name))
+            self._last_roi_bbox = (0, 0, 0, 0)
+            self._last_roi_mask = None
+            return image
+
+        x, y, w, h = bbox
+        roi_image = image[y:y+h, x:x+w]
+        self._last_roi_bbox = bbox
+        self._last_roi_mask = mask
+        if self.verbose:
+            print(f"🔍 {self.name}: ROI extraído shape={spec[0]} bbox=({x},{y},{w},{h}) -> {roi_image.shape}")
+        return roi_image
+
+    def cached_artifact(self, kind: str, params: Tuple, roi_image: np.ndarray, compute, pointwise: bool = False):
+        """Retorna `compute(roi_image)` reaproveitando o resultado de outra ferramenta que já
+        pediu o mesmo (tipo, parâmetros) sobre a mesma região da mesma versão da imagem.
+
+        O cache do frame (`_artifact_cache`/`_artifact_version`) é configurado pelo
+        InspectionProcessor antes de cada passo; fora dele o artefato é apenas calculado.
+        O resultado pode ser somente leitura: não altere o array retornado.
+        """
+        cache = getattr(self, '_artifact_cache', None)
+        bbox = getattr(self, '_last_roi_bbox', None)
+        if cache is None or bbox is None:
+            return compute(roi_image)
+        return cache.get_or_compute(kind, params, self._artifact_version, bbox, lambda: compute(roi_image), pointwise)
+
+    def output_artifact(self, output: np.ndarray) -> Optional[Tuple[str, Tuple]]:
+        """(tipo, parâmetros) do artefato que a saída deste filtro representa sobre a imagem
+        já escrita no ROI, ou None.
+
+        Uma saída em cinza escrita em imagem colorida (GRAY2BGR) é exatamente o cinza do ROI
+        resultante, então ferramentas seguintes não precisam convertê-lo de novo.
+        """
+        if isinstance(output, np.ndarray) and output.ndim == 2:
+            return ('gray', ())
+        return None
+
+    def gray_equivalent(self) -> bool:
+        """`process` sobre um ROI cinza dá o mesmo resultado que sobre o mesmo cinza replicado
+        em BGR (filtros que tratam cada canal igualmente). Permite que uma sequência fundida
+        trabalhe em um único canal depois de uma conversão para cinza."""
+        return False
+
+    def is_point_op(self) -> bool:
+        """Filtro pontual sobre cinza 8 bits: cada pixel de saída depende só do próprio valor
+        (e, no máximo, do histograma da entrada), então pode ser composto em uma LUT."""
+        return False
+
+    def lut_input(self, roi_image: np.ndarray) -> Optional[np.ndarray]:
+        """Imagem cinza 8 bits sobre a qual `point_lut` se aplica (None quando não há)."""
+        if roi_image.ndim == 2 and roi_image.dtype == np.uint8:
+            return roi_image
+        return None
+
+    def point_lut(self, input_hist) -> Optional[np.ndarray]:
+        """LUT (256 entradas, uint8) equivalente a `process` sobre a saída de `lut_input`.
+
+        `input_hist()` retorna o histograma da entrada (para filtros que dependem dele).
+        """
+        return None
+
+    def gray_roi(self, roi_image: np.ndarray) -> np.ndarray:
+        """ROI em escala de cinza (conversão BGR->cinza compartilhada entre ferramentas)."""
+        if len(roi_image.shape) != 3:
+            return roi_image
+        return self.cached_artifact('gray', (), roi_image, lambda img: cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), pointwise=True)
+
+    def prepare_roi(self, image_size: Optional[Tuple[int, int]] = None):
+        """Pré-compila a geometria do ROI configurado para um tamanho de imagem (largura, altura).
+
+        Chamado pelo InspectionProcessor ao compilar o plano de execução; tamanhos não
+        previstos são compilados sob demanda no primeiro frame em que aparecerem.
+        """
+        if self._roi_spec is None or not image_size:
+            return
+        try:
+            img_width, img_height = int(image_size[0]), int(image_size[1])
+        except Exception:
+            return
+        if img_width <= 0 or img_height <= 0:
+            return
+        key = (img_width, img_height)
+        if key not in self._static_geometry:
+            self._static_geometry[key] = self._compute_roi_geometry(self._roi_spec, img_width, img_height)
+
+    def _cached_roi_geometry(self, spec: Tuple, img_width: int, img_height: int):
+        """Busca a geometria no cache compartilhado (chave: shape + offset arredondado + tamanho)."""
+        if spec[0] == 'ellipse':
+            # Ângulo contínuo (rotação) arredondado para não fragmentar o cache
+            key = (spec[:5] + (round(float(spec[5]), 3),), img_width, img_height)
+        else:
+            key = (spec, img_width, img_height)
+        try:
+            hash(key)
+        except TypeError:
+            return self._compute_roi_geometry(spec, img_width, img_height)
+        return ROI_GEOMETRY_CACHE.get_or_compute(key, lambda: self._compute_roi_geometry(spec, img_width, img_height))
+
+    def _roi_spec_from_conf(self, roi_conf: Dict[str, Any]) -> Optional[Tuple]:
+        """Normaliza o dicionário de ROI em uma tupla imutável (shape, parâmetros...)."""
+        if not roi_conf:
+            return None
 
         # Back-compat: se vier no formato antigo, tratar como retângulo
         is_legacy_rect = all(k in roi_conf for k in ('x', 'y', 'w', 'h')) and 'shape' not in roi_conf
         shape = roi_conf.get('shape', 'rect' if is_legacy_rect else roi_conf.get('shape', 'rect'))
 
+        if shape == 'rect':
+            # Pode vir como ROI antigo ({x,y,w,h}) ou aninhado em roi['rect']
+            r = roi_conf.get('rect', roi_conf)
+            return ('rect', r.get('x', 0), r.get('y', 0), r.get('w'), r.get('h'))
+        if shape == 'circle':
+            c = roi_conf.get('circle', {})
+            return ('circle', c.get('cx', 0), c.get('cy', 0), c.get('r', 0))
+        if shape == 'ellipse':
+            e = roi_conf.get('ellipse', {})
+            return ('ellipse', e.get('cx', 0), e.get('cy', 0), e.get('rx', 0), e.get('ry', 0), e.get('angle', 0.0))
+        # Desconhecido: cai no comportamento antigo, evitando quebra
+        return ('legacy', roi_conf.get('x', 0), roi_conf.get('y', 0), roi_conf.get('w'), roi_conf.get('h'))
+
+    def _offset_roi_conf(self, tx: Dict[str, Any]):
+        """Retorna (cópia do ROI com offset aplicado, offset aplicado ou None)."""
+        roi_conf = copy.deepcopy(self.roi) if isinstance(self.roi, dict) else {}
+        applied_tx = None
+        try:
+            dx = float(tx.get('dx', 0.0) or 0.0)
+            dy = float(tx.get('dy', 0.0) or 0.0)
+            dth = float(tx.get('dtheta_deg', 0.0) or 0.0)
+            rotate = bool(tx.get('rotate', False))
+            shape_tx = roi_conf.get('shape')
+            # Legacy retângulo direto
+            if shape_tx == 'rect' or (not shape_tx and all(k in roi_conf for k in ('x','y','w','h'))):
+                r = roi_conf.get('rect', roi_conf)
+                r['x'] = int(round(float(r.get('x', 0)) + dx))
+                r['y'] = int(round(float(r.get('y', 0)) + dy))
+                if 'rect' in roi_conf:
+                    roi_conf['rect'] = r
+                else:
+                    roi_conf.update(r)
+                if 'shape' not in roi_conf:
+                    roi_conf['shape'] = 'rect'
+                applied_tx = {'dx': dx, 'dy': dy, 'dtheta_deg': dth, 'rotate': rotate}
+            elif shape_tx == 'circle' and isinstance(roi_conf.get('circle'), dict):
+                c = roi_conf['circle']
+                c['cx'] = int(round(float(c.get('cx', 0)) + dx))
+                c['cy'] = int(round(float(c.get('cy', 0)) + dy))
+                applied_tx = {'dx': dx, 'dy': dy, 'dtheta_deg': dth, 'rotate': rotate}
+            elif shape_tx == 'ellipse' and isinstance(roi_conf.get('ellipse'), dict):
+                e = roi_conf['ellipse']
+                e['cx'] = int(round(float(e.get('cx', 0)) + dx))
+                e['cy'] = int(round(float(e.get('cy', 0)) + dy))
+                if rotate:
+                    e['angle'] = float(e.get('angle', 0.0)) + dth
+                applied_tx = {'dx': dx, 'dy': dy, 'dtheta_deg': dth, 'rotate': rotate}
+        except Exception:
+            applied_tx = None
+        return roi_conf, applied_tx
+
+    def _compute_roi_geometry(self, spec: Tuple, img_width: int, img_height: int):
+        """Calcula (bbox, máscara, aviso) do ROI para o tamanho de imagem informado.
+
+        `aviso` é None quando o ROI é válido; caso contrário contém a mensagem a exibir
+        (com o marcador `{name}` para o nome da ferramenta). Retângulos não têm máscara (None);
+        as demais máscaras são somente leitura, pois são compartilhadas entre frames e ferramentas.
+        """
         # Funções auxiliares
         def clamp_bbox(x: int, y: int, w: int, h: int):
             x = max(0, min(x, img_width - 1))
@@ -110,82 +279,48 @@ class BaseTool(ABC):
             h = max(0, min(h, img_height - y))
             return x, y, w, h
 
-        mask = None
-        if shape == 'rect':
-            # Pode vir como ROI antigo ({x,y,w,h}) ou aninhado em roi['rect']
-            r = roi_conf.get('rect', roi_conf)
-            x, y = int(r.get('x', 0)), int(r.get('y', 0))
-            w, h = int(r.get('w', img_width)), int(r.get('h', img_height))
+        shape = spec[0]
+        if shape in ('rect', 'legacy'):
+            x, y = int(spec[1]), int(spec[2])
+            w = int(spec[3]) if spec[3] is not None else img_width
+            h = int(spec[4]) if spec[4] is not None else img_height
             x, y, w, h = clamp_bbox(x, y, w, h)
-            if w <= 0 or h <= 0:
-                print(f"⚠️ ROI inválido para {self.name}: ({x},{y},{w},{h}) em imagem {img_width}x{img_height}")
-                self._last_roi_bbox = (0, 0, 0, 0)
-                self._last_roi_mask = None
-                return image
-            roi_image = image[y:y+h, x:x+w]
-            mask = np.ones((h, w), dtype=np.uint8) * 255
+            if shape == 'rect' and (w <= 0 or h <= 0):
+                return None, None, f"⚠️ ROI inválido para {{name}}: ({x},{y},{w},{h}) em imagem {img_width}x{img_height}"
+            # Retângulo puro dispensa máscara
+            return (x, y, w, h), None, None
 
         elif shape == 'circle':
-            c = roi_conf.get('circle', {})
-            cx, cy = int(c.get('cx', 0)), int(c.get('cy', 0))
-            r = int(c.get('r', 0))
+            cx, cy = int(spec[1]), int(spec[2])
+            r = int(spec[3])
             if r <= 0:
-                print(f"⚠️ ROI círculo inválido para {self.name}: (cx={cx}, cy={cy}, r={r})")
-                self._last_roi_bbox = (0, 0, 0, 0)
-                self._last_roi_mask = None
-                return image
-            x, y = cx - r, cy - r
-            w, h = 2 * r, 2 * r
-            x, y, w, h = clamp_bbox(x, y, w, h)
+                return None, None, f"⚠️ ROI círculo inválido para {{name}}: (cx={cx}, cy={cy}, r={r})"
+            x, y, w, h = clamp_bbox(cx - r, cy - r, 2 * r, 2 * r)
             if w <= 0 or h <= 0:
-                print(f"⚠️ ROI círculo fora dos limites para {self.name}")
-                self._last_roi_bbox = (0, 0, 0, 0)
-                self._last_roi_mask = None
-                return image
-            roi_image = image[y:y+h, x:x+w]
+                return None, None, f"⚠️ ROI círculo fora dos limites para {{name}}"
             mask = np.zeros((h, w), dtype=np.uint8)
             # centro relativo após clamp
             rel_cx = min(max(r, 0), w - 1)
             rel_cy = min(max(r, 0), h - 1)
             cv2.circle(mask, (rel_cx, rel_cy), min(r, w - 1, h - 1), 255, -1)
 
-        elif shape == 'ellipse':
-            e = roi_conf.get('ellipse', {})
-            cx, cy = int(e.get('cx', 0)), int(e.get('cy', 0))
-            rx, ry = int(e.get('rx', 0)), int(e.get('ry', 0))
-            angle = float(e.get('angle', 0.0))
+        else:
+            cx, cy = int(spec[1]), int(spec[2])
+            rx, ry = int(spec[3]), int(spec[4])
+            angle = float(spec[5])
             if rx <= 0 or ry <= 0:
-                print(f"⚠️ ROI elipse inválido para {self.name}: (cx={cx}, cy={cy}, rx={rx}, ry={ry})")
-                self._last_roi_bbox = (0, 0, 0, 0)
-                self._last_roi_mask = None
-                return image
-            x, y = cx - rx, cy - ry
-            w, h = 2 * rx, 2 * ry
-            x, y, w, h = clamp_bbox(x, y, w, h)
+                return None, None, f"⚠️ ROI elipse inválido para {{name}}: (cx={cx}, cy={cy}, rx={rx}, ry={ry})"
+            x, y, w, h = clamp_bbox(cx - rx, cy - ry, 2 * rx, 2 * ry)
             if w <= 0 or h <= 0:
-                print(f"⚠️ ROI elipse fora dos limites para {self.name}")
-                self._last_roi_bbox = (0, 0, 0, 0)
-                self._last_roi_mask = None
-                return image
-            roi_image = image[y:y+h, x:x+w]
+                return None, None, f"⚠️ ROI elipse fora dos limites para {{name}}"
             mask = np.zeros((h, w), dtype=np.uint8)
             # centro relativo após clamp
             rel_cx = min(max(rx, 0), w - 1)
             rel_cy = min(max(ry, 0), h - 1)
             cv2.ellipse(mask, (rel_cx, rel_cy), (min(rx, w - 1), min(ry, h - 1)), angle, 0, 360, 255, -1)
 
-        else:
-            # Desconhecido: cai no comportamento antigo, evitando quebra
-            x, y = int(roi_conf.get('x', 0)), int(roi_conf.get('y', 0))
-            w, h = int(roi_conf.get('w', img_width)), int(roi_conf.get('h', img_height))
-            x, y, w, h = clamp_bbox(x, y, w, h)
-            roi_image = image[y:y+h, x:x+w]
-            mask = np.ones((h, w), dtype=np.uint8) * 255
-
-        self._last_roi_bbox = (x, y, w, h)
-        self._last_roi_mask = mask
-        print(f"🔍 {self.name}: ROI extraído shape={shape} bbox=({x},{y},{w},{h}) -> {roi_image.shape}")
-        return roi_image
+        mask.setflags(write=False)
+        return (x, y, w, h), mask, None
     
     def is_filter_tool(self) -> bool:
         """Verifica se é ferramenta de filtro (modifica imagem)"""
@@ -197,7 +332,7 @@ class BaseTool(ABC):
     
     def is_math_tool(self) -> bool:
         """Verifica se é ferramenta matemática (usa resultados de outras)"""
-        return self.type in ['math', 'statistics', 'comparison']
+        return self.type in ['math', 'spc', 'statistics', 'comparison']
     
     def validate_config(self) -> bool:
         """Valida a configuração da ferramenta (implementação base)"""
@@ -0,0 +1,210 @@
+"""Tabela colunar de descritores de forma dos blobs, calculada em lote sobre a matriz de labels.
+
+Cada descritor é um array NumPy indexado pelo label do connectedComponentsWithStats (o índice
+0 é o fundo); nenhum passo percorre os blobs em Python, então o custo depende do número de
+pixels, não do número de blobs.
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+FEATURE_NAMES = ('perimeter', 'circularity', 'elongation', 'orientation', 'convexity', 'mean_intensity')
+
+# Dependências entre descritores (calculadas juntas)
+_REQUIRES = {
+    'circularity': ('perimeter',),
+    'orientation': ('elongation',),
+}
+
+# Perímetro por configuração local da borda (vizinhança 3x3), como skimage.measure.perimeter
+_PERIMETER_KERNEL = np.array([[10, 2, 10], [2, 1, 2], [10, 2, 10]], dtype=np.float32)
+_PERIMETER_WEIGHTS = np.zeros(50, dtype=np.float64)
+_PERIMETER_WEIGHTS[[5, 7, 15, 17, 25, 27]] = 1.0
+_PERIMETER_WEIGHTS[[21, 33]] = np.sqrt(2.0)
+_PERIMETER_WEIGHTS[[13, 23]] = (1.0 + np.sqrt(2.0)) / 2.0
+_CROSS = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+
+# Direções em que se buscam os vértices do fecho convexo
+_HULL_DIRECTIONS = 32
+_HULL_ANGLES = np.arange(_HULL_DIRECTIONS) * (2.0 * np.pi / _HULL_DIRECTIONS)
+_HULL_COS = np.cos(_HULL_ANGLES).astype(np.float32)
+_HULL_SIN = np.sin(_HULL_ANGLES).astype(np.float32)
+
+
+def resolve_features(names: Iterable[str]) -> Tuple[str, ...]:
+    """Descritores a calcular (com dependências), na ordem de FEATURE_NAMES."""
+    wanted = set(names)
+    for name in list(wanted):
+        wanted.update(_REQUIRES.get(name, ()))
+    return tuple(name for name in FEATURE_NAMES if name in wanted)
+
+
+def _border(binary: np.ndarray) -> np.ndarray:
+    """Pixels do blob com algum vizinho-4 de fundo (0/1). Como os componentes são separados em
+    8-conectividade, todo vizinho de primeiro plano pertence ao mesmo componente."""
+    foreground = (binary != 0).view(np.uint8)
+    eroded = cv2.erode(foreground, _CROSS, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+    return foreground - eroded
+
+
+def _perimeter(border: np.ndarray, flat_labels: np.ndarray, border_idx: np.ndarray, num_labels: int) -> np.ndarray:
+    codes = cv2.filter2D(border, cv2.CV_16S, _PERIMETER_KERNEL, borderType=cv2.BORDER_CONSTANT)
+    weights = _PERIMETER_WEIGHTS[codes.ravel()[border_idx]]
+    return np.bincount(flat_labels[border_idx], weights=weights, minlength=num_labels)
+
+
+def _central_moments(flat_labels: np.ndarray, width: int, num_labels: int, centroids: np.ndarray,
+                     safe_area: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Momentos centrais normalizados (mu20, mu02, mu11) por label, somando 1/12 (variância de
+    um pixel quadrado) à diagonal para que nenhum blob fique degenerado."""
+    foreground = np.flatnonzero(flat_labels)
+    fg_labels = flat_labels[foreground]
+    ys, xs = np.divmod(foreground, width)
+    xs = xs - centroids[fg_labels, 0]
+    ys = ys - centroids[fg_labels, 1]
+    mu20 = np.bincount(fg_labels, weights=xs * xs, minlength=num_labels) / safe_area + 1.0 / 12.0
+    mu02 = np.bincount(fg_labels, weights=ys * ys, minlength=num_labels) / safe_area + 1.0 / 12.0
+    mu11 = np.bincount(fg_labels, weights=xs * ys, minlength=num_labels) / safe_area
+    return mu20, mu02, mu11
+
+
+def _hull_area(border_idx: np.ndarray, flat_labels: np.ndarray, width: int, num_labels: int,
+               centroids: np.ndarray, moments: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """Área do fecho convexo dos centros dos pixels de cada blob.
+
+    É a mesma medida da área do blob (contagem de pixels = centros dentro da forma). O fecho
+    dos centros é o fecho dos pixels extremos de cada linha, então só esses entram nas
+    projeções. O pixel mais avançado em cada uma de `_HULL_DIRECTIONS` direções é um vértice
+    do fecho e o polígono desses vértices (em ordem angular) é inscrito nele: exato para
+    blobs poligonais e ~0,6% menor em contornos curvos. Antes de projetar, cada blob é
+    normalizado pela sua matriz de covariância (transformação de determinante 1, que preserva
+    áreas), para que as direções uniformes amostrem blobs alongados como um disco.
+    """
+    hull = np.zeros(num_labels, dtype=np.float64)
+    if border_idx.size == 0:
+        return hull
+    # Ordem (label, linha, coluna): border_idx já está em ordem de varredura
+    order = np.argsort(flat_labels[border_idx], kind='stable')
+    idx = border_idx[order]
+    labels = flat_labels[idx]
+    rows = idx // width
+    row_start = np.r_[True, (labels[1:] != labels[:-1]) | (rows[1:] != rows[:-1])]
+    row_end = np.r_[row_start[1:], True]
+    extremes = row_start | row_end
+    idx, labels = idx[extremes], labels[extremes]
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    blob_labels = labels[starts]
+
+    # Matriz de branqueamento por blob: Σ^(-1/2) escalada para determinante 1
+    mu20, mu02, mu11 = (m[blob_labels] for m in moments)
+    s = np.sqrt(mu20 * mu02 - mu11 * mu11)
+    scale = 1.0 / (np.sqrt(mu20 + mu02 + 2.0 * s) * np.sqrt(s))
+    a11, a12, a22 = (mu02 + s) * scale, -mu11 * scale, (mu20 + s) * scale
+
+    ys, xs = np.divmod(idx, width)
+    dx = xs - centroids[labels, 0]
+    dy = ys - centroids[labels, 1]
+    seg = np.repeat(np.arange(blob_labels.size), np.diff(np.r_[starts, labels.size]))
+    u = (a11[seg] * dx + a12[seg] * dy).astype(np.float32)
+    v = (a12[seg] * dx + a22[seg] * dy).astype(np.float32)
+    # Projeções em (direção, ponto): as reduções por segmento correm sobre memória contígua
+    projection = np.outer(_HULL_COS, u) + np.outer(_HULL_SIN, v)
+    support = np.maximum.reduceat(projection, starts, axis=1)
+    # Primeiro ponto que atinge o máximo de cada (direção, blob)
+    candidates = np.where(projection == support[:, seg], np.arange(u.size), u.size)
+    vertex = np.minimum.reduceat(candidates, starts, axis=1).T
+    vu, vv = u[vertex].astype(np.float64), v[vertex].astype(np.float64)
+    # Shoelace (vértices repetidos formam arestas nulas)
+    hull[blob_labels] = 0.5 * np.sum(vu * np.roll(vv, -1, axis=1) - np.roll(vu, -1, axis=1) * vv, axis=1)
+    return hull
+
+
+def compute_blob_features(labels: np.ndarray, num_labels: int, stats: np.ndarray, centroids: np.ndarray,
+                          binary: np.ndarray, gray: np.ndarray, names: Iterable[str],
+                          candidates: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Calcula os descritores `names` (ver resolve_features) para todos os labels de uma vez.
+
+    - perimeter: perímetro ponderado pela configuração local da borda (1, √2, (1+√2)/2)
+    - circularity: 4π·área/perímetro² (limitado a 1; blob de um pixel = 1)
+    - elongation: razão eixo maior/eixo menor pelos momentos centrais de 2ª ordem (≥ 1)
+    - orientation: ângulo do eixo maior em graus, em relação ao eixo x (y para baixo), em (-90, 90]
+    - convexity: pixels do blob / área do fecho convexo dos centros dos pixels (solidez),
+      limitada a 1; blobs convexos medem 1 (o fecho dos centros não conta a meia faixa
+      de pixel da borda que a contagem inclui)
+    - mean_intensity: média dos níveis de cinza dos pixels do blob
+
+    `candidates` (máscara booleana por label, opcional) limita o fecho convexo, o descritor mais
+    caro, aos blobs que ainda podem passar nos filtros; os demais ficam com convexity = 1.
+    """
+    names = resolve_features(names)
+    table: Dict[str, np.ndarray] = {}
+    if not names:
+        return table
+    area = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+    safe_area = np.maximum(area, 1.0)
+    flat_labels = labels.ravel()
+    width = labels.shape[1]
+
+    border_idx = None
+    border = None
+    if 'perimeter' in names or 'convexity' in names:
+        border = _border(binary)
+        border_idx = np.flatnonzero(border)
+
+    if 'perimeter' in names:
+        perimeter = _perimeter(border, flat_labels, border_idx, num_labels)
+        table['perimeter'] = perimeter
+        if 'circularity' in names:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                circularity = 4.0 * np.pi * area / (perimeter * perimeter)
+            table['circularity'] = np.where(perimeter > 0, np.minimum(circularity, 1.0), 1.0)
+
+    moments = None
+    if 'elongation' in names or 'convexity' in names:
+        moments = _central_moments(flat_labels, width, num_labels, centroids, safe_area)
+
+    if 'elongation' in names:
+        mu20, mu02, mu11 = moments
+        spread = np.sqrt(4.0 * mu11 * mu11 + (mu20 - mu02) ** 2)
+        major = (mu20 + mu02 + spread) / 2.0
+        minor = (mu20 + mu02 - spread) / 2.0
+        table['elongation'] = np.sqrt(major / np.maximum(minor, 1e-12))
+        if 'orientation' in names:
+            angle = np.degrees(0.5 * np.arctan2(2.0 * mu11, mu20 - mu02))
+            table['orientation'] = np.where(angle <= -90.0, angle + 180.0, angle)
+
+    if 'convexity' in names:
+        hull_idx = border_idx if candidates is None else border_idx[candidates[flat_labels[border_idx]]]
+        hull = _hull_area(hull_idx, flat_labels, width, num_labels, centroids, moments)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            convexity = area / hull
+        table['convexity'] = np.clip(np.where(hull > 0, convexity, 1.0), 0.0, 1.0)
+
+    if 'mean_intensity' in names:
+        gray = gray if gray.ndim == 2 else cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+        sums = np.bincount(flat_labels, weights=gray.ravel(), minlength=num_labels)
+        table['mean_intensity'] = sums / safe_area
+
+    return table
+
+
+def parse_feature_limits(config: Dict[str, Any]) -> Dict[str, Tuple[float, float]]:
+    """Limites `<descritor>_min`/`<descritor>_max` presentes na configuração da ferramenta."""
+    limits = {}
+    for name in FEATURE_NAMES:
+        lo = config.get(f'{name}_min')
+        hi = config.get(f'{name}_max')
+        if lo is None and hi is None:
+            continue
+        limits[name] = (float(lo) if lo is not None else -np.inf, float(hi) if hi is not None else np.inf)
+    return limits
+
+
+def feature_mask(table: Dict[str, np.ndarray], limits: Dict[str, Tuple[float, float]], num_labels: int) -> np.ndarray:
+    """Máscara booleana (por label) dos blobs dentro de todos os limites."""
+    mask = np.ones(num_labels, dtype=bool)
+    for name, (lo, hi) in limits.items():
+        values = table[name]
+        mask &= (values >= lo) & (values <= hi)
+    return mask
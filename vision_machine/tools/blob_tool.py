@@ -1,8 +1,157 @@
 import time
 import cv2
 import numpy as np
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, NamedTuple, Tuple
 from .base_tool import BaseTool
+from .blob_features import FEATURE_NAMES, compute_blob_features, feature_mask, parse_feature_limits, resolve_features
+
+# Nível de geometria calculado por blob (do mais barato ao mais caro)
+GEOMETRY_LEVELS = ('none', 'bbox', 'outer', 'full', 'lazy')
+
+_CHAIN_MODES = {
+    'SIMPLE': cv2.CHAIN_APPROX_SIMPLE,
+    'NONE': cv2.CHAIN_APPROX_NONE,
+    'TC89_L1': cv2.CHAIN_APPROX_TC89_L1,
+    'TC89_KCOS': cv2.CHAIN_APPROX_TC89_KCOS,
+}
+
+
+class PolygonParams(NamedTuple):
+    """Parâmetros de extração de polígonos (separados da ferramenta para a geometria adiada)."""
+    contour_chain: str
+    approx_epsilon_ratio: float
+    polygon_max_points: int
+
+    def chain_mode(self) -> int:
+        return _CHAIN_MODES.get(self.contour_chain, cv2.CHAIN_APPROX_SIMPLE)
+
+    def build_polygon(self, contour) -> List[List[int]]:
+        """Gera polígono a partir do contorno com aproximação e amostragem opcional."""
+        try:
+            pts = contour
+            # Aproximação controlada por epsilon (0 desabilita)
+            if self.approx_epsilon_ratio and self.approx_epsilon_ratio > 0:
+                peri = max(1e-6, cv2.arcLength(contour, True))
+                epsilon = max(0.5, float(self.approx_epsilon_ratio) * peri)
+                approx = cv2.approxPolyDP(contour, epsilon, True)
+                pts = approx
+            # Converter para lista de pontos inteiros (x, y)
+            pts_xy = pts.reshape(-1, 2).astype('int32')
+            # Limitar número de pontos para performance, se configurado
+            if self.polygon_max_points and self.polygon_max_points > 0 and len(pts_xy) > self.polygon_max_points:
+                step = int(np.ceil(len(pts_xy) / float(self.polygon_max_points)))
+                pts_xy = pts_xy[::max(1, step)]
+            poly = pts_xy.tolist()
+            # Garantir fechamento do polígono
+            if len(poly) > 0 and (poly[0][0] != poly[-1][0] or poly[0][1] != poly[-1][1]):
+                poly.append(poly[0])
+            return poly
+        except Exception:
+            return []
+
+    def component_polygons(self, binary: np.ndarray, labels: np.ndarray, valid: np.ndarray,
+                           holes: bool = True) -> Dict[int, Tuple[List[List[int]], List[List[List[int]]]]]:
+        """Polígonos dos componentes `valid`: label -> (contorno externo, todos os contornos).
+
+        Um único findContours (RETR_CCOMP: bordas externas e de buracos) sobre a imagem binária;
+        cada contorno é atribuído ao componente pelo label do seu primeiro ponto (bordas
+        externas e de buracos passam sobre pixels do próprio componente, em 8-conectividade
+        como connectedComponents). A ordem dos contornos de um componente é a do varrimento.
+        Com `holes=False` só os contornos externos são aproximados (a lista de todos fica vazia).
+        """
+        try:
+            contours, hierarchy = cv2.findContours(binary, cv2.RETR_CCOMP, self.chain_mode())
+            if not contours:
+                return {}
+            starts = np.array([c[0, 0] for c in contours])
+            contour_labels = labels[starts[:, 1], starts[:, 0]]
+            is_outer = hierarchy[0][:, 3] == -1 if hierarchy is not None else np.ones(len(contours), dtype=bool)
+            # Contornos dos componentes válidos, agrupados por label (ordem original dentro do grupo)
+            selected = np.isin(contour_labels, valid)
+            if not holes:
+                selected &= is_outer
+            kept = np.flatnonzero(selected)
+            kept = kept[np.argsort(contour_labels[kept], kind='stable')]
+        except Exception:
+            return {}
+
+        polygons = {}
+        outer = {}
+        for ci in kept.tolist():
+            label_id = int(contour_labels[ci])
+            entry = polygons.get(label_id)
+            if entry is None:
+                entry = polygons[label_id] = ([], [])
+            poly = self.build_polygon(contours[ci])
+            if poly and holes:
+                entry[1].append(poly)
+            if is_outer[ci]:
+                # Usar o maior contorno externo do componente (área só calculada se houver mais de um)
+                best = outer.get(label_id)
+                if best is None:
+                    outer[label_id] = (ci, None)
+                    entry[0][:] = poly
+                else:
+                    best_area = best[1] if best[1] is not None else cv2.contourArea(contours[best[0]])
+                    area = cv2.contourArea(contours[ci])
+                    if area > best_area:
+                        outer[label_id] = (ci, area)
+                        entry[0][:] = poly
+                    else:
+                        outer[label_id] = (best[0], best_area)
+        return polygons
+
+
+def _attach_polygons(blobs: List[Dict[str, Any]], labels: List[int], polygons: Dict[int, Tuple]) -> None:
+    """Preenche `contour`/`contours` das entradas de blob (na ordem de `labels`)."""
+    for blob_entry, label_id in zip(blobs, labels):
+        poly, all_polys = polygons.get(label_id, ([], []))
+        blob_entry['contour'] = poly
+        if all_polys:
+            blob_entry['contours'] = all_polys
+
+
+class DeferredBlobGeometry:
+    """Polígonos de um resultado com `geometry: lazy`, calculados só quando o frame é publicado.
+
+    Guarda apenas a matriz de labels do connectedComponentsWithStats e os labels válidos; a
+    imagem binária é refeita a partir dos labels (bordas de um componente não dependem dos
+    demais), então o resultado é idêntico ao do modo `full`. Serializável via pickle (farm).
+    """
+
+    __slots__ = ('labels', 'valid', 'params', 'blobs')
+
+    def __init__(self, labels: np.ndarray, valid: np.ndarray, params: PolygonParams, blobs: List[Dict[str, Any]]):
+        self.labels = labels
+        self.valid = valid
+        self.params = params
+        self.blobs = blobs
+
+    def __getstate__(self):
+        return (self.labels, self.valid, self.params, self.blobs)
+
+    def __setstate__(self, state):
+        self.labels, self.valid, self.params, self.blobs = state
+
+    def materialize(self) -> None:
+        """Calcula os polígonos e os grava nas entradas de blob do resultado (uma única vez)."""
+        if self.labels is None:
+            return
+        labels, valid = self.labels, self.valid
+        self.labels = None
+        binary = np.isin(labels, valid).view(np.uint8)
+        polygons = self.params.component_polygons(binary, labels, valid)
+        _attach_polygons(self.blobs, valid.tolist(), polygons)
+
+
+def materialize_deferred_geometry(tool_results: List[Dict[str, Any]]) -> None:
+    """Calcula (in-place) a geometria adiada dos resultados e remove a chave `deferred_geometry`."""
+    for result in tool_results or ():
+        if isinstance(result, dict):
+            deferred = result.pop('deferred_geometry', None)
+            if deferred is not None:
+                deferred.materialize()
+
 
 class BlobTool(BaseTool):
     """Ferramenta para detecção e análise de blobs"""
@@ -24,6 +173,25 @@ class BlobTool(BaseTool):
         self.contour_chain = str(config.get('contour_chain', 'SIMPLE')).upper()  # SIMPLE | NONE | TC89_L1 | TC89_KCOS
         self.approx_epsilon_ratio = float(config.get('approx_epsilon_ratio', 0.01))  # fração do perímetro; 0 desabilita
         self.polygon_max_points = int(config.get('polygon_max_points', 0))  # 0 = sem limite
+        self.polygon_params = PolygonParams(self.contour_chain, self.approx_epsilon_ratio, self.polygon_max_points)
+
+        # Geometria por blob: none | bbox | outer | full | lazy (polígonos só ao publicar)
+        self.geometry = str(config.get('geometry', 'full')).lower()
+        if self.geometry not in GEOMETRY_LEVELS:
+            print(f"⚠️ {self.name}: geometry '{self.geometry}' inválido, usando 'full'")
+            self.geometry = 'full'
+
+        # Descritores de forma: `features` (lista ou true = todos) vão para a tabela do resultado;
+        # limites `<descritor>_min/_max` filtram os blobs (os descritores filtrados também são calculados)
+        features = config.get('features') or []
+        if features is True:
+            features = list(FEATURE_NAMES)
+        unknown = [name for name in features if name not in FEATURE_NAMES]
+        if unknown:
+            print(f"⚠️ {self.name}: descritores desconhecidos ignorados: {unknown}")
+        self.feature_output = tuple(name for name in FEATURE_NAMES if name in features)
+        self.feature_limits = parse_feature_limits(config)
+        self.feature_names = resolve_features(self.feature_output + tuple(self.feature_limits))
     
     def process(self, image: np.ndarray, roi_image: np.ndarray, 
                 previous_results: Dict[int, Dict] = None) -> Dict[str, Any]:
@@ -33,33 +201,28 @@ class BlobTool(BaseTool):
         try:
             # A imagem já deve vir em grayscale da ferramenta grayscale
             # Se não estiver, converter (mas isso não deve acontecer no pipeline correto)
+            # (conversão compartilhada com as demais ferramentas do frame via cache de artefatos)
             if len(roi_image.shape) == 3:
-                print(f"    ⚠️ {self.name}: Imagem recebida em RGB/BGR, convertendo para grayscale")
-                gray_image = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY)
-            else:
-                gray_image = roi_image
+                if self.verbose:
+                    print(f"    ⚠️ {self.name}: Imagem recebida em RGB/BGR, convertendo para grayscale")
+            elif self.verbose:
                 print(f"    ✅ {self.name}: Imagem recebida em grayscale (otimizado)")
-            
-            # Aplicar máscara de ROI (quando disponível) ANTES do threshold, para eliminar áreas fora do shape
-            roi_mask = getattr(self, '_last_roi_mask', None)
-            if roi_mask is not None:
-                try:
-                    # Garantir máscara uint8
-                    if roi_mask.dtype != np.uint8:
-                        roi_mask = roi_mask.astype(np.uint8)
-                    gray_image = cv2.bitwise_and(gray_image, gray_image, mask=roi_mask)
-                except Exception:
-                    pass
+            gray_image = self.gray_roi(roi_image)
 
             # Limiarização por faixa [th_min, th_max] para detectar regiões escuras/claras conforme configurado
             # Mantém mesma interface de parâmetros, mas aplica corretamente o intervalo desejado
             lo = int(max(0, min(255, self.th_min)))
             hi = int(max(lo, min(255, self.th_max)))
-            binary = cv2.inRange(gray_image, lo, hi)
+            binary = self.cached_artifact('gray_in_range', (lo, hi), gray_image,
+                                          lambda gray: cv2.inRange(gray, lo, hi), pointwise=True)
 
-            # Aplicar máscara DEPOIS do threshold também, garantindo que contornos fiquem restritos ao shape
+            # Restringir à máscara do ROI (quando disponível) para eliminar áreas fora do shape
+            roi_mask = getattr(self, '_last_roi_mask', None)
             if roi_mask is not None:
                 try:
+                    # Garantir máscara uint8
+                    if roi_mask.dtype != np.uint8:
+                        roi_mask = roi_mask.astype(np.uint8)
                     binary = cv2.bitwise_and(binary, binary, mask=roi_mask)
                 except Exception:
                     pass
@@ -67,67 +230,38 @@ class BlobTool(BaseTool):
             # Detectar componentes conectados para contar apenas pixels na faixa (sem "preencher buracos")
             num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary, connectivity=8)
 
-            valid_blobs = []
-            total_area = 0.0
-
-            # label 0 é o fundo
-            for label_id in range(1, num_labels):
-                x = int(stats[label_id, cv2.CC_STAT_LEFT])
-                y = int(stats[label_id, cv2.CC_STAT_TOP])
-                w = int(stats[label_id, cv2.CC_STAT_WIDTH])
-                h = int(stats[label_id, cv2.CC_STAT_HEIGHT])
-                area_pixels = float(stats[label_id, cv2.CC_STAT_AREA])  # exatamente a contagem de pixels na faixa
-
-                if not (self.area_min <= area_pixels <= self.area_max):
-                    continue
-
-                cx, cy = centroids[label_id]
-                centroid = (int(round(cx)), int(round(cy)))
-                bbox = [x, y, w, h]
+            # Estatísticas convertidas em lote (label 0 é o fundo)
+            areas = stats[1:, cv2.CC_STAT_AREA]
+            keep = (areas >= self.area_min) & (areas <= self.area_max)
+            table = None
+            if self.feature_names:
+                # Tabela colunar (um array por descritor, indexado pelo label) e filtros vetorizados
+                table = compute_blob_features(labels, num_labels, stats, centroids, binary, gray_image,
+                                              self.feature_names, candidates=np.r_[False, keep])
+                if self.feature_limits:
+                    keep &= feature_mask(table, self.feature_limits, num_labels)[1:]
+            valid = np.flatnonzero(keep) + 1
+            bboxes = stats[valid, :4].tolist()
+            valid_areas = stats[valid, cv2.CC_STAT_AREA].astype(np.float64)
+            centroid_list = np.rint(centroids[valid]).astype(np.int64).tolist()
 
-                # Extrair contorno do componente para visualização (opcional)
-                try:
-                    component_mask = (labels[y:y+h, x:x+w] == label_id).astype(np.uint8) * 255
-                    # Encontrar contornos com hierarquia para identificar externos e buracos
-                    comp_contours, hierarchy = cv2.findContours(component_mask, cv2.RETR_CCOMP, self._chain_mode())
-                    outer_contours = []
-                    all_polys = []
-                    if comp_contours is not None and len(comp_contours) > 0:
-                        if hierarchy is not None and len(hierarchy) > 0:
-                            hierarchy = hierarchy[0]
-                        else:
-                            hierarchy = [[-1, -1, -1, -1] for _ in range(len(comp_contours))]
-
-                        for ci, cnt in enumerate(comp_contours):
-                            poly_i = self._build_polygon_from_contour(cnt)
-                            if poly_i:
-                                poly_i = [[int(px + x), int(py + y)] for px, py in poly_i]
-                                all_polys.append(poly_i)
-                            if int(hierarchy[ci][3]) == -1:
-                                outer_contours.append(cnt)
-
-                    if outer_contours:
-                        # usar o maior contorno externo do componente
-                        contour = max(outer_contours, key=cv2.contourArea)
-                        poly = self._build_polygon_from_contour(contour)
-                        if poly:
-                            poly = [[int(px + x), int(py + y)] for px, py in poly]
-                    else:
-                        poly = []
-                except Exception:
-                    poly = []
-                    all_polys = []
-
-                blob_entry = {
-                    'area': float(area_pixels),
-                    'centroid': centroid,
+            valid_blobs = [
+                {
+                    'area': area_pixels,  # exatamente a contagem de pixels na faixa
+                    'centroid': tuple(centroid),
                     'bounding_box': bbox,
-                    'contour': poly
+                    'contour': self._bbox_polygon(bbox) if self.geometry == 'bbox' else []
                 }
-                if 'all_polys' in locals() and all_polys:
-                    blob_entry['contours'] = all_polys
-                valid_blobs.append(blob_entry)
-                total_area += area_pixels
+                for bbox, area_pixels, centroid in zip(bboxes, valid_areas.tolist(), centroid_list)
+            ]
+            deferred = None
+            if valid.size and self.geometry in ('outer', 'full'):
+                polygons = self.polygon_params.component_polygons(binary, labels, valid,
+                                                                   holes=self.geometry == 'full')
+                _attach_polygons(valid_blobs, valid.tolist(), polygons)
+            elif valid.size and self.geometry == 'lazy':
+                deferred = DeferredBlobGeometry(labels, valid, self.polygon_params, valid_blobs)
+            total_area = float(valid_areas.sum())
             
             # Calcular área do ROI para referência
             roi_area = roi_image.shape[0] * roi_image.shape[1]
@@ -137,7 +271,7 @@ class BlobTool(BaseTool):
             
             processing_time = (time.time() - start_time) * 1000  # em milissegundos
             
-            return {
+            result = {
                 'tool_id': self.id,
                 'tool_name': self.name,
                 'tool_type': self.type,
@@ -146,9 +280,17 @@ class BlobTool(BaseTool):
                 'blob_count': len(valid_blobs),
                 'total_area': float(total_area),  # Garantir que seja float
                 'roi_area': float(roi_area),      # Garantir que seja float
+                'geometry': self.geometry,
                 'test_results': test_results,
                 'pass_fail': test_results['overall_pass'] if self.inspec_pass_fail else None
             }
+            if self.feature_output:
+                # Tabela colunar: uma lista por descritor, na ordem de `blobs`
+                result['features'] = {name: table[name][valid].tolist() for name in self.feature_output}
+            if deferred is not None:
+                # Polígonos calculados só se o frame for publicado/logado (materialize_deferred_geometry)
+                result['deferred_geometry'] = deferred
+            return result
             
         except Exception as e:
             processing_time = (time.time() - start_time) * 1000
@@ -229,35 +371,20 @@ class BlobTool(BaseTool):
 
     def _chain_mode(self) -> int:
         """Mapeia configuração de cadeia de contorno para constante do OpenCV."""
-        mode = self.contour_chain
-        if mode == 'NONE':
-            return cv2.CHAIN_APPROX_NONE
-        if mode == 'TC89_L1':
-            return cv2.CHAIN_APPROX_TC89_L1
-        if mode == 'TC89_KCOS':
-            return cv2.CHAIN_APPROX_TC89_KCOS
-        return cv2.CHAIN_APPROX_SIMPLE
+        return self.polygon_params.chain_mode()
+
+    @staticmethod
+    def _bbox_polygon(bbox: List[int]) -> List[List[int]]:
+        """Retângulo (fechado) da bounding box, usado como contorno em `geometry: bbox`."""
+        x, y, w, h = bbox
+        x1, y1 = x + w - 1, y + h - 1
+        return [[x, y], [x1, y], [x1, y1], [x, y1], [x, y]]
+
+    def _component_polygons(self, binary: np.ndarray, labels: np.ndarray,
+                            valid: np.ndarray) -> Dict[int, Tuple[List[List[int]], List[List[List[int]]]]]:
+        """Polígonos dos componentes `valid` (ver PolygonParams.component_polygons)."""
+        return self.polygon_params.component_polygons(binary, labels, valid)
 
     def _build_polygon_from_contour(self, contour) -> List[List[int]]:
         """Gera polígono a partir do contorno com aproximação e amostragem opcional."""
-        try:
-            pts = contour
-            # Aproximação controlada por epsilon (0 desabilita)
-            if self.approx_epsilon_ratio and self.approx_epsilon_ratio > 0:
-                peri = max(1e-6, cv2.arcLength(contour, True))
-                epsilon = max(0.5, float(self.approx_epsilon_ratio) * peri)
-                approx = cv2.approxPolyDP(contour, epsilon, True)
-                pts = approx
-            # Converter para lista de pontos inteiros (x, y)
-            pts_xy = pts.reshape(-1, 2).astype('int32')
-            # Limitar número de pontos para performance, se configurado
-            if self.polygon_max_points and self.polygon_max_points > 0 and len(pts_xy) > self.polygon_max_points:
-                step = int(np.ceil(len(pts_xy) / float(self.polygon_max_points)))
-                pts_xy = pts_xy[::max(1, step)]
-            poly = pts_xy.tolist()
-            # Garantir fechamento do polígono
-            if len(poly) > 0 and (poly[0][0] != poly[-1][0] or poly[0][1] != poly[-1][1]):
-                poly.append(poly[0])
-            return poly
-        except Exception:
-            return []
+        return self.polygon_params.build_polygon(contour)
@@ -22,13 +22,11 @@ class BlurFilterTool(BaseTool):
             k = max(3, self.ksize | 1)
             if self.method == 'median':
                 # Median blur requer imagem de 1 ou 3 canais
-                if len(roi_image.shape) == 2:
-                    out = cv2.medianBlur(roi_image, k)
-                else:
-                    out = cv2.medianBlur(roi_image, k)
+                out = self.cached_artifact('median_blur', (k,), roi_image, lambda img: cv2.medianBlur(img, k))
             else:
                 # Gaussian por padrão
-                out = cv2.GaussianBlur(roi_image, (k, k), self.sigma)
+                out = self.cached_artifact('gaussian_blur', (k, self.sigma), roi_image,
+                                           lambda img: cv2.GaussianBlur(img, (k, k), self.sigma))
 
             self.last_processing_time = (time.time() - start_time) * 1000
             return out
@@ -36,6 +34,9 @@ class BlurFilterTool(BaseTool):
             self.last_processing_time = (time.time() - start_time) * 1000
             return roi_image
 
+    def gray_equivalent(self) -> bool:
+        return True
+
     def validate_config(self) -> bool:
         return True
 
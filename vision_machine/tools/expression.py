@@ -0,0 +1,212 @@
+"""Expressões seguras para fórmulas sobre resultados de ferramentas (MathTool).
+
+A fórmula é analisada uma única vez (`ast`): só números, operadores aritméticos, comparações,
+`and`/`or`/`not`, `a if cond else b` e as funções de `FUNCTIONS` são aceitos. Cada variável
+vira um vínculo pré-resolvido (ferramenta, caminho de campos) e a árvore validada é compilada
+para bytecode; por frame restam apenas as leituras dos campos e um `eval` sem builtins.
+
+Variáveis:
+- `total_area`: campo do resultado da ferramenta de referência (`reference_tool_id`)
+- `t3.blob_count`: campo do resultado da ferramenta de id 3
+- `test_results.overall_pass`: campos aninhados com ponto
+- `blobs.area`, `t3.edges.strength`, `features.circularity`: listas viram arrays NumPy
+  (uma coluna por campo), para uso nas funções de agregação (`mean(blobs.area)`)
+
+Todos os valores são convertidos para float (ou arrays float64), o que também impede
+inteiros gigantes em potências.
+"""
+import ast
+import math
+import re
+from operator import itemgetter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+_TOOL_ALIAS_RE = re.compile(r'^t(\d+)$')
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call,
+    ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+
+def _aggregate(reducer, empty: float):
+    """Agregação sobre um array (`mean(blobs.area)`) ou sobre vários escalares (`max(a, b)`)."""
+    def apply(*args):
+        if not args:
+            raise ValueError("função de agregação sem argumentos")
+        values = np.asarray(args[0] if len(args) == 1 else args, dtype=np.float64)
+        if values.ndim == 0:
+            return float(values)
+        if values.size == 0:
+            return empty
+        return float(reducer(values))
+    return apply
+
+
+def _count(values) -> float:
+    return float(np.size(values))
+
+
+def _clip(value, lo, hi):
+    out = np.clip(value, lo, hi)
+    return float(out) if np.ndim(out) == 0 else out
+
+
+FUNCTIONS = {
+    'min': _aggregate(np.min, math.nan),
+    'max': _aggregate(np.max, math.nan),
+    'mean': _aggregate(np.mean, math.nan),
+    'median': _aggregate(np.median, math.nan),
+    'std': _aggregate(np.std, math.nan),
+    'sum': _aggregate(np.sum, 0.0),
+    'count': _count,
+    'abs': np.abs,
+    'sqrt': np.sqrt,
+    'clip': _clip,
+}
+CONSTANTS = {'pi': math.pi}
+
+
+class Binding(NamedTuple):
+    """Variável da fórmula: campo `path` do resultado da ferramenta `tool_id`."""
+    tool_id: Any
+    path: Tuple[str, ...]
+
+
+def _as_number(value: Any, text: str):
+    if isinstance(value, (bool, int, float, np.generic)):
+        return float(value)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        try:
+            return np.asarray(value, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"campo '{text}' é uma lista de objetos; use {text}.<campo>") from None
+    raise ValueError(f"campo '{text}' não é numérico")
+
+
+def _column(items: List[Any], path: Tuple[str, ...], text: str):
+    """Coluna `path` de uma lista de dicts (ex.: área de cada blob) como array float64."""
+    try:
+        if len(path) == 1:
+            column = list(map(itemgetter(path[0]), items))
+        else:
+            column = [_resolve(item, path, text) for item in items]
+        return np.asarray(column, dtype=np.float64)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"campo '{text}' ausente ou não numérico nos itens da lista") from e
+
+
+def _resolve(value: Any, path: Tuple[str, ...], text: str):
+    for i, key in enumerate(path):
+        if isinstance(value, dict):
+            if key not in value:
+                raise ValueError(f"campo '{text}' não encontrado")
+            value = value[key]
+        elif isinstance(value, list):
+            return _column(value, path[i:], text)
+        else:
+            raise ValueError(f"campo '{text}' não encontrado")
+    return _as_number(value, text)
+
+
+class Expression:
+    """Fórmula compilada; `evaluate(results)` lê os campos vinculados e calcula o valor."""
+
+    def __init__(self, text: str, default_tool_id: Optional[Any] = None):
+        self.text = text
+        self.default_tool_id = default_tool_id
+        self.bindings: List[Binding] = []
+        self._names: List[str] = []
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Fórmula inválida '{text}': {e.msg}") from None
+        tree = self._bind(tree)
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ValueError(f"Fórmula '{text}': construção não permitida ({type(node).__name__})")
+            if isinstance(node, ast.Constant) and (isinstance(node.value, str) or node.value is None):
+                raise ValueError(f"Fórmula '{text}': apenas constantes numéricas são permitidas")
+        ast.fix_missing_locations(tree)
+        self._code = compile(tree, '<formula>', 'eval')
+        self._globals = {'__builtins__': {}, **FUNCTIONS, **CONSTANTS}
+        # Ferramentas lidas pela fórmula (dependências no plano de execução), sem repetição
+        self.tool_ids: Tuple[Any, ...] = tuple(dict.fromkeys(b.tool_id for b in self.bindings))
+
+    def _bind(self, tree: ast.Expression) -> ast.Expression:
+        """Troca cada variável (nome ou cadeia `a.b.c`) por um nome interno `_vN`."""
+        expression = self
+
+        class _Binder(ast.NodeTransformer):
+            def visit_Call(self, node: ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                    raise ValueError(f"Fórmula '{expression.text}': função não permitida")
+                if node.keywords or any(isinstance(a, ast.Starred) for a in node.args):
+                    raise ValueError(f"Fórmula '{expression.text}': argumentos nomeados não são permitidos")
+                node.args = [self.visit(a) for a in node.args]
+                return node
+
+            def visit_Attribute(self, node: ast.Attribute):
+                return expression._variable(node)
+
+            def visit_Name(self, node: ast.Name):
+                if node.id in CONSTANTS:
+                    return node
+                return expression._variable(node)
+
+            def visit_Constant(self, node: ast.Constant):
+                # Números como float: sem inteiros de precisão arbitrária
+                if isinstance(node.value, int) and not isinstance(node.value, bool):
+                    return ast.copy_location(ast.Constant(float(node.value)), node)
+                return node
+
+        return _Binder().visit(tree)
+
+    def _variable(self, node: ast.AST) -> ast.Name:
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            raise ValueError(f"Fórmula '{self.text}': variável inválida")
+        parts.append(node.id)
+        parts.reverse()
+        if any(part.startswith('__') for part in parts):
+            raise ValueError(f"Fórmula '{self.text}': nomes com '__' não são permitidos")
+        if parts[0] in FUNCTIONS:
+            raise ValueError(f"Fórmula '{self.text}': '{parts[0]}' é uma função")
+        alias = _TOOL_ALIAS_RE.match(parts[0])
+        if alias:
+            if len(parts) < 2:
+                raise ValueError(f"Fórmula '{self.text}': use {parts[0]}.<campo>")
+            binding = Binding(int(alias.group(1)), tuple(parts[1:]))
+        else:
+            if self.default_tool_id is None:
+                raise ValueError(f"Fórmula '{self.text}': '{parts[0]}' exige reference_tool_id (ou use t<id>.{parts[0]})")
+            binding = Binding(self.default_tool_id, tuple(parts))
+        name = f'_v{len(self.bindings)}'
+        self.bindings.append(binding)
+        self._names.append('.'.join(parts))
+        return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+
+    def evaluate(self, results: Dict[Any, Dict[str, Any]]):
+        """Valor da fórmula (float, bool ou array) sobre os resultados já calculados do frame."""
+        values = {}
+        for i, (tool_id, path) in enumerate(self.bindings):
+            result = results.get(tool_id)
+            if not isinstance(result, dict):
+                raise ValueError(f"Resultado da ferramenta {tool_id} não encontrado")
+            values[f'_v{i}'] = _resolve(result, path, self._names[i])
+        return eval(self._code, self._globals, values)
+
+
+def compile_expression(text: str, default_tool_id: Optional[Any] = None) -> Expression:
+    """Analisa e compila `text` (ValueError com a causa quando a fórmula é inválida)."""
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("Fórmula vazia")
+    return Expression(text, default_tool_id)
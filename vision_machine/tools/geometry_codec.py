@@ -0,0 +1,274 @@
+"""Codificação compacta da geometria dos resultados (blobs e bordas da Locate) para publicação.
+
+Os resultados em memória continuam com listas Python; `pack_tool_results` gera cópias rasas
+em que `blobs`/`edges` viram `blobs_packed`/`edges_packed` e `unpack_tool_result` faz o
+caminho inverso (sem perdas). O frontend decodifica o mesmo formato (utils/geometryCodec.js).
+
+Blobs (`codec: "vmgeo1"`): um único fluxo de varints zigzag em base64 com, nesta ordem,
+as colunas `area`, `bx`, `by` (delta em relação ao blob anterior), `bw`, `bh`, `cx - bx`,
+`cy - by`, `n_polys`, `contour_ref` (índice + 1 do contorno externo em `polys`; 0 = vazio) e
+`has_contours`; depois o número de pontos de cada polígono (negativo quando fechado: o ponto
+final repetido é omitido) e, por fim, os pontos: o primeiro relativo ao canto da bounding box
+e os demais como delta do ponto anterior.
+
+Bordas (`codec: "vmcol1"`): tabela colunar float64 em base64 (n x campos); campos texto são
+índices em uma tabela de valores. O cabeçalho de campos só compensa a partir de algumas bordas:
+com poucas, `edges` segue como JSON (ver `_edges_pay_off`).
+"""
+import base64
+import json
+from itertools import chain
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+BLOB_CODEC = 'vmgeo1'
+EDGE_CODEC = 'vmcol1'
+GEOMETRY_ENCODINGS = ('packed', 'json')
+
+_BLOB_KEYS = frozenset(('area', 'centroid', 'bounding_box', 'contour', 'contours'))
+_BLOB_COLUMNS = 10
+
+
+def _zigzag_varints(values: np.ndarray) -> bytes:
+    """Inteiros com sinal -> varints zigzag (7 bits por byte), vetorizado."""
+    values = np.asarray(values, dtype=np.int64)
+    if values.size == 0:
+        return b''
+    z = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+    nbytes = np.ones(z.size, dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += z >= np.uint64(1 << (7 * k))
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    offsets = np.cumsum(nbytes) - nbytes
+    for k in range(int(nbytes.max())):
+        sel = nbytes > k
+        chunk = ((z[sel] >> np.uint64(7 * k)) & np.uint64(0x7F)).astype(np.uint8)
+        chunk |= (nbytes[sel] > k + 1).astype(np.uint8) << 7
+        out[offsets[sel] + k] = chunk
+    return out.tobytes()
+
+
+def _read_varints(data: bytes) -> np.ndarray:
+    """Inverso de `_zigzag_varints`."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if raw.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero((raw & 0x80) == 0)
+    starts = np.r_[0, ends[:-1] + 1]
+    position = np.arange(raw.size) - np.repeat(starts, ends - starts + 1)
+    parts = (raw & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    z = np.add.reduceat(parts, starts)
+    return ((z >> np.uint64(1)).astype(np.int64)) ^ -((z & np.uint64(1)).astype(np.int64))
+
+
+def _blob_polygons(blob: Dict[str, Any]) -> Optional[tuple]:
+    """(polígonos, contour_ref, has_contours) ou None quando o blob não é codificável."""
+    contour = blob.get('contour') or []
+    contours = blob.get('contours')
+    if contours is None:
+        return ([contour], 1, 0) if contour else ([], 0, 0)
+    if not contour:
+        return contours, 0, 1
+    for i, poly in enumerate(contours):
+        if poly == contour:
+            return contours, i + 1, 1
+    return None
+
+
+def pack_blobs(blobs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Codifica a lista `blobs` do BlobTool; None quando algum blob foge do formato padrão."""
+    columns = np.zeros((_BLOB_COLUMNS, len(blobs)), dtype=np.int64)
+    polygons = []
+    for i, blob in enumerate(blobs):
+        if not _BLOB_KEYS.issuperset(blob):
+            return None
+        area = blob.get('area', 0)
+        if area != int(area):
+            return None
+        entry = _blob_polygons(blob)
+        if entry is None:
+            return None
+        polys, contour_ref, has_contours = entry
+        bx, by, bw, bh = blob['bounding_box']
+        cx, cy = blob['centroid']
+        columns[:, i] = (area, bx, by, bw, bh, cx - bx, cy - by, len(polys), contour_ref, has_contours)
+        polygons.append(polys)
+    # Canto da bounding box como delta do blob anterior (blobs seguem a ordem de varredura)
+    corners = columns[1:3].copy()
+    columns[1:3, 1:] = np.diff(corners, axis=1)
+
+    all_polys = list(chain.from_iterable(polygons))
+    # Polígonos fechados (último ponto = primeiro) não repetem o ponto final: contagem negativa
+    closed = np.fromiter((len(p) > 1 and p[0] == p[-1] for p in all_polys), dtype=bool, count=len(all_polys))
+    sizes = np.fromiter((len(p) for p in all_polys), dtype=np.int64, count=len(all_polys))
+    points = np.fromiter(chain.from_iterable(chain.from_iterable(all_polys)), dtype=np.int64,
+                         count=int(sizes.sum()) * 2).reshape(-1, 2)
+    counts = np.where(closed, -(sizes - 1), sizes)
+    if points.size:
+        ends = np.cumsum(sizes)
+        points = np.delete(points, ends[closed] - 1, axis=0)
+        kept = np.abs(counts)
+        # Primeiro ponto de cada polígono relativo ao canto do seu blob; demais como delta
+        poly_starts = np.cumsum(kept) - kept
+        poly_blob = np.repeat(np.arange(len(blobs)), columns[7])
+        deltas = np.diff(points, axis=0, prepend=points[:1])
+        deltas[poly_starts] = points[poly_starts] - corners.T[poly_blob]
+        points = deltas
+    stream = np.concatenate((columns.ravel(), counts, points.ravel()))
+    return {
+        'codec': BLOB_CODEC,
+        'count': len(blobs),
+        'data': base64.b64encode(_zigzag_varints(stream)).decode('ascii'),
+    }
+
+
+def unpack_blobs(packed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Inverso de `pack_blobs`."""
+    if packed.get('codec') != BLOB_CODEC:
+        raise ValueError(f"Codec de blobs desconhecido: {packed.get('codec')}")
+    n = int(packed.get('count', 0))
+    stream = _read_varints(base64.b64decode(packed.get('data', '')))
+    columns = stream[:_BLOB_COLUMNS * n].reshape(_BLOB_COLUMNS, n)
+    columns[1:3] = np.cumsum(columns[1:3], axis=1)
+    n_polys = int(columns[7].sum())
+    offset = _BLOB_COLUMNS * n
+    counts = stream[offset:offset + n_polys]
+    deltas = stream[offset + n_polys:].reshape(-1, 2)
+    kept = np.abs(counts)
+    poly_starts = np.cumsum(kept) - kept
+    poly_blob = np.repeat(np.arange(n), columns[7])
+    # Pontos absolutos: soma acumulada reiniciada no início de cada polígono
+    deltas[poly_starts] += columns[1:3].T[poly_blob]
+    points = np.cumsum(deltas, axis=0)
+    if poly_starts.size:
+        offsets = points[poly_starts] - deltas[poly_starts]
+        points -= np.repeat(offsets, kept, axis=0)
+    # Reabrir fechamento: repetir o primeiro ponto ao final dos polígonos fechados
+    flat = points.tolist()
+    polys = []
+    for start, size, closed in zip(poly_starts.tolist(), kept.tolist(), (counts < 0).tolist()):
+        poly = flat[start:start + size]
+        if closed:
+            poly.append(poly[0])
+        polys.append(poly)
+    blobs = []
+    poly_index = 0
+    for area, bx, by, bw, bh, dcx, dcy, count, contour_ref, has_contours in columns.T.tolist():
+        blob_polys = polys[poly_index:poly_index + count]
+        poly_index += count
+        blob = {
+            'area': float(area),
+            'centroid': [bx + dcx, by + dcy],
+            'bounding_box': [bx, by, bw, bh],
+            'contour': blob_polys[contour_ref - 1] if contour_ref else [],
+        }
+        if has_contours:
+            blob['contours'] = blob_polys
+        blobs.append(blob)
+    return blobs
+
+
+def pack_edges(edges: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Codifica a lista `edges` da Locate em colunas; None quando os campos não são uniformes."""
+    if not edges:
+        return None
+    names = list(edges[0])
+    fields = []
+    table = np.zeros((len(edges), len(names)), dtype=np.float64)
+    for j, name in enumerate(names):
+        try:
+            values = [edge[name] for edge in edges]
+        except (KeyError, TypeError):
+            return None
+        if all(isinstance(v, str) for v in values):
+            labels = sorted(set(values))
+            index = {label: k for k, label in enumerate(labels)}
+            table[:, j] = [index[v] for v in values]
+            fields.append([name, 's', labels])
+        elif all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            table[:, j] = values
+            fields.append([name, 'i'])
+        elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            table[:, j] = values
+            fields.append([name, 'f'])
+        else:
+            return None
+    if any(len(edge) != len(names) for edge in edges):
+        return None
+    return {
+        'codec': EDGE_CODEC,
+        'count': len(edges),
+        'fields': fields,
+        'data': base64.b64encode(table.astype('<f8').tobytes()).decode('ascii'),
+    }
+
+
+def unpack_edges(packed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Inverso de `pack_edges`."""
+    if packed.get('codec') != EDGE_CODEC:
+        raise ValueError(f"Codec de bordas desconhecido: {packed.get('codec')}")
+    fields = packed.get('fields', [])
+    table = np.frombuffer(base64.b64decode(packed.get('data', '')), dtype='<f8').reshape(-1, len(fields))
+    columns = []
+    for j, field in enumerate(fields):
+        values = table[:, j].tolist()
+        if field[1] == 's':
+            values = [field[2][int(v)] for v in values]
+        elif field[1] == 'i':
+            values = [int(v) for v in values]
+        columns.append(values)
+    names = [field[0] for field in fields]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _edges_pay_off(edges: List[Dict[str, Any]], packed: Dict[str, Any]) -> bool:
+    """Se a forma codificada é menor que a lista JSON (estimada pela primeira borda: os campos
+    são uniformes)."""
+    row = len(json.dumps(edges[0])) + 2
+    return len(json.dumps(packed)) < row * len(edges)
+
+
+def pack_tool_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia rasa do resultado com `blobs`/`edges` codificados (o original não é alterado).
+
+    Nunca falha: geometria fora do formato esperado segue como JSON comum.
+    """
+    if not isinstance(result, dict):
+        return result
+    packed = None
+    try:
+        if isinstance(result.get('blobs'), list) and result['blobs']:
+            blobs = pack_blobs(result['blobs'])
+            if blobs is not None:
+                packed = dict(result)
+                del packed['blobs']
+                packed['blobs_packed'] = blobs
+        if isinstance(result.get('edges'), list) and result['edges']:
+            edges = pack_edges(result['edges'])
+            if edges is not None and _edges_pay_off(result['edges'], edges):
+                packed = packed or dict(result)
+                del packed['edges']
+                packed['edges_packed'] = edges
+    except (TypeError, ValueError, KeyError, AttributeError, OverflowError):
+        return result
+    return packed or result
+
+
+def unpack_tool_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverso de `pack_tool_result` (resultados sem geometria codificada voltam intactos)."""
+    if not isinstance(result, dict) or ('blobs_packed' not in result and 'edges_packed' not in result):
+        return result
+    result = dict(result)
+    if 'blobs_packed' in result:
+        result['blobs'] = unpack_blobs(result.pop('blobs_packed'))
+    if 'edges_packed' in result:
+        result['edges'] = unpack_edges(result.pop('edges_packed'))
+    return result
+
+
+def pack_tool_results(tool_results: List[Dict[str, Any]], encoding: str = 'packed') -> List[Dict[str, Any]]:
+    """Aplica `pack_tool_result` à lista conforme `geometry_encoding` da receita (`packed` | `json`)."""
+    if encoding == 'json' or not tool_results:
+        return tool_results
+    return [pack_tool_result(result) for result in tool_results]
@@ -22,7 +22,7 @@ class GrayscaleTool(BaseTool):
             if len(roi_image.shape) == 3:  # RGB/BGR
                 if self.method == 'luminance':
                     # Fórmula de luminância: 0.299*R + 0.587*G + 0.114*B
-                    gray = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY)
+                    gray = self.gray_roi(roi_image)
                 elif self.method == 'average':
                     gray = np.mean(roi_image, axis=2).astype(np.uint8)
                 elif self.method == 'weighted':
@@ -30,7 +30,7 @@ class GrayscaleTool(BaseTool):
                     weights = [0.3, 0.5, 0.2]  # B, G, R
                     gray = np.average(roi_image, axis=2, weights=weights).astype(np.uint8)
                 else:
-                    gray = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY)
+                    gray = self.gray_roi(roi_image)
             else:
                 # Se já for grayscale, converter para 3 canais primeiro
                 if len(roi_image.shape) == 2:
@@ -54,6 +54,25 @@ class GrayscaleTool(BaseTool):
             print(f"❌ Erro na ferramenta Grayscale {self.name}: {str(e)}")
             return roi_image
     
+    def gray_equivalent(self) -> bool:
+        # A média ponderada sobre canais iguais pode arredondar para baixo
+        return self.method != 'weighted'
+
+    def is_point_op(self) -> bool:
+        return True
+
+    def lut_input(self, roi_image: np.ndarray):
+        if len(roi_image.shape) == 3:
+            # average/weighted têm arredondamento próprio: só a luminância vira cinza compartilhado
+            return self.gray_roi(roi_image) if self.method not in ('average', 'weighted') else None
+        return super().lut_input(roi_image)
+
+    def point_lut(self, input_hist):
+        # Sobre cinza a conversão é a identidade; a normalização é a LUT do equalizeHist
+        if not self.normalize:
+            return np.arange(256, dtype=np.uint8)
+        return equalize_hist_lut(input_hist())
+
     def validate_config(self) -> bool:
         """Valida a configuração da ferramenta"""
         valid_methods = ['luminance', 'average', 'weighted']
@@ -61,3 +80,22 @@ class GrayscaleTool(BaseTool):
             print(f"❌ Método inválido para GrayscaleTool: {self.method}")
             return False
         return True
+
+
+def equalize_hist_lut(hist: np.ndarray) -> np.ndarray:
+    """LUT idêntica à usada internamente por cv2.equalizeHist para o histograma informado."""
+    hist = np.asarray(hist, dtype=np.int64).ravel()
+    lut = np.zeros(256, dtype=np.uint8)
+    nonzero = np.flatnonzero(hist)
+    if nonzero.size == 0:
+        return lut
+    first = int(nonzero[0])
+    total = int(hist.sum())
+    if hist[first] == total:
+        # Imagem constante: equalizeHist mantém o valor
+        lut[:] = first
+        return lut
+    scale = np.float32(255.0) / np.float32(total - hist[first])
+    sums = np.cumsum(hist[first + 1:]).astype(np.float32)
+    lut[first + 1:] = np.clip(np.rint(sums * scale), 0, 255).astype(np.uint8)
+    return lut
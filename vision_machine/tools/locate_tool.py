@@ -21,8 +21,13 @@ class LocateTool(BaseTool):
       - edge_select: 'first' | 'strongest' | 'closest_to_mid' (padrão 'strongest')
       - smooth_ksize: int (ímpar, padrão 5) suavização 1D do perfil
       - grad_kernel: int (1,3,5; padrão 3) janela para Sobel no cálculo de ângulo 2D
+      - subpixel: bool (padrão false) posição da borda refinada entre amostras
       - reference: { x: float, y: float, angle | angle_deg: float }  (opcional)
       - rotate: bool (opcional; se true, offset inclui rotação; senão mantém ângulo da referência)
+      - caliper_count: int (padrão 1) raios paralelos à seta; > 1 ativa o modo caliper
+      - caliper_width: float (padrão 10) largura (px) da faixa coberta pelos raios
+      - caliper_mode: 'average' | 'fit' (padrão 'average') perfil médio dos raios ou
+        uma borda por raio com ajuste de reta
     """
 
     def __init__(self, config: Dict[str, Any]):
@@ -35,6 +40,8 @@ class LocateTool(BaseTool):
         self.edge_select = str(config.get('edge_select', 'strongest')).lower()
         self.smooth_ksize = int(config.get('smooth_ksize', 5))
         self.grad_kernel = int(config.get('grad_kernel', 3))
+        # Refinamento sub-pixel da posição da borda (opcional: muda x/y/offset das referências já capturadas)
+        self.subpixel = bool(config.get('subpixel', False))
         # Echo de apply_transform no result (valor de config)
         try:
             self.apply_transform = bool(config.get('apply_transform', False))
@@ -47,6 +54,12 @@ class LocateTool(BaseTool):
             self.rotate = bool(config.get('rotate', False))
         except Exception:
             self.rotate = False
+        # Modo caliper: N raios paralelos amostrados juntos (bilinear) numa faixa em torno da seta
+        self.caliper_count = max(1, int(config.get('caliper_count', 1)))
+        self.caliper_width = max(0.0, float(config.get('caliper_width', 10.0)))
+        self.caliper_mode = str(config.get('caliper_mode', 'average')).lower()
+        if self.caliper_mode not in ('average', 'fit'):
+            self.caliper_mode = 'average'
 
     def process(self, image: np.ndarray, roi_image: np.ndarray,
                 previous_results: Dict[int, Dict] = None) -> Dict[str, Any]:
@@ -54,10 +67,7 @@ class LocateTool(BaseTool):
 
         try:
             # Garantir grayscale para análise
-            if len(roi_image.shape) == 3:
-                gray_roi = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY)
-            else:
-                gray_roi = roi_image
+            gray_roi = self.gray_roi(roi_image)
 
             # Obter seta (p0, p1) em coordenadas globais e convertê-las para locais do ROI
             p0_g, p1_g = self._get_arrow_points_global(image.shape)
@@ -65,75 +75,11 @@ class LocateTool(BaseTool):
             p0 = (float(p0_g[0] - x_off), float(p0_g[1] - y_off))
             p1 = (float(p1_g[0] - x_off), float(p1_g[1] - y_off))
 
-            # Amostrar intensidades ao longo da seta
-            samples_xy, intens = self._sample_along_line(gray_roi, p0, p1)
-
-            # Suavizar sinal 1D
-            intens_s = self._smooth_1d(intens, self.smooth_ksize)
-
-            # Gradiente 1D ao longo da seta
-            grad_1d = np.gradient(intens_s)
-
-            # 1) Primeira estratégia: cruzamento de nível de intensidade no valor 'threshold'
-            #    Isso permite escolher explicitamente a borda próxima a um tom desejado
-            level_T = float(max(0.0, min(255.0, self.threshold)))
-            lvl_peaks = self._find_level_crossings(intens_s, level_T)
-
-            # 2) Estratégia de gradiente (magnitude do bordo)
-            #    Usada para ranking e fallback quando não há cruzamentos de nível
-            th = self._compute_threshold(grad_1d)
-            try:
-                max_grad = float(np.max(np.abs(grad_1d))) if grad_1d.size else 0.0
-            except Exception:
-                max_grad = 0.0
-            # Ajuste de segurança: se threshold > max_grad, reduza para fração do pico
-            if max_grad > 0 and th > max_grad:
-                th = max(1.0, 0.5 * max_grad)
-
-            # Detectar picos (bordas) por gradiente
-            grad_peaks = self._find_peaks(grad_1d, th)
-            # Fallback: se nada encontrado e modo fixo, tente adaptativo
-            if not grad_peaks and self.threshold_mode != 'adaptive':
-                th_adapt = self._compute_threshold(grad_1d.astype(np.float32)) if True else th
-                grad_peaks = self._find_peaks(grad_1d, th_adapt)
-                if grad_peaks:
-                    th = th_adapt
-
-            # Escolher base inicial para seleção: priorizar cruzamentos de nível, se existirem
-            base_candidates = lvl_peaks if len(lvl_peaks) > 0 else grad_peaks
-            # Selecionar UM índice conforme política
-            selected_idx = self._select_single_edge(base_candidates, grad_1d, len(intens_s))
-            selected = [selected_idx] if selected_idx is not None else []
-
-            # Calcular ângulo local pela orientação do gradiente 2D (Sobel)
-            gx, gy = self._sobel_gradients(gray_roi)
-
-            edges: List[Dict[str, Any]] = []
-            for idx in selected:
-                px, py = samples_xy[idx]
-                # Coordenadas globais
-                gx_i = int(round(px))
-                gy_i = int(round(py))
-                gx_i = max(0, min(gx.shape[1] - 1, gx_i))
-                gy_i = max(0, min(gx.shape[0] - 1, gy_i))
-                gxi = float(gx[gy_i, gx_i])
-                gyi = float(gy[gy_i, gx_i])
-
-                # Ângulo do gradiente e do bordo (gradiente ⟂ bordo)
-                grad_ang = math.degrees(math.atan2(gyi, gxi))
-                edge_ang = self._normalize_angle(grad_ang + 90.0)
-
-                # Força do pico
-                strength = float(abs(grad_1d[idx]))
-
-                edges.append({
-                    'x': float(px + x_off),
-                    'y': float(py + y_off),
-                    'angle_deg': float(edge_ang),
-                    'polarity': self._infer_polarity_at(grad_1d[idx]),
-                    'strength': strength,
-                    't': float(idx) / max(1.0, float(len(intens_s) - 1))
-                })
+            caliper_out = None
+            if self.caliper_count > 1:
+                edges, caliper_out = self._caliper_edges(gray_roi, p0, p1, x_off, y_off)
+            else:
+                edges = self._single_ray_edges(gray_roi, p0, p1, x_off, y_off)
 
             # Escolha primária (resultado atual)
             primary = edges[0] if edges else None
@@ -165,7 +111,7 @@ class LocateTool(BaseTool):
                         'angle_deg': float(dA) if bool(self.rotate) else float(reference_out['angle_deg'])
                     }
 
-            return {
+            result = {
                 'tool_id': self.id,
                 'tool_name': self.name,
                 'tool_type': self.type,
@@ -187,6 +133,9 @@ class LocateTool(BaseTool):
                 },
                 'pass_fail': None if not self.inspec_pass_fail else True
             }
+            if caliper_out is not None:
+                result['caliper'] = caliper_out
+            return result
 
         except Exception as e:
             processing_time = (time.time() - start_time) * 1000.0
@@ -200,6 +149,204 @@ class LocateTool(BaseTool):
                 'pass_fail': False if self.inspec_pass_fail else None
             }
 
+    # ----------------------
+    # Detecção ao longo da seta
+    # ----------------------
+    def _locate_in_profile(self, intens: np.ndarray) -> Tuple[int | None, float, np.ndarray, np.ndarray]:
+        """Borda escolhida num perfil 1D de intensidades: índice da amostra (ou None), posição
+        sub-pixel (em amostras), perfil suavizado e gradiente."""
+        # Suavizar sinal 1D
+        intens_s = self._smooth_1d(intens, self.smooth_ksize)
+
+        # Gradiente 1D ao longo da seta
+        grad_1d = np.gradient(intens_s)
+
+        # 1) Primeira estratégia: cruzamento de nível de intensidade no valor 'threshold'
+        #    Isso permite escolher explicitamente a borda próxima a um tom desejado
+        level_T = float(max(0.0, min(255.0, self.threshold)))
+        lvl_peaks = self._find_level_crossings(intens_s, level_T)
+
+        # 2) Estratégia de gradiente (magnitude do bordo)
+        #    Usada para ranking e fallback quando não há cruzamentos de nível
+        th = self._compute_threshold(grad_1d)
+        try:
+            max_grad = float(np.max(np.abs(grad_1d))) if grad_1d.size else 0.0
+        except Exception:
+            max_grad = 0.0
+        # Ajuste de segurança: se threshold > max_grad, reduza para fração do pico
+        if max_grad > 0 and th > max_grad:
+            th = max(1.0, 0.5 * max_grad)
+
+        # Detectar picos (bordas) por gradiente
+        grad_peaks = self._find_peaks(grad_1d, th)
+        # Fallback: se nada encontrado e modo fixo, tente adaptativo
+        if len(grad_peaks) == 0 and self.threshold_mode != 'adaptive':
+            th_adapt = self._compute_threshold(grad_1d.astype(np.float32)) if True else th
+            grad_peaks = self._find_peaks(grad_1d, th_adapt)
+
+        # Escolher base inicial para seleção: priorizar cruzamentos de nível, se existirem
+        base_candidates = lvl_peaks if len(lvl_peaks) > 0 else grad_peaks
+        # Selecionar UM índice conforme política
+        idx = self._select_single_edge(base_candidates, grad_1d, len(intens_s))
+        if idx is None:
+            return None, 0.0, intens_s, grad_1d
+        if not self.subpixel:
+            return idx, float(idx), intens_s, grad_1d
+        if len(lvl_peaks) > 0:
+            pos = self._refine_level_crossing(intens_s, idx, level_T)
+        else:
+            pos = self._refine_peak(grad_1d, idx)
+        return idx, pos, intens_s, grad_1d
+
+    def _single_ray_edges(self, gray: np.ndarray, p0: Tuple[float, float], p1: Tuple[float, float],
+                          x_off: float, y_off: float) -> List[Dict[str, Any]]:
+        """Modo padrão: um raio (vizinho mais próximo) ao longo da seta."""
+        samples_xy, intens = self._sample_along_line(gray, p0, p1)
+        idx, pos, intens_s, grad_1d = self._locate_in_profile(intens)
+        if idx is None:
+            return []
+        px, py = self._interp_samples(samples_xy, pos)
+        # Ângulo local pela orientação do gradiente 2D (Sobel) só na vizinhança do ponto
+        gxi, gyi = self._sobel_at(gray, int(round(px)), int(round(py)))
+
+        # Ângulo do gradiente e do bordo (gradiente ⟂ bordo)
+        grad_ang = math.degrees(math.atan2(gyi, gxi))
+        edge_ang = self._normalize_angle(grad_ang + 90.0)
+        return [{
+            'x': float(px + x_off),
+            'y': float(py + y_off),
+            'angle_deg': float(edge_ang),
+            'polarity': self._infer_polarity_at(grad_1d[idx]),
+            # Força do pico
+            'strength': float(abs(grad_1d[idx])),
+            't': pos / max(1.0, float(len(intens_s) - 1))
+        }]
+
+    def _caliper_grid(self, p0: Tuple[float, float], p1: Tuple[float, float]):
+        """Grade N x L de coordenadas dos raios: linhas paralelas à seta, espaçadas na normal."""
+        x0, y0 = p0
+        dx, dy = p1[0] - x0, p1[1] - y0
+        length = max(1.0, float(math.hypot(dx, dy)))
+        num = max(10, int(round(length)))
+        ts = np.linspace(0.0, 1.0, num=num, dtype=np.float32)
+        ux, uy = dx / length, dy / length
+        # Normal à seta (à esquerda do sentido p0 -> p1 no sistema com y para baixo)
+        nx, ny = -uy, ux
+        half = self.caliper_width / 2.0
+        offsets = np.linspace(-half, half, num=self.caliper_count, dtype=np.float32)
+        map_x = (x0 + ts * dx)[None, :] + offsets[:, None] * nx
+        map_y = (y0 + ts * dy)[None, :] + offsets[:, None] * ny
+        return map_x.astype(np.float32), map_y.astype(np.float32), ts, (ux, uy), (nx, ny), offsets
+
+    def _sample_band(self, gray: np.ndarray, map_x: np.ndarray, map_y: np.ndarray) -> np.ndarray:
+        """Intensidades bilineares da grade (um único remap sobre o recorte da faixa, em float32)."""
+        h, w = gray.shape[:2]
+        bx0 = int(max(0, math.floor(float(map_x.min())) - 1))
+        by0 = int(max(0, math.floor(float(map_y.min())) - 1))
+        bx1 = int(min(w, math.ceil(float(map_x.max())) + 2))
+        by1 = int(min(h, math.ceil(float(map_y.max())) + 2))
+        if bx1 <= bx0 or by1 <= by0:
+            bx0, by0, bx1, by1 = 0, 0, w, h
+        crop = gray[by0:by1, bx0:bx1].astype(np.float32)
+        return cv2.remap(crop, map_x - bx0, map_y - by0, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    def _caliper_edges(self, gray: np.ndarray, p0: Tuple[float, float], p1: Tuple[float, float],
+                       x_off: float, y_off: float) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Modo caliper: N raios paralelos numa faixa de `caliper_width` px em torno da seta.
+
+        - average: detecção sobre o perfil médio dos raios
+        - fit: uma borda por raio e ajuste de reta pelos pontos (ponto = interseção com a seta;
+          ângulo = direção da reta); com menos de 2 raios com borda, usa o perfil médio
+        O ângulo do modo average vem dos gradientes da própria faixa (ao longo e através dos raios).
+        """
+        map_x, map_y, ts, (ux, uy), (nx, ny), offsets = self._caliper_grid(p0, p1)
+        band = self._sample_band(gray, map_x, map_y)
+        length = max(1.0, float(math.hypot(p1[0] - p0[0], p1[1] - p0[1])))
+        step_t = length / max(1.0, float(len(ts) - 1))
+        step_s = float(offsets[1] - offsets[0]) if len(offsets) > 1 else 1.0
+        caliper_out = {
+            'count': int(self.caliper_count),
+            'width': float(self.caliper_width),
+            'mode': self.caliper_mode,
+        }
+        n = len(ts)
+
+        def _edge(t_idx: float, grad_value: float, angle: float) -> Dict[str, Any]:
+            t = float(t_idx) / max(1.0, float(n - 1))
+            return {
+                'x': float(p0[0] + t * (p1[0] - p0[0]) + x_off),
+                'y': float(p0[1] + t * (p1[1] - p0[1]) + y_off),
+                'angle_deg': float(self._normalize_angle(angle)),
+                'polarity': self._infer_polarity_at(grad_value),
+                'strength': float(abs(grad_value)),
+                't': t
+            }
+
+        if self.caliper_mode == 'fit':
+            fitted = self._fit_caliper(band, map_x, map_y, (ux, uy), p0, p1)
+            if fitted is not None:
+                t_idx, grad_value, angle, points, rms = fitted
+                caliper_out['points'] = [[float(x + x_off), float(y + y_off)] for x, y in points]
+                caliper_out['fit_rms'] = float(rms)
+                return [_edge(t_idx, grad_value, angle)], caliper_out
+
+        idx, pos, _, grad_1d = self._locate_in_profile(band.mean(axis=0))
+        if idx is None:
+            return [], caliper_out
+        # Gradiente 2D da faixa na coluna da borda: ao longo (t) e através (s) dos raios
+        band_s = self._smooth_rows(band)
+        lo, hi = max(0, idx - 1), min(n - 1, idx + 1)
+        g_t = float(np.mean(band_s[:, hi] - band_s[:, lo])) / max(1e-6, (hi - lo) * step_t)
+        g_s = float(np.mean(np.gradient(band_s[:, idx]))) / max(1e-6, step_s)
+        gxi = g_t * ux + g_s * nx
+        gyi = g_t * uy + g_s * ny
+        edge_ang = math.degrees(math.atan2(gyi, gxi)) + 90.0
+        return [_edge(pos, float(grad_1d[idx]), edge_ang)], caliper_out
+
+    def _fit_caliper(self, band: np.ndarray, map_x: np.ndarray, map_y: np.ndarray,
+                     u: Tuple[float, float], p0: Tuple[float, float], p1: Tuple[float, float]):
+        """Borda por raio + reta ajustada. Retorna (índice em t, gradiente, ângulo, pontos, rms) ou None."""
+        points = []
+        grads = []
+        for row in range(band.shape[0]):
+            idx, pos, _, grad_1d = self._locate_in_profile(band[row])
+            if idx is None:
+                continue
+            # A grade é linear ao longo do raio: posição sub-pixel por interpolação das pontas
+            frac = pos / max(1.0, float(band.shape[1] - 1))
+            points.append((float(map_x[row, 0] + frac * (map_x[row, -1] - map_x[row, 0])),
+                           float(map_y[row, 0] + frac * (map_y[row, -1] - map_y[row, 0]))))
+            grads.append(float(grad_1d[idx]))
+        if len(points) < 2:
+            return None
+        pts = np.asarray(points, dtype=np.float32)
+        vx, vy, cx, cy = (float(v) for v in cv2.fitLine(pts, cv2.DIST_L2, 0, 0.01, 0.01).ravel())
+        # Interseção da reta com a seta: p0 + a·(p1 - p0) = c + b·v
+        dx, dy = p1[0] - p0[0], p1[1] - p0[1]
+        det = dx * (-vy) - dy * (-vx)
+        if abs(det) < 1e-9:
+            return None
+        rx, ry = cx - p0[0], cy - p0[1]
+        a = (rx * (-vy) - ry * (-vx)) / det
+        if not -0.05 <= a <= 1.05:
+            return None
+        grad_value = float(np.mean(grads))
+        # Sentido da reta coerente com a convenção ângulo do bordo = ângulo do gradiente + 90°
+        gx, gy = (u[0], u[1]) if grad_value >= 0 else (-u[0], -u[1])
+        if vx * (-gy) + vy * gx < 0:
+            vx, vy = -vx, -vy
+        residuals = (pts[:, 0] - cx) * (-vy) + (pts[:, 1] - cy) * vx
+        rms = float(np.sqrt(np.mean(residuals * residuals)))
+        t_idx = min(1.0, max(0.0, a)) * (band.shape[1] - 1)
+        return t_idx, grad_value, math.degrees(math.atan2(vy, vx)), points, rms
+
+    def _smooth_rows(self, band: np.ndarray) -> np.ndarray:
+        """Suavização 1D (mesmo kernel do perfil) de cada raio da faixa."""
+        k = int(self.smooth_ksize) if int(self.smooth_ksize) % 2 == 1 else int(self.smooth_ksize) + 1
+        if k < 3:
+            return band
+        return cv2.GaussianBlur(band, (k, 1), 0)
+
     # ----------------------
     # Utilidades internas
     # ----------------------
@@ -221,7 +368,8 @@ class LocateTool(BaseTool):
         p1 = _pt('p1', default_p1)
         return p0, p1
 
-    def _sample_along_line(self, gray: np.ndarray, p0: Tuple[float, float], p1: Tuple[float, float]) -> Tuple[List[Tuple[float, float]], np.ndarray]:
+    def _sample_along_line(self, gray: np.ndarray, p0: Tuple[float, float], p1: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Coordenadas (n x 2, float) e intensidades das amostras ao longo da seta."""
         x0, y0 = p0
         x1, y1 = p1
         dx = x1 - x0
@@ -232,12 +380,27 @@ class LocateTool(BaseTool):
         xs = x0 + ts * dx
         ys = y0 + ts * dy
 
+        if self.subpixel:
+            # Bilinear: o perfil acompanha a posição real das amostras (necessário para o sub-pixel)
+            h, w = gray.shape[:2]
+            xs_c = np.clip(xs, 0.0, w - 1.0)
+            ys_c = np.clip(ys, 0.0, h - 1.0)
+            xf = np.minimum(np.floor(xs_c).astype(np.int32), max(0, w - 2))
+            yf = np.minimum(np.floor(ys_c).astype(np.int32), max(0, h - 2))
+            xn = np.minimum(xf + 1, w - 1)
+            yn = np.minimum(yf + 1, h - 1)
+            fx = xs_c - xf
+            fy = ys_c - yf
+            top = gray[yf, xf].astype(np.float32) * (1.0 - fx) + gray[yf, xn].astype(np.float32) * fx
+            bottom = gray[yn, xf].astype(np.float32) * (1.0 - fx) + gray[yn, xn].astype(np.float32) * fx
+            intens = (top * (1.0 - fy) + bottom * fy).astype(np.float32)
+            return np.column_stack((xs, ys)), intens
+
         # Amostragem por vizinho mais próximo (rápido e suficiente para V1)
         xi = np.clip(np.round(xs).astype(np.int32), 0, gray.shape[1] - 1)
         yi = np.clip(np.round(ys).astype(np.int32), 0, gray.shape[0] - 1)
         intens = gray[yi, xi].astype(np.float32)
-        samples_xy = list(zip(xs.tolist(), ys.tolist()))
-        return samples_xy, intens
+        return np.column_stack((xs, ys)), intens
 
     def _smooth_1d(self, signal: np.ndarray, ksize: int) -> np.ndarray:
         try:
@@ -267,7 +430,8 @@ class LocateTool(BaseTool):
         else:
             return float(max(1.0, self.threshold))
 
-    def _find_peaks(self, grad_1d: np.ndarray, th: float) -> List[int]:
+    def _find_peaks(self, grad_1d: np.ndarray, th: float) -> np.ndarray:
+        """Índices (crescentes) dos máximos locais de |grad| acima do limiar, vetorizado."""
         g = grad_1d
         if self.polaridade == 'dark_to_light':
             mask = g >= th
@@ -276,39 +440,66 @@ class LocateTool(BaseTool):
         else:
             mask = np.abs(g) >= th
 
-        idxs = np.where(mask)[0].tolist()
-        if not idxs:
-            return []
-        # Reduzir para picos locais simples: manter índices que são maiores (em magnitude) que vizinhos imediatos
-        peaks = []
-        for i in idxs:
-            left = abs(g[i - 1]) if i - 1 >= 0 else -1e9
-            right = abs(g[i + 1]) if i + 1 < g.shape[0] else -1e9
-            if abs(g[i]) >= left and abs(g[i]) >= right:
-                peaks.append(i)
-        # Remover picos muito próximos (janela mínima de 2 px)
-        dedup = []
-        last = -10
-        for i in peaks:
-            if i - last >= 2:
-                dedup.append(i)
-                last = i
-        return dedup
-
-    def _select_single_edge(self, peaks: List[int], grad_1d: np.ndarray, n: int) -> int | None:
-        if not peaks:
+        # Picos locais simples: magnitude maior ou igual à dos vizinhos imediatos
+        mag = np.abs(g)
+        padded = np.pad(mag, 1, constant_values=-1e9)
+        mask &= (mag >= padded[:-2]) & (mag >= padded[2:])
+        peaks = np.flatnonzero(mask)
+        if peaks.size < 2:
+            return peaks
+        # Remover picos muito próximos (janela mínima de 2 px): em cada sequência de índices
+        # consecutivos (platôs) ficam o primeiro e os alternados, como numa varredura gulosa
+        run_start = np.r_[True, np.diff(peaks) != 1]
+        start_pos = np.flatnonzero(run_start)
+        offset = np.arange(peaks.size) - np.repeat(start_pos, np.diff(np.r_[start_pos, peaks.size]))
+        return peaks[offset % 2 == 0]
+
+    def _select_single_edge(self, peaks: np.ndarray, grad_1d: np.ndarray, n: int) -> int | None:
+        if len(peaks) == 0:
             return None
+        peaks = np.asarray(peaks)
         if self.edge_select == 'first':
-            return sorted(peaks)[0]
+            return int(peaks[0])
         if self.edge_select == 'closest_to_mid':
             mid = (n - 1) / 2.0
-            return sorted(peaks, key=lambda i: abs(i - mid))[0]
-        # strongest (default)
-        return sorted(peaks, key=lambda i: abs(float(grad_1d[i])), reverse=True)[0]
-
-    def _find_level_crossings(self, intens: np.ndarray, T: float) -> List[int]:
+            return int(peaks[np.argmin(np.abs(peaks - mid))])
+        # strongest (default); empates ficam com o primeiro
+        return int(peaks[np.argmax(np.abs(grad_1d[peaks]))])
+
+    @staticmethod
+    def _refine_peak(grad_1d: np.ndarray, idx: int) -> float:
+        """Vértice da parábola por |grad| em idx-1, idx, idx+1 (deslocamento limitado a ±0,5)."""
+        if idx <= 0 or idx >= grad_1d.shape[0] - 1:
+            return float(idx)
+        left, center, right = (abs(float(v)) for v in grad_1d[idx - 1:idx + 2])
+        denom = left - 2.0 * center + right
+        if denom >= 0.0:
+            return float(idx)
+        return float(idx) + max(-0.5, min(0.5, 0.5 * (left - right) / denom))
+
+    @staticmethod
+    def _refine_level_crossing(intens: np.ndarray, idx: int, level: float) -> float:
+        """Posição do cruzamento do nível entre as amostras idx-1 e idx (interpolação linear)."""
+        if idx <= 0:
+            return float(idx)
+        a, b = float(intens[idx - 1]), float(intens[idx])
+        if a == b:
+            return float(idx)
+        return float(idx - 1) + max(0.0, min(1.0, (level - a) / (b - a)))
+
+    @staticmethod
+    def _interp_samples(samples_xy: np.ndarray, pos: float) -> Tuple[float, float]:
+        """Coordenadas na posição fracionária `pos` das amostras (interpolação linear)."""
+        i = min(int(pos), samples_xy.shape[0] - 1)
+        frac = pos - i
+        if frac <= 0.0 or i + 1 >= samples_xy.shape[0]:
+            return float(samples_xy[i, 0]), float(samples_xy[i, 1])
+        x, y = samples_xy[i] + frac * (samples_xy[i + 1] - samples_xy[i])
+        return float(x), float(y)
+
+    def _find_level_crossings(self, intens: np.ndarray, T: float) -> np.ndarray:
         if intens is None or intens.size < 2:
-            return []
+            return np.zeros(0, dtype=np.int64)
         vals = intens.astype(np.float32)
         # Sinais de comparação
         below = vals[:-1] < T
@@ -325,14 +516,24 @@ class LocateTool(BaseTool):
                 np.logical_and(below, above_or_eq),
                 np.logical_and(above, below_or_eq)
             )
-        idxs = np.where(mask)[0] + 1  # escolhe o índice da amostra "superior" do cruzamento
-        return idxs.tolist()
+        return np.flatnonzero(mask) + 1  # escolhe o índice da amostra "superior" do cruzamento
+
+    def _sobel_at(self, gray: np.ndarray, x: int, y: int) -> Tuple[float, float]:
+        """Sobel (gx, gy) num único pixel, calculado só na janela do kernel em volta dele.
 
-    def _sobel_gradients(self, gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        Idêntico ao Sobel do ROI inteiro: a janela contém todo o suporte do kernel e, quando
+        encosta na borda do ROI, a reflexão da borda é a mesma.
+        """
         k = 1 if self.grad_kernel not in (3, 5, 7) else self.grad_kernel
-        gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=k)
-        gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=k)
-        return gx, gy
+        r = max(1, k // 2)
+        h, w = gray.shape[:2]
+        x = max(0, min(w - 1, x))
+        y = max(0, min(h - 1, y))
+        x0, y0 = max(0, x - r), max(0, y - r)
+        window = gray[y0:min(h, y + r + 1), x0:min(w, x + r + 1)]
+        gx = cv2.Sobel(window, cv2.CV_32F, 1, 0, ksize=k)
+        gy = cv2.Sobel(window, cv2.CV_32F, 0, 1, ksize=k)
+        return float(gx[y - y0, x - x0]), float(gy[y - y0, x - x0])
 
     def _infer_polarity_at(self, grad_value: float) -> str:
         if self.polaridade == 'any':
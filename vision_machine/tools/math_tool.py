@@ -1,19 +1,50 @@
+import math
 import time
 import numpy as np
-from typing import Dict, Any, Union
+from typing import Dict, Any, Tuple, Union
 from .base_tool import BaseTool
+from .expression import compile_expression
+
+# Faixas de aprovação padrão das operações prontas (sobrescritas por result_min/result_max)
+_DEFAULT_LIMITS = {
+    'area_ratio': (0.1, 0.9),
+    'blob_density': (0.01, 0.1),
+}
 
 class MathTool(BaseTool):
-    """Ferramenta para operações matemáticas baseadas em resultados de outras ferramentas"""
+    """Ferramenta para operações matemáticas baseadas em resultados de outras ferramentas.
+
+    `custom_formula` (ou `formula`) é compilada uma única vez (ver tools/expression.py) e pode
+    ler campos de várias ferramentas (`t3.total_area / t5.total_area`) e agregar listas
+    (`mean(blobs.area)`). `result_min`/`result_max` definem a faixa de aprovação.
+    """
     
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.operation = config.get('operation', '')
-        self.formula = config.get('formula', '')
+        self.formula = config.get('formula') or config.get('custom_formula') or ''
         self.reference_tool_id = config.get('reference_tool_id')
+        self.expression = None
+        if self.operation == 'custom_formula':
+            self.expression = compile_expression(self.formula, self.reference_tool_id)
+        self.result_limits = self._parse_limits(config)
         
-        if not self.reference_tool_id:
+        if not self.referenced_tool_ids():
             raise ValueError(f"MathTool {self.name} deve ter reference_tool_id definido")
+
+    def referenced_tool_ids(self) -> Tuple[Any, ...]:
+        """Ferramenta de referência e as citadas na fórmula."""
+        ids = super().referenced_tool_ids()
+        if self.expression is not None:
+            ids = tuple(dict.fromkeys(ids + self.expression.tool_ids))
+        return ids
+
+    def _parse_limits(self, config: Dict[str, Any]) -> Tuple[float, float] | None:
+        lo = config.get('result_min')
+        hi = config.get('result_max')
+        if lo is None and hi is None:
+            return _DEFAULT_LIMITS.get(self.operation)
+        return (float(lo) if lo is not None else -math.inf, float(hi) if hi is not None else math.inf)
     
     def process(self, image: np.ndarray, roi_image: np.ndarray, 
                 previous_results: Dict[int, Dict] = None) -> Dict[str, Any]:
@@ -21,13 +52,16 @@ class MathTool(BaseTool):
         start_time = time.time()
         
         try:
-            # Obter resultado da ferramenta de referência
-            reference_result = self.get_reference_result(previous_results, self.reference_tool_id)
-            if not reference_result:
-                raise ValueError(f"Resultado da ferramenta {self.reference_tool_id} não encontrado")
-            
-            # Executar operação matemática
-            math_result = self._execute_operation(reference_result)
+            if self.expression is not None:
+                math_result = self._evaluate_custom_formula(previous_results or {})
+            else:
+                # Obter resultado da ferramenta de referência
+                reference_result = self.get_reference_result(previous_results, self.reference_tool_id)
+                if not reference_result:
+                    raise ValueError(f"Resultado da ferramenta {self.reference_tool_id} não encontrado")
+
+                # Executar operação matemática
+                math_result = self._execute_operation(reference_result)
             
             processing_time = (time.time() - start_time) * 1000
             
@@ -40,6 +74,7 @@ class MathTool(BaseTool):
                 'operation': self.operation,
                 'formula': self.formula,
                 'result': math_result,
+                'limits': self._limits_out(),
                 'pass_fail': self._evaluate_result(math_result) if self.inspec_pass_fail else None
             }
             
@@ -70,39 +105,36 @@ class MathTool(BaseTool):
             roi_area = reference_result.get('roi_area', 1)
             return blob_count / roi_area if roi_area > 0 else 0
             
-        elif self.operation == 'custom_formula':
-            # Executar fórmula customizada (implementação básica)
-            return self._evaluate_custom_formula(reference_result)
-        
         else:
             raise ValueError(f"Operação {self.operation} não suportada")
     
-    def _evaluate_custom_formula(self, reference_result: Dict) -> float:
-        """Avalia fórmula customizada (implementação básica)"""
-        # Substituir variáveis na fórmula
-        formula = self.formula
-        for key, value in reference_result.items():
-            if isinstance(value, (int, float)):
-                formula = formula.replace(key, str(value))
-        
+    def _evaluate_custom_formula(self, previous_results: Dict) -> float:
+        """Avalia a fórmula compilada sobre os resultados anteriores do frame"""
         try:
-            # Avaliar fórmula (cuidado com segurança!)
-            return eval(formula)
-        except Exception as e:
+            value = self.expression.evaluate(previous_results)
+        except (ArithmeticError, ValueError, TypeError) as e:
             raise ValueError(f"Erro ao avaliar fórmula: {str(e)}")
+        if np.ndim(value) != 0:
+            raise ValueError("A fórmula deve resultar em um número (use min/max/mean/sum/count para listas)")
+        return float(value)
     
     def _evaluate_result(self, result: float) -> bool:
-        """Avalia se o resultado matemático passa nos critérios"""
-        # Implementar lógica de avaliação baseada na operação
-        if self.operation == 'area_ratio':
-            return 0.1 <= result <= 0.9  # Exemplo: razão entre 10% e 90%
-        elif self.operation == 'blob_density':
-            return 0.01 <= result <= 0.1  # Exemplo: densidade entre 1% e 10%
-        return True  # Por padrão, passa
+        """Avalia se o resultado está na faixa result_min/result_max (sem faixa, passa)"""
+        if self.result_limits is None:
+            return True
+        lo, hi = self.result_limits
+        return lo <= result <= hi
     
+    def _limits_out(self) -> Dict[str, Any] | None:
+        if self.result_limits is None:
+            return None
+        lo, hi = self.result_limits
+        # Sem infinitos no JSON publicado
+        return {'min': lo if math.isfinite(lo) else None, 'max': hi if math.isfinite(hi) else None}
+
     def validate_config(self) -> bool:
         """Valida a configuração da ferramenta"""
-        if not self.reference_tool_id:
+        if not self.referenced_tool_ids():
             print(f"❌ reference_tool_id é obrigatório para MathTool")
             return False
         
@@ -38,6 +38,9 @@ class MorphologyFilterTool(BaseTool):
             self.last_processing_time = (time.time() - start_time) * 1000
             return roi_image
 
+    def gray_equivalent(self) -> bool:
+        return True
+
     def validate_config(self) -> bool:
         return True
 
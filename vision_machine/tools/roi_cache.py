@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class RoiGeometryCache:
+    """Cache LRU limitado (por entradas e por bytes) da geometria de ROIs.
+
+    A chave é (parâmetros do shape já com o offset arredondado ao pixel, largura, altura)
+    e o valor é a tupla (bbox, máscara, aviso) produzida por `BaseTool._compute_roi_geometry`.
+    As máscaras armazenadas são somente leitura, pois são compartilhadas entre ferramentas,
+    frames e threads.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[Hashable, Tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Tuple]) -> Tuple:
+        """Retorna a geometria da chave, calculando-a (fora do lock) quando ausente."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = compute()
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            # Máscara maior que o orçamento inteiro: não vale a pena guardar
+            return entry
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._bytes += size
+                while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                    _, old = self._entries.popitem(last=False)
+                    self._bytes -= self._entry_size(old)
+        return entry
+
+    def configure(self, max_entries: int = None, max_bytes: int = None):
+        """Ajusta os limites do cache (aplicados na próxima inserção)."""
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max(1, int(max_entries))
+            if max_bytes is not None:
+                self.max_bytes = max(0, int(max_bytes))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    @staticmethod
+    def _entry_size(entry: Tuple) -> int:
+        mask = entry[1] if entry else None
+        return int(getattr(mask, 'nbytes', 0)) + 64
+
+
+# Instância compartilhada por todas as ferramentas do processo
+ROI_GEOMETRY_CACHE = RoiGeometryCache()
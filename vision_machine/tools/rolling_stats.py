@@ -0,0 +1,143 @@
+"""Estatísticas de uma janela deslizante com atualização O(1) (SpcTool).
+
+Tudo vive em arrays pré-alocados do tamanho da janela:
+- `values`: buffer circular das amostras (a amostra `seq` fica na posição `seq % window`);
+- somas de `x - shift` e `(x - shift)²` atualizadas a cada amostra (entra uma, sai uma); o
+  deslocamento evita o cancelamento numérico da variância e as somas são recalculadas
+  exatamente a cada volta completa do buffer (custo amortizado O(1));
+- mínimo e máximo por filas monotônicas de índices (O(1) amortizado por amostra).
+"""
+from typing import Optional
+
+import numpy as np
+
+
+class _ExtremeQueue:
+    """Fila monotônica de índices de amostras: a frente é o mínimo (`sign=1`) ou o máximo
+    (`sign=-1`) da janela."""
+    __slots__ = ('seqs', 'head', 'size', 'sign')
+
+    def __init__(self, window: int, sign: int):
+        self.seqs = np.zeros(window, dtype=np.int64)
+        self.head = 0
+        self.size = 0
+        self.sign = sign
+
+    def push(self, seq: int, value: float, values: np.ndarray, window: int):
+        seqs = self.seqs
+        # Só a amostra que acabou de sair da janela pode expirar
+        if self.size and seqs[self.head] <= seq - window:
+            self.head = (self.head + 1) % window
+            self.size -= 1
+        sign = self.sign
+        while self.size and sign * values[seqs[(self.head + self.size - 1) % window] % window] >= sign * value:
+            self.size -= 1
+        seqs[(self.head + self.size) % window] = seq
+        self.size += 1
+
+    def load(self, x: np.ndarray, start: int, window: int):
+        """Reconstrói a fila para as amostras `x` (índices `start..`) sem laço Python."""
+        y = self.sign * x
+        suffix = np.minimum.accumulate(y[::-1])[::-1]
+        keep = np.empty(x.size, dtype=bool)
+        keep[-1] = True
+        keep[:-1] = y[:-1] < suffix[1:]
+        kept = np.flatnonzero(keep) + start
+        self.head = 0
+        self.size = kept.size
+        self.seqs[:kept.size] = kept
+
+    def front(self, values: np.ndarray, window: int) -> float:
+        return float(values[self.seqs[self.head] % window])
+
+
+class RollingStats:
+    """Média, desvio padrão, mínimo e máximo das últimas `window` amostras."""
+
+    def __init__(self, window: int):
+        self.window = int(window)
+        if self.window < 2:
+            raise ValueError("window deve ser >= 2")
+        self.values = np.zeros(self.window, dtype=np.float64)
+        # Amostras na janela e total já recebido (índice da próxima amostra)
+        self.count = 0
+        self.total = 0
+        self._shift = 0.0
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._min = _ExtremeQueue(self.window, 1)
+        self._max = _ExtremeQueue(self.window, -1)
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray, window: int, total: Optional[int] = None) -> 'RollingStats':
+        """Janela inicializada com as últimas `window` amostras (em ordem cronológica)."""
+        stats = cls(window)
+        x = np.asarray(samples, dtype=np.float64)[-stats.window:]
+        n = x.size
+        total = max(int(total if total is not None else n), n)
+        stats.total = total
+        if n:
+            start = total - n
+            stats.values[(start + np.arange(n)) % stats.window] = x
+            stats.count = n
+            stats._min.load(x, start, stats.window)
+            stats._max.load(x, start, stats.window)
+            stats._resync()
+        return stats
+
+    def push(self, value: float):
+        w = self.window
+        seq = self.total
+        slot = seq % w
+        if self.count == 0:
+            self._shift = value
+        d = value - self._shift
+        if self.count == w:
+            old = self.values[slot] - self._shift
+            self._sum -= old
+            self._sumsq -= old * old
+        else:
+            self.count += 1
+        self.values[slot] = value
+        self._sum += d
+        self._sumsq += d * d
+        self._min.push(seq, value, self.values, w)
+        self._max.push(seq, value, self.values, w)
+        self.total = seq + 1
+        if slot == w - 1:
+            # Uma vez por volta do buffer: somas exatas (sem acumular erro de arredondamento)
+            self._resync()
+
+    def _resync(self):
+        # Janela incompleta ocupa as posições de (total - count) em diante (from_samples)
+        x = self.values if self.count == self.window else self.samples()
+        self._shift = float(x.mean())
+        d = x - self._shift
+        self._sum = float(d.sum())
+        self._sumsq = float(np.dot(d, d))
+
+    def samples(self) -> np.ndarray:
+        """Cópia das amostras da janela em ordem cronológica."""
+        if self.count < self.window:
+            start = (self.total - self.count) % self.window
+            return np.roll(self.values, -start)[:self.count]
+        return np.roll(self.values, -(self.total % self.window))
+
+    def mean(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return self._shift + self._sum / self.count
+
+    def std(self) -> Optional[float]:
+        """Desvio padrão amostral (n-1) da janela."""
+        n = self.count
+        if n < 2:
+            return None
+        var = (self._sumsq - self._sum * self._sum / n) / (n - 1)
+        return float(np.sqrt(var)) if var > 0 else 0.0
+
+    def min(self) -> Optional[float]:
+        return self._min.front(self.values, self.window) if self.count else None
+
+    def max(self) -> Optional[float]:
+        return self._max.front(self.values, self.window) if self.count else None
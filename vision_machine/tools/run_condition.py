@@ -0,0 +1,82 @@
+import operator
+import re
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '>': operator.gt,
+    '<': operator.lt,
+}
+_CONDITION_RE = re.compile(r'^\s*([A-Za-z_][\w.]*)\s*(==|!=|>=|<=|>|<)\s*(.+?)\s*$')
+_LITERALS = {'true': True, 'false': False, 'null': None, 'none': None}
+
+
+class RunCondition(NamedTuple):
+    """Condição `campo op valor` avaliada sobre o resultado de uma ferramenta anterior."""
+    tool_id: Any
+    path: Tuple[str, ...]
+    op: str
+    value: Any
+    text: str
+
+    def evaluate(self, results: Dict[Any, Dict[str, Any]]) -> bool:
+        """Falso quando o resultado/campo não existe ou os tipos não são comparáveis."""
+        current: Any = results.get(self.tool_id)
+        for key in self.path:
+            if not isinstance(current, dict) or key not in current:
+                return False
+            current = current[key]
+        try:
+            return bool(_OPERATORS[self.op](current, self.value))
+        except TypeError:
+            return False
+
+
+def _parse_value(text: str) -> Any:
+    lowered = text.lower()
+    if lowered in _LITERALS:
+        return _LITERALS[lowered]
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in '"\'':
+        return text[1:-1]
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parse_run_if(spec: Any, default_tool_id: Optional[Any] = None) -> Tuple[RunCondition, ...]:
+    """Converte a configuração `run_if` em condições pré-compiladas (todas devem ser verdadeiras).
+
+    Formatos aceitos:
+    - `"edge_count > 0"`: avaliada sobre o resultado de `reference_tool_id`
+    - `{"tool_id": 3, "condition": "pass_fail == true"}`
+    - lista com qualquer combinação dos anteriores
+    Campos aninhados usam ponto (ex.: `test_results.overall_pass == true`).
+    """
+    if spec is None or spec == '' or spec == []:
+        return ()
+    items = spec if isinstance(spec, list) else [spec]
+    conditions = []
+    for item in items:
+        tool_id = default_tool_id
+        text = item
+        if isinstance(item, dict):
+            tool_id = item.get('tool_id', default_tool_id)
+            text = item.get('condition')
+        if not isinstance(text, str):
+            raise ValueError(f"run_if inválido: {item!r}")
+        match = _CONDITION_RE.match(text)
+        if not match:
+            raise ValueError(f"Condição run_if inválida: '{text}' (esperado 'campo op valor')")
+        if tool_id is None:
+            raise ValueError(f"run_if '{text}' sem tool_id (defina tool_id ou reference_tool_id)")
+        field, op, value = match.groups()
+        conditions.append(RunCondition(tool_id, tuple(field.split('.')), op, _parse_value(value), text.strip()))
+    return tuple(conditions)
@@ -0,0 +1,280 @@
+import math
+import time
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from .base_tool import BaseTool
+from .expression import compile_expression
+from .rolling_stats import RollingStats
+
+# Regras de Western Electric avaliadas por padrão
+WESTERN_ELECTRIC_RULES = (1, 2, 3, 4)
+
+
+def _optional_float(value: Any, name: str) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{name} deve ser um número finito")
+    return value
+
+
+def _parse_rules(rules: Any) -> Tuple[int, ...]:
+    """Regras ativas: lista de números (1 a 4) ou texto `"1,2,3,4"`."""
+    if rules is None:
+        return WESTERN_ELECTRIC_RULES
+    if isinstance(rules, str):
+        rules = [r for r in rules.replace(';', ',').split(',') if r.strip()]
+    parsed = tuple(sorted({int(r) for r in rules}))
+    invalid = [r for r in parsed if r not in WESTERN_ELECTRIC_RULES]
+    if invalid:
+        raise ValueError(f"Regras inválidas: {invalid} (use 1 a 4)")
+    return parsed
+
+
+class _SpcState:
+    """Estado acumulado entre frames. No hot swap a nova versão da ferramenta pode receber o
+    próprio objeto (compartilhado) da versão anterior, sem copiar as amostras."""
+    __slots__ = ('stats', 'center', 'sigma', 'zones', 'run_side', 'run_len', 'frame_seq')
+
+    def __init__(self, stats: RollingStats, center: Optional[float], sigma: Optional[float]):
+        self.stats = stats
+        # Linha central e sigma das regras (None até o fim da linha de base, quando estimados)
+        self.center = center
+        self.sigma = sigma
+        # Zonas (lado * faixas de sigma) das 4 amostras anteriores, mais recente no fim
+        self.zones = [0, 0, 0, 0]
+        # Sequência atual de amostras do mesmo lado da linha central (regra 4)
+        self.run_side = 0
+        self.run_len = 0
+        # Frame da última amostra (re-inspeção do mesmo frame não acrescenta amostra)
+        self.frame_seq = None
+
+
+class SpcTool(BaseTool):
+    """Controle estatístico de processo de um campo numérico ao longo dos frames.
+
+    `field` é lido do resultado de `reference_tool_id` (`total_area`, `offset.x`) ou de outra
+    ferramenta (`t3.blob_count`), com a mesma sintaxe das fórmulas da MathTool. As
+    estatísticas da janela (`window`) são atualizadas em O(1) por frame (tools/rolling_stats.py);
+    a linha central e o sigma das regras de Western Electric vêm de `center`/`sigma` ou são
+    estimados nas primeiras `baseline` amostras.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.field = str(config.get('field') or '').strip()
+        if not self.field:
+            raise ValueError(f"SpcTool {self.name} deve ter field definido")
+        self.expression = compile_expression(self.field, self.reference_tool_id)
+        self.window = int(config.get('window', 100) or 100)
+        if self.window < 2:
+            raise ValueError("window deve ser >= 2")
+        self.baseline = min(max(int(config.get('baseline', 25) or 25), 2), self.window)
+        self.lsl = _optional_float(config.get('lsl'), 'lsl')
+        self.usl = _optional_float(config.get('usl'), 'usl')
+        self.center = _optional_float(config.get('center'), 'center')
+        self.sigma = _optional_float(config.get('sigma'), 'sigma')
+        if self.sigma is not None and self.sigma <= 0:
+            raise ValueError("sigma deve ser > 0")
+        self.rules = _parse_rules(config.get('rules'))
+        self.fail_on_drift = bool(config.get('fail_on_drift', True))
+        self.state = self._new_state()
+
+    def referenced_tool_ids(self) -> Tuple[Any, ...]:
+        """Ferramenta de referência e as citadas em `field`."""
+        return tuple(dict.fromkeys(super().referenced_tool_ids() + self.expression.tool_ids))
+
+    def _new_state(self, stats: Optional[RollingStats] = None) -> _SpcState:
+        return _SpcState(stats or RollingStats(self.window), self.center, self.sigma)
+
+    # --- Estado entre frames (hot swap) ---
+
+    def state_key(self, lineage: Dict[Any, str]) -> Tuple:
+        """Identidade das amostras: o campo e a linhagem das ferramentas lidas."""
+        return (self.field,) + tuple(lineage.get(tool_id) for tool_id in self.referenced_tool_ids())
+
+    def reset_state(self):
+        """Descarta o histórico (a ferramenta acompanhada mudou)."""
+        self.state = self._new_state()
+
+    def adopt_state(self, previous: 'SpcTool'):
+        """Continua o histórico da versão anterior desta ferramenta (mesmo campo, mesma origem).
+
+        Chamado na troca de processador, entre dois frames: `previous` não recebe mais amostras.
+        """
+        old = previous.state
+        control_same = (previous.center, previous.sigma, previous.baseline, previous.rules) == \
+                       (self.center, self.sigma, self.baseline, self.rules)
+        if old.stats.window == self.window and control_same:
+            # Mesmo objeto: a versão anterior não processa mais frames depois da troca
+            self.state = old
+            return
+        stats = old.stats if old.stats.window == self.window else \
+            RollingStats.from_samples(old.stats.samples(), self.window, old.stats.total)
+        state = self._new_state(stats)
+        state.frame_seq = old.frame_seq
+        if self.center is None and previous.center is None and previous.baseline == self.baseline:
+            state.center = old.center
+        if self.sigma is None and previous.sigma is None and previous.baseline == self.baseline:
+            state.sigma = old.sigma
+        self._estimate_limits(state)
+        if state.center is not None and state.sigma is not None:
+            # Histórico das regras refeito com os novos limites sobre as últimas amostras
+            for value in stats.samples()[-8:]:
+                self._commit_rules(state, self._check_rules(state, float(value))[1])
+        self.state = state
+
+    # --- Processamento ---
+
+    def process(self, image: np.ndarray, roi_image: np.ndarray,
+                previous_results: Dict[int, Dict] = None) -> Dict[str, Any]:
+        """Acrescenta o valor do frame à janela e avalia limites de especificação e regras"""
+        start_time = time.time()
+
+        try:
+            value = self._read_value(previous_results or {})
+            state = self.state
+            frame_seq = getattr(self, '_frame_seq', None)
+            violations, rule_state = self._check_rules(state, value)
+            if frame_seq is None or frame_seq != state.frame_seq:
+                state.stats.push(value)
+                self._commit_rules(state, rule_state)
+                self._estimate_limits(state)
+                state.frame_seq = frame_seq
+
+            stats = state.stats
+            mean = stats.mean()
+            std = stats.std()
+            cp, cpk = self._capability(mean, std)
+            in_spec = (self.lsl is None or value >= self.lsl) and (self.usl is None or value <= self.usl)
+            drift = bool(violations)
+            control = state.center is not None and state.sigma is not None
+            processing_time = (time.time() - start_time) * 1000
+
+            return {
+                'tool_id': self.id,
+                'tool_name': self.name,
+                'tool_type': self.type,
+                'processing_time_ms': processing_time,
+                'reference_tool_id': self.reference_tool_id,
+                'field': self.field,
+                'value': value,
+                'count': stats.count,
+                'total': stats.total,
+                'mean': mean,
+                'std': std,
+                'min': stats.min(),
+                'max': stats.max(),
+                'center': state.center if control else None,
+                'sigma': state.sigma if control else None,
+                'ucl': state.center + 3 * state.sigma if control else None,
+                'lcl': state.center - 3 * state.sigma if control else None,
+                'lsl': self.lsl,
+                'usl': self.usl,
+                'cp': cp,
+                'cpk': cpk,
+                'in_spec': in_spec,
+                'violations': violations,
+                'drift': drift,
+                'pass_fail': (in_spec and not (drift and self.fail_on_drift)) if self.inspec_pass_fail else None
+            }
+
+        except Exception as e:
+            processing_time = (time.time() - start_time) * 1000
+            print(f"❌ Erro na ferramenta SPC {self.name}: {str(e)}")
+            return {
+                'tool_id': self.id,
+                'tool_name': self.name,
+                'tool_type': self.type,
+                'processing_time_ms': processing_time,
+                'status': 'error',
+                'error': str(e),
+                'pass_fail': False if self.inspec_pass_fail else None
+            }
+
+    def _read_value(self, previous_results: Dict) -> float:
+        try:
+            value = self.expression.evaluate(previous_results)
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ValueError(f"Erro ao ler '{self.field}': {str(e)}")
+        if np.ndim(value) != 0:
+            raise ValueError(f"'{self.field}' deve resultar em um número (use min/max/mean/sum/count para listas)")
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError(f"'{self.field}' não é finito ({value})")
+        return value
+
+    def _check_rules(self, state: _SpcState, value: float) -> Tuple[List[int], Optional[Tuple[int, int, int]]]:
+        """Regras violadas pelo valor atual (sem alterar o estado) e a zona/sequência resultante.
+
+        1: um ponto além de 3σ; 2: 2 de 3 pontos além de 2σ do mesmo lado; 3: 4 de 5 pontos
+        além de 1σ do mesmo lado; 4: 8 pontos seguidos do mesmo lado da linha central.
+        O ponto atual faz parte do padrão (cada violação é atribuída ao frame que a completa).
+        """
+        if state.center is None or state.sigma is None:
+            return [], None
+        z = (value - state.center) / state.sigma
+        a = abs(z)
+        k = 3 if a > 3 else 2 if a > 2 else 1 if a > 1 else 0
+        side = 1 if z > 0 else -1 if z < 0 else 0
+        zones = state.zones
+        run = (state.run_len + 1 if side == state.run_side else 1) if side else 0
+        violations = []
+        rules = self.rules
+        if 1 in rules and k == 3:
+            violations.append(1)
+        if 2 in rules and k >= 2 and (zones[2] * side >= 2 or zones[3] * side >= 2):
+            violations.append(2)
+        if 3 in rules and k >= 1 and sum(1 for q in zones if q * side >= 1) >= 3:
+            violations.append(3)
+        if 4 in rules and run >= 8:
+            violations.append(4)
+        return violations, (side * k, side, run)
+
+    @staticmethod
+    def _commit_rules(state: _SpcState, rule_state: Optional[Tuple[int, int, int]]):
+        if rule_state is None:
+            return
+        zone, state.run_side, state.run_len = rule_state
+        zones = state.zones
+        zones[0], zones[1], zones[2], zones[3] = zones[1], zones[2], zones[3], zone
+
+    def _estimate_limits(self, state: _SpcState):
+        """Linha central/sigma não configurados: estimados ao completar a linha de base."""
+        if state.center is not None and state.sigma is not None:
+            return
+        stats = state.stats
+        if stats.count < self.baseline:
+            return
+        baseline = stats.samples()[-self.baseline:] if stats.count > self.baseline else None
+        mean = float(baseline.mean()) if baseline is not None else stats.mean()
+        std = float(baseline.std(ddof=1)) if baseline is not None else stats.std()
+        sigma = state.sigma if state.sigma is not None else std
+        if not sigma or sigma <= 0:
+            # Linha de base constante: aguardar variação
+            return
+        state.center = state.center if state.center is not None else mean
+        state.sigma = sigma
+
+    def _capability(self, mean: Optional[float], std: Optional[float]) -> Tuple[Optional[float], Optional[float]]:
+        """Cp e Cpk da janela (Cpk unilateral quando só um limite de especificação existe)."""
+        if mean is None or not std or (self.lsl is None and self.usl is None):
+            return None, None
+        cp = (self.usl - self.lsl) / (6 * std) if self.lsl is not None and self.usl is not None else None
+        margins = []
+        if self.usl is not None:
+            margins.append(self.usl - mean)
+        if self.lsl is not None:
+            margins.append(mean - self.lsl)
+        return cp, min(margins) / (3 * std)
+
+    def validate_config(self) -> bool:
+        """Valida a configuração da ferramenta"""
+        if not self.field:
+            print(f"❌ field é obrigatório para SpcTool")
+            return False
+        if self.lsl is not None and self.usl is not None and self.lsl >= self.usl:
+            print(f"❌ lsl deve ser menor que usl na SpcTool")
+            return False
+        return True
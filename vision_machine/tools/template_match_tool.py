@@ -0,0 +1,328 @@
+import base64
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .base_tool import BaseTool
+
+# Lado mínimo do modelo no nível mais grosso da pirâmide (abaixo disso a correlação perde
+# detalhe e gera candidatos falsos)
+_MIN_TEMPLATE_SIDE = 12
+_MAX_PYRAMID_LEVELS = 5
+# Bisseções do ângulo em resolução total (passo final = angle_step / 2^(n+1))
+_ANGLE_BISECTIONS = 3
+
+
+def decode_template(data: str) -> Optional[np.ndarray]:
+    """Imagem do modelo (PNG/JPEG em base64, com ou sem prefixo data URL) em escala de cinza."""
+    if not data:
+        return None
+    if data.startswith('data:'):
+        data = data.split(',', 1)[-1]
+    buf = np.frombuffer(base64.b64decode(data), dtype=np.uint8)
+    return cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+
+
+class TemplateMatchTool(BaseTool):
+    """Localização de um modelo (template) por correlação normalizada em pirâmide de imagens.
+
+    Busca grosso-fino: todas as posições (e ângulos, com rotação) só no nível mais reduzido;
+    nos níveis seguintes apenas janelas pequenas em torno dos melhores candidatos. Os modelos
+    rotacionados de cada nível são pré-calculados na construção da ferramenta.
+
+    Parâmetros esperados no config:
+      - template: imagem do modelo em base64 (PNG/JPEG; aceita data URL)
+        (alternativamente template_path: caminho do arquivo)
+      - min_score: float (padrão 0.7) correlação mínima (TM_CCOEFF_NORMED) para aceitar o modelo
+      - angle_range: float (padrão 0) busca em [-angle_range, +angle_range] graus
+      - angle_step: float (padrão 1) passo angular no nível de resolução total
+      - pyramid_levels: int (padrão -1 = automático) níveis de redução (cada um divide por 2)
+      - candidates: int (padrão 3) candidatos do nível grosso refinados até a resolução total
+      - reference / rotate / apply_transform: como na LocateTool (offset para os ROIs seguintes)
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.min_score = float(config.get('min_score', 0.7))
+        self.angle_range = abs(float(config.get('angle_range', 0.0) or 0.0))
+        self.angle_step = max(0.1, float(config.get('angle_step', 1.0) or 1.0))
+        self.candidates = max(1, int(config.get('candidates', 3)))
+        self.apply_transform = bool(config.get('apply_transform', False))
+        self.rotate = bool(config.get('rotate', False))
+        self.reference = self._parse_reference(config.get('reference'))
+
+        template = decode_template(config.get('template') or '')
+        if template is None and config.get('template_path'):
+            template = cv2.imread(str(config.get('template_path')), cv2.IMREAD_GRAYSCALE)
+        if template is None or template.size == 0:
+            raise ValueError("TemplateMatchTool: modelo ausente ou inválido ('template'/'template_path')")
+        self.template = template
+        self.levels = self._pyramid_depth(int(config.get('pyramid_levels', -1)))
+        # Ângulos no nível 0; o nível l usa os índices múltiplos de 2^l (passo dobrado por nível)
+        n_half = int(math.floor(self.angle_range / self.angle_step + 1e-9))
+        self.angles = np.arange(-n_half, n_half + 1, dtype=np.float64) * self.angle_step
+        self.center_angle = n_half
+        # models[l][k]: modelo do ângulo k reduzido ao nível l (rotação feita em resolução total)
+        self.models: List[List[np.ndarray]] = [[] for _ in range(self.levels + 1)]
+        for angle in self.angles:
+            rotated = self._rotate_template(template, float(angle))
+            for level in range(self.levels + 1):
+                self.models[level].append(rotated)
+                if level < self.levels:
+                    rotated = cv2.pyrDown(rotated)
+
+    def _pyramid_depth(self, requested: int) -> int:
+        side = min(self.template.shape[:2])
+        auto = 0
+        while auto < _MAX_PYRAMID_LEVELS and (side >> (auto + 1)) >= _MIN_TEMPLATE_SIDE:
+            auto += 1
+        if requested < 0:
+            return auto
+        return max(0, min(requested, auto))
+
+    @staticmethod
+    def _rotate_template(template: np.ndarray, angle: float) -> np.ndarray:
+        """Modelo girado `angle` graus (sentido horário na tela, como os ângulos da Locate),
+        mesmo tamanho; os cantos recebem a média do modelo, neutra na correlação normalizada."""
+        if angle == 0.0:
+            return template
+        h, w = template.shape[:2]
+        m = cv2.getRotationMatrix2D(((w - 1) / 2.0, (h - 1) / 2.0), -angle, 1.0)
+        fill = float(np.mean(template))
+        return cv2.warpAffine(template, m, (w, h), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=fill)
+
+    def process(self, image: np.ndarray, roi_image: np.ndarray,
+                previous_results: Dict[int, Dict] = None) -> Dict[str, Any]:
+        start_time = time.time()
+
+        try:
+            gray_roi = self.gray_roi(roi_image)
+            x_off, y_off, _, _ = getattr(self, '_last_roi_bbox', (0, 0, image.shape[1], image.shape[0]))
+            th, tw = self.template.shape[:2]
+            if gray_roi.shape[0] < th or gray_roi.shape[1] < tw:
+                raise ValueError(f"ROI {gray_roi.shape[1]}x{gray_roi.shape[0]} menor que o modelo {tw}x{th}")
+
+            levels = self.levels
+            while levels > 0 and (gray_roi.shape[0] >> levels < self.models[levels][0].shape[0]
+                                  or gray_roi.shape[1] >> levels < self.models[levels][0].shape[1]):
+                levels -= 1
+            pyramid = self.cached_artifact('pyramid', (levels,), gray_roi, lambda g: self._build_pyramid(g, levels))
+            match = self._search(pyramid, levels)
+
+            result_out = None
+            reference_out = None
+            offset_out = None
+            score = match[3] if match is not None else None
+            found = match is not None and score >= self.min_score
+            if found:
+                x, y, angle, _ = match
+                result_out = {
+                    'x': float(x + (tw - 1) / 2.0 + x_off),
+                    'y': float(y + (th - 1) / 2.0 + y_off),
+                    'angle_deg': float(angle)
+                }
+                if self.reference is not None:
+                    reference_out = dict(self.reference)
+                    dA = self._normalize_angle(result_out['angle_deg'] - reference_out['angle_deg'])
+                    offset_out = {
+                        'x': result_out['x'] - reference_out['x'],
+                        'y': result_out['y'] - reference_out['y'],
+                        'angle_deg': float(dA) if self.rotate else float(reference_out['angle_deg'])
+                    }
+
+            processing_time = (time.time() - start_time) * 1000.0
+            return {
+                'tool_id': self.id,
+                'tool_name': self.name,
+                'tool_type': self.type,
+                'processing_time_ms': processing_time,
+                'score': float(score) if score is not None else None,
+                'found': bool(found),
+                'template_size': [int(tw), int(th)],
+                'pyramid_levels': int(levels),
+                'reference': reference_out,
+                'result': result_out,
+                'offset': offset_out,
+                'rotate': bool(self.rotate),
+                'apply_transform': bool(self.apply_transform),
+                'pass_fail': None if not self.inspec_pass_fail else bool(found)
+            }
+
+        except Exception as e:
+            processing_time = (time.time() - start_time) * 1000.0
+            return {
+                'tool_id': self.id,
+                'tool_name': self.name,
+                'tool_type': self.type,
+                'processing_time_ms': processing_time,
+                'status': 'error',
+                'error': str(e),
+                'pass_fail': False if self.inspec_pass_fail else None
+            }
+
+    # ----------------------
+    # Busca grosso-fino
+    # ----------------------
+    @staticmethod
+    def _build_pyramid(gray: np.ndarray, levels: int) -> Tuple[np.ndarray, ...]:
+        pyramid = [gray]
+        for _ in range(levels):
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+        return tuple(pyramid)
+
+    def _search(self, pyramid: Tuple[np.ndarray, ...], levels: int) -> Optional[Tuple[float, float, float, float]]:
+        """Melhor ocorrência (x, y do canto superior esquerdo no nível 0, ângulo, score)."""
+        stride = 1 << levels
+        coarse = self._angle_indices(0, len(self.angles) - 1, stride)
+        candidates = self._coarse_candidates(pyramid[levels], levels, coarse)
+        best = None
+        for x, y, k in candidates:
+            step = stride
+            for level in range(levels - 1, -1, -1):
+                # Posição dobrada a cada nível; ângulos vizinhos no passo do nível
+                step >>= 1
+                x, y = 2 * x, 2 * y
+                angle_idx = self._angle_indices(k - step, k + step, step)
+                x, y, k, _ = self._refine(pyramid[level], level, x, y, angle_idx, radius=2)
+            # Resolução total: k±1, cada ângulo na sua melhor posição
+            x, y, k, score = self._refine(pyramid[0], 0, x, y, self._angle_indices(k - 1, k + 1, 1), radius=1)
+            if best is None or score > best[3]:
+                best = (x, y, k, score)
+        if best is None:
+            return None
+        # Sub-pixel e sub-passo só no vencedor (modelos girados na hora)
+        return self._refine_angle(pyramid[0], *best[:3])
+
+    def _angle_indices(self, lo: int, hi: int, step: int) -> List[int]:
+        n = len(self.angles)
+        # Índices múltiplos de `step` em relação ao ângulo central, dentro de [lo, hi]
+        first = self.center_angle + int(math.ceil((lo - self.center_angle) / step)) * step
+        return [k for k in range(first, hi + 1, step) if 0 <= k < n] or [min(max(lo, 0), n - 1)]
+
+    def _coarse_candidates(self, image: np.ndarray, level: int, angle_idx: List[int]) -> List[Tuple[int, int, int]]:
+        """Varredura completa no nível grosso: melhores posições (com supressão de vizinhos)."""
+        best_score = None
+        best_angle = None
+        for k in angle_idx:
+            scores = cv2.matchTemplate(image, self.models[level][k], cv2.TM_CCOEFF_NORMED)
+            if best_score is None:
+                best_score = scores
+                best_angle = np.full(scores.shape, k, dtype=np.int32)
+            else:
+                better = scores > best_score
+                np.copyto(best_score, scores, where=better)
+                best_angle[better] = k
+        mh, mw = self.models[level][angle_idx[0]].shape[:2]
+        ry, rx = max(1, mh // 2), max(1, mw // 2)
+        work = best_score.copy()
+        candidates = []
+        for _ in range(self.candidates):
+            _, max_val, _, (x, y) = cv2.minMaxLoc(work)
+            if not np.isfinite(max_val) or max_val <= -1.0:
+                break
+            candidates.append((x, y, int(best_angle[y, x])))
+            work[max(0, y - ry):y + ry + 1, max(0, x - rx):x + rx + 1] = -1.0
+        return candidates
+
+    def _refine(self, image: np.ndarray, level: int, x: int, y: int, angle_idx: List[int], radius: int):
+        """Correlação só numa janela de ±radius em torno de (x, y) para os ângulos dados."""
+        h, w = image.shape[:2]
+        best = None
+        for k in angle_idx:
+            model = self.models[level][k]
+            if model.shape[0] > h or model.shape[1] > w:
+                continue
+            score, bx, by, _, _ = self._match_window(image, model, x, y, radius)
+            if best is None or score > best[3]:
+                best = (bx, by, k, score)
+        return best if best is not None else (x, y, angle_idx[0], -1.0)
+
+    def _match_window(self, image: np.ndarray, model: np.ndarray, x: int, y: int, radius: int):
+        """(score, x, y, fx, fy) do máximo da correlação numa janela de ±radius em torno de (x, y)."""
+        h, w = image.shape[:2]
+        mh, mw = model.shape[:2]
+        x0, y0 = min(max(0, x - radius), w - mw), min(max(0, y - radius), h - mh)
+        x1, y1 = min(w - mw, x + radius), min(h - mh, y + radius)
+        if x1 < x0 or y1 < y0:
+            return -1.0, x, y, 0.0, 0.0
+        scores = cv2.matchTemplate(image[y0:y1 + mh, x0:x1 + mw], model, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, (bx, by) = cv2.minMaxLoc(scores)
+        fx = self._parabola_offset(scores[by, bx - 1:bx + 2]) if 0 < bx < scores.shape[1] - 1 else 0.0
+        fy = self._parabola_offset(scores[by - 1:by + 2, bx]) if 0 < by < scores.shape[0] - 1 else 0.0
+        return float(max_val), x0 + bx, y0 + by, fx, fy
+
+    def _refine_angle(self, image: np.ndarray, x: int, y: int, k: int) -> Tuple[float, float, float, float]:
+        """Posição sub-pixel, ângulo sub-passo e score em resolução total, a partir do ângulo k.
+
+        k já é o melhor entre k±1 (_search). O pico da correlação em função do ângulo costuma
+        ser assimétrico e a parábola em ±1 passo erra frações de grau, então o ângulo é
+        bisseccionado com modelos girados na hora (o melhor ângulo contra ±meio passo), cada um
+        na sua própria melhor posição (janela de ±1 px em torno da posição do melhor até
+        então). A parábola final usa os vizinhos a angle_step / 2^_ANGLE_BISECTIONS.
+        """
+        best = self._match_window(image, self.models[0][k], x, y, radius=1)
+        angle = float(self.angles[k])
+        if len(self.angles) < 2:
+            return best[1] + best[3], best[2] + best[4], angle, best[0]
+        lo, hi = float(self.angles[0]), float(self.angles[-1])
+        scores = {angle: best[0]}
+
+        def evaluate(a: float):
+            if a not in scores and lo <= a <= hi:
+                match = self._match_window(image, self._rotate_template(self.template, a), best[1], best[2], radius=1)
+                scores[a] = match[0]
+                return match
+            return None
+
+        half = self.angle_step
+        for _ in range(_ANGLE_BISECTIONS):
+            half *= 0.5
+            for match, a in [(evaluate(a), a) for a in (angle - half, angle + half)]:
+                if match is not None and match[0] > best[0]:
+                    angle, best = a, match
+        # Parábola no trio final (vizinhos a ±half do melhor ângulo)
+        evaluate(angle - half)
+        evaluate(angle + half)
+        if angle - half in scores and angle + half in scores:
+            trio = np.array([scores[angle - half], best[0], scores[angle + half]])
+            angle += self._parabola_offset(trio) * half
+        return best[1] + best[3], best[2] + best[4], angle, best[0]
+
+    @staticmethod
+    def _parabola_offset(values: np.ndarray) -> float:
+        """Deslocamento do vértice da parábola por três valores (limitado a ±0,5)."""
+        left, center, right = (float(v) for v in values)
+        denom = left - 2.0 * center + right
+        if denom >= 0.0:
+            return 0.0
+        return max(-0.5, min(0.5, 0.5 * (left - right) / denom))
+
+    # ----------------------
+    # Utilidades internas
+    # ----------------------
+    def _normalize_angle(self, ang: float) -> float:
+        a = float(ang)
+        while a <= -180.0:
+            a += 360.0
+        while a > 180.0:
+            a -= 360.0
+        return a
+
+    def _parse_reference(self, ref_like: Any) -> Dict[str, float] | None:
+        if not isinstance(ref_like, dict):
+            return None
+        try:
+            ang = ref_like.get('angle_deg', ref_like.get('angle'))
+            if ref_like.get('x') is None or ref_like.get('y') is None or ang is None:
+                return None
+            return {
+                'x': float(ref_like['x']),
+                'y': float(ref_like['y']),
+                'angle_deg': self._normalize_angle(float(ang))
+            }
+        except (TypeError, ValueError):
+            return None
@@ -19,20 +19,22 @@ class ThresholdFilterTool(BaseTool):
         start_time = time.time()
         try:
             # Garantir grayscale para limiarização
-            if len(roi_image.shape) == 3:
-                gray = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = roi_image
+            gray = self.gray_roi(roi_image)
 
             if self.mode == 'range':
                 lo = int(max(0, min(255, self.th_min)))
                 hi = int(max(lo, min(255, self.th_max)))
-                out = cv2.inRange(gray, lo, hi)
+                out = self.cached_artifact('gray_in_range', (lo, hi), gray,
+                                           lambda g: cv2.inRange(g, lo, hi), pointwise=True)
             elif self.mode == 'otsu':
-                _, out = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                # Limiar depende do histograma do ROI inteiro: sem recorte de artefato maior
+                out = self.cached_artifact('gray_otsu', (), gray,
+                                           lambda g: cv2.threshold(g, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1])
             else:
                 # binary
-                _, out = cv2.threshold(gray, int(self.th_min), int(self.th_max), cv2.THRESH_BINARY)
+                th, maxval = int(self.th_min), int(self.th_max)
+                out = self.cached_artifact('gray_threshold', (th, maxval), gray,
+                                           lambda g: cv2.threshold(g, th, maxval, cv2.THRESH_BINARY)[1], pointwise=True)
 
             self.last_processing_time = (time.time() - start_time) * 1000
             return out
@@ -40,6 +42,28 @@ class ThresholdFilterTool(BaseTool):
             self.last_processing_time = (time.time() - start_time) * 1000
             return roi_image
 
+    def gray_equivalent(self) -> bool:
+        # Cinza replicado em BGR volta exatamente ao mesmo cinza
+        return True
+
+    def is_point_op(self) -> bool:
+        # Otsu depende do histograma de uma forma que não é reproduzida aqui
+        return self.mode in ('binary', 'range')
+
+    def lut_input(self, roi_image: np.ndarray):
+        return super().lut_input(self.gray_roi(roi_image))
+
+    def point_lut(self, input_hist):
+        values = np.arange(256)
+        if self.mode == 'range':
+            lo = int(max(0, min(255, self.th_min)))
+            hi = int(max(lo, min(255, self.th_max)))
+            return np.where((values >= lo) & (values <= hi), 255, 0).astype(np.uint8)
+        if self.mode == 'binary':
+            maxval = int(max(0, min(255, self.th_max)))
+            return np.where(values > int(self.th_min), maxval, 0).astype(np.uint8)
+        return None
+
     def validate_config(self) -> bool:
         return True
 
@@ -0,0 +1,145 @@
+import gc
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+class FrameTrace:
+    """Spans de um frame (início/fim em time.perf_counter) coletados pelos estágios do pipeline."""
+
+    __slots__ = ('frame_number', 'start', 'end', 'spans')
+
+    def __init__(self, frame_number: int):
+        self.frame_number = frame_number
+        self.start = time.perf_counter()
+        self.end = None
+        self.spans = []
+
+    def add(self, name: str, t0: float, t1: float, cat: str = 'vm'):
+        """Registra um span já medido (thread atual)."""
+        self.spans.append((name, cat, threading.get_ident(), t0, t1))
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+
+class TraceRecorder:
+    """Gravador opcional de traces por frame em um ring de tamanho fixo.
+
+    Desligado, `begin_frame()` retorna None e nenhum span é coletado. Ligado, os frames
+    concluídos ficam nos últimos `capacity` slots e podem ser exportados no formato
+    Chrome trace-event (chrome://tracing / Perfetto), junto com as pausas de GC ocorridas.
+    """
+
+    def __init__(self, capacity: int = 200, enabled: bool = False):
+        self._lock = threading.Lock()
+        self._frames = deque(maxlen=max(1, int(capacity)))
+        self._gc_pauses = deque(maxlen=max(1, int(capacity)) * 4)
+        self._gc_start = {}
+        self._epoch = time.perf_counter()
+        self.enabled = False
+        self.set_enabled(enabled)
+
+    @property
+    def capacity(self) -> int:
+        return self._frames.maxlen
+
+    def set_enabled(self, enabled: bool, capacity: Optional[int] = None):
+        with self._lock:
+            if capacity is not None and int(capacity) != self._frames.maxlen:
+                self._frames = deque(self._frames, maxlen=max(1, int(capacity)))
+                self._gc_pauses = deque(self._gc_pauses, maxlen=max(1, int(capacity)) * 4)
+            enabled = bool(enabled)
+            if enabled and not self.enabled:
+                gc.callbacks.append(self._on_gc)
+            elif not enabled and self.enabled:
+                try:
+                    gc.callbacks.remove(self._on_gc)
+                except ValueError:
+                    pass
+            self.enabled = enabled
+
+    def begin_frame(self, frame_number: int) -> Optional[FrameTrace]:
+        return FrameTrace(frame_number) if self.enabled else None
+
+    def finish_frame(self, trace: Optional[FrameTrace]):
+        if trace is None:
+            return
+        trace.end = time.perf_counter()
+        with self._lock:
+            self._frames.append(trace)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._gc_pauses.clear()
+
+    def _on_gc(self, phase: str, info: Dict[str, Any]):
+        tid = threading.get_ident()
+        if phase == 'start':
+            self._gc_start[tid] = time.perf_counter()
+        else:
+            t0 = self._gc_start.pop(tid, None)
+            if t0 is not None:
+                self._gc_pauses.append((f"gc gen{info.get('generation')}", tid, t0, time.perf_counter()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'enabled': self.enabled, 'capacity': self.capacity, 'frames': len(self._frames)}
+
+    def export_chrome_trace(self, last: Optional[int] = None, slowest: Optional[int] = None) -> Dict[str, Any]:
+        """Exporta os últimos `last` frames ou os `slowest` mais lentos como Chrome trace JSON."""
+        with self._lock:
+            frames = list(self._frames)
+            gc_pauses = list(self._gc_pauses)
+        if slowest:
+            frames = sorted(frames, key=lambda f: f.duration_ms, reverse=True)[:int(slowest)]
+            frames.sort(key=lambda f: f.start)
+        elif last:
+            frames = frames[-int(last):]
+
+        pid = os.getpid()
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        events: List[Dict[str, Any]] = []
+        tids = set()
+
+        def _us(t: float) -> float:
+            return round((t - self._epoch) * 1e6, 1)
+
+        for frame in frames:
+            events.append({
+                'name': f'frame {frame.frame_number}', 'cat': 'frame', 'ph': 'X', 'pid': pid, 'tid': 0,
+                'ts': _us(frame.start), 'dur': round((frame.end - frame.start) * 1e6, 1),
+                'args': {'frame': frame.frame_number, 'duration_ms': round(frame.duration_ms, 3)}
+            })
+            for name, cat, tid, t0, t1 in frame.spans:
+                tids.add(tid)
+                events.append({
+                    'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+                    'ts': _us(t0), 'dur': round((t1 - t0) * 1e6, 1),
+                    'args': {'frame': frame.frame_number}
+                })
+
+        # Pausas de GC dentro da janela dos frames exportados
+        if frames:
+            window_start = frames[0].start
+            window_end = max(f.end for f in frames)
+            for name, tid, t0, t1 in gc_pauses:
+                if t1 >= window_start and t0 <= window_end:
+                    tids.add(tid)
+                    events.append({
+                        'name': name, 'cat': 'gc', 'ph': 'X', 'pid': pid, 'tid': tid,
+                        'ts': _us(t0), 'dur': round((t1 - t0) * 1e6, 1)
+                    })
+
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': 'Frames'}})
+        for tid in sorted(tids):
+            events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                'args': {'name': thread_names.get(tid, f'thread-{tid}')}
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
@@ -16,6 +16,7 @@ import asyncio
 import signal
 import atexit
 import glob
+import copy
 import threading
 from datetime import datetime
 import uuid
@@ -30,9 +31,15 @@ from flask_socketio import SocketIO, emit, disconnect
 import cv2
 import numpy as np
 
+from metrics import METRICS
+from tracing import TraceRecorder
+from frame_region import read_image
+
 # Import do sistema de ferramentas
 try:
-    from inspection_processor import InspectionProcessor
+    from inspection_processor import InspectionProcessor, stateful_tool_names
+    from worker_farm import InspectionWorkerFarm
+    from tools import materialize_deferred_geometry, pack_tool_results
     TOOLS_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"⚠️ Sistema de ferramentas não disponível: {str(e)}")
@@ -45,6 +52,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Filas do pipeline captura -> inspeção -> publicação (ver TestModeProcessor)
+DEFAULT_PROCESSING_CONFIG = {
+    "inspect_queue_size": 2,
+    "inspect_queue_policy": "block",
+    "publish_queue_size": 4,
+    "publish_queue_policy": "block",
+    "workers": 0,
+    "worker_slots": 0
+}
+
 class ImageSource:
     """Classe para gerenciar diferentes fontes de imagem"""
     
@@ -248,7 +265,8 @@ class ImageSource:
             image_path = self.image_files[self.current_image_index]
             logger.info(f"📁 Lendo imagem: {image_path}")
             
-            frame = cv2.imread(image_path)
+            # decode_scale (2, 4, 8): decodificação reduzida (IMREAD_REDUCED_*), bem mais rápida em JPEG grandes
+            frame = read_image(image_path, self.source_config.get('decode_scale', 1))
             
             if frame is None:
                 error_msg = f"Erro ao ler imagem: {image_path}"
@@ -351,14 +369,96 @@ class ImageSource:
             # Re-raise para que o erro seja capturado pelo update_source_config
             raise
 
+class StageQueue:
+    """Fila limitada entre estágios do pipeline de processamento.
+
+    Políticas quando a fila está cheia:
+    - 'block': o produtor aguarda espaço (nenhum frame é perdido; backpressure)
+    - 'drop_oldest': descarta o item mais antigo da fila
+    - 'drop_newest': descarta o item que está sendo inserido
+    """
+
+    POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+    def __init__(self, name: str, maxsize: int = 2, policy: str = 'block'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Política de fila inválida para '{name}': {policy}")
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.put_count = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item, timeout: float = 0.1, force_block: bool = False) -> bool:
+        """Insere um item. Retorna False se não houve espaço dentro do timeout (política 'block'
+        ou `force_block`) ou se o próprio item foi descartado ('drop_newest')."""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.policy == 'drop_newest' and not force_block:
+                    self.dropped += 1
+                    return False
+                if self.policy == 'drop_oldest' and not force_block:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif not self._cond.wait_for(lambda: len(self._items) < self.maxsize, timeout=timeout):
+                    return False
+            self._items.append(item)
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout: float = 0.1):
+        """Retira o item mais antigo ou None se a fila continuar vazia após o timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._items) > 0, timeout=timeout):
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'depth': len(self._items),
+                'maxsize': self.maxsize,
+                'policy': self.policy,
+                'put': self.put_count,
+                'dropped': self.dropped,
+                'max_depth': self.max_depth,
+            }
+
+
 class TestModeProcessor:
-    """Processador para o modo teste da VM"""
+    """Processador para o modo teste da VM
+
+    O processamento é dividido em três estágios, cada um em sua própria thread,
+    ligados por filas limitadas (ver `StageQueue`):
+    captura (grab) -> inspeção (inspect) -> publicação (log + WebSocket).
+    Assim o frame N+1 é capturado enquanto o frame N é inspecionado e o N-1 é codificado.
+    """
     
-    def __init__(self, vm_instance, socketio_instance):
+    def __init__(self, vm_instance, socketio_instance, trace_recorder: Optional[TraceRecorder] = None):
         self.vm = vm_instance
         self.socketio = socketio_instance
+        # Tracing por frame (opcional; desligado não coleta nada)
+        self.trace_recorder = trace_recorder or TraceRecorder()
         self.running = False
         self.processing_thread = None
+        self.inspect_thread = None
+        self.publish_thread = None
         self.frame_count = 0
         self.approved_count = 0
         self.rejected_count = 0
@@ -366,6 +466,20 @@ class TestModeProcessor:
         self.websocket_update_interval = 1.0  # 1 segundo
         self.last_frame = None
         
+        # Filas entre estágios (recriadas a cada start conforme processing_config)
+        self.inspect_queue = None
+        self.publish_queue = None
+        self.stage_stats = {}
+        self.stage_stats_lock = threading.Lock()
+        # Histogramas de latência (/api/metrics)
+        self._stage_latency = {
+            'grab': METRICS.stage('capture'),
+            'inspect': METRICS.stage('inspect'),
+            'publish': METRICS.stage('publish'),
+        }
+        self._cycle_latency = METRICS.stage('cycle')
+        self._jpeg_websocket_latency = METRICS.stage('jpeg_encode_websocket')
+        
         # Controle para modo gatilho
         self.trigger_requested = False
         self.trigger_lock = threading.Lock()
@@ -382,8 +496,48 @@ class TestModeProcessor:
             return
         
         logger.info("🚀 Iniciando processador de teste...")
+        processing_config = getattr(self.vm, 'processing_config', {}) or {}
+        self.inspect_queue = StageQueue(
+            'inspect',
+            processing_config.get('inspect_queue_size', 2),
+            processing_config.get('inspect_queue_policy', 'block')
+        )
+        self.publish_queue = StageQueue(
+            'publish',
+            processing_config.get('publish_queue_size', 4),
+            processing_config.get('publish_queue_policy', 'block')
+        )
+        with self.stage_stats_lock:
+            self.stage_stats = {
+                stage: {'count': 0, 'total_ms': 0.0, 'last_ms': 0.0}
+                for stage in ('grab', 'inspect', 'publish')
+            }
+        
+        # Worker farm opcional: N processos, cada um com seu InspectionProcessor
+        num_workers = int(processing_config.get('workers', 0) or 0)
+        stateful = stateful_tool_names(self.vm.inspection_config) if num_workers > 0 and TOOLS_AVAILABLE else []
+        if stateful:
+            logger.warning(f"⚠️ Ferramentas com estado entre frames ({', '.join(stateful)}): worker farm desativado, inspeção no processo principal")
+        elif num_workers > 0 and TOOLS_AVAILABLE:
+            try:
+                self.vm.worker_farm = InspectionWorkerFarm(
+                    copy.deepcopy(self.vm.inspection_config),
+                    num_workers,
+                    processing_config.get('worker_slots') or None,
+                    config_version=self.vm.config_version,
+                    fail_fast=self.vm.mode == 'RUN'
+                )
+                logger.info(f"✅ Worker farm iniciado com {num_workers} processos")
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao iniciar worker farm, usando processamento local: {str(e)}")
+                self.vm.worker_farm = None
+        
         self.running = True
-        self.processing_thread = threading.Thread(target=self._processing_loop, daemon=True)
+        self.processing_thread = threading.Thread(target=self._processing_loop, name='GrabStage', daemon=True)
+        self.inspect_thread = threading.Thread(target=self._inspection_loop, name='InspectStage', daemon=True)
+        self.publish_thread = threading.Thread(target=self._publish_loop, name='PublishStage', daemon=True)
+        self.publish_thread.start()
+        self.inspect_thread.start()
         self.processing_thread.start()
         logger.info("✅ Processador de modo teste iniciado com sucesso")
         logger.info(f"📊 Thread ID: {self.processing_thread.ident}")
@@ -393,10 +547,20 @@ class TestModeProcessor:
         """Para o processamento em modo teste"""
         logger.info("🛑 Parando processador de teste...")
         self.running = False
-        if self.processing_thread and self.processing_thread.is_alive():
-            logger.info("⏳ Aguardando thread finalizar...")
-            self.processing_thread.join(timeout=2)
-            logger.info(f"📊 Thread finalizada: {not self.processing_thread.is_alive()}")
+        current = threading.current_thread()
+        for thread in (self.processing_thread, self.inspect_thread, self.publish_thread):
+            if thread and thread.is_alive() and thread is not current:
+                logger.info(f"⏳ Aguardando thread {thread.name} finalizar...")
+                thread.join(timeout=2)
+                logger.info(f"📊 Thread {thread.name} finalizada: {not thread.is_alive()}")
+        for stage_queue in (self.inspect_queue, self.publish_queue):
+            if stage_queue is not None:
+                stage_queue.clear()
+        farm = getattr(self.vm, 'worker_farm', None)
+        if farm is not None:
+            self.vm.worker_farm = None
+            farm.close()
+            logger.info("✅ Worker farm encerrado")
         logger.info("✅ Processador de modo teste parado")
     
     def request_trigger(self):
@@ -405,9 +569,47 @@ class TestModeProcessor:
             self.trigger_requested = True
             logger.info("🔘 Trigger solicitado para próxima execução")
     
+    def get_pipeline_status(self) -> Dict[str, Any]:
+        """Profundidade/política das filas e tempos médios de cada estágio (para /api/status)"""
+        with self.stage_stats_lock:
+            stages = {
+                stage: {
+                    'count': s['count'],
+                    'last_ms': round(s['last_ms'], 2),
+                    'avg_ms': round(s['total_ms'] / s['count'], 2) if s['count'] else 0.0
+                }
+                for stage, s in self.stage_stats.items()
+            }
+        farm = getattr(self.vm, 'worker_farm', None)
+        return {
+            'running': self.running,
+            'stages': stages,
+            'workers': farm.stats() if farm is not None else None,
+            'queues': {
+                q.name: q.stats() for q in (self.inspect_queue, self.publish_queue) if q is not None
+            }
+        }
+    
+    def _record_stage_time(self, stage: str, elapsed_ms: float):
+        self._stage_latency[stage].observe(elapsed_ms)
+        with self.stage_stats_lock:
+            s = self.stage_stats.get(stage)
+            if s is not None:
+                s['count'] += 1
+                s['total_ms'] += elapsed_ms
+                s['last_ms'] = elapsed_ms
+    
+    def _stop_with_error(self, error_message: str):
+        """Coloca a VM em erro e encerra todos os estágios"""
+        logger.error(f"❌ {error_message}")
+        self.vm.set_error(error_message)
+        self.running = False
+        logger.error("🛑 Processador parado devido a erro crítico")
+    
     def _processing_loop(self):
-        """Loop principal de processamento"""
+        """Estágio de captura: obtém frames da fonte e os entrega à fila de inspeção"""
         logger.info("🔄 Loop de processamento iniciado")
+        grabbed = 0
         while self.running:
             try:
                 # Verificar se está em modo válido (TESTE ou RUN)
@@ -429,10 +631,7 @@ class TestModeProcessor:
                     continue
 
                 if not hasattr(self.vm, 'image_source') or self.vm.image_source is None:
-                    error_message = "Source de imagem não disponível"
-                    logger.error(f"❌ {error_message}")
-                    self.vm.set_error(error_message)
-                    self.running = False
+                    self._stop_with_error("Source de imagem não disponível")
                     break
                 
                 # Verificar tipo de trigger
@@ -449,31 +648,22 @@ class TestModeProcessor:
                             logger.info("🔘 Trigger consumido, processando frame...")
                 
                 # Obter frame da fonte de imagem
+                grab_start = time.time()
+                trace = self.trace_recorder.begin_frame(grabbed + 1)
                 frame = self.vm.image_source.get_frame()
                 if frame is not None:
-                    # Guardar último frame para transmissão
-                    self.last_frame = frame
-                    logger.info(f"📸 Frame {self.frame_count + 1} obtido, processando...")
-                    
-                    # Processar frame (simulação de inspeção)
-                    result = self._process_frame(frame)
-                    # Enfileirar log conforme política
-                    try:
-                        self.vm.try_enqueue_log(frame, result)
-                    except Exception:
-                        pass
-                    
-                    # Atualizar contadores
-                    self.frame_count += 1
-                    if result['approved']:
-                        self.approved_count += 1
-                    else:
-                        self.rejected_count += 1
+                    self._record_stage_time('grab', (time.time() - grab_start) * 1000)
+                    if trace is not None:
+                        trace.add('capture', trace.start, time.perf_counter(), 'stage')
+                    grabbed += 1
+                    logger.info(f"📸 Frame {grabbed} obtido, enviando para inspeção...")
                     
-                    logger.info(f"✅ Frame {self.frame_count} processado: {'Aprovado' if result['approved'] else 'Reprovado'}")
-                    
-                    # Enviar para WebSocket se necessário
-                    self._send_websocket_update(result)
+                    # Frames de gatilho nunca são descartados: aguardar espaço na fila
+                    force_block = trigger_type == 'trigger'
+                    while self.running and not self.inspect_queue.put((grabbed, frame, grab_start, trace), force_block=force_block):
+                        if self.inspect_queue.policy == 'drop_newest' and not force_block:
+                            logger.debug(f"⏭️ Frame {grabbed} descartado (fila de inspeção cheia)")
+                            break
                 else:
                     logger.warning("⚠️ Nenhum frame obtido da fonte de imagem")
                 
@@ -487,29 +677,159 @@ class TestModeProcessor:
                     time.sleep(0.1)  # Verificação rápida para novos triggers
                 
             except Exception as e:
-                error_message = f"Erro crítico no loop de processamento: {str(e)}"
-                logger.error(f"❌ {error_message}")
-                
-                # Mudar status da VM para error e parar processamento
-                self.vm.set_error(error_message)
+                self._stop_with_error(f"Erro crítico no loop de processamento: {str(e)}")
+                break
+    
+    def _inspection_loop(self):
+        """Estágio de inspeção: processa frames da fila e entrega resultados à publicação"""
+        farm = getattr(self.vm, 'worker_farm', None)
+        pending_item = None
+        if farm is not None:
+            # Retorna quando o farm é desligado com a inspeção em andamento (receita com SPC)
+            pending_item = self._farm_inspection_loop(farm)
+        # Imagens finais em uso simultâneo: fila de publicação + item sendo publicado + frame atual
+        frames_in_flight = self.publish_queue.maxsize + 2
+        while self.running:
+            item = pending_item if pending_item is not None else self.inspect_queue.get(timeout=0.1)
+            pending_item = None
+            if item is None:
+                continue
+            frame_number, frame, captured_at, trace = item
+            try:
+                processor = getattr(self.vm, 'inspection_processor', None)
+                frame_buffer = getattr(processor, 'frame_buffer', None)
+                if frame_buffer is not None:
+                    frame_buffer.ensure_pool_size(frames_in_flight)
                 
-                # Parar o processador
-                self.running = False
+                inspect_start = time.time()
+                trace_start = time.perf_counter()
+                result = self._process_frame(frame, trace)
+                self._record_stage_time('inspect', (time.time() - inspect_start) * 1000)
+                if trace is not None:
+                    trace.add('inspect', trace_start, time.perf_counter(), 'stage')
+                self._finish_frame(frame, result, captured_at, trace)
+            except Exception as e:
+                self._stop_with_error(f"Erro crítico no loop de processamento: {str(e)}")
+                break
+    
+    def _farm_inspection_loop(self, farm):
+        """Estágio de inspeção com worker farm: distribui frames entre os processos e
+        entrega os resultados à publicação na ordem de captura.
+
+        Se o farm é desligado durante a inspeção (`vm.worker_farm` trocado por None ao aplicar
+        uma receita com ferramentas de estado entre frames), para de enviar frames, entrega os
+        que estão nos workers, encerra os processos e devolve o item já retirado da fila (ou
+        None) para o processamento local continuar na mesma ordem.
+        """
+        pending_item = None
+        captured_at = {}
+        while self.running:
+            try:
+                detached = self.vm.worker_farm is not farm
+                if detached and not farm.in_flight:
+                    farm.close()
+                    logger.info("✅ Worker farm encerrado; inspeção segue no processo principal")
+                    return pending_item
+                if not detached and pending_item is None and farm.can_submit():
+                    pending_item = self.inspect_queue.get(timeout=0.005 if farm.in_flight else 0.1)
+                if pending_item is not None and not detached:
+                    frame_number, frame, captured, trace = pending_item
+                    if farm.submit(frame_number, frame):
+                        captured_at[frame_number] = (captured, trace, time.perf_counter())
+                        pending_item = None
                 
-                logger.error("🛑 Processador parado devido a erro crítico")
+                for frame_number, frame, status, payload in farm.collect(timeout=0.005):
+                    captured, trace, submitted = captured_at.pop(frame_number, (None, None, None))
+                    if trace is not None:
+                        trace.add('inspect (worker)', submitted, time.perf_counter(), 'stage')
+                    if status == 'error':
+                        raise Exception(f"Erro ao processar frame {frame_number}: {payload}")
+                    if status == 'empty':
+                        # Workers sem ferramentas: mesmo fallback (simulação) do processamento local
+                        result = self._process_frame(frame)
+                    else:
+                        result = {
+                            'approved': payload.get('inspection_summary', {}).get('overall_pass', True),
+                            'processing_time_ms': payload['worker']['round_trip_ms'],
+                            'inspection_result': payload
+                        }
+                    self._record_stage_time('inspect', result['processing_time_ms'])
+                    self._finish_frame(frame, result, captured, trace)
+            except Exception as e:
+                self._stop_with_error(f"Erro crítico no loop de processamento: {str(e)}")
                 break
+        if self.vm.worker_farm is not farm:
+            # Desligado durante a inspeção: o stop() não o encontra mais em vm.worker_farm
+            farm.close()
+        return None
     
-    def _process_frame(self, frame: np.ndarray) -> Dict[str, Any]:
+    def _finish_frame(self, frame: np.ndarray, result: Dict[str, Any], captured_at: Optional[float] = None, trace=None):
+        """Atualiza contadores e envia o frame inspecionado ao estágio de publicação"""
+        self.frame_count += 1
+        if result['approved']:
+            self.approved_count += 1
+        else:
+            self.rejected_count += 1
+        
+        logger.info(f"✅ Frame {self.frame_count} processado: {'Aprovado' if result['approved'] else 'Reprovado'}")
+        
+        # Contadores capturados agora: a publicação pode ocorrer frames depois
+        counts = (self.frame_count, self.approved_count, self.rejected_count)
+        while self.running and not self.publish_queue.put((frame, result, counts, captured_at, trace)):
+            if self.publish_queue.policy == 'drop_newest':
+                break
+    
+    def _publish_loop(self):
+        """Estágio de publicação: log (JPEG) e atualização WebSocket (JPEG + base64)"""
+        while self.running:
+            item = self.publish_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            try:
+                frame, result, counts, captured_at, trace = item
+                publish_start = time.time()
+                self.last_frame = frame
+            
+                if 'inspection_result' in result:
+                    # Enviar resultado completo via WebSocket
+                    emit_start = time.perf_counter()
+                    self._send_inspection_result(result['inspection_result'])
+                    if trace is not None:
+                        trace.add('emit inspection_result', emit_start, time.perf_counter(), 'publish')
+            
+                # Enfileirar log conforme política
+                try:
+                    self.vm.try_enqueue_log(frame, result, trace)
+                except Exception:
+                    pass
+            
+                # Enviar para WebSocket se necessário
+                self._send_websocket_update(result, counts, trace)
+                self.trace_recorder.finish_frame(trace)
+                publish_end = time.time()
+                self._record_stage_time('publish', (publish_end - publish_start) * 1000)
+                if captured_at is not None:
+                    # Ciclo completo: início da captura até o fim da publicação
+                    self._cycle_latency.observe((publish_end - captured_at) * 1000)
+            except Exception as e:
+                self._stop_with_error(f"Erro crítico no loop de publicação: {str(e)}")
+                break
+    
+    def _process_frame(self, frame: np.ndarray, trace=None) -> Dict[str, Any]:
         """Processa um frame usando sistema de ferramentas ou simulação"""
         try:
             start_time = time.time()
             
             # Verificar se há processador de ferramentas disponível
-            if hasattr(self.vm, 'inspection_processor') and self.vm.inspection_processor:
-                # Usar sistema de ferramentas
-                logger.info("🔧 Processando frame com sistema de ferramentas...")
-                inspection_result = self.vm.inspection_processor.process_inspection(frame)
-                
+            # (lock: a troca de versão do processador só ocorre entre frames)
+            with self.vm.processor_lock:
+                processor = getattr(self.vm, 'inspection_processor', None)
+                if processor:
+                    # Usar sistema de ferramentas
+                    logger.info("🔧 Processando frame com sistema de ferramentas...")
+                    inspection_result = processor.process_inspection(frame, trace=trace)
+            
+            if processor:
                 # Extrair resultado de aprovação
                 overall_pass = inspection_result.get('inspection_summary', {}).get('overall_pass', True)
                 approved = overall_pass
@@ -517,9 +837,6 @@ class TestModeProcessor:
                 # Calcular tempo total
                 total_time = (time.time() - start_time) * 1000
                 
-                # Enviar resultado completo via WebSocket
-                self._send_inspection_result(inspection_result)
-                
                 return {
                     'approved': approved,
                     'processing_time_ms': total_time,
@@ -547,8 +864,12 @@ class TestModeProcessor:
             # Re-raise para ser capturado pelo _processing_loop
             raise Exception(error_message)
     
-    def _send_websocket_update(self, result: Dict[str, Any]):
-        """Envia atualização para WebSocket (no TESTE com rate limit; no RUN sem limite)"""
+    def _send_websocket_update(self, result: Dict[str, Any], counts: Optional[tuple] = None, trace=None):
+        """Envia atualização para WebSocket (no TESTE com rate limit; no RUN sem limite)
+
+        `counts` = (frame, aprovados, reprovados) no momento da inspeção do frame; quando
+        omitido, usa os contadores atuais.
+        """
         # Verificar se há erro ativo
         if self.vm.status == 'error':
             logger.warning("⚠️ Não enviando WebSocket devido a erro ativo")
@@ -591,19 +912,25 @@ class TestModeProcessor:
                     total_time = inspection_summary.get('total_processing_time_ms', 0)
                     tools_config = self.vm.inspection_config.get('tools', [])
                     tools_results = result['inspection_result']['tool_results']
+                    # Polígonos adiados (Blob com geometry=lazy) só para frames efetivamente enviados
+                    if TOOLS_AVAILABLE:
+                        materialize_deferred_geometry(tools_results)
                 else:
                     # Sistema antigo (simulação) - usar dados básicos
                     total_time = result.get('processing_time_ms', 0)
                     tools_config = []
                     tools_results = []
                 
+                frame_count, approved_count, rejected_count = counts or (
+                    self.frame_count, self.approved_count, self.rejected_count
+                )
                 websocket_data = {
-                    'aprovados': self.approved_count,
-                    'reprovados': self.rejected_count,
-                    'frame': self.frame_count,
+                    'aprovados': approved_count,
+                    'reprovados': rejected_count,
+                    'frame': frame_count,
                     'time': f"{total_time:.2f}ms",
                     'tools': tools_config,  # JSON de configuração da inspeção
-                    'result': tools_results,  # Lista resultante de todos os processos das tools
+                    'result': self._pack_geometry(tools_results),  # Lista resultante de todos os processos das tools
                     'timestamp': timestamp,
                     'source_type': source_type,
                     'mode': self.vm.mode
@@ -623,7 +950,12 @@ class TestModeProcessor:
 
                     if image_to_send is not None:
                         encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
+                        encode_start = time.perf_counter()
                         ok, jpeg_buf = cv2.imencode('.jpg', image_to_send, encode_param)
+                        encode_end = time.perf_counter()
+                        self._jpeg_websocket_latency.observe((encode_end - encode_start) * 1000)
+                        if trace is not None:
+                            trace.add('jpeg_encode_websocket', encode_start, encode_end, 'publish')
                         if ok:
                             jpeg_bytes = jpeg_buf.tobytes()
                             websocket_data['image_base64'] = base64.b64encode(jpeg_bytes).decode('ascii')
@@ -642,10 +974,13 @@ class TestModeProcessor:
                     logger.info("📡 Enviando para WebSocket (payload omitido por segurança)")
                 
                 # Enviar para todos os clientes conectados
+                emit_start = time.perf_counter()
                 self.socketio.emit('test_result', websocket_data, namespace='/')
+                if trace is not None:
+                    trace.add('emit test_result', emit_start, time.perf_counter(), 'publish')
                 
                 self.last_websocket_update = current_time
-                logger.info(f"✅ WebSocket atualizado com sucesso: Frame {self.frame_count}")
+                logger.info(f"✅ WebSocket atualizado com sucesso: Frame {frame_count}")
                 
             except Exception as e:
                 error_message = f"Erro ao enviar para WebSocket: {str(e)}"
@@ -657,6 +992,29 @@ class TestModeProcessor:
         else:
             logger.debug(f"⏳ WebSocket rate-limited: {self.websocket_update_interval - (current_time - self.last_websocket_update):.2f}s restantes")
     
+    def publish_reinspection(self, inspection_result: Dict[str, Any]):
+        """Publica o resultado de uma re-inspeção incremental do último frame (edição de ferramenta)
+
+        Não altera os contadores: o frame já foi contabilizado quando foi inspecionado.
+        """
+        if not self.running:
+            return
+        summary = inspection_result.get('inspection_summary', {})
+        result = {
+            'approved': summary.get('overall_pass', True),
+            'processing_time_ms': summary.get('total_processing_time_ms', 0),
+            'inspection_result': inspection_result
+        }
+        logger.info(f"⚡ Re-inspeção a partir da ferramenta {summary.get('reinspected_from')} em {result['processing_time_ms']:.2f}ms")
+        self._send_inspection_result(inspection_result)
+        self._send_websocket_update(result)
+    
+    def _pack_geometry(self, tools_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Codifica blobs/bordas dos resultados para o WebSocket (`geometry_encoding` da receita)."""
+        if not TOOLS_AVAILABLE:
+            return tools_results
+        return pack_tool_results(tools_results, self.vm.inspection_config.get('geometry_encoding', 'packed'))
+
     def _send_inspection_result(self, inspection_result: Dict[str, Any]):
         """Envia resultado completo de inspeção via WebSocket"""
         try:
@@ -692,6 +1050,8 @@ class VisionMachine:
         self.log_buffer_lock = threading.Lock()
         self.log_flush_event = threading.Event()
         self.log_worker_running = True
+        self._log_enqueue_latency = METRICS.stage('log_enqueue')
+        self._jpeg_log_latency = METRICS.stage('jpeg_encode_log')
         # Diretório de logs
         self.logs_dir = os.path.join(os.path.dirname(self.config_file) or '.', 'logs')
         try:
@@ -714,9 +1074,18 @@ class VisionMachine:
         
         # Inicializar processador de inspeção com ferramentas
         self.inspection_processor = None
+        # Worker farm (multi-processo) criado pelo TestModeProcessor quando processing.workers > 0
+        self.worker_farm = None
+        # Callback que publica re-inspeções incrementais (definido pelo servidor Flask)
+        self.reinspection_listener = None
+        # Versão da configuração de inspeção (incrementada a cada troca de processador)
+        self.config_version = 0
+        self.processor_lock = threading.RLock()
         if TOOLS_AVAILABLE and hasattr(self, 'inspection_config') and self.inspection_config.get('tools'):
             try:
                 self.inspection_processor = InspectionProcessor(self.inspection_config)
+                self.inspection_processor.set_stage_cache(self.mode == 'TESTE')
+                self.inspection_processor.set_fail_fast(self.mode == 'RUN')
                 logger.info(f"✅ Processador de ferramentas inicializado com {len(self.inspection_processor.tools)} ferramentas")
             except Exception as e:
                 logger.warning(f"⚠️ Erro ao inicializar processador de ferramentas: {str(e)}")
@@ -769,6 +1138,8 @@ class VisionMachine:
                 })
                 # Intervalo de atualização do WebSocket no modo RUN (segundos)
                 self.websocket_update_RUN_mode = config.get('websocket_update_RUN_mode', 1.0)
+                # Pipeline de processamento (filas entre captura, inspeção e publicação)
+                self.processing_config = config.get('processing', dict(DEFAULT_PROCESSING_CONFIG))
                 
                 logger.info(f"Configurações carregadas de {self.config_file}")
             else:
@@ -808,6 +1179,8 @@ class VisionMachine:
         }
         # Padrão: no RUN limitar WebSocket a 1s
         self.websocket_update_RUN_mode = 1.0
+        # Pipeline de processamento (filas entre captura, inspeção e publicação)
+        self.processing_config = dict(DEFAULT_PROCESSING_CONFIG)
 
         # Configuração padrão de logging de resultados
         self.logging_config = {
@@ -841,6 +1214,7 @@ class VisionMachine:
                 }),
                 'error_msg': self.error_msg,  # Salvar mensagem de erro
                 'websocket_update_RUN_mode': getattr(self, 'websocket_update_RUN_mode', 1.0),
+                'processing': getattr(self, 'processing_config', dict(DEFAULT_PROCESSING_CONFIG)),
                 'last_saved': datetime.utcnow().isoformat()
             }
             
@@ -909,11 +1283,20 @@ class VisionMachine:
             return not bool(approved)
         return False
 
-    def try_enqueue_log(self, frame: Optional[np.ndarray], result: Dict[str, Any]):
+    def try_enqueue_log(self, frame: Optional[np.ndarray], result: Dict[str, Any], trace=None):
+        if not self.logging_config.get('enabled', False):
+            return
+        enqueue_start = time.perf_counter()
         try:
-            if not self.logging_config.get('enabled', False):
-                return
+            self._enqueue_log(frame, result, trace)
+        finally:
+            enqueue_end = time.perf_counter()
+            self._log_enqueue_latency.observe((enqueue_end - enqueue_start) * 1000)
+            if trace is not None:
+                trace.add('log_enqueue', enqueue_start, enqueue_end, 'publish')
 
+    def _enqueue_log(self, frame: Optional[np.ndarray], result: Dict[str, Any], trace=None):
+        try:
             # Extrair aprovação e timestamp
             if 'inspection_result' in result:
                 approved = bool(result.get('approved', True))
@@ -926,6 +1309,8 @@ class VisionMachine:
 
             if not self._should_log(approved):
                 return
+            if TOOLS_AVAILABLE and isinstance(result.get('inspection_result'), dict):
+                materialize_deferred_geometry(result['inspection_result'].get('tool_results'))
 
             # Selecionar imagem para salvar (usar final_image quando disponível, senão frame)
             image_to_save = final_image if isinstance(final_image, np.ndarray) else frame
@@ -935,7 +1320,12 @@ class VisionMachine:
             if isinstance(image_to_save, np.ndarray):
                 try:
                     encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
+                    encode_start = time.perf_counter()
                     ok, jpeg_buf = cv2.imencode('.jpg', image_to_save, encode_param)
+                    encode_end = time.perf_counter()
+                    self._jpeg_log_latency.observe((encode_end - encode_start) * 1000)
+                    if trace is not None:
+                        trace.add('jpeg_encode_log', encode_start, encode_end, 'publish')
                     if ok:
                         jpeg_bytes = jpeg_buf.tobytes()
                         height, width = int(image_to_save.shape[0]), int(image_to_save.shape[1])
@@ -967,7 +1357,8 @@ class VisionMachine:
                         'frame': inspection_summary.get('frame', 0),
                         'time': f"{inspection_summary.get('total_processing_time_ms', 0):.2f}ms",
                         'tools': tools_config,  # Configuração das ferramentas
-                        'result': tools_results  # Resultados das ferramentas
+                        # Resultados das ferramentas (geometria compacta conforme geometry_encoding)
+                        'result': pack_tool_results(tools_results, self.inspection_config.get('geometry_encoding', 'packed')) if TOOLS_AVAILABLE else tools_results
                     })
                     
                     # Remover tool_results para evitar duplicação
@@ -991,7 +1382,11 @@ class VisionMachine:
                 'image_jpeg': jpeg_bytes
             }
 
+            lock_start = time.perf_counter()
             with self.log_buffer_lock:
+                if trace is not None:
+                    # Espera pelo lock (contenção com o worker de logs)
+                    trace.add('log_buffer_lock', lock_start, time.perf_counter(), 'lock')
                 self.log_buffer.append(record)
                 # Sinalizar flush se tamanho do buffer atingir limiar
                 if len(self.log_buffer) >= int(self.logging_config.get('batch_size', 20)):
@@ -1187,6 +1582,65 @@ class VisionMachine:
         
         logger.info(f"✅ Configuração de trigger válida: tipo={trigger_type}")
 
+    def _build_inspection_processor(self):
+        """Prepara o processador para a configuração atual fora do lock: só as ferramentas
+        alteradas são criadas. As inalteradas (instâncias e caches de ROI) e o estado entre frames
+        são tomados do processador em uso na troca (`_set_inspection_processor`), sem disputar
+        o frame em andamento."""
+        return InspectionProcessor(self.inspection_config, previous=self.inspection_processor, attach=False)
+
+    def _set_inspection_processor(self, processor):
+        """Substitui o processador de inspeção (nova versão de configuração), liberando recursos
+        (pool de threads) do anterior.
+
+        No modo TESTE o novo processador herda o cache de estágios do último frame e reprocessa
+        apenas a partir da primeira ferramenta alterada; o resultado é entregue imediatamente a
+        `reinspection_listener` (edição ao vivo sem esperar o próximo ciclo).
+        Com worker farm ativo, a configuração atual é difundida a todos os workers.
+        """
+        with self.processor_lock:
+            # Sob o lock a troca acontece entre dois frames (o estágio de inspeção segura o lock por frame)
+            old = self.inspection_processor
+            if processor is not None:
+                # Reuso das ferramentas inalteradas e histórico (SPC) até o último frame do anterior
+                processor.attach(old)
+            self.config_version += 1
+            reinspection = None
+            if processor is not None:
+                processor.config_version = self.config_version
+                processor.set_stage_cache(self.mode == 'TESTE')
+                processor.set_fail_fast(self.mode == 'RUN')
+                if self.mode == 'TESTE' and old is not None:
+                    try:
+                        start_index = processor.adopt_stage_cache(old)
+                        if start_index is not None:
+                            reinspection = processor.reinspect(start_index)
+                    except Exception as e:
+                        logger.warning(f"⚠️ Falha na re-inspeção incremental: {str(e)}")
+            self.inspection_processor = processor
+            farm = getattr(self, 'worker_farm', None)
+            stateful = stateful_tool_names(self.inspection_config) if farm is not None else []
+            if stateful:
+                # Um único histórico na ordem de captura: o estágio de inspeção entrega os frames
+                # que estão nos workers, encerra o farm e segue no processo principal
+                self.worker_farm = None
+                logger.warning(f"⚠️ Ferramentas com estado entre frames ({', '.join(stateful)}): worker farm desligado")
+            elif farm is not None:
+                farm.update_config(copy.deepcopy(self.inspection_config), self.config_version, fail_fast=self.mode == 'RUN')
+                logger.info(f"📡 Configuração v{self.config_version} enviada aos workers de inspeção")
+            if old is not None and old is not processor:
+                try:
+                    old.close()
+                except Exception:
+                    pass
+        if processor is not None:
+            logger.info(f"🔁 Configuração de inspeção v{self.config_version}: {processor.reused_tools} ferramentas reaproveitadas, {len(processor.tools) - processor.reused_tools} recriadas")
+        if reinspection is not None and self.reinspection_listener is not None:
+            try:
+                self.reinspection_listener(reinspection)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao publicar re-inspeção: {str(e)}")
+
     def update_inspection_config(self, new_config: Dict[str, Any]):
         """Atualiza configuração de inspeção e salva"""
         # Atualizar configuração
@@ -1195,14 +1649,14 @@ class VisionMachine:
         # Recriar inspection_processor com nova configuração
         if TOOLS_AVAILABLE and self.inspection_config.get('tools'):
             try:
-                self.inspection_processor = InspectionProcessor(self.inspection_config)
+                self._set_inspection_processor(self._build_inspection_processor())
                 logger.info(f"✅ Processador de ferramentas recriado com {len(self.inspection_processor.tools)} ferramentas")
             except Exception as e:
                 logger.warning(f"⚠️ Erro ao recriar processador de ferramentas: {str(e)}")
-                self.inspection_processor = None
+                self._set_inspection_processor(None)
         else:
             logger.info("ℹ️ Processador de ferramentas não configurado ou não disponível")
-            self.inspection_processor = None
+            self._set_inspection_processor(None)
         
         # Sempre salvar após atualização
         self.save_config()
@@ -1281,14 +1735,14 @@ class VisionMachine:
             # Recriar inspection_processor com nova configuração
             if TOOLS_AVAILABLE:
                 try:
-                    self.inspection_processor = InspectionProcessor(self.inspection_config)
+                    self._set_inspection_processor(self._build_inspection_processor())
                     logger.info(f"✅ Processador de ferramentas recriado com {len(self.inspection_processor.tools)} ferramentas")
                 except Exception as e:
                     logger.warning(f"⚠️ Erro ao recriar processador de ferramentas: {str(e)}")
-                    self.inspection_processor = None
+                    self._set_inspection_processor(None)
             else:
                 logger.info("ℹ️ Sistema de ferramentas não disponível")
-                self.inspection_processor = None
+                self._set_inspection_processor(None)
             
             # Sempre salvar após atualização
             self.save_config()
@@ -1338,18 +1792,18 @@ class VisionMachine:
             # Recriar inspection_processor com nova configuração
             if TOOLS_AVAILABLE and tools:  # Só recriar se ainda houver tools
                 try:
-                    self.inspection_processor = InspectionProcessor(self.inspection_config)
+                    self._set_inspection_processor(self._build_inspection_processor())
                     logger.info(f"✅ Processador de ferramentas recriado com {len(self.inspection_processor.tools)} ferramentas")
                 except Exception as e:
                     logger.warning(f"⚠️ Erro ao recriar processador de ferramentas: {str(e)}")
-                    self.inspection_processor = None
+                    self._set_inspection_processor(None)
             elif not tools:
                 # Se não há mais tools, limpar o processador
                 logger.info("ℹ️ Nenhuma tool restante, limpando processador de ferramentas")
-                self.inspection_processor = None
+                self._set_inspection_processor(None)
             else:
                 logger.info("ℹ️ Sistema de ferramentas não disponível")
-                self.inspection_processor = None
+                self._set_inspection_processor(None)
             
             # Sempre salvar após remoção
             self.save_config()
@@ -1372,6 +1826,13 @@ class VisionMachine:
         """Muda o modo de operação e salva"""
         if new_mode in ['TESTE', 'RUN']:
             self.mode = new_mode
+            # Cache de estágios (re-inspeção incremental) só no modo TESTE; fail-fast só no RUN
+            if self.inspection_processor is not None:
+                self.inspection_processor.set_stage_cache(new_mode == 'TESTE')
+                self.inspection_processor.set_fail_fast(new_mode == 'RUN')
+            farm = getattr(self, 'worker_farm', None)
+            if farm is not None:
+                farm.set_fail_fast(new_mode == 'RUN')
             self.status = 'idle'
             # Limpar erro ao mudar modo
             self.error_msg = ""
@@ -1433,7 +1894,8 @@ class VisionMachine:
 class FlaskVisionServer:
     """Servidor Flask para a VM de visão computacional"""
     
-    def __init__(self, machine_id: str = "vm_default", django_url: str = "http://localhost:8000", config_file: str = None):
+    def __init__(self, machine_id: str = "vm_default", django_url: str = "http://localhost:8000", config_file: str = None,
+                 trace: bool = False, trace_capacity: int = 200):
         self.app = Flask(__name__)
         self.app.config['SECRET_KEY'] = 'vm_secret_key_change_in_production'
         
@@ -1452,8 +1914,13 @@ class FlaskVisionServer:
         # Instância da VM
         self.vm = VisionMachine(machine_id, django_url, config_file)
         
+        # Tracing por frame (opt-in: --trace ou POST /api/trace)
+        self.trace_recorder = TraceRecorder(capacity=trace_capacity, enabled=trace)
+        
         # Processador de modo teste
-        self.test_processor = TestModeProcessor(self.vm, self.socketio)
+        self.test_processor = TestModeProcessor(self.vm, self.socketio, self.trace_recorder)
+        # Edição de ferramentas no modo TESTE: publicar a re-inspeção imediatamente
+        self.vm.reinspection_listener = self.test_processor.publish_reinspection
         
         # Configurar handlers de shutdown
         self._setup_shutdown_handlers()
@@ -1579,9 +2046,44 @@ class FlaskVisionServer:
                 "logging_buffer_size": getattr(self.vm, 'current_log_buffer_size', lambda: 0)(),
                 "logs_count": getattr(self.vm, 'current_logs_count', lambda: 0)(),
                 "trigger_info": trigger_info,
-                "source_available": self.vm.image_source is not None
+                "source_available": self.vm.image_source is not None,
+                "pipeline": self.test_processor.get_pipeline_status()
             })
         
+        @self.app.route('/api/metrics', methods=['GET'])
+        def get_metrics():
+            """Histogramas de latência (p50/p90/p99/max) em formato Prometheus ou JSON (?format=json)"""
+            if request.args.get('format') == 'json':
+                return jsonify({
+                    'machine_id': self.vm.machine_id,
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'metrics': METRICS.to_dict()
+                })
+            return Response(METRICS.to_prometheus(), mimetype='text/plain; version=0.0.4')
+        
+        @self.app.route('/api/trace', methods=['GET', 'POST'])
+        def trace():
+            """Tracing por frame: GET exporta Chrome trace JSON (?last=N ou ?slowest=K);
+            POST liga/desliga ({"enabled": bool, "capacity": int, "clear": bool})"""
+            try:
+                if request.method == 'POST':
+                    data = request.get_json() or {}
+                    if data.get('clear'):
+                        self.trace_recorder.clear()
+                    if 'enabled' in data or 'capacity' in data:
+                        self.trace_recorder.set_enabled(
+                            data.get('enabled', self.trace_recorder.enabled),
+                            data.get('capacity')
+                        )
+                    logger.info(f"🧭 Tracing: {self.trace_recorder.stats()}")
+                    return jsonify({"success": True, **self.trace_recorder.stats()})
+                
+                last = request.args.get('last', type=int)
+                slowest = request.args.get('slowest', type=int)
+                return jsonify(self.trace_recorder.export_chrome_trace(last=last, slowest=slowest))
+            except Exception as e:
+                return jsonify({"error": str(e)}), 400
+        
         @self.app.route('/api/control', methods=['POST'])
         def control():
             """Endpoint para controle da VM pelo orquestrador"""
@@ -1944,6 +2446,8 @@ def main():
     parser.add_argument('--host', default='0.0.0.0', help='Host para bind do servidor')
     parser.add_argument('--port', type=int, default=5000, help='Porta do servidor')
     parser.add_argument('--debug', action='store_true', help='Modo debug')
+    parser.add_argument('--trace', action='store_true', help='Habilita tracing por frame (GET /api/trace)')
+    parser.add_argument('--trace-capacity', type=int, default=200, help='Quantidade de frames mantidos no trace')
     
     args = parser.parse_args()
     
@@ -1951,7 +2455,9 @@ def main():
     server = FlaskVisionServer(
         machine_id=args.machine_id,
         django_url=args.django_url,
-        config_file=args.config_file
+        config_file=args.config_file,
+        trace=args.trace,
+        trace_capacity=args.trace_capacity
     )
     
     try:
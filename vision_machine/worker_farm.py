@@ -0,0 +1,374 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Anexa um bloco de memória compartilhada criado pelo processo principal.
+
+    O processo principal é o dono do bloco (cria e remove); o worker apenas mapeia.
+    Os workers compartilham o resource_tracker do processo principal, então o registro
+    feito aqui (Python < 3.13) não remove o bloco quando o worker termina.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(worker_index: int, task_queue, result_queue, inspection_config: Dict[str, Any], config_version: int,
+                 fail_fast: bool = False):
+    """Loop de um processo worker: mantém seu próprio InspectionProcessor.
+
+    `fail_fast`: ativa o fail-fast da receita (modo RUN) em cada processador criado.
+
+    Mensagens recebidas em `task_queue`:
+    - ('frame', frame_number, shm_name, slot, offset, shape, dtype)
+    - ('config', version, inspection_config, fail_fast)
+    - ('fail_fast', enabled): troca de modo, aplicada a partir do próximo frame
+    - ('stop',)
+    """
+    from inspection_processor import InspectionProcessor
+
+    def _build(config, version, previous=None):
+        # Ferramentas inalteradas do processador anterior são reaproveitadas
+        if not config.get('tools'):
+            return None
+        built = InspectionProcessor(config, previous=previous, config_version=version)
+        built.set_fail_fast(fail_fast)
+        return built
+
+    processor = _build(inspection_config, config_version)
+    attached: Dict[str, shared_memory.SharedMemory] = {}
+
+    while True:
+        message = task_queue.get()
+        kind = message[0]
+        if kind == 'stop':
+            break
+        if kind == 'fail_fast':
+            fail_fast = message[1]
+            if processor is not None:
+                processor.set_fail_fast(fail_fast)
+            continue
+        if kind == 'config':
+            _, config_version, inspection_config, fail_fast = message
+            try:
+                new_processor = _build(inspection_config, config_version, processor)
+            except Exception as e:
+                print(f"❌ Worker {worker_index}: erro ao aplicar configuração v{config_version}: {str(e)}")
+                new_processor = None
+            if processor is not None:
+                processor.close()
+            processor = new_processor
+            continue
+
+        _, frame_number, shm_name, slot, offset, shape, dtype = message
+        start_time = time.time()
+        try:
+            shm = attached.get(shm_name)
+            if shm is None:
+                # Ring recriado pelo processo principal: descartar mapeamentos antigos
+                for old in attached.values():
+                    try:
+                        old.close()
+                    except BufferError:
+                        pass
+                attached = {shm_name: _attach_shared_memory(shm_name)}
+                shm = attached[shm_name]
+            frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+
+            if processor is None:
+                result_queue.put(('empty', frame_number, slot, worker_index, config_version, None, None))
+                continue
+
+            # O processador nunca escreve no frame de entrada (copy-on-write)
+            inspection_result = processor.process_inspection(frame)
+            final_image = inspection_result.pop('final_image', None)
+
+            # Imagem final volta pelo mesmo slot (sem pickle); None = igual ao frame de entrada
+            final_info = None
+            if isinstance(final_image, np.ndarray) and not np.may_share_memory(final_image, frame):
+                if final_image.nbytes <= frame.nbytes:
+                    out = np.ndarray(final_image.shape, dtype=final_image.dtype, buffer=shm.buf, offset=offset)
+                    np.copyto(out, final_image)
+                    final_info = ('slot', final_image.shape, final_image.dtype.str)
+                else:
+                    final_info = ('inline', final_image)
+            inspection_result['worker'] = {
+                'index': worker_index,
+                'config_version': config_version,
+                'total_ms': (time.time() - start_time) * 1000
+            }
+            del frame
+            result_queue.put(('ok', frame_number, slot, worker_index, config_version, inspection_result, final_info))
+        except Exception as e:
+            result_queue.put(('error', frame_number, slot, worker_index, config_version, str(e), None))
+
+    for shm in attached.values():
+        try:
+            shm.close()
+        except Exception:
+            pass
+
+
+class InspectionWorkerFarm:
+    """Pool de processos de inspeção alimentado por um ring de frames em memória compartilhada.
+
+    Cada worker mantém seu próprio `InspectionProcessor`. O frame é copiado uma vez para um
+    slot livre do ring (sem pickle da imagem) e o worker recebe apenas (nome, slot, shape);
+    a imagem final retorna pelo mesmo slot. `collect()` devolve os resultados reordenados
+    pelo número do frame, e `update_config()` envia a nova configuração a todos os workers
+    entre dois frames: todo frame submetido depois dela é processado com a nova versão.
+    `fail_fast=True` (modo RUN) ativa nos workers o fail-fast definido na receita; a troca de
+    modo chega aos workers por `set_fail_fast()`.
+    """
+
+    def __init__(self, inspection_config: Dict[str, Any], num_workers: int = 2, num_slots: Optional[int] = None,
+                 config_version: int = 0, fail_fast: bool = False):
+        self.num_workers = max(1, int(num_workers))
+        self.num_slots = max(self.num_workers, int(num_slots or self.num_workers * 2))
+        self.config_version = config_version
+        self.fail_fast = bool(fail_fast)
+        self._ctx = mp.get_context('spawn')
+        self._lock = threading.Lock()
+        self._result_queue = self._ctx.Queue()
+        self._task_queues = []
+        self._workers = []
+        self._in_flight: Dict[int, int] = {}
+        # frame_number -> (slot, worker, frame original, instante de submissão)
+        self._pending: Dict[int, Tuple[int, int, np.ndarray, float]] = {}
+        # frame_number -> (frame original, status, payload) aguardando os frames anteriores
+        self._completed: Dict[int, Tuple[np.ndarray, str, Any]] = {}
+        self._submitted_order: List[int] = []
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._slot_bytes = 0
+        self._free_slots: List[int] = []
+        self.dropped_results = 0
+        # (índice, exitcode) dos workers que terminaram inesperadamente
+        self.dead_workers: List[Tuple[int, Optional[int]]] = []
+
+        for index in range(self.num_workers):
+            task_queue = self._ctx.Queue()
+            worker = self._ctx.Process(
+                target=_worker_main,
+                args=(index, task_queue, self._result_queue, inspection_config, self.config_version, self.fail_fast),
+                name=f'InspectionWorker-{index}',
+                daemon=True
+            )
+            worker.start()
+            self._task_queues.append(task_queue)
+            self._workers.append(worker)
+            self._in_flight[index] = 0
+
+    # ------------------------------------------------------------------
+    # Submissão
+    # ------------------------------------------------------------------
+    def can_submit(self) -> bool:
+        """Há slot livre no ring (ou o ring ainda não foi criado)."""
+        with self._lock:
+            return self._shm is None or bool(self._free_slots)
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._completed)
+
+    def submit(self, frame_number: int, frame: np.ndarray) -> bool:
+        """Copia o frame para um slot livre e o envia ao worker menos ocupado.
+
+        Retorna False quando não há slot livre. Os números de frame devem ser crescentes.
+        """
+        frame = np.ascontiguousarray(frame)
+        with self._lock:
+            if self._shm is None or frame.nbytes > self._slot_bytes:
+                if self._pending:
+                    # Frame maior que o slot: aguardar o ring esvaziar antes de recriá-lo
+                    return False
+                self._create_ring(frame.nbytes)
+            if not self._free_slots:
+                return False
+            slot = self._free_slots.pop()
+            offset = slot * self._slot_bytes
+            target = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._shm.buf, offset=offset)
+            np.copyto(target, frame)
+            del target
+
+            if not self._in_flight:
+                # Todos os workers terminaram (falha já levantada por collect)
+                return False
+            worker = min(self._in_flight, key=self._in_flight.get)
+            self._in_flight[worker] += 1
+            self._pending[frame_number] = (slot, worker, frame, time.time())
+            self._submitted_order.append(frame_number)
+            self._task_queues[worker].put(
+                ('frame', frame_number, self._shm.name, slot, offset, frame.shape, frame.dtype.str)
+            )
+            return True
+
+    def update_config(self, inspection_config: Dict[str, Any], version: Optional[int] = None,
+                      fail_fast: Optional[bool] = None) -> int:
+        """Difunde a nova configuração para todos os workers e retorna a nova versão
+        (`version` quando informada, senão a atual + 1). `fail_fast` (quando informado)
+        troca também o modo; senão os workers mantêm o atual.
+
+        Feito sob o mesmo lock de `submit`: nenhum frame fica entre as mensagens de
+        configuração dos diferentes workers, então todos trocam de versão no mesmo frame.
+        """
+        with self._lock:
+            self.config_version = self.config_version + 1 if version is None else int(version)
+            if fail_fast is not None:
+                self.fail_fast = bool(fail_fast)
+            for task_queue in self._task_queues:
+                task_queue.put(('config', self.config_version, inspection_config, self.fail_fast))
+            return self.config_version
+
+    def set_fail_fast(self, enabled: bool):
+        """Ativa/desativa o fail-fast nos workers (troca de modo TESTE/RUN), a partir do
+        próximo frame submetido, no mesmo frame para todos (mesmo lock de `submit`)."""
+        with self._lock:
+            self.fail_fast = bool(enabled)
+            for task_queue in self._task_queues:
+                task_queue.put(('fail_fast', self.fail_fast))
+
+    # ------------------------------------------------------------------
+    # Coleta
+    # ------------------------------------------------------------------
+    def collect(self, timeout: float = 0.01) -> List[Tuple[int, np.ndarray, str, Any]]:
+        """Recebe os resultados disponíveis e devolve os que já estão em ordem.
+
+        Cada item é (frame_number, frame original, status, payload):
+        - 'ok': payload é o resultado de `process_inspection` (com 'final_image' e 'worker')
+        - 'empty': o worker não tem ferramentas configuradas (payload None)
+        - 'error': payload é a mensagem de erro
+
+        Se um worker terminou inesperadamente (OOM, crash nativo do OpenCV), seus frames
+        pendentes são descartados, os slots liberados e RuntimeError é levantado: sem isso o
+        frame dele ficaria para sempre à frente da ordem de entrega e o ring se esgotaria.
+        """
+        deadline = time.time() + max(0.0, timeout)
+        while True:
+            remaining = deadline - time.time()
+            try:
+                message = self._result_queue.get(timeout=remaining) if remaining > 0 else self._result_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._receive(message)
+            # Após o primeiro, drenar o que já chegou sem esperar
+            deadline = 0
+        self._check_workers()
+
+        ready = []
+        with self._lock:
+            while self._submitted_order and self._submitted_order[0] in self._completed:
+                frame_number = self._submitted_order.pop(0)
+                frame, status, payload = self._completed.pop(frame_number)
+                ready.append((frame_number, frame, status, payload))
+        return ready
+
+    def _receive(self, message):
+        status, frame_number, slot, worker, config_version, payload, final_info = message
+        with self._lock:
+            pending = self._pending.pop(frame_number, None)
+            if pending is None:
+                self.dropped_results += 1
+                return
+            _, _, frame, submitted_at = pending
+            if worker in self._in_flight:
+                self._in_flight[worker] = max(0, self._in_flight[worker] - 1)
+
+            if status == 'ok':
+                if final_info is None:
+                    payload['final_image'] = frame
+                elif final_info[0] == 'slot':
+                    _, shape, dtype = final_info
+                    view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self._shm.buf, offset=slot * self._slot_bytes)
+                    # Cópia necessária: o slot será reutilizado pelo próximo frame
+                    payload['final_image'] = view.copy()
+                    del view
+                else:
+                    payload['final_image'] = final_info[1]
+                payload['worker']['round_trip_ms'] = (time.time() - submitted_at) * 1000
+
+            self._free_slots.append(slot)
+            self._completed[frame_number] = (frame, status, payload)
+
+    def _check_workers(self):
+        """Detecta workers mortos; descarta seus frames pendentes e levanta RuntimeError."""
+        dead = [index for index in self._in_flight if not self._workers[index].is_alive()]
+        if not dead:
+            return
+        # Resultados que o worker enviou antes de terminar ainda são aproveitados
+        while True:
+            try:
+                self._receive(self._result_queue.get_nowait())
+            except queue.Empty:
+                break
+        lost = []
+        with self._lock:
+            for index in dead:
+                del self._in_flight[index]
+                self.dead_workers.append((index, self._workers[index].exitcode))
+                for frame_number, (slot, worker, _, _) in list(self._pending.items()):
+                    if worker == index:
+                        del self._pending[frame_number]
+                        self._submitted_order.remove(frame_number)
+                        self._free_slots.append(slot)
+                        lost.append(frame_number)
+        details = ', '.join(f"worker {index} (exitcode {self._workers[index].exitcode})" for index in dead)
+        raise RuntimeError(f"Worker farm: {details} terminou inesperadamente; frames perdidos: {sorted(lost) or 'nenhum'}")
+
+    # ------------------------------------------------------------------
+    # Ring de memória compartilhada
+    # ------------------------------------------------------------------
+    def _create_ring(self, frame_bytes: int):
+        self._release_ring()
+        # Alinhar slots em 64 bytes
+        self._slot_bytes = (int(frame_bytes) + 63) // 64 * 64
+        self._shm = shared_memory.SharedMemory(create=True, size=self._slot_bytes * self.num_slots)
+        self._free_slots = list(range(self.num_slots - 1, -1, -1))
+
+    def _release_ring(self):
+        if self._shm is not None:
+            try:
+                self._shm.close()
+                self._shm.unlink()
+            except Exception:
+                pass
+            self._shm = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'alive': sum(1 for w in self._workers if w.is_alive()),
+                'slots': self.num_slots,
+                'free_slots': len(self._free_slots) if self._shm is not None else self.num_slots,
+                'slot_bytes': self._slot_bytes,
+                'in_flight': dict(self._in_flight),
+                'config_version': self.config_version,
+                'fail_fast': self.fail_fast,
+                'dropped_results': self.dropped_results,
+            }
+
+    def close(self, timeout: float = 2.0):
+        """Encerra os workers e remove o ring de memória compartilhada."""
+        for task_queue in self._task_queues:
+            try:
+                task_queue.put(('stop',))
+            except Exception:
+                pass
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+            if worker.is_alive():
+                worker.terminate()
+        with self._lock:
+            self._pending.clear()
+            self._completed.clear()
+            self._submitted_order.clear()
+            self._release_ring()